@@ -0,0 +1,163 @@
+"""Microbenchmark per-request work in the 7taps webhook before/after single-pass analysis.
+
+"before" replays the old request flow: the debug loop awaited
+``analyze_xapi_statement_content`` for every statement, then
+``_prepare_statement_payload`` awaited it again before publishing.  "after"
+runs the current ``_publish_7taps_statements``, which builds one
+``StatementContext`` per statement.  Both sides share the same stubs:
+Pub/Sub publishing is a local no-op and ``batch_processor.process_content``
+routes like the real processor (obvious local-rule hit -> immediate Gemini
+call, otherwise batch queue) without leaving the process, so external calls
+are counted rather than made.
+
+    PYTHONPATH=. python .infra/scripts/benchmark_7taps_webhook.py \\
+        --statements 20 --requests 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+from app.api import ai_flagged_content, batch_ai_safety, seventaps, xapi
+from app.services.dedup_store import get_dedup_store
+
+_publish_contexts = xapi.publish_contexts_async
+
+RESPONSES = [
+    "I tried a screen-free evening and slept better.",
+    "Honestly I have felt hopeless this week.",
+    "Going for walks at lunch helped me focus.",
+    "Sometimes I want to end it all.",
+]
+
+
+def _statements(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "actor": {"mbox": f"mailto:Learner{i}@Example.com", "name": f"Learner {i}"},
+            "verb": {"id": "http://adlnet.gov/expapi/verbs/responded", "display": {"en-US": "responded"}},
+            "object": {
+                "id": "https://7taps.com/lessons/lesson-3",
+                "definition": {"name": {"en-US": "Lesson 3 reflection"}},
+            },
+            "result": {"response": RESPONSES[i % len(RESPONSES)]},
+            "timestamp": "2025-01-01T00:00:00Z",
+        }
+        for i in range(count)
+    ]
+
+
+def _counting(counter: Counter, name: str, func):
+    def wrapper(*args, **kwargs):
+        counter[name] += 1
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _instrument(stack: ExitStack, counter: Counter) -> None:
+    check = batch_ai_safety.check_obvious_flags
+    extract = ai_flagged_content.extract_statement_text
+
+    async def process_content(content, context, statement_id, user_id):
+        counter["ai_analyzer_calls"] += 1
+        obvious = batch_ai_safety.check_obvious_flags(content)
+        if obvious["is_obvious"]:
+            counter["external_calls"] += 1  # immediate Gemini request
+        return {"status": "queued", "analysis_metadata": {}}
+
+    stack.enter_context(patch.object(batch_ai_safety, "check_obvious_flags", _counting(counter, "rule_checks", check)))
+    stack.enter_context(patch.object(ai_flagged_content, "extract_statement_text", _counting(counter, "text_extractions", extract)))
+    stack.enter_context(patch.object(xapi, "extract_statement_text", _counting(counter, "text_extractions", extract)))
+    stack.enter_context(patch.object(batch_ai_safety.batch_processor, "process_content", process_content))
+    stack.enter_context(patch.object(
+        xapi, "_publish_payloads",
+        lambda payloads, source: [{"success": True, "message_id": str(i)} for i, _ in enumerate(payloads)],
+    ))
+    stack.enter_context(patch.object(xapi, "_alert_critical_statement", lambda payload, verdict: None))
+    stack.enter_context(patch("builtins.print", lambda *args, **kwargs: None))
+
+
+def _legacy_build_context(statement, *, source):
+    """Old ``_prepare_statement_payload`` minus its awaited analysis (added on publish)."""
+    if not statement.id:
+        statement.id = str(uuid.uuid4())
+    payload = statement.to_dict()
+    payload["id"] = statement.id
+    payload["ingested_at"] = datetime.now(timezone.utc).isoformat()
+    payload["ingestion_source"] = source
+    return xapi.StatementContext(statement=statement, source=source, payload=payload)
+
+
+async def _legacy_publish(contexts, *, source):
+    for context in contexts:
+        context.payload["ai_content_analysis"] = await ai_flagged_content.analyze_xapi_statement_content(
+            context.payload
+        )
+    return await _publish_contexts(contexts, source=source)
+
+
+async def legacy_request(statements: List[Dict[str, Any]], source: str) -> None:
+    """The pre-context request flow: analyze in the debug loop, then again before publish."""
+    for statement in statements:
+        await ai_flagged_content.analyze_xapi_statement_content(statement)
+
+    with patch.object(seventaps, "build_statement_context", _legacy_build_context), \
+            patch.object(xapi, "publish_contexts_async", _legacy_publish):
+        await seventaps._publish_7taps_statements(statements, source=source)
+
+
+async def current_request(statements: List[Dict[str, Any]], source: str) -> None:
+    await seventaps._publish_7taps_statements(statements, source=source)
+
+
+def run(label: str, handler, statements_per_request: int, requests: int) -> Dict[str, Any]:
+    counter: Counter = Counter()
+    with ExitStack() as stack:
+        _instrument(stack, counter)
+
+        async def drive() -> float:
+            cpu = 0.0
+            for _ in range(requests):
+                statements = _statements(statements_per_request)
+                started = time.process_time()
+                await handler(statements, "bench")
+                cpu += time.process_time() - started
+            return cpu
+
+        cpu_seconds = asyncio.run(drive())
+
+    per_request = {name: count / requests for name, count in sorted(counter.items())}
+    return {"label": label, "cpu_ms_per_request": cpu_seconds * 1000 / requests, **per_request}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, default=20, help="statements per webhook request")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    get_dedup_store().clear()
+    run("warmup", current_request, args.statements, 5)
+    results = [
+        run("before", legacy_request, args.statements, args.requests),
+        run("after", current_request, args.statements, args.requests),
+    ]
+
+    columns = ["cpu_ms_per_request", "ai_analyzer_calls", "external_calls", "rule_checks", "text_extractions"]
+    print(f"{args.statements} statements/request, {args.requests} requests (per-request averages)")
+    print(f"{'':>7}  " + "  ".join(f"{column:>18}" for column in columns))
+    for result in results:
+        print(f"{result['label']:>7}  " + "  ".join(f"{result.get(column, 0):>18.2f}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare a full-day scan of the JSON archive tier with the Parquet tier.
+
+One day of statements is archived into an in-memory bucket twice: as the
+NDJSON.gz segments the storage subscriber writes and as the Parquet files
+of ``app.etl.parquet_archive``.  Each tier is then scanned for the columns
+a retroactive trigger-word scan needs (``statement_id``, ``timestamp``,
+``result_response``), once unfiltered and once filtered to one verb.  The
+JSON tier has to download, decompress and parse every statement; the
+Parquet reader fetches only the projected column chunks and the row groups
+whose statistics match.
+
+    PYTHONPATH=. python .infra/scripts/benchmark_archive_tiers.py --statements 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmark_columnar_transform import _statements
+from local_gcp import LocalBucket
+
+from app.etl.archive_segments import ArchiveSegmentConfig, SegmentArchiveWriter, iter_archived_statements
+from app.etl.parquet_archive import ParquetArchiveConfig, ParquetArchiveWriter, read_parquet_archive
+
+DAY = "2025-01-01"
+PUBLISHED = datetime(2025, 1, 1, 12, tzinfo=timezone.utc)
+COLUMNS = ["statement_id", "timestamp", "result_response"]
+VERB = "http://adlnet.gov/expapi/verbs/completed"
+
+
+def archive_day(statements: List[Dict[str, Any]]) -> Tuple[LocalBucket, Dict[str, int]]:
+    bucket = LocalBucket("benchmark")
+    segments = SegmentArchiveWriter(bucket, ArchiveSegmentConfig(max_age=3600.0), writer_id="bench")
+    parquet = ParquetArchiveWriter(bucket, ParquetArchiveConfig(max_age=3600.0), writer_id="bench")
+    for statement in statements:
+        segments.append(statement, lambda ok: None, PUBLISHED)
+        parquet.append(statement, PUBLISHED)
+    segments.close()
+    parquet.close()
+    return bucket, {
+        "json_bytes": segments.metrics["bytes_uploaded"],
+        "parquet_bytes": parquet.metrics["bytes_uploaded"],
+    }
+
+
+def json_scan(bucket: LocalBucket, verb: str | None = None) -> int:
+    rows = []
+    for statement, _ in iter_archived_statements(bucket, DAY):
+        if verb and (statement.get("verb") or {}).get("id") != verb:
+            continue
+        rows.append((statement.get("id"), statement.get("timestamp"), (statement.get("result") or {}).get("response")))
+    return len(rows)
+
+
+def parquet_scan(bucket: LocalBucket, verb: str | None = None) -> int:
+    filters = [("verb_id", "=", verb)] if verb else None
+    return read_parquet_archive(bucket, DAY, columns=COLUMNS, filters=filters).num_rows
+
+
+def measure(scan: Callable[..., int], bucket: LocalBucket, verb: str | None) -> Dict[str, Any]:
+    bucket.bytes_read = 0
+    started = time.perf_counter()
+    rows = scan(bucket, verb)
+    elapsed = time.perf_counter() - started
+    return {"rows": rows, "seconds": elapsed, "read_mb": bucket.bytes_read / 1024 / 1024}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, default=100000)
+    args = parser.parse_args()
+
+    statements = _statements(args.statements)
+    for i, statement in enumerate(statements):
+        if i % 4 == 0:
+            statement["verb"] = {"id": VERB, "display": {"en-US": "completed"}}
+    bucket, sizes = archive_day(statements)
+    print(
+        f"{args.statements} statements: JSON tier {sizes['json_bytes'] / 1024 / 1024:.1f} MB, "
+        f"Parquet tier {sizes['parquet_bytes'] / 1024 / 1024:.1f} MB"
+    )
+    print(f"{'scan':>16}  {'rows':>8}  {'seconds':>8}  {'rows_per_sec':>12}  {'read_mb':>8}")
+    for verb in (None, VERB):
+        for tier, scan in (("json", json_scan), ("parquet", parquet_scan)):
+            result = measure(scan, bucket, verb)
+            name = f"{tier}{' +verb' if verb else ''}"
+            print(
+                f"{name:>16}  {result['rows']:>8}  {result['seconds']:>8.3f}  "
+                f"{result['rows'] / result['seconds']:>12.0f}  {result['read_mb']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
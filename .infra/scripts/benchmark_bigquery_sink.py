@@ -0,0 +1,138 @@
+"""Measure BigQueryBatchSink throughput against a local BigQuery stand-in.
+
+The stand-in keeps tables in memory and charges a fixed latency per job
+(load or query) plus a small per-row cost, which is what dominates real
+BigQuery DML: a per-statement MERGE pays the job overhead for every row.
+Batch size 1 reproduces the old one-MERGE-per-message behaviour.
+
+    PYTHONPATH=. python .infra/scripts/benchmark_bigquery_sink.py \\
+        --rows 1000 --batch-sizes 1 50 500 --job-latency 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+from app.etl.bigquery_batch_sink import BigQueryBatchSink, SinkConfig
+
+
+class _Job:
+    def __init__(self, client: "LocalBigQuery", work):
+        self._client = client
+        self._work = work
+        self.num_dml_affected_rows = None
+
+    def result(self):
+        self._client.jobs += 1
+        self.num_dml_affected_rows = self._work()
+        time.sleep(self._client.job_latency + self._client.row_latency * (self.num_dml_affected_rows or 0))
+        return self
+
+
+class LocalBigQuery:
+    """In-memory stand-in for the subset of ``bigquery.Client`` the sink uses."""
+
+    def __init__(self, job_latency: float = 0.05, row_latency: float = 0.00002):
+        self.project = "local"
+        self.job_latency = job_latency
+        self.row_latency = row_latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.jobs = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _name(table_id: str) -> str:
+        return table_id.split(".", 1)[1] if table_id.startswith("local.") else table_id
+
+    def create_table(self, table):
+        self.tables.setdefault(f"{table.dataset_id}.{table.table_id}", [])
+
+    def delete_table(self, table_id, not_found_ok=False):
+        self.tables.pop(self._name(table_id), None)
+
+    def load_table_from_json(self, rows, table_id, job_config=None):
+        def work():
+            self.tables.setdefault(self._name(table_id), []).extend(rows)
+            return len(rows)
+        return _Job(self, work)
+
+    def query(self, sql, job_config=None):
+        target, staging = re.search(r"MERGE `([^`]+)` T\s+USING `([^`]+)` S", sql).groups()
+
+        def work():
+            with self._lock:
+                existing = {row["statement_id"] for row in self.tables.setdefault(target, [])}
+                new_rows = [row for row in self.tables.get(staging, []) if row["statement_id"] not in existing]
+                self.tables[target].extend(new_rows)
+            return len(new_rows)
+        return _Job(self, work)
+
+
+def _rows(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "statement_id": str(uuid.uuid4()),
+            "timestamp": "2025-01-01T00:00:00Z",
+            "stored": "2025-01-01T00:00:01Z",
+            "actor_id": f"learner{i}@example.com",
+            "verb_id": "http://adlnet.gov/expapi/verbs/completed",
+            "object_id": f"https://7taps.com/lessons/lesson-{i % 10}",
+            "result_response": "I slept better this week.",
+            "raw_json": "{}",
+        }
+        for i in range(count)
+    ]
+
+
+def run(batch_size: int, rows: int, job_latency: float) -> Dict[str, Any]:
+    client = LocalBigQuery(job_latency=job_latency)
+    sink = BigQueryBatchSink(client, "taps_data", "statements", SinkConfig(batch_size=batch_size, max_latency=0.2))
+    acked = threading.Semaphore(0)
+    committed = []
+
+    def on_commit(ok: bool) -> None:
+        committed.append(ok)
+        acked.release()
+
+    started = time.perf_counter()
+    for row in _rows(rows):
+        sink.add(row, on_commit)
+    for _ in range(rows):
+        acked.acquire()
+    elapsed = time.perf_counter() - started
+    sink.close()
+
+    return {
+        "batch_size": batch_size,
+        "rows_per_sec": rows / elapsed,
+        "jobs": client.jobs,
+        "jobs_per_row": client.jobs / rows,
+        "committed": sum(committed),
+        "stored": len(client.tables.get("taps_data.statements", [])),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--job-latency", type=float, default=0.05, help="seconds per BigQuery job")
+    args = parser.parse_args()
+
+    print(f"{args.rows} rows, {args.job_latency * 1000:.0f}ms per job")
+    print(f"{'batch':>6}  {'rows_per_sec':>12}  {'jobs':>6}  {'jobs_per_row':>12}  {'committed':>9}  {'stored':>6}")
+    for batch_size in args.batch_sizes:
+        result = run(batch_size, args.rows, args.job_latency)
+        print(
+            f"{result['batch_size']:>6}  {result['rows_per_sec']:>12.1f}  {result['jobs']:>6}  "
+            f"{result['jobs_per_row']:>12.3f}  {result['committed']:>9}  {result['stored']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compare the per-row dict transform with the columnar Arrow/Parquet transform.
+
+The dict path is what a JSON staging load pays today: one
+``transform_xapi_to_bigquery_row`` dict per statement, projected onto the
+staging schema and serialized as newline-delimited JSON.  The columnar path
+extracts straight into per-column lists, builds one Arrow RecordBatch and
+writes Parquet.  Throughput and peak memory (tracemalloc) are measured in
+separate passes so tracing does not skew the timings.
+
+    PYTHONPATH=. python .infra/scripts/benchmark_columnar_transform.py --statements 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, List
+
+from app.etl import columnar_transform
+from app.etl.bigquery_batch_sink import staging_row
+from app.etl.pubsub_bigquery_processor import PubSubBigQueryProcessor
+from app.utils import json_codec
+
+
+def _statements(count: int) -> List[Dict[str, Any]]:
+    statements = []
+    for i in range(count):
+        statement = {
+            "id": str(uuid.uuid4()),
+            "timestamp": "2025-01-01T00:00:00.000Z",
+            "version": "1.0.3",
+            "actor": {"objectType": "Agent", "name": f"Learner {i}", "mbox": f"mailto:learner{i}@example.com"},
+            "verb": {"id": "http://adlnet.gov/expapi/verbs/answered", "display": {"en-US": "answered"}},
+            "object": {
+                "id": f"https://7taps.com/lessons/lesson-{i % 10}/cards/{i % 7}",
+                "objectType": "Activity",
+                "definition": {
+                    "name": {"en-US": f"Card {i % 7}"},
+                    "type": "http://adlnet.gov/expapi/activities/cmi.interaction",
+                },
+            },
+            "context": {"platform": "7taps", "language": "en-US", "registration": str(uuid.uuid4())},
+        }
+        if i % 2:
+            statement["result"] = {
+                "score": {"raw": i % 10, "min": 0, "max": 10, "scaled": (i % 10) / 10},
+                "success": True,
+                "completion": True,
+                "response": "I slept better this week.",
+                "duration": "PT1M",
+            }
+        statements.append(statement)
+    return statements
+
+
+def dict_path(statements: List[Dict[str, Any]]) -> int:
+    transform = PubSubBigQueryProcessor.transform_xapi_to_bigquery_row
+    processor = object.__new__(PubSubBigQueryProcessor)  # the transform uses no client state
+    payload = b"\n".join(
+        json_codec.dumps_bytes(staging_row(transform(processor, statement, "")))
+        for statement in statements
+    )
+    return len(payload)
+
+
+def columnar_path(statements: List[Dict[str, Any]]) -> int:
+    batch = columnar_transform.statements_to_record_batch(statements)
+    return len(columnar_transform.to_parquet_bytes(batch))
+
+
+def measure(path: Callable[[List[Dict[str, Any]]], int], statements: List[Dict[str, Any]]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    size = path(statements)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    path(statements)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "rows_per_sec": len(statements) / elapsed,
+        "peak_mb": peak / 1024 / 1024,
+        "output_mb": size / 1024 / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, default=100000)
+    args = parser.parse_args()
+
+    statements = _statements(args.statements)
+    print(f"{args.statements} statements, JSON backend: {json_codec.BACKEND}")
+    print(f"{'path':>10}  {'rows_per_sec':>12}  {'peak_mb':>8}  {'output_mb':>9}")
+    for name, path in (("dict", dict_path), ("columnar", columnar_path)):
+        result = measure(path, statements)
+        print(f"{name:>10}  {result['rows_per_sec']:>12.0f}  {result['peak_mb']:>8.1f}  {result['output_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Microbenchmark JSON encode/decode of realistic 7taps statements: stdlib vs the shared codec.
+
+Each round runs the serialization a statement goes through on its way to
+BigQuery: publish (encode to bytes), subscriber decode, ``raw_json`` encode
+for the row, the archive's indented encode, and the trigger-word alert's
+``to_jsonable`` round trip.  "stdlib" uses ``json`` exactly as those paths
+did before; "codec" uses ``app.utils.json_codec`` (orjson when installed).
+
+    PYTHONPATH=. python .infra/scripts/benchmark_json_codec.py --statements 500 --rounds 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from app.utils import json_codec
+
+RESPONSES = [
+    "I tried a screen-free evening and slept better. 😊",
+    "Honestly I have felt hopeless this week.",
+    "Going for walks at lunch helped me focus — über hilfreich.",
+    "Me senté a leer en vez de mirar el teléfono.",
+]
+
+
+def _statements(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "actor": {
+                "objectType": "Agent",
+                "mbox": f"mailto:learner{i}@example.com",
+                "name": f"Learner {i}",
+                "account": {"homePage": "https://7taps.com", "name": f"learner-{i}"},
+            },
+            "verb": {"id": "http://adlnet.gov/expapi/verbs/responded", "display": {"en-US": "responded"}},
+            "object": {
+                "objectType": "Activity",
+                "id": f"https://7taps.com/lessons/lesson-{i % 10}/cards/{i % 7}",
+                "definition": {
+                    "name": {"en-US": f"Lesson {i % 10} reflection"},
+                    "description": {"en-US": "Describe one change you made to your screen habits this week."},
+                    "type": "http://adlnet.gov/expapi/activities/cmi.interaction",
+                    "interactionType": "long-fill-in",
+                },
+            },
+            "result": {
+                "response": RESPONSES[i % len(RESPONSES)],
+                "completion": True,
+                "success": True,
+                "duration": "PT2M14S",
+                "score": {"raw": i % 10, "min": 0, "max": 10, "scaled": (i % 10) / 10},
+            },
+            "context": {
+                "registration": str(uuid.uuid4()),
+                "platform": "7taps",
+                "language": "en-US",
+                "contextActivities": {
+                    "parent": [{"id": f"https://7taps.com/lessons/lesson-{i % 10}"}],
+                    "grouping": [{"id": "https://7taps.com/courses/digital-wellness"}],
+                },
+                "extensions": {
+                    "https://7taps.com/cohort": "cohort-a",
+                    "https://7taps.com/card-index": i % 7,
+                },
+            },
+            "timestamp": datetime(2025, 1, 1, tzinfo=timezone.utc).isoformat(),
+            "stored": datetime.now(timezone.utc),  # a non-JSON type, as seen by to_jsonable
+        }
+        for i in range(count)
+    ]
+
+
+def stdlib_pipeline(statement: Dict[str, Any]) -> None:
+    message = json.dumps(statement, default=str).encode("utf-8")
+    decoded = json.loads(message.decode("utf-8"))
+    json.dumps(decoded)
+    json.dumps(decoded, indent=2)
+    json.loads(json.dumps(statement, default=str))
+
+
+def codec_pipeline(statement: Dict[str, Any]) -> None:
+    message = json_codec.dumps_bytes(statement, default=str)
+    decoded = json_codec.loads(message)
+    json_codec.dumps(decoded)
+    json_codec.dumps(decoded, indent=True)
+    json_codec.to_jsonable(statement)
+
+
+def run(label: str, pipeline: Callable[[Dict[str, Any]], None], statements, rounds: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for statement in statements:
+            pipeline(statement)
+    elapsed = time.perf_counter() - started
+    processed = len(statements) * rounds
+    return {
+        "label": label,
+        "us_per_statement": elapsed / processed * 1e6,
+        "statements_per_sec": processed / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    statements = _statements(args.statements)
+    run("warmup", codec_pipeline, statements, 1)
+    results = [
+        run("stdlib", stdlib_pipeline, statements, args.rounds),
+        run("codec", codec_pipeline, statements, args.rounds),
+    ]
+
+    print(f"codec backend: {json_codec.BACKEND}; {args.statements} statements x {args.rounds} rounds")
+    print(f"{'':>7}  {'us_per_statement':>18}  {'statements_per_sec':>18}")
+    for result in results:
+        print(f"{result['label']:>7}  {result['us_per_statement']:>18.2f}  {result['statements_per_sec']:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""End-to-end pipeline benchmark: ingest route -> Pub/Sub -> BigQuery/GCS, in one process.
+
+Drives ``POST /api/xapi/ingest/batch`` with concurrent clients while the real
+``PubSubBigQueryProcessor`` and ``PubSubStorageSubscriber`` (or, with
+``--consumers unified``, the ``UnifiedConsumer``) consume from a local
+Pub/Sub broker and write to a SQLite-backed BigQuery stand-in and an
+in-memory bucket (see ``local_gcp.py``).  Latency can be injected per
+publish batch, per BigQuery job (plus per affected row) and per upload.
+
+Reports sustained statements/sec (first send to last row committed),
+p50/p95/p99 ingest-to-row latency (request sent to MERGE visible) and
+BigQuery jobs per statement, and writes everything to a JSON file so runs
+can be compared:
+
+    PYTHONPATH=. python .infra/scripts/benchmark_pipeline_e2e.py \\
+        --statements 5000 --clients 8 --batch-size 50 \\
+        --bq-job-latency 0.5 --publish-latency 0.02 --output before.json
+    PYTHONPATH=. python .infra/scripts/benchmark_pipeline_e2e.py ... --compare before.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from google.cloud import bigquery, pubsub_v1
+
+from local_gcp import LocalBigQuery, LocalGCPConfig, LocalPubSub, LocalStorage
+
+from app.config import settings
+from app.etl.archive_segments import LEGACY_PREFIX, MANIFEST_SUFFIX
+from app.utils import json_codec
+
+USERS_SCHEMA = [
+    bigquery.SchemaField(name, field_type)
+    for name, field_type in [
+        ("user_id", "STRING"),
+        ("email", "STRING"),
+        ("name", "STRING"),
+        ("sources", "STRING"),
+        ("first_seen", "TIMESTAMP"),
+        ("last_seen", "TIMESTAMP"),
+        ("activity_count", "INTEGER"),
+        ("csv_data", "JSON"),
+        ("created_at", "TIMESTAMP"),
+        ("updated_at", "TIMESTAMP"),
+    ]
+]
+
+HEADLINE = ["statements_per_sec", "latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "bigquery_jobs_per_statement"]
+
+
+def _statements(count: int, learners: int) -> List[Dict[str, Any]]:
+    statements = []
+    for i in range(count):
+        learner = i % learners
+        statement = {
+            "id": str(uuid.uuid4()),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "version": "1.0.3",
+            "actor": {"objectType": "Agent", "name": f"Learner {learner}", "mbox": f"mailto:learner{learner}@example.com"},
+            "verb": {"id": "http://adlnet.gov/expapi/verbs/answered", "display": {"en-US": "answered"}},
+            "object": {
+                "id": f"https://7taps.com/lessons/lesson-{i % 10}/cards/{i % 7}",
+                "objectType": "Activity",
+                "definition": {
+                    "name": {"en-US": f"Card {i % 7}"},
+                    "type": "http://adlnet.gov/expapi/activities/cmi.interaction",
+                },
+            },
+            "context": {"platform": "7taps", "language": "en-US"},
+        }
+        if i % 2:
+            statement["result"] = {"response": "I slept better this week.", "completion": True, "duration": "PT1M"}
+        statements.append(statement)
+    return statements
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 2)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class PipelineHarness:
+    """Wires the stand-ins into the app modules and runs the consumers in background threads."""
+
+    def __init__(self, args: argparse.Namespace):
+        from app.api import cloud_function_ingestion
+
+        self.args = args
+        self.bigquery = LocalBigQuery(job_latency=args.bq_job_latency, row_latency=args.bq_row_latency)
+        self.pubsub = LocalPubSub(publish_latency=args.publish_latency)
+        self.storage = LocalStorage(upload_latency=args.gcs_latency)
+        self.config = LocalGCPConfig(
+            self.bigquery,
+            self.storage,
+            project_id=cloud_function_ingestion.PROJECT_ID,
+            pubsub_topic=cloud_function_ingestion.PUBSUB_TOPIC,
+        )
+        self.consumers: List[Any] = []
+        self._stack = ExitStack()
+
+    def __enter__(self) -> "PipelineHarness":
+        from app.api import cloud_function_ingestion
+        from app.config.bigquery_schema import BigQuerySchema
+        from app.etl import archive_index
+        from app.services import user_normalization
+        from app.services.pubsub_publisher import PubSubPublisherService
+
+        stack = self._stack
+        stack.enter_context(patch.object(settings, "INGEST_ADMISSION_ENABLED", self.args.admission))
+        stack.enter_context(patch.object(settings, "BIGQUERY_SINK_LOAD_FORMAT", self.args.load_format))
+        stack.enter_context(patch.object(settings, "ARCHIVE_SEGMENTS_ENABLED", self.args.archive == "segments"))
+        stack.enter_context(patch.object(settings, "ARCHIVE_SEGMENT_MAX_AGE", self.args.archive_max_age))
+        if self.args.sink_batch_size:
+            stack.enter_context(patch.object(settings, "BIGQUERY_SINK_BATCH_SIZE", self.args.sink_batch_size))
+
+        for target in (
+            "app.config.bigquery_schema.gcp_config",
+            "app.etl.pubsub_storage_subscriber.gcp_config",
+        ):
+            stack.enter_context(patch(target, self.config))
+        for target in (
+            "app.etl.pubsub_bigquery_processor.get_gcp_config",
+            "app.services.user_normalization.get_gcp_config",
+            "app.config.gcp_config.get_gcp_config",
+        ):
+            stack.enter_context(patch(target, return_value=self.config))
+        stack.enter_context(patch.object(pubsub_v1, "SubscriberClient", self.pubsub.subscriber))
+        stack.enter_context(patch.object(user_normalization, "user_normalization_service", None))
+        stack.enter_context(patch.object(archive_index, "_archive_index", None))
+
+        publisher_service = PubSubPublisherService(
+            cloud_function_ingestion.PROJECT_ID,
+            cloud_function_ingestion.PUBSUB_TOPIC,
+            client_factory=self.pubsub.publisher,
+        )
+        stack.enter_context(patch.object(cloud_function_ingestion, "publisher_service", publisher_service))
+        stack.enter_context(patch.object(cloud_function_ingestion, "publisher", None))
+        stack.enter_context(patch.object(cloud_function_ingestion, "topic_path", None))
+        stack.enter_context(patch.object(cloud_function_ingestion, "admission_controller", None))
+
+        for table_id, schema in BigQuerySchema().get_table_schemas().items():
+            self.bigquery.create_table(bigquery.Table(f"local.{self.config.bigquery_dataset}.{table_id}", schema=schema))
+        self.bigquery.create_table(bigquery.Table(f"local.{self.config.bigquery_dataset}.users", schema=USERS_SCHEMA))
+        return self
+
+    def start_consumers(self, timeout: float = 30.0) -> None:
+        if self.args.consumers == "unified":
+            from app.etl.unified_consumer import UnifiedConsumer
+
+            consumer = UnifiedConsumer()
+            self.consumers.append((consumer, consumer.start_processing, consumer.stop_processing))
+        else:
+            from app.etl.pubsub_bigquery_processor import PubSubBigQueryProcessor
+            from app.etl.pubsub_storage_subscriber import PubSubStorageSubscriber
+
+            processor = PubSubBigQueryProcessor()
+            subscriber = PubSubStorageSubscriber()
+            self.consumers.append((processor, processor.start_processing, processor.stop_processing))
+            self.consumers.append((subscriber, subscriber.start_subscribing, subscriber.stop_subscribing))
+
+        for consumer, start, _ in self.consumers:
+            threading.Thread(target=start, name=f"bench-{type(consumer).__name__}", daemon=True).start()
+
+        # Messages published before a subscription exists are dropped, as in Pub/Sub
+        deadline = time.monotonic() + timeout
+        while len(self.pubsub.subscriptions) < len(self.consumers):
+            if time.monotonic() > deadline:
+                raise RuntimeError("Consumers did not create their subscriptions")
+            time.sleep(0.05)
+
+    def archived(self) -> int:
+        """Statements archived: one per legacy object plus each segment manifest's record count."""
+        total = 0
+        for name, blob in list(self.storage.bucket(self.config.storage_bucket).objects.items()):
+            if name.endswith(MANIFEST_SUFFIX):
+                total += json.loads(blob.data)["records"]
+            elif name.startswith(LEGACY_PREFIX):
+                total += 1
+        return total
+
+    def __exit__(self, *exc_info) -> None:
+        for _, _, stop in self.consumers:
+            try:
+                stop()
+            except Exception as e:
+                print(f"warning: failed to stop consumer: {e}", file=sys.stderr)
+        self.pubsub.close()
+        self._stack.close()
+
+
+def _drive_load(app: FastAPI, statements: List[Dict[str, Any]], args: argparse.Namespace) -> Dict[str, Any]:
+    """Post ``statements`` in batches from ``args.clients`` threads; returns send times and request stats."""
+    batches = [statements[i:i + args.batch_size] for i in range(0, len(statements), args.batch_size)]
+    sent_at: Dict[str, float] = {}
+    request_ms: List[float] = []
+    counters = {"requests": 0, "throttled": 0, "rejected": 0}
+    lock = threading.Lock()
+    cursor = iter(batches)
+
+    def client_loop(client_id: int) -> None:
+        client = TestClient(app)
+        headers = {"X-Forwarded-For": f"10.0.0.{client_id}"}
+        while True:
+            with lock:
+                batch = next(cursor, None)
+            if batch is None:
+                return
+            while True:
+                started = time.perf_counter()
+                with lock:
+                    for statement in batch:
+                        sent_at.setdefault(statement["id"], started)
+                response = client.post("/api/xapi/ingest/batch", json=batch, headers=headers)
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    counters["requests"] += 1
+                    request_ms.append(elapsed)
+                if response.status_code != 429:
+                    break
+                with lock:
+                    counters["throttled"] += 1
+                time.sleep(float(response.headers.get("Retry-After", 1)))
+            if response.status_code != 200:
+                with lock:
+                    counters["rejected"] += len(batch)
+                continue
+            failed = [result for result in response.json()["batch_results"] if not result["success"]]
+            with lock:
+                counters["rejected"] += len(failed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    send_seconds = time.perf_counter() - started
+
+    return {
+        "sent_at": sent_at,
+        "send_seconds": round(send_seconds, 3),
+        "ingest_statements_per_sec": round(len(statements) / send_seconds, 1) if send_seconds else None,
+        "request_p50_ms": _percentile(request_ms, 50),
+        "request_p95_ms": _percentile(request_ms, 95),
+        "request_p99_ms": _percentile(request_ms, 99),
+        **counters,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.api import xapi
+
+    app = FastAPI()
+    app.include_router(xapi.router)
+    statements = _statements(args.statements, args.learners)
+
+    with PipelineHarness(args) as harness:
+        harness.start_consumers()
+        load = _drive_load(app, statements, args)
+        sent_at = load.pop("sent_at")
+
+        # Wait for every accepted statement to land in the table (and the archive, if one is written)
+        expected = len(sent_at) - load["rejected"]
+        deadline = time.monotonic() + args.drain_timeout
+        while time.monotonic() < deadline:
+            committed = sum(1 for statement_id in sent_at if statement_id in harness.bigquery.committed_at)
+            if committed >= expected and harness.archived() >= expected:
+                break
+            time.sleep(0.05)
+
+        committed_at = {
+            statement_id: harness.bigquery.committed_at[statement_id]
+            for statement_id in sent_at
+            if statement_id in harness.bigquery.committed_at
+        }
+        latencies_ms = [(committed_at[statement_id] - sent_at[statement_id]) * 1000 for statement_id in committed_at]
+        elapsed = (max(committed_at.values()) - min(sent_at.values())) if committed_at else None
+        jobs = dict(harness.bigquery.jobs)
+        total_jobs = sum(jobs.values())
+        consumer_status = {
+            type(consumer).__name__: json.loads(json_codec.dumps(consumer.get_status(), default=str))
+            for consumer, _, _ in harness.consumers
+        }
+        result = {
+            "statements": len(statements),
+            "committed": len(committed_at),
+            "archived": harness.archived(),
+            "elapsed_seconds": round(elapsed, 3) if elapsed else None,
+            "statements_per_sec": round(len(committed_at) / elapsed, 1) if elapsed else None,
+            "latency_p50_ms": _percentile(latencies_ms, 50),
+            "latency_p95_ms": _percentile(latencies_ms, 95),
+            "latency_p99_ms": _percentile(latencies_ms, 99),
+            "latency_max_ms": _percentile(latencies_ms, 100),
+            "bigquery_jobs": total_jobs,
+            "bigquery_jobs_per_statement": round(total_jobs / len(committed_at), 4) if committed_at else None,
+            "bigquery_jobs_by_kind": jobs,
+            "bigquery_unsupported_queries": dict(harness.bigquery.unsupported_queries),
+            "ingest": load,
+            "pubsub": harness.pubsub.get_status(),
+            "consumers": consumer_status,
+        }
+
+    result["run"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "json_codec": json_codec.BACKEND,
+        "args": vars(args),
+        "settings": {
+            name: getattr(settings, name)
+            for name in (
+                "BIGQUERY_SINK_BATCH_SIZE",
+                "BIGQUERY_SINK_MAX_LATENCY",
+                "BIGQUERY_SINK_LOAD_FORMAT",
+                "STATEMENT_INDEX_ENABLED",
+                "ETL_ADAPTIVE_FLOW_ENABLED",
+                "INGEST_ADMISSION_ENABLED",
+                "ARCHIVE_SEGMENTS_ENABLED",
+                "ARCHIVE_SEGMENT_MAX_AGE",
+            )
+        },
+    }
+    return result
+
+
+def _print_comparison(result: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"\n{'metric':<28}  {'baseline':>10}  {'this run':>10}  {'change':>8}")
+    for name in HEADLINE:
+        before, after = baseline.get(name), result.get(name)
+        change = f"{(after - before) / before * 100:+.1f}%" if before and after is not None else "n/a"
+        print(f"{name:<28}  {before if before is not None else 'n/a':>10}  {after if after is not None else 'n/a':>10}  {change:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--statements", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=4, help="concurrent HTTP clients")
+    parser.add_argument("--batch-size", type=int, default=50, help="statements per ingest request")
+    parser.add_argument("--learners", type=int, default=200, help="distinct actors in the generated load")
+    parser.add_argument("--consumers", choices=["legacy", "unified"], default="legacy")
+    parser.add_argument("--sink-batch-size", type=int, default=0, help="override BIGQUERY_SINK_BATCH_SIZE")
+    parser.add_argument("--load-format", choices=["json", "parquet"], default=settings.BIGQUERY_SINK_LOAD_FORMAT)
+    parser.add_argument("--archive", choices=["segments", "objects"], default="segments" if settings.ARCHIVE_SEGMENTS_ENABLED else "objects")
+    parser.add_argument("--archive-max-age", type=float, default=settings.ARCHIVE_SEGMENT_MAX_AGE,
+                        help="seconds before a partial archive segment is uploaded")
+    parser.add_argument("--admission", action="store_true", help="keep ingest admission control on")
+    parser.add_argument("--bq-job-latency", type=float, default=0.2, help="seconds per BigQuery job")
+    parser.add_argument("--bq-row-latency", type=float, default=0.00002, help="seconds per affected row")
+    parser.add_argument("--publish-latency", type=float, default=0.01, help="seconds per Pub/Sub publish batch")
+    parser.add_argument("--gcs-latency", type=float, default=0.02, help="seconds per object upload")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="seconds to wait for rows to land")
+    parser.add_argument("--output", default="pipeline_benchmark.json")
+    parser.add_argument("--compare", help="previous --output file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's INFO logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # Per-message INFO logs would dominate the measurement
+        logging.disable(logging.INFO)
+
+    result = run(args)
+    with open(args.output, "w") as output:
+        json.dump(result, output, indent=2, default=str)
+
+    print(
+        f"{result['committed']}/{result['statements']} statements committed, {result['archived']} archived "
+        f"({args.consumers} consumers, {args.clients} clients x {args.batch_size}/request)"
+    )
+    print(f"sustained: {result['statements_per_sec']} statements/sec over {result['elapsed_seconds']}s")
+    print(
+        f"ingest-to-row latency: p50 {result['latency_p50_ms']}ms  p95 {result['latency_p95_ms']}ms  "
+        f"p99 {result['latency_p99_ms']}ms"
+    )
+    print(f"bigquery jobs: {result['bigquery_jobs']} ({result['bigquery_jobs_per_statement']}/statement) "
+          f"{result['bigquery_jobs_by_kind']}")
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            _print_comparison(result, json.load(baseline))
+
+
+if __name__ == "__main__":
+    main()
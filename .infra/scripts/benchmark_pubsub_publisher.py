@@ -0,0 +1,136 @@
+"""Benchmark the batched Pub/Sub publisher against a local fake publisher.
+
+Compares the old ingest behaviour (publish one statement, block on
+``future.result()``, repeat) with ``PubSubPublisherService.publish_batch``,
+which hands every message to the client up front and resolves all futures
+together.  No Google Cloud credentials are needed: the fake client batches
+messages the same way ``pubsub_v1.PublisherClient`` does (flush on
+``max_messages`` or ``max_latency``) and charges a fixed round-trip time per
+flushed batch.
+
+    PYTHONPATH=. python .infra/scripts/benchmark_pubsub_publisher.py \\
+        --rtt-ms 20 --batch-sizes 1 10 100 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Dict, List
+
+from app.services.pubsub_publisher import PublisherConfig, PubSubPublisherService
+
+
+class FakeBatchingPublisher:
+    """Local publisher that mimics Pub/Sub client-side batching and RTT."""
+
+    def __init__(self, config: PublisherConfig, rtt_seconds: float):
+        self.config = config
+        self.rtt_seconds = rtt_seconds
+        self._lock = threading.Lock()
+        self._batch: List[Future] = []
+        self._timer: threading.Timer | None = None
+        self._counter = 0
+
+    def topic_path(self, project_id: str, topic_name: str) -> str:
+        return f"projects/{project_id}/topics/{topic_name}"
+
+    def publish(self, topic: str, data: bytes, **attributes: str) -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._batch.append(future)
+            if len(self._batch) >= self.config.batch_max_messages:
+                self._flush_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.config.batch_max_latency, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return future
+
+    def _flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            threading.Thread(target=self._send, args=(batch,), daemon=True).start()
+
+    def _send(self, batch: List[Future]) -> None:
+        time.sleep(self.rtt_seconds)
+        for future in batch:
+            self._counter += 1
+            future.set_result(str(self._counter))
+
+
+def _statements(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "actor": {"mbox": f"mailto:learner{i}@example.com", "name": f"Learner {i}"},
+            "verb": {"id": "http://adlnet.gov/expapi/verbs/responded", "display": {"en-US": "responded"}},
+            "object": {
+                "id": "https://7taps.com/lessons/lesson-3",
+                "definition": {"name": {"en-US": "Lesson 3 reflection"}},
+            },
+            "result": {"response": "I tried a screen-free evening and slept better."},
+            "timestamp": "2025-01-01T00:00:00Z",
+        }
+        for i in range(count)
+    ]
+
+
+def run_sequential(client: FakeBatchingPublisher, statements: List[Dict[str, Any]]) -> float:
+    """Old path: one blocking publish per statement."""
+    topic = client.topic_path("bench", "xapi")
+    started = time.perf_counter()
+    for statement in statements:
+        client.publish(topic, json.dumps(statement).encode("utf-8"), source="bench").result()
+    return time.perf_counter() - started
+
+
+def run_batched(service: PubSubPublisherService, statements: List[Dict[str, Any]]) -> float:
+    started = time.perf_counter()
+    results = service.publish_batch(statements, source="bench")
+    elapsed = time.perf_counter() - started
+    assert all(result["success"] for result in results)
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="simulated Pub/Sub round trip per batch")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--sequential-limit", type=int, default=200,
+                        help="cap statements used for the (slow) sequential baseline")
+    args = parser.parse_args()
+
+    config = PublisherConfig()
+    rtt = args.rtt_ms / 1000.0
+    service = PubSubPublisherService(
+        "bench", "xapi", config=config,
+        client_factory=lambda cfg: FakeBatchingPublisher(cfg, rtt),
+    )
+
+    print(f"Simulated RTT {args.rtt_ms:.0f}ms, batch_max_messages={config.batch_max_messages}, "
+          f"batch_max_latency={config.batch_max_latency * 1000:.0f}ms")
+    print(f"{'batch':>6}  {'sequential stmt/s':>18}  {'batched stmt/s':>15}  {'speedup':>8}")
+    for size in args.batch_sizes:
+        statements = _statements(size)
+        seq_count = min(size, args.sequential_limit)
+        seq_elapsed = run_sequential(FakeBatchingPublisher(config, rtt), statements[:seq_count])
+        batched_elapsed = run_batched(service, statements)
+        seq_rate = seq_count / seq_elapsed
+        batched_rate = size / batched_elapsed
+        print(f"{size:>6}  {seq_rate:>18.1f}  {batched_rate:>15.1f}  {batched_rate / seq_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,661 @@
+"""Local stand-ins for the Pub/Sub, BigQuery and Cloud Storage clients the pipeline uses.
+
+Used by ``benchmark_pipeline_e2e.py`` to run the real ingest routes and
+consumers without Google Cloud:
+
+* ``LocalPubSub`` - an in-memory broker.  Publishes are batched and charged
+  ``publish_latency`` per batch (like the client's batch + RTT); each
+  subscription redelivers nacked messages after its retry-policy backoff
+  and honours ``FlowControl`` ``max_messages``; callbacks run on a
+  10-thread pool like the real streaming pull.
+* ``LocalBigQuery`` - tables live in SQLite.  Load jobs, streaming inserts,
+  the sink's staging ``MERGE`` and simple parameterised ``SELECT``s are
+  executed for real; each job is charged ``job_latency`` plus
+  ``row_latency`` per affected row.  Queries SQLite cannot run (JSON MERGEs
+  and other BigQuery-only SQL) complete as no-ops and are counted.
+* ``LocalStorage`` - in-memory buckets.
+
+Only the client surface the pipeline touches is implemented.
+"""
+
+from __future__ import annotations
+
+import io
+import itertools
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence
+
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud import bigquery
+from google.cloud.bigquery.table import Row
+
+SQLITE_TYPES = {
+    "STRING": "TEXT",
+    "JSON": "TEXT",
+    "TIMESTAMP": "TEXT",
+    "DATE": "TEXT",
+    "FLOAT": "REAL",
+    "FLOAT64": "REAL",
+    "NUMERIC": "REAL",
+    "INTEGER": "INTEGER",
+    "INT64": "INTEGER",
+    "BOOLEAN": "INTEGER",
+    "BOOL": "INTEGER",
+}
+
+STATEMENT_MERGE = re.compile(r"MERGE `([^`]+)` T\s+USING `([^`]+)` S.*?INSERT \(([^)]*)\)", re.S)
+
+
+# ----------------------------------------------------------------------
+# BigQuery
+# ----------------------------------------------------------------------
+
+
+class _Job:
+    """Query/load job: does its work on ``result()`` and charges the configured latency."""
+
+    def __init__(self, client: "LocalBigQuery", kind: str, work: Callable[[], Any]):
+        self._client = client
+        self.kind = kind
+        self._work = work
+        self._done = False
+        self._rows: List[Row] = []
+        self.num_dml_affected_rows: Optional[int] = None
+
+    def result(self, page_size: Optional[int] = None, timeout: Optional[float] = None, **kwargs) -> "_Job":
+        if self._done:
+            return self
+        self._done = True
+        outcome = self._work()
+        if isinstance(outcome, list):
+            self._rows = outcome
+            affected = len(outcome)
+        else:
+            affected, on_visible = outcome
+            self.num_dml_affected_rows = affected
+        time.sleep(self._client.job_latency + self._client.row_latency * affected)
+        if not isinstance(outcome, list) and on_visible is not None:
+            on_visible()
+        self._client.jobs[self.kind] += 1
+        return self
+
+    def __iter__(self) -> Iterator[Row]:
+        return iter(self.result()._rows)
+
+
+class LocalBigQuery:
+    """SQLite-backed stand-in for the ``bigquery.Client`` surface the pipeline uses."""
+
+    def __init__(self, project: str = "local", job_latency: float = 0.0, row_latency: float = 0.0):
+        self.project = project
+        self.job_latency = job_latency
+        self.row_latency = row_latency
+        self._db = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        self._schemas: Dict[str, List[bigquery.SchemaField]] = {}
+        self.jobs: Counter = Counter()
+        self.unsupported_queries: Counter = Counter()
+        # statement_id -> time.perf_counter() when its MERGE became visible
+        self.committed_at: Dict[str, float] = {}
+
+    # Table references ---------------------------------------------------
+
+    def _name(self, table: Any) -> str:
+        if hasattr(table, "table_id") and hasattr(table, "dataset_id"):
+            return f"{table.dataset_id}.{table.table_id}"
+        parts = str(table).split(".")
+        return ".".join(parts[-2:])
+
+    def dataset(self, dataset_id: str) -> bigquery.DatasetReference:
+        return bigquery.DatasetReference(self.project, dataset_id)
+
+    def create_table(self, table: bigquery.Table, exists_ok: bool = False) -> bigquery.Table:
+        name = self._name(table)
+        with self._lock:
+            if name in self._schemas:
+                if exists_ok:
+                    return table
+                raise gcp_exceptions.Conflict(f"Already Exists: Table {name}")
+            columns = ", ".join(
+                f'"{field.name}" {SQLITE_TYPES.get(field.field_type.upper(), "TEXT")}' for field in table.schema
+            )
+            self._db.execute(f'CREATE TABLE "{name}" ({columns})')
+            self._schemas[name] = list(table.schema)
+        return table
+
+    def get_table(self, table: Any) -> bigquery.Table:
+        name = self._name(table)
+        if name not in self._schemas:
+            raise gcp_exceptions.NotFound(f"Not found: Table {name}")
+        return bigquery.Table(f"{self.project}.{name}", schema=self._schemas[name])
+
+    def delete_table(self, table: Any, not_found_ok: bool = False) -> None:
+        name = self._name(table)
+        with self._lock:
+            if name not in self._schemas:
+                if not_found_ok:
+                    return
+                raise gcp_exceptions.NotFound(f"Not found: Table {name}")
+            self._db.execute(f'DROP TABLE "{name}"')
+            del self._schemas[name]
+
+    def row_count(self, table: Any) -> int:
+        with self._lock:
+            return self._db.execute(f'SELECT COUNT(*) FROM "{self._name(table)}"').fetchone()[0]
+
+    # Writes ---------------------------------------------------------------
+
+    @staticmethod
+    def _value(value: Any) -> Any:
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, default=str)
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+
+    def _insert(self, name: str, rows: Sequence[Dict[str, Any]]) -> int:
+        columns = [field.name for field in self._schemas[name]]
+        placeholders = ", ".join("?" for _ in columns)
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        with self._lock:
+            self._db.executemany(
+                f'INSERT INTO "{name}" ({quoted}) VALUES ({placeholders})',
+                [[self._value(row.get(column)) for column in columns] for row in rows],
+            )
+        return len(rows)
+
+    def _ensure_loadable(self, destination: Any, job_config: Optional[bigquery.LoadJobConfig]) -> str:
+        name = self._name(destination)
+        if name not in self._schemas:
+            schema = getattr(job_config, "schema", None) if job_config is not None else None
+            if not schema:
+                raise gcp_exceptions.NotFound(f"Not found: Table {name}")
+            self.create_table(bigquery.Table(f"{self.project}.{name}", schema=schema))
+        return name
+
+    def load_table_from_json(self, rows, destination, job_config=None, **kwargs) -> _Job:
+        rows = list(rows)
+        name = self._ensure_loadable(destination, job_config)
+        return _Job(self, "load", lambda: (self._insert(name, rows), None))
+
+    def load_table_from_file(self, file_obj, destination, job_config=None, **kwargs) -> _Job:
+        import pyarrow.parquet as pq
+
+        rows = pq.read_table(io.BytesIO(file_obj.read())).to_pylist()
+        name = self._ensure_loadable(destination, job_config)
+        return _Job(self, "load", lambda: (self._insert(name, rows), None))
+
+    def insert_rows(self, table, rows, selected_fields=None, **kwargs) -> List[Dict[str, Any]]:
+        _Job(self, "streaming_insert", lambda: (self._insert(self._name(table), list(rows)), None)).result()
+        return []
+
+    # Queries --------------------------------------------------------------
+
+    def query(self, sql: str, job_config: Optional[bigquery.QueryJobConfig] = None, **kwargs) -> _Job:
+        merge = STATEMENT_MERGE.search(sql)
+        if merge:
+            target, staging, columns = merge.groups()
+            return _Job(self, "merge", lambda: self._merge(self._name(target), self._name(staging), columns))
+        params = list(getattr(job_config, "query_parameters", None) or [])
+        return _Job(self, "query", lambda: self._select(sql, params))
+
+    def _merge(self, target: str, staging: str, columns: str):
+        quoted = ", ".join(f'"{column.strip()}"' for column in columns.split(","))
+        with self._lock:
+            new_ids = [row[0] for row in self._db.execute(
+                f'SELECT statement_id FROM "{staging}" S WHERE NOT EXISTS '
+                f'(SELECT 1 FROM "{target}" T WHERE T.statement_id = S.statement_id)'
+            )]
+            self._db.execute(
+                f'INSERT INTO "{target}" ({quoted}) SELECT {quoted} FROM "{staging}" S WHERE NOT EXISTS '
+                f'(SELECT 1 FROM "{target}" T WHERE T.statement_id = S.statement_id)'
+            )
+
+        def visible() -> None:
+            now = time.perf_counter()
+            for statement_id in new_ids:
+                self.committed_at.setdefault(statement_id, now)
+
+        return len(new_ids), visible
+
+    def _translate(self, sql: str, params: List[Any]):
+        sql = re.sub(r"`([^`]+)`", lambda match: f'"{self._name(match.group(1))}"', sql)
+        values: Dict[str, Any] = {}
+        for param in params:
+            if hasattr(param, "values"):
+                names = [f"{param.name}_{index}" for index in range(len(param.values))]
+                values.update(zip(names, param.values))
+                expansion = "(" + ", ".join(f":{name}" for name in names) + ")" if names else "(NULL)"
+                sql = sql.replace(f"UNNEST(@{param.name})", expansion)
+            else:
+                values[param.name] = self._value(param.value)
+        sql = re.sub(r"@(\w+)", lambda match: f":{match.group(1)}", sql)
+        sql = re.sub(r"\bIF\(", "IIF(", sql)
+        return sql, values
+
+    def _select(self, sql: str, params: List[Any]) -> List[Row]:
+        translated, values = self._translate(sql, params)
+        try:
+            with self._lock:
+                cursor = self._db.execute(translated, values)
+                index = {column[0]: position for position, column in enumerate(cursor.description or [])}
+                return [Row(tuple(row), index) for row in cursor.fetchall()]
+        except sqlite3.Error:
+            self.unsupported_queries[" ".join(sql.split())[:60]] += 1
+            return []
+
+
+# ----------------------------------------------------------------------
+# Pub/Sub
+# ----------------------------------------------------------------------
+
+
+class LocalMessage:
+    """Received message with the ack/nack surface of ``pubsub_v1.subscriber.message.Message``."""
+
+    def __init__(self, subscription: "_Subscription", message_id: str, data: bytes, attributes: Dict[str, str]):
+        self._subscription = subscription
+        self.message_id = message_id
+        self.data = data
+        self.attributes = attributes
+        self.publish_time = datetime.now(timezone.utc)
+        self.delivery_attempt = None  # only set by Pub/Sub when a dead-letter policy exists
+        self.ack_id = message_id
+        self.size = len(data)
+        self._settled = False
+
+    def _settle(self) -> bool:
+        if self._settled:
+            return False
+        self._settled = True
+        return True
+
+    def ack(self) -> None:
+        if self._settle():
+            self._subscription.settle(self, acked=True)
+
+    def nack(self) -> None:
+        if self._settle():
+            self._subscription.settle(self, acked=False)
+
+    def modify_ack_deadline(self, seconds: int) -> None:
+        self._subscription.metrics["ack_extensions"] += 1
+
+
+class _Subscription:
+    def __init__(self, name: str, topic: str, retry_policy: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.topic = topic
+        self.min_backoff = 0.0
+        self.max_backoff = 0.0
+        self.set_retry_policy(retry_policy)
+        self._attempts: Counter = Counter()
+        self.ready: Deque[LocalMessage] = deque()
+        self.condition = threading.Condition()
+        self.outstanding = 0
+        self.metrics: Counter = Counter()
+        self.pulls: List["_StreamingPull"] = []
+
+    def enqueue(self, message_id: str, data: bytes, attributes: Dict[str, str]) -> None:
+        with self.condition:
+            self.ready.append(LocalMessage(self, message_id, data, attributes))
+            self.condition.notify_all()
+
+    def settle(self, message: LocalMessage, acked: bool) -> None:
+        with self.condition:
+            self.outstanding -= 1
+            if acked:
+                self.metrics["acked"] += 1
+                self._attempts.pop(message.message_id, None)
+            else:
+                self.metrics["nacked"] += 1
+                self._attempts[message.message_id] += 1
+                delay = min(self.max_backoff, self.min_backoff * 2 ** (self._attempts[message.message_id] - 1))
+                if delay:
+                    timer = threading.Timer(delay, self.enqueue, (message.message_id, message.data, message.attributes))
+                    timer.daemon = True
+                    timer.start()
+                else:
+                    self.ready.append(LocalMessage(self, message.message_id, message.data, message.attributes))
+            self.condition.notify_all()
+
+    def set_retry_policy(self, retry_policy: Optional[Dict[str, Any]]) -> None:
+        """Exponential redelivery backoff for nacked messages; none means immediate redelivery."""
+        if retry_policy:
+            self.min_backoff = float(retry_policy["minimum_backoff"]["seconds"])
+            self.max_backoff = float(retry_policy["maximum_backoff"]["seconds"])
+
+
+class _StreamingPull:
+    """Dispatches messages to ``callback`` on a thread pool within the flow-control limit."""
+
+    def __init__(self, subscription: _Subscription, callback: Callable[[LocalMessage], None], max_messages: int):
+        self.subscription = subscription
+        self.callback = callback
+        self.max_messages = max_messages
+        self._cancelled = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=10, thread_name_prefix=f"pull-{subscription.name[-20:]}")
+        self._seen: set = set()
+        self._thread = threading.Thread(target=self._dispatch, name="local-streaming-pull", daemon=True)
+        self._thread.start()
+
+    def _dispatch(self) -> None:
+        subscription = self.subscription
+        while not self._cancelled.is_set():
+            with subscription.condition:
+                subscription.condition.wait_for(
+                    lambda: self._cancelled.is_set()
+                    or (subscription.ready and subscription.outstanding < self.max_messages),
+                    timeout=0.5,
+                )
+                if self._cancelled.is_set() or not subscription.ready or subscription.outstanding >= self.max_messages:
+                    continue
+                message = subscription.ready.popleft()
+                subscription.outstanding += 1
+                subscription.metrics["delivered"] += 1
+                if message.message_id in self._seen:
+                    subscription.metrics["redelivered"] += 1
+                self._seen.add(message.message_id)
+            self._executor.submit(self.callback, message)
+
+    def result(self, timeout: Optional[float] = None) -> None:
+        self._cancelled.wait(timeout)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        with self.subscription.condition:
+            self.subscription.condition.notify_all()
+        self._executor.shutdown(wait=False)
+
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+
+class LocalPublisherClient:
+    def __init__(self, broker: "LocalPubSub"):
+        self._broker = broker
+
+    @staticmethod
+    def topic_path(project_id: str, topic_name: str) -> str:
+        return f"projects/{project_id}/topics/{topic_name}"
+
+    def publish(self, topic: str, data: bytes, **attributes: str) -> Future:
+        return self._broker.publish(topic, data, attributes)
+
+
+class LocalSubscriberClient:
+    def __init__(self, broker: "LocalPubSub"):
+        self._broker = broker
+
+    @staticmethod
+    def subscription_path(project_id: str, subscription_name: str) -> str:
+        return f"projects/{project_id}/subscriptions/{subscription_name}"
+
+    def get_subscription(self, request: Dict[str, Any]):
+        subscription = self._broker.subscriptions.get(request["subscription"])
+        if subscription is None:
+            raise gcp_exceptions.NotFound(f"Subscription does not exist: {request['subscription']}")
+        return SimpleNamespace(
+            name=subscription.name,
+            topic=subscription.topic,
+            ack_deadline_seconds=60,
+            message_retention_duration="604800s",
+            retry_policy=None,
+        )
+
+    def create_subscription(self, request: Dict[str, Any] = None, **kwargs):
+        request = request or kwargs.get("request") or {}
+        return self._broker.create_subscription(request["name"], request["topic"], request.get("retry_policy"))
+
+    def update_subscription(self, request: Dict[str, Any] = None, **kwargs) -> None:
+        request = request or kwargs.get("request") or {}
+        update = request["subscription"]
+        subscription = self._broker.subscriptions.get(update["name"])
+        if subscription is None:
+            raise gcp_exceptions.NotFound(f"Subscription does not exist: {update['name']}")
+        subscription.set_retry_policy(update.get("retry_policy"))
+
+    def subscribe(self, subscription: str, callback, flow_control=None, **kwargs) -> _StreamingPull:
+        max_messages = getattr(flow_control, "max_messages", None) or 1000
+        return self._broker.subscribe(subscription, callback, max_messages)
+
+    def close(self) -> None:
+        pass
+
+
+class LocalPubSub:
+    """In-memory broker shared by the publisher and subscriber stand-ins."""
+
+    def __init__(self, publish_latency: float = 0.0):
+        self.publish_latency = publish_latency
+        self.subscriptions: Dict[str, _Subscription] = {}
+        self._topics: Dict[str, List[_Subscription]] = defaultdict(list)
+        self._outbox: Deque = deque()
+        self._outbox_ready = threading.Condition()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.metrics: Counter = Counter()
+        self._closed = False
+        threading.Thread(target=self._deliver_loop, name="local-pubsub-publisher", daemon=True).start()
+
+    def publisher(self, *args, **kwargs) -> LocalPublisherClient:
+        return LocalPublisherClient(self)
+
+    def subscriber(self, *args, **kwargs) -> LocalSubscriberClient:
+        return LocalSubscriberClient(self)
+
+    def create_subscription(self, name: str, topic: str, retry_policy: Optional[Dict[str, Any]] = None) -> _Subscription:
+        with self._lock:
+            if name in self.subscriptions:
+                raise gcp_exceptions.AlreadyExists(f"Subscription already exists: {name}")
+            subscription = _Subscription(name, topic, retry_policy)
+            self.subscriptions[name] = subscription
+            self._topics[topic].append(subscription)
+            return subscription
+
+    def subscribe(self, name: str, callback, max_messages: int) -> _StreamingPull:
+        subscription = self.subscriptions[name]
+        pull = _StreamingPull(subscription, callback, max_messages)
+        subscription.pulls.append(pull)
+        return pull
+
+    def publish(self, topic: str, data: bytes, attributes: Dict[str, str]) -> Future:
+        future: Future = Future()
+        with self._outbox_ready:
+            self._outbox.append((topic, data, attributes, future))
+            self._outbox_ready.notify()
+        return future
+
+    def _deliver_loop(self) -> None:
+        """Drain everything queued as one batch, charge one round trip, then deliver."""
+        while not self._closed:
+            with self._outbox_ready:
+                self._outbox_ready.wait_for(lambda: self._outbox or self._closed, timeout=0.5)
+                batch = list(self._outbox)
+                self._outbox.clear()
+            if not batch:
+                continue
+            if self.publish_latency:
+                time.sleep(self.publish_latency)
+            self.metrics["publish_batches"] += 1
+            for topic, data, attributes, future in batch:
+                message_id = str(next(self._ids))
+                for subscription in self._topics.get(topic, []):
+                    subscription.enqueue(message_id, data, attributes)
+                self.metrics["published"] += 1
+                future.set_result(message_id)
+
+    def close(self) -> None:
+        """Cancel every streaming pull (unblocking ``future.result()`` in the consumers)."""
+        self._closed = True
+        with self._outbox_ready:
+            self._outbox_ready.notify_all()
+        for subscription in self.subscriptions.values():
+            for pull in subscription.pulls:
+                pull.cancel()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            **self.metrics,
+            "subscriptions": {
+                name.rsplit("/", 1)[-1]: {**subscription.metrics, "backlog": len(subscription.ready)}
+                for name, subscription in self.subscriptions.items()
+            },
+        }
+
+
+# ----------------------------------------------------------------------
+# Cloud Storage
+# ----------------------------------------------------------------------
+
+
+class _LocalBlobReader(io.BytesIO):
+    """Seekable reader that counts the bytes actually read, like ranged GCS reads."""
+
+    def __init__(self, bucket: "LocalBucket", data: bytes):
+        super().__init__(data)
+        self._bucket = bucket
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        chunk = super().read(size)
+        self._bucket.count_read(len(chunk))
+        return chunk
+
+    def readinto(self, buffer) -> int:
+        count = super().readinto(buffer)
+        self._bucket.count_read(count)
+        return count
+
+
+class LocalBlob:
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.metadata: Optional[Dict[str, str]] = None
+        self.size: Optional[int] = None
+        self.generation = 0
+        self.data: bytes = b""
+
+    def upload_from_string(
+        self, data, content_type: Optional[str] = None, if_generation_match: Optional[int] = None, **kwargs
+    ) -> None:
+        if self.bucket.upload_latency:
+            time.sleep(self.bucket.upload_latency)
+        self.data = data.encode() if isinstance(data, str) else bytes(data)
+        self.size = len(self.data)
+        self.bucket.store(self, if_generation_match)
+
+    def download_as_bytes(self, if_generation_match: Optional[int] = None, **kwargs) -> bytes:
+        blob = self.bucket.objects.get(self.name)
+        if blob is None:
+            raise gcp_exceptions.NotFound(self.name)
+        if if_generation_match is not None and blob.generation != if_generation_match:
+            raise gcp_exceptions.PreconditionFailed(self.name)
+        self.bucket.count_read(len(blob.data))
+        return blob.data
+
+    def open(self, mode: str = "rb", **kwargs) -> _LocalBlobReader:
+        return _LocalBlobReader(self.bucket, self.bucket.objects[self.name].data)
+
+    def delete(self, **kwargs) -> None:
+        self.bucket.remove(self.name)
+
+
+class LocalBucket:
+    def __init__(self, name: str, upload_latency: float = 0.0):
+        self.name = name
+        self.upload_latency = upload_latency
+        self.objects: Dict[str, LocalBlob] = {}
+        self.bytes = 0
+        self._generation = 0
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return True
+
+    def create(self) -> None:
+        pass
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def count_read(self, size: int) -> None:
+        with self._lock:
+            self.bytes_read += size
+
+    def get_blob(self, name: str) -> Optional[LocalBlob]:
+        return self.objects.get(name)
+
+    def store(self, blob: LocalBlob, if_generation_match: Optional[int] = None) -> None:
+        with self._lock:
+            previous = self.objects.get(blob.name)
+            generation = previous.generation if previous else 0
+            if if_generation_match is not None and if_generation_match != generation:
+                raise gcp_exceptions.PreconditionFailed(blob.name)
+            if previous is not None:
+                self.bytes -= previous.size or 0
+            self._generation += 1
+            blob.generation = self._generation
+            self.objects[blob.name] = blob
+            self.bytes += blob.size or 0
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            blob = self.objects.pop(name)
+            self.bytes -= blob.size or 0
+
+    def list_blobs(self, prefix: str = "", **kwargs) -> List[LocalBlob]:
+        with self._lock:
+            return [blob for name, blob in self.objects.items() if name.startswith(prefix)]
+
+
+class LocalStorage:
+    def __init__(self, upload_latency: float = 0.0):
+        self.upload_latency = upload_latency
+        self.buckets: Dict[str, LocalBucket] = {}
+
+    def bucket(self, name: str) -> LocalBucket:
+        if name not in self.buckets:
+            self.buckets[name] = LocalBucket(name, self.upload_latency)
+        return self.buckets[name]
+
+
+# ----------------------------------------------------------------------
+# GCP config
+# ----------------------------------------------------------------------
+
+
+class LocalGCPConfig:
+    """Drop-in for ``GCPConfig`` backed by the stand-ins above."""
+
+    def __init__(
+        self,
+        bigquery_client: LocalBigQuery,
+        storage_client: LocalStorage,
+        project_id: str = "local",
+        pubsub_topic: str = "xapi-ingestion-topic",
+        bigquery_dataset: str = "taps_data",
+        storage_bucket: str = "local-raw-xapi",
+    ):
+        self.project_id = project_id
+        self.pubsub_topic = pubsub_topic
+        self.bigquery_dataset = bigquery_dataset
+        self.storage_bucket = storage_bucket
+        self.credentials = None
+        self.bigquery_client = bigquery_client
+        self.storage_client = storage_client
+
+    def get_topic_path(self) -> str:
+        return LocalPublisherClient.topic_path(self.project_id, self.pubsub_topic)
+
+    def get_subscription_path(self, subscription_name: str) -> str:
+        return LocalSubscriberClient.subscription_path(self.project_id, subscription_name)
@@ -0,0 +1,95 @@
+"""Tests for the AIMD flow controller in front of the BigQuery sink."""
+
+import threading
+from types import SimpleNamespace
+
+from app.etl.adaptive_flow_control import AdaptiveFlowConfig, AdaptiveFlowController
+from app.etl.pubsub_bigquery_processor import PubSubBigQueryProcessor
+
+
+def _controller(**overrides):
+    options = dict(
+        max_messages=400,
+        max_bytes=4000,
+        min_messages=50,
+        max_batch_size=200,
+        min_batch_size=20,
+        increase_step=50,
+        latency_target=5.0,
+    )
+    options.update(overrides)
+    return AdaptiveFlowController(AdaptiveFlowConfig(**options))
+
+
+def test_slow_flushes_halve_the_window_and_recovery_is_additive():
+    controller = _controller()
+    controller.observe_flush(12.0, 200, True)
+
+    assert controller.adjust() == "decrease"
+    assert controller.window == 200
+    assert controller.batch_size == 200  # latency alone keeps the batch size
+    assert controller.byte_window == 2000
+
+    for _ in range(10):
+        controller.observe_flush(1.0, 200, True)
+        controller.adjust()
+    assert controller.window == 400  # capped at the FlowControl ceiling
+
+
+def test_flush_errors_shrink_batch_size_down_to_the_floor():
+    controller = _controller()
+    for _ in range(5):
+        controller.observe_flush(1.0, 200, False)
+        controller.adjust()
+
+    assert controller.window == 50
+    assert controller.batch_size == 20
+    assert controller.metrics["decreases"] == 5
+
+
+def test_idle_interval_holds_the_window():
+    controller = _controller()
+    assert controller.adjust() == "hold"
+    assert controller.window == 400
+
+
+def test_acquire_blocks_until_a_slot_is_released():
+    controller = _controller(min_messages=1)
+    controller.window = 1
+    assert controller.acquire(10)
+    assert not controller.acquire(10, timeout=0.05)
+
+    admitted = threading.Event()
+    waiter = threading.Thread(target=lambda: controller.acquire(10) and admitted.set())
+    waiter.start()
+    controller.release(10)
+    waiter.join(2)
+
+    assert admitted.is_set()
+    assert controller.in_flight == 1
+    assert controller.metrics["waits"] == 2
+
+
+def test_oversized_message_is_admitted_when_nothing_is_in_flight():
+    controller = _controller()
+    assert controller.acquire(10 ** 6, timeout=0)
+    assert not controller.acquire(1, timeout=0)
+
+
+def test_redelivered_message_holds_and_releases_its_own_slot():
+    processor = object.__new__(PubSubBigQueryProcessor)
+    processor._held, processor._held_lock = {}, threading.Lock()
+    processor.flow_controller = _controller()
+
+    # The ack deadline expired while the first delivery was still held
+    first = SimpleNamespace(message_id="m-1", ack_id="ack-1", data=b"x" * 10)
+    redelivery = SimpleNamespace(message_id="m-1", ack_id="ack-2", data=b"x" * 10)
+    processor._hold(first)
+    processor._hold(redelivery)
+    assert processor.flow_controller.in_flight == 2
+
+    processor._settle(redelivery)
+    processor._settle(first)
+    processor._settle(first)  # e.g. a stage error after the commit callback
+    assert processor.flow_controller.in_flight == 0
+    assert processor._held == {}
@@ -0,0 +1,156 @@
+"""Tests for per-source admission control on the ingest routes."""
+
+import json
+from unittest.mock import patch
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.api import xapi
+from app.services.admission_control import (
+    AdmissionConfig,
+    AdmissionController,
+    SourceLimit,
+)
+
+app = FastAPI()
+app.include_router(xapi.router)
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _controller(load=None, **overrides):
+    values = dict(default_limit=SourceLimit(rate=10.0, burst=20.0))
+    values.update(overrides)
+    clock = FakeClock()
+    probe = (lambda: load) if load is not None else None
+    return AdmissionController(AdmissionConfig(**values), load_probe=probe, clock=clock), clock
+
+
+def _statement(statement_id):
+    return {
+        "id": statement_id,
+        "actor": {"mbox": f"mailto:{statement_id}@example.com"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/completed"},
+        "object": {"id": "http://example.com/activity"},
+    }
+
+
+def test_bucket_rejects_when_empty_and_refills_over_time():
+    controller, clock = _controller()
+
+    assert controller.admit("api:a", cost=20).allowed
+    decision = controller.admit("api:a", cost=5)
+    assert not decision.allowed
+    assert decision.retry_after == 0.5
+
+    # Other sources have their own bucket
+    assert controller.admit("api:b", cost=5).allowed
+
+    clock.now += 0.5
+    assert controller.admit("api:a", cost=5).allowed
+    counters = controller.get_status()["sources"]["api:a"]
+    assert counters["rejected_requests"] == 1
+    assert counters["admitted_statements"] == 25
+
+
+def test_per_source_and_wildcard_limits():
+    controller, _ = _controller(source_limits={
+        "7taps:importer": SourceLimit(rate=1.0, burst=2.0),
+        "cloud:*": SourceLimit(rate=1000.0, burst=5000.0),
+    })
+
+    assert controller.limit_for("7taps:importer").burst == 2.0
+    assert controller.limit_for("cloud:10.0.0.1").burst == 5000.0
+    assert controller.limit_for("api:10.0.0.1").burst == 20.0
+    assert controller.admit("7taps:importer", cost=3).allowed  # larger than burst, admitted from a full bucket
+    assert not controller.admit("7taps:importer", cost=1).allowed
+
+
+def test_publisher_pressure_slows_refill():
+    load = {"in_flight": 0, "queue_limit": 1000, "latency_ms": 2000.0}
+    controller, clock = _controller(load=load, latency_target_ms=500.0)
+
+    assert controller.load_fraction() == 0.25
+    controller.admit("api:a", cost=20)
+    clock.now += 1.0
+    # Healthy refill would give 10 tokens; under 4x latency pressure only 2.5
+    assert not controller.admit("api:a", cost=3).allowed
+    assert controller.admit("api:a", cost=2).allowed
+    assert controller.metrics["shed_checks"] == 3
+
+    load.update(latency_ms=0.0, in_flight=1600)
+    assert controller.load_fraction() == 0.5
+
+
+def test_batch_route_returns_429_with_retry_after():
+    controller, _ = _controller(default_limit=SourceLimit(rate=1.0, burst=2.0))
+
+    def publish_all(payloads, source):
+        return [{"success": True, "message_id": f"msg-{payload['id']}"} for payload in payloads]
+
+    with patch.object(xapi, "get_admission_controller", return_value=controller), \
+            patch.object(xapi, "_publish_payloads", side_effect=publish_all), \
+            patch.object(xapi.settings, "INGEST_ADMISSION_DECLARED_SOURCES", ["importer-1", "importer-2"]):
+        ok = client.post("/api/xapi/ingest/batch", json=[_statement("a"), _statement("b")],
+                         headers={"X-Ingest-Source": "importer-1"})
+        limited = client.post("/api/xapi/ingest/batch", json=[_statement("c")],
+                              headers={"X-Ingest-Source": "importer-1"})
+        other = client.post("/api/xapi/ingest/batch", json=[_statement("d")],
+                            headers={"X-Ingest-Source": "importer-2"})
+
+    assert ok.status_code == 200
+    assert limited.status_code == 429
+    assert limited.headers["Retry-After"] == "1"
+    assert limited.json()["detail"]["source"] == "api:importer-1"
+    assert other.status_code == 200
+
+
+def test_callers_are_keyed_by_trusted_address_not_self_declared_source():
+    def source(headers, hops=1, declared=()):
+        request = Request({
+            "type": "http",
+            "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+            "client": ("10.0.0.9", 4321),
+        })
+        with patch.object(xapi.settings, "INGEST_ADMISSION_TRUSTED_PROXY_HOPS", hops), \
+                patch.object(xapi.settings, "INGEST_ADMISSION_DECLARED_SOURCES", list(declared)):
+            return xapi.admission_source(request)
+
+    # The client can prepend X-Forwarded-For entries, but not the one the front end appends
+    assert source({"X-Forwarded-For": "1.2.3.4, 203.0.113.7"}) == "api:203.0.113.7"
+    assert source({"X-Forwarded-For": "203.0.113.7", "X-Ingest-Source": "rotating-42"}) == "api:203.0.113.7"
+    assert source({"X-Forwarded-For": "203.0.113.7", "X-Ingest-Source": "importer-1"},
+                  declared=["importer-1"]) == "api:importer-1"
+    assert source({"X-Forwarded-For": "1.2.3.4"}, hops=0) == "api:10.0.0.9"
+
+
+def test_stream_batches_are_admitted_before_publishing():
+    controller, _ = _controller(default_limit=SourceLimit(rate=0.01, burst=5.0))
+    published = []
+
+    def publish_all(payloads, source):
+        published.extend(payload["id"] for payload in payloads)
+        return [{"success": True, "message_id": f"msg-{payload['id']}"} for payload in payloads]
+
+    body = "".join(json.dumps(_statement(f"s{i}")) + "\n" for i in range(12)).encode()
+    with patch.object(xapi, "get_admission_controller", return_value=controller), \
+            patch.object(xapi, "_publish_payloads", side_effect=publish_all), \
+            patch.object(xapi.settings, "INGEST_PIPELINE_CHUNK_SIZE", 4), \
+            patch.object(xapi.settings, "INGEST_STREAM_ADMISSION_MAX_WAIT", 0.0):
+        response = client.post("/api/xapi/ingest/stream", content=body,
+                               headers={"Content-Type": "application/x-ndjson"})
+
+    # One token for the request and four for the first batch; the second batch is refused
+    assert response.status_code == 429
+    detail = response.json()["detail"]
+    assert detail["resume_from_line"] == 5
+    assert detail["summary"]["successful"] == 4
+    assert published == ["s0", "s1", "s2", "s3"]
@@ -0,0 +1,164 @@
+"""Tests for the incrementally maintained archive index."""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+from google.api_core import exceptions as gcp_exceptions
+
+from app.etl.archive_index import ArchiveIndex, ArchiveIndexConfig
+from app.etl.archive_segments import ArchiveSegmentConfig, SegmentArchiveWriter
+
+PUBLISHED = datetime(2025, 1, 1, 13, 15, tzinfo=timezone.utc)
+
+
+class FakeBlob:
+    def __init__(self, bucket, name, data=b"", metadata=None):
+        self.bucket = bucket
+        self.name = name
+        self.data = data
+        self.metadata = metadata
+        self.generation = 0
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None):
+        current = self.bucket.objects.get(self.name)
+        if if_generation_match is not None and if_generation_match != (current.generation if current else 0):
+            raise gcp_exceptions.PreconditionFailed(self.name)
+        self.data = data.encode() if isinstance(data, str) else data
+        self.bucket.generation += 1
+        self.generation = self.bucket.generation
+        self.bucket.objects[self.name] = self
+
+    def download_as_bytes(self, if_generation_match=None):
+        return self.data
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+        self.generation = 0
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def get_blob(self, name):
+        return self.objects.get(name)
+
+    def list_blobs(self, prefix=""):
+        return [blob for name, blob in list(self.objects.items()) if name.startswith(prefix)]
+
+    def stored_index(self):
+        return json.loads(self.objects["xapi-archive/_index.json"].data)
+
+
+def _index(bucket):
+    return ArchiveIndex(bucket, ArchiveIndexConfig(cache_ttl=60.0))
+
+
+def test_read_merges_stored_index_and_unflushed_deltas():
+    bucket = FakeBucket()
+    index = _index(bucket)
+    index.record(PUBLISHED, size=100)
+    index.record(PUBLISHED + timedelta(hours=1), size=50)
+    assert bucket.objects == {}
+
+    assert index.flush()
+    index.record(PUBLISHED + timedelta(days=1), size=10, records=5)
+
+    assert bucket.stored_index()["days"]["2025-01-01"]["objects"] == 2
+    summary = index.summary()
+    assert summary["total_objects"] == 3
+    assert summary["total_statements"] == 7
+    assert summary["total_size_bytes"] == 160
+    assert summary["first_at"] == PUBLISHED.isoformat()
+    assert list(summary["days"]) == ["2025-01-02", "2025-01-01"]
+
+
+def test_concurrent_writers_do_not_lose_counts():
+    bucket = FakeBucket()
+    first, second = _index(bucket), _index(bucket)
+    first.record(PUBLISHED, size=1)
+    second.record(PUBLISHED, size=1)
+    assert first.flush()
+
+    # A stale generation is rejected and retried against the fresh object
+    original_load = second._load
+    second._load = lambda: (original_load()[0], 0) if not second.metrics["flush_conflicts"] else original_load()
+    assert second.flush()
+
+    assert second.metrics["flush_conflicts"] == 1
+    assert bucket.stored_index()["days"]["2025-01-01"]["objects"] == 2
+
+
+def test_reconcile_rebuilds_past_days_and_keeps_today():
+    bucket = FakeBucket()
+    today = datetime.now(timezone.utc)
+    legacy = "xapi-statements/2025/01/01/learner@example.com/131500_msg-1.json"
+    bucket.objects[legacy] = FakeBlob(bucket, legacy, b"{}")
+    segment = "xapi-archive/dt=2025-01-01/hour=13/segment-1-w-000001.ndjson.gz"
+    bucket.objects[segment] = FakeBlob(
+        bucket,
+        segment,
+        b"x" * 30,
+        {"records": "4", "min_published_at": PUBLISHED.isoformat(), "max_published_at": PUBLISHED.isoformat()},
+    )
+
+    index = _index(bucket)
+    index.record(PUBLISHED, size=999, records=999)  # drifted count, replaced by the listing
+    index.record(today, size=7)
+    assert index.flush()
+    index.reconcile()
+
+    days = bucket.stored_index()["days"]
+    assert days["2025-01-01"]["objects"] == 2
+    assert days["2025-01-01"]["records"] == 5
+    assert days["2025-01-01"]["bytes"] == 32
+    assert days[today.strftime("%Y-%m-%d")]["bytes"] == 7
+    assert bucket.stored_index()["reconciled_at"]
+
+
+def test_unreconciled_index_is_reconciled_when_maintenance_starts():
+    bucket = FakeBucket()
+    segment = "xapi-archive/dt=2025-01-01/hour=13/segment-1-w-000001.ndjson.gz"
+    bucket.objects[segment] = FakeBlob(bucket, segment, b"x" * 30, {"records": "4"})
+
+    # No index object yet: the first maintenance pass rebuilds it from the listing
+    index = _index(bucket)
+    index._reconcile_if_due()
+    assert index.metrics["reconciles"] == 1
+    assert bucket.stored_index()["days"]["2025-01-01"]["records"] == 4
+
+    # A restart does not reconcile again before the interval, measured from reconciled_at
+    restarted = _index(bucket)
+    restarted._reconcile_if_due()
+    assert restarted.metrics["reconciles"] == 0
+
+    stored = bucket.stored_index()
+    stored["reconciled_at"] = (datetime.now(timezone.utc) - timedelta(hours=7)).isoformat()
+    bucket.objects["xapi-archive/_index.json"].data = json.dumps(stored).encode()
+    stale = _index(bucket)
+    stale._reconcile_if_due()
+    assert stale.metrics["reconciles"] == 1
+
+
+def test_segment_writer_records_uploads_in_the_index():
+    bucket = FakeBucket()
+    index = _index(bucket)
+    writer = SegmentArchiveWriter(
+        bucket, ArchiveSegmentConfig(max_records=2, retry_backoff=0.0), writer_id="test", index=index
+    )
+    writer.append({"id": "s-1"}, lambda ok: None, PUBLISHED)
+    writer.append({"id": "s-2"}, lambda ok: None, PUBLISHED + timedelta(minutes=5))
+    writer.flush()
+    writer.close()
+
+    day = index.summary()["days"]["2025-01-01"]
+    assert day["objects"] == 1
+    assert day["records"] == 2
+    assert day["last_at"] == (PUBLISHED + timedelta(minutes=5)).isoformat()
+
+    # The rebuilt entry from the segment's metadata matches what the writer recorded
+    assert index.scan()["2025-01-01"] == day
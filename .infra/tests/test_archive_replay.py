@@ -0,0 +1,150 @@
+"""Tests for the parallel archive-to-BigQuery replay engine."""
+
+import gzip
+import json
+import re
+
+import pyarrow.parquet as pq
+
+from app.etl.archive_replay import ArchiveReplay, DirectoryBucket, ReplayConfig, list_partitions
+
+
+class FakeJob:
+    def __init__(self, work):
+        self._work = work
+        self.num_dml_affected_rows = None
+
+    def result(self):
+        self.num_dml_affected_rows = self._work()
+        return self
+
+
+class FakeBigQuery:
+    """Applies staging loads and MERGEs in memory; loads containing ``poison_id`` fail."""
+
+    project = "test"
+
+    def __init__(self, poison_id=None):
+        self.poison_id = poison_id
+        self.tables = {"archive.statements": []}
+        self.jobs = []
+
+    def create_table(self, table):
+        self.tables[f"{table.dataset_id}.{table.table_id}"] = []
+
+    def delete_table(self, table_id, not_found_ok=False):
+        self.tables.pop(table_id.split(".", 1)[1], None)
+
+    def _load(self, rows, table_id, kind):
+        def work():
+            if any(row["statement_id"] == self.poison_id for row in rows):
+                raise ValueError("invalid row")
+            self.tables[table_id.split(".", 1)[1]].extend(rows)
+            return len(rows)
+        self.jobs.append((kind, len(rows)))
+        return FakeJob(work)
+
+    def load_table_from_file(self, file_obj, table_id, job_config=None):
+        return self._load(pq.read_table(file_obj).to_pylist(), table_id, "load_parquet")
+
+    def load_table_from_json(self, rows, table_id, job_config=None):
+        return self._load(rows, table_id, "load_json")
+
+    def query(self, sql, job_config=None):
+        target, staging = re.search(r"MERGE `([^`]+)` T\s+USING `([^`]+)` S", sql).groups()
+
+        def work():
+            existing = {row["statement_id"] for row in self.tables[target]}
+            new = [row for row in self.tables[staging] if row["statement_id"] not in existing]
+            self.tables[target].extend(new)
+            return len(new)
+        self.jobs.append(("merge", target))
+        return FakeJob(work)
+
+    def statement_ids(self):
+        return sorted(row["statement_id"] for row in self.tables["archive.statements"])
+
+
+def _statement(statement_id):
+    return {
+        "id": statement_id,
+        "timestamp": "2025-01-01T13:00:00Z",
+        "actor": {"name": "Learner", "mbox": "mailto:learner@example.com"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/answered"},
+        "object": {"id": "https://7taps.com/lessons/1"},
+    }
+
+
+def _archive(root):
+    """Two segment hours and one legacy object, with one statement archived twice."""
+    def segment(path, ids):
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(gzip.compress(b"".join(json.dumps(_statement(i)).encode() + b"\n" for i in ids)))
+
+    segment("xapi-archive/dt=2025-01-01/hour=13/segment-a-w-000001.ndjson.gz", ["s-1", "s-2"])
+    segment("xapi-archive/dt=2025-01-01/hour=13/segment-a-w-000002.manifest.json", [])
+    segment("xapi-archive/dt=2025-01-01/hour=14/segment-b-w-000003.ndjson.gz", ["s-3", "s-1"])
+    legacy = root / "xapi-statements/2025/01/01/learner@example.com/133000_msg-4.json"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_text(json.dumps(_statement("s-4"), indent=2))
+    return DirectoryBucket(str(root))
+
+
+def _replay(bucket, client, checkpoint, **config):
+    return ArchiveReplay(
+        bucket, client, "archive", ReplayConfig(partition_attempts=1, **config), checkpoint_path=str(checkpoint)
+    )
+
+
+def test_partitions_group_segments_and_legacy_objects_by_hour(tmp_path):
+    bucket = _archive(tmp_path)
+    partitions = list_partitions(bucket, "2025-01-01", "2025-01-02")
+    assert [partition.key for partition in partitions] == ["2025-01-01T13", "2025-01-01T14"]
+    assert [len(partition.blobs) for partition in partitions] == [2, 1]
+
+
+def test_replay_is_idempotent_and_checkpointed(tmp_path):
+    bucket = _archive(tmp_path / "bucket")
+    client = FakeBigQuery()
+
+    summary = _replay(bucket, client, tmp_path / "a.json").run("2025-01-01")
+    assert summary["partitions_replayed"] == 2
+    assert summary["statements_read"] == 5
+    assert summary["rows_inserted"] == 4
+    assert client.statement_ids() == ["s-1", "s-2", "s-3", "s-4"]
+    assert not [table for table in client.tables if "_replay_" in table]  # staging tables dropped
+
+    checkpoint = json.loads((tmp_path / "a.json").read_text())
+    assert set(checkpoint["partitions"]) == {"2025-01-01T13", "2025-01-01T14"}
+
+    # Same checkpoint: nothing left to do
+    assert _replay(bucket, client, tmp_path / "a.json").run("2025-01-01")["partitions_skipped"] == 2
+
+    # Without a checkpoint the MERGE keeps a second replay from duplicating rows
+    again = _replay(bucket, client, tmp_path / "b.json", load_format="json").run("2025-01-01")
+    assert again["rows_inserted"] == 0
+    assert client.statement_ids() == ["s-1", "s-2", "s-3", "s-4"]
+
+
+def test_interrupted_replay_resumes_only_unfinished_partitions(tmp_path):
+    bucket = _archive(tmp_path / "bucket")
+    client = FakeBigQuery(poison_id="s-3")
+
+    first = _replay(bucket, client, tmp_path / "run.json").run("2025-01-01")
+    assert (first["partitions_replayed"], first["partitions_failed"]) == (1, 1)
+
+    client.poison_id = None
+    client.jobs.clear()
+    resumed = _replay(bucket, client, tmp_path / "run.json").run("2025-01-01")
+    assert (resumed["partitions_skipped"], resumed["partitions_replayed"]) == (1, 1)
+    assert [kind for kind, _ in client.jobs] == ["load_parquet", "merge"]
+    assert client.statement_ids() == ["s-1", "s-2", "s-3", "s-4"]
+
+
+def test_dry_run_reads_without_bigquery(tmp_path):
+    bucket = _archive(tmp_path / "bucket")
+    summary = ArchiveReplay(bucket, None, "archive", dry_run=True).run("2025-01-01")
+    assert summary["statements_read"] == 5
+    assert summary["duplicates"] == 0  # duplicates are only counted within a partition
+    assert summary["load_jobs"] == summary["merge_jobs"] == 0
@@ -0,0 +1,147 @@
+"""Tests for the rolling NDJSON.gz archive segment writer and legacy compaction."""
+
+import gzip
+import json
+import threading
+from datetime import datetime, timezone
+
+from app.etl.archive_segments import (
+    ArchiveSegmentConfig,
+    SegmentArchiveWriter,
+    compact_legacy_objects,
+    partition_for,
+)
+
+PUBLISHED = datetime(2025, 1, 1, 13, 15, tzinfo=timezone.utc)
+
+
+class FakeBlob:
+    def __init__(self, bucket, name, data=None):
+        self.bucket = bucket
+        self.name = name
+        self.data = data
+
+    def upload_from_string(self, data, content_type=None):
+        if self.bucket.failures > 0:
+            self.bucket.failures -= 1
+            raise ConnectionError("gcs unavailable")
+        self.bucket.objects[self.name] = FakeBlob(self.bucket, self.name, data)
+
+    def download_as_bytes(self):
+        return self.data.encode() if isinstance(self.data, str) else self.data
+
+    def delete(self):
+        del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.objects = {}
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix=""):
+        return [blob for name, blob in list(self.objects.items()) if name.startswith(prefix)]
+
+    def segments(self):
+        return sorted(name for name in self.objects if name.endswith(".ndjson.gz"))
+
+    def manifest(self, segment):
+        return json.loads(self.objects[segment.replace(".ndjson.gz", ".manifest.json")].data)
+
+
+def _writer(bucket, **overrides):
+    config = ArchiveSegmentConfig(**{"max_age": 60.0, "retry_backoff": 0.0, **overrides})
+    return SegmentArchiveWriter(bucket, config, writer_id="test")
+
+
+def test_partition_is_the_utc_publish_hour():
+    assert partition_for(PUBLISHED) == "dt=2025-01-01/hour=13"
+    assert partition_for(datetime(2025, 1, 1, 13, 59)) == "dt=2025-01-01/hour=13"
+
+
+def test_acks_only_after_segment_and_manifest_upload():
+    bucket = FakeBucket()
+    writer = _writer(bucket, max_records=3)
+    durable = []
+
+    writer.append({"id": "s-1"}, durable.append, PUBLISHED)
+    writer.append({"id": "s-2"}, durable.append, PUBLISHED)
+    assert durable == [] and bucket.objects == {}
+
+    writer.append({"id": "s-3"}, durable.append, PUBLISHED)  # reaches max_records: rolled
+    writer.flush()
+    assert durable == [True, True, True]
+
+    (segment,) = bucket.segments()
+    assert segment.startswith("xapi-archive/dt=2025-01-01/hour=13/segment-")
+    lines = gzip.decompress(bucket.objects[segment].data).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["s-1", "s-2", "s-3"]
+
+    manifest = bucket.manifest(segment)
+    assert manifest["records"] == 3
+    assert manifest["compressed_bytes"] == len(bucket.objects[segment].data)
+    assert manifest["min_published_at"] == PUBLISHED.isoformat()
+    writer.close()
+
+
+def test_partitions_roll_independently_by_size():
+    bucket = FakeBucket()
+    writer = _writer(bucket, max_bytes=40)
+    later = PUBLISHED.replace(hour=14)
+
+    writer.append({"id": "s-1"}, lambda ok: None, PUBLISHED)
+    writer.append({"id": "s-2"}, lambda ok: None, later)
+    writer.append({"id": "s-3", "pad": "x" * 40}, lambda ok: None, PUBLISHED)
+    writer.flush()
+    writer.close()
+
+    partitions = [name.split("/")[2] for name in bucket.segments()]
+    assert sorted(partitions) == ["hour=13", "hour=14"]
+    assert writer.metrics["records_archived"] == 3
+
+
+def test_partial_segments_are_uploaded_after_max_age():
+    bucket = FakeBucket()
+    writer = _writer(bucket, max_age=0.05)
+    done = threading.Event()
+    writer.append({"id": "s-1"}, lambda ok: done.set(), PUBLISHED)
+    assert done.wait(5)
+    writer.close()
+    assert len(bucket.segments()) == 1
+
+
+def test_upload_is_retried_then_reported_as_failed():
+    bucket = FakeBucket(failures=1)
+    writer = _writer(bucket, max_records=1, upload_attempts=2)
+    durable = []
+    writer.append({"id": "s-1"}, durable.append, PUBLISHED)
+    writer.flush()
+    assert durable == [True]
+    assert writer.metrics["upload_retries"] == 1
+
+    bucket.failures = 10
+    writer.append({"id": "s-2"}, durable.append, PUBLISHED)
+    writer.flush()
+    writer.close()
+    assert durable == [True, False]
+    assert writer.metrics["segments_failed"] == 1
+
+
+def test_compaction_rewrites_legacy_objects_and_deletes_them():
+    bucket = FakeBucket()
+    for i in range(4):
+        name = f"xapi-statements/2025/01/01/learner@example.com/13{i:02d}00_msg-{i}.json"
+        bucket.objects[name] = FakeBlob(bucket, name, json.dumps({"id": f"s-{i}"}, indent=2))
+    bad = "xapi-statements/2025/01/01/x/130000_bad.json"
+    bucket.objects[bad] = FakeBlob(bucket, bad, "{not json")
+
+    counts = compact_legacy_objects(bucket, ArchiveSegmentConfig(retry_backoff=0.0), day="2025-01-01", delete=True)
+
+    assert counts == {"objects": 5, "compacted": 4, "skipped": 1, "deleted": 4, "failed": 0}
+    (segment,) = bucket.segments()
+    assert "dt=2025-01-01/hour=13" in segment
+    assert bucket.manifest(segment)["source"] == "compaction"
+    assert [name for name in bucket.objects if name.startswith("xapi-statements/")] == [bad]
@@ -0,0 +1,223 @@
+"""Tests for the micro-batched BigQuery sink used by the Pub/Sub processor."""
+
+import re
+import threading
+import time
+
+import pyarrow.parquet as pq
+from google.api_core import exceptions as gcp_exceptions
+
+from app.etl.bigquery_batch_sink import BigQueryBatchSink, SinkConfig, build_merge_query
+from app.services.statement_index import StatementIdIndex
+
+
+class FakeJob:
+    def __init__(self, work):
+        self._work = work
+        self.num_dml_affected_rows = None
+
+    def result(self):
+        self.num_dml_affected_rows = self._work()
+        return self
+
+
+class FakeRows:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def result(self):
+        return self._rows
+
+
+class FakeBigQuery:
+    """Records jobs and applies staging loads and MERGEs in memory."""
+
+    project = "test"
+
+    def __init__(self, poison_id=None):
+        self.poison_id = poison_id
+        self.tables = {}
+        self.jobs = []
+        self.deleted = []
+
+    def create_table(self, table):
+        self.tables[f"{table.dataset_id}.{table.table_id}"] = []
+
+    def delete_table(self, table_id, not_found_ok=False):
+        self.deleted.append(table_id)
+        self.tables.pop(table_id.split(".", 1)[1], None)
+
+    def load_table_from_json(self, rows, table_id, job_config=None):
+        def work():
+            if any(row["statement_id"] == self.poison_id for row in rows):
+                raise ValueError("invalid row")
+            self.tables[table_id.split(".", 1)[1]].extend(rows)
+            return len(rows)
+        self.jobs.append(("load", len(rows)))
+        return FakeJob(work)
+
+    def load_table_from_file(self, file_obj, table_id, job_config=None):
+        rows = pq.read_table(file_obj).to_pylist()
+        self.jobs.append(("load_parquet", len(rows)))
+
+        def work():
+            self.tables[table_id.split(".", 1)[1]].extend(rows)
+            return len(rows)
+        return FakeJob(work)
+
+    def query(self, sql, job_config=None):
+        if "IN UNNEST(@ids)" in sql:
+            ids = set(job_config.query_parameters[0].values)
+            target = re.search(r"FROM `([^`]+)`", sql).group(1)
+            self.jobs.append(("lookup", len(ids)))
+            return FakeRows([
+                {"statement_id": row["statement_id"]}
+                for row in self.tables.get(target, [])
+                if row["statement_id"] in ids
+            ])
+        target, staging = re.search(r"MERGE `([^`]+)` T\s+USING `([^`]+)` S", sql).groups()
+
+        def work():
+            existing = {row["statement_id"] for row in self.tables.setdefault(target, [])}
+            new_rows = [row for row in self.tables[staging] if row["statement_id"] not in existing]
+            self.tables[target].extend(new_rows)
+            return len(new_rows)
+        self.jobs.append(("merge", None))
+        return FakeJob(work)
+
+
+def _row(statement_id):
+    return {"statement_id": statement_id, "timestamp": "2025-01-01T00:00:00Z", "result_response": {"a": 1}}
+
+
+def test_size_flush_runs_one_load_and_one_merge_then_acks():
+    client = FakeBigQuery()
+    client.tables["ds.statements"] = [{"statement_id": "old"}]
+    sink = BigQueryBatchSink(client, "ds", "statements", SinkConfig(batch_size=3, max_latency=60))
+    acks = []
+    done = threading.Event()
+
+    def on_commit(ok):
+        acks.append(ok)
+        if len(acks) == 3:
+            done.set()
+
+    for statement_id in ("a", "old", "a"):
+        sink.add(_row(statement_id), on_commit)
+    assert done.wait(5)
+    sink.close()
+
+    assert acks == [True, True, True]
+    assert client.jobs == [("load", 2), ("merge", None)]
+    assert [row["statement_id"] for row in client.tables["ds.statements"]] == ["old", "a"]
+    assert client.tables["ds.statements"][1]["result_response"] == '{"a":1}'
+    assert sink.metrics["rows_inserted"] == 1
+    assert sink.metrics["duplicates_in_batch"] == 1
+    assert len(client.deleted) == 1
+
+
+def test_latency_flush_commits_partial_batch():
+    client = FakeBigQuery()
+    sink = BigQueryBatchSink(client, "ds", "statements", SinkConfig(batch_size=500, max_latency=0.05))
+    committed = threading.Event()
+
+    sink.add(_row("a"), lambda ok: committed.set())
+    started = time.monotonic()
+    assert committed.wait(5)
+    assert time.monotonic() - started < 2
+    sink.close()
+
+
+def test_failed_flush_is_split_so_only_bad_row_is_nacked():
+    client = FakeBigQuery(poison_id="bad")
+    sink = BigQueryBatchSink(client, "ds", "statements", SinkConfig(batch_size=4, max_latency=60))
+    outcomes = {}
+
+    for statement_id in ("a", "b", "bad", "c"):
+        sink.add(_row(statement_id), lambda ok, statement_id=statement_id: outcomes.__setitem__(statement_id, ok))
+    sink.close()
+
+    assert outcomes == {"a": True, "b": True, "bad": False, "c": True}
+    assert {row["statement_id"] for row in client.tables["ds.statements"]} == {"a", "b", "c"}
+    assert sink.metrics["rows_failed"] == 1
+    # Staging tables are dropped even when the load fails
+    assert len(client.deleted) == sink.metrics["flushes"] + sink.metrics["flush_failures"]
+
+
+def test_transient_failure_fails_the_batch_once_without_bisecting():
+    class Unavailable(FakeBigQuery):
+        def load_table_from_json(self, rows, table_id, job_config=None):
+            self.jobs.append(("load", len(rows)))
+            raise gcp_exceptions.ServiceUnavailable("backend error")
+
+    client = Unavailable()
+    sink = BigQueryBatchSink(client, "ds", "statements", SinkConfig(batch_size=8, max_latency=60))
+    outcomes = []
+    for statement_id in "abcdefgh":
+        sink.add(_row(statement_id), outcomes.append)
+    sink.close()
+
+    assert outcomes == [False] * 8
+    assert client.jobs == [("load", 8)]
+    assert (sink.metrics["flush_failures"], sink.metrics["rows_failed"]) == (1, 8)
+
+
+def test_merge_inserts_every_column():
+    query = build_merge_query("ds.statements", "ds.statements_staging_x")
+    assert "WHEN NOT MATCHED THEN" in query
+    assert "S.raw_json" in query and "S.result_success" in query
+
+
+def test_index_skips_redeliveries_and_batches_bloom_positive_lookups():
+    client = FakeBigQuery()
+    client.tables["ds.statements"] = [{"statement_id": "old"}]
+    index = StatementIdIndex(capacity=1000, error_rate=0.01, lru_size=100)
+    index.bootstrap(["old"])
+    sink = BigQueryBatchSink(client, "ds", "statements", SinkConfig(batch_size=10, max_latency=60), index=index)
+    acks = []
+
+    for statement_id in ("old", "a", "b"):
+        sink.add(_row(statement_id), acks.append)
+    sink.flush()
+    assert client.jobs == [("lookup", 1), ("load", 2), ("merge", None)]
+
+    # Redelivered messages hit the LRU: acked with no BigQuery job at all
+    client.jobs.clear()
+    for statement_id in ("old", "a", "b"):
+        sink.add(_row(statement_id), acks.append)
+    sink.close()
+
+    assert client.jobs == []
+    assert acks == [True] * 6
+    assert sink.metrics["rows_skipped_existing"] == 4
+    assert index.metrics["confirmed_existing"] == 1
+
+
+def test_flush_observer_sees_every_attempt():
+    client = FakeBigQuery(poison_id="bad")
+    observed = []
+    sink = BigQueryBatchSink(
+        client, "ds", "statements", SinkConfig(batch_size=2, max_latency=60),
+        on_flush=lambda seconds, rows, committed: observed.append((rows, committed)),
+    )
+
+    for statement_id in ("a", "bad"):
+        sink.add(_row(statement_id), lambda ok: None)
+    sink.close()
+
+    assert observed == [(2, False), (1, True), (1, False)]
+
+
+def test_parquet_staging_load():
+    client = FakeBigQuery()
+    sink = BigQueryBatchSink(client, "ds", "statements", SinkConfig(batch_size=10, max_latency=60, load_format="parquet"))
+
+    for statement_id in ("a", "b"):
+        sink.add(_row(statement_id), lambda ok: None)
+    sink.close()
+
+    assert client.jobs == [("load_parquet", 2), ("merge", None)]
+    stored = client.tables["ds.statements"]
+    assert [row["statement_id"] for row in stored] == ["a", "b"]
+    assert stored[0]["result_response"] == '{"a":1}'
+    assert stored[0]["timestamp"].year == 2025
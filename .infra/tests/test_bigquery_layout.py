@@ -0,0 +1,209 @@
+"""Tests for the declared BigQuery table layouts and the layout manager."""
+
+import re
+from dataclasses import replace
+from datetime import date
+
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud import bigquery
+
+from app.config.bigquery_layout import TABLE_LAYOUTS, TableLayout, get_table_layout
+from app.config.bigquery_schema import BigQuerySchema
+from app.etl.bigquery_layout_manager import BigQueryLayoutManager
+
+
+# The schema methods need no client
+SCHEMAS = object.__new__(BigQuerySchema).get_table_schemas()
+
+
+class FakeJob:
+    def __init__(self, rows=None, affected=None, processed=0):
+        self._rows = rows or []
+        self.num_dml_affected_rows = affected
+        self.total_bytes_processed = processed
+
+    def result(self):
+        return self._rows
+
+
+class FakeBigQuery:
+    """Holds tables as ``bigquery.Table`` objects and records every query."""
+
+    project = "test"
+
+    def __init__(self, tables):
+        self.tables = {table.table_id: table for table in tables}
+        self.queries = []
+        self.job_configs = []
+        self.updates = []
+        self.on_copy = None  # called after a CREATE TABLE ... AS SELECT, e.g. to simulate a writer
+
+    def get_table(self, table_ref):
+        name = table_ref.rsplit(".", 1)[-1]
+        if name not in self.tables:
+            raise gcp_exceptions.NotFound(table_ref)
+        return self.tables[name]
+
+    def update_table(self, table, fields):
+        self.updates.append((table.table_id, {name: getattr(table, name) for name in fields}))
+
+    def query(self, sql, job_config=None):
+        self.queries.append(sql)
+        self.job_configs.append(job_config)
+        if job_config is not None and job_config.dry_run:
+            # Pretend the clustered copy lets each query read a tenth of the data
+            return FakeJob(processed=100 if "__layout_" in sql else 1000)
+        if sql.lstrip().startswith("SELECT actor_id"):
+            return FakeJob(rows=[{"actor_id": "a-1", "verb_id": "v-1", "object_id": "o-1"}])
+        created = re.match(r"CREATE TABLE `[\w.]+\.(\w+)`[\s\S]*FROM `[\w.]+\.(\w+)`", sql)
+        if created:
+            copy = bigquery.Table(f"test.analytics.{created.group(1)}", schema=self.tables[created.group(2)].schema)
+            copy._properties["numRows"] = self.tables[created.group(2)]._properties.get("numRows")
+            self.tables[copy.table_id] = copy
+            if self.on_copy:
+                self.on_copy(self)
+        renamed = re.match(r"ALTER TABLE `[\w.]+\.(\w+)` RENAME TO (\w+)", sql)
+        if renamed:
+            table = self.tables.pop(renamed.group(1))
+            table._properties["tableReference"]["tableId"] = renamed.group(2)
+            self.tables[renamed.group(2)] = table
+        dropped = re.match(r"DROP TABLE `[\w.]+\.(\w+)`", sql)
+        if dropped:
+            del self.tables[dropped.group(1)]
+        return FakeJob()
+
+
+def _statements_table(**options):
+    table = bigquery.Table("test.analytics.statements", schema=SCHEMAS["statements"])
+    table.time_partitioning = bigquery.TimePartitioning(field="timestamp")
+    table._properties.update({"numRows": "42", "lastModifiedTime": "1735689600000"})
+    for name, value in options.items():
+        setattr(table, name, value)
+    return table
+
+
+def test_declared_layouts_match_the_schemas():
+    for table_name, layout in TABLE_LAYOUTS.items():
+        columns = {field.name: field.field_type for field in SCHEMAS[table_name]}
+        assert len(layout.clustering) <= 4
+        assert all(column in columns for column in layout.clustering), table_name
+        if layout.partition_field:
+            assert columns[layout.partition_field] in ("TIMESTAMP", "DATE"), table_name
+
+    # Tables without a first_seen column are no longer partitioned on it
+    alert_emails = get_table_layout("alert_emails").apply(bigquery.Table("test.analytics.alert_emails"))
+    assert alert_emails.time_partitioning is None
+    assert alert_emails.clustering_fields == ["email"]
+
+    statements = get_table_layout("statements")
+    assert statements.ddl_options() == (
+        "PARTITION BY DATE(timestamp)\n"
+        "CLUSTER BY actor_id, verb_id, object_id, normalized_user_id\n"
+        "OPTIONS(require_partition_filter=FALSE)"
+    )
+    assert TableLayout.from_table(statements.apply(bigquery.Table("test.analytics.statements"))) == TableLayout(
+        partition_field="timestamp", clustering=statements.clustering
+    )
+
+
+def test_plan_reports_drift_and_the_needed_action():
+    layouts = {
+        "statements": TABLE_LAYOUTS["statements"],
+        "filtered": TableLayout(partition_field="timestamp", require_partition_filter=True),
+        "absent": TableLayout(),
+    }
+    filtered = _statements_table()
+    filtered._properties["tableReference"]["tableId"] = "filtered"
+    client = FakeBigQuery([_statements_table(), filtered])
+    plan = {entry["table"]: entry for entry in BigQueryLayoutManager(client, "analytics", layouts).plan()}
+
+    assert (plan["statements"]["status"], plan["statements"]["action"]) == ("drift", "rebuild")
+    assert plan["statements"]["differences"] == [
+        {"option": "clustering", "declared": TABLE_LAYOUTS["statements"].clustering, "live": []}
+    ]
+    assert plan["filtered"]["action"] == "update"
+    assert plan["absent"]["status"] == "missing"
+
+    client.tables["statements"].clustering_fields = TABLE_LAYOUTS["statements"].clustering
+    assert BigQueryLayoutManager(client, "analytics", layouts).check("statements")["status"] == "ok"
+
+    # A declared clustering column the live table lacks blocks the migration
+    client.tables["statements"].schema = [
+        field for field in client.tables["statements"].schema if field.name != "normalized_user_id"
+    ]
+    client.tables["statements"].clustering_fields = None
+    manager = BigQueryLayoutManager(client, "analytics", layouts)
+    assert manager.check("statements")["status"] == "invalid"
+    assert manager.migrate("statements")["migrated"] is False
+    assert client.queries == []
+
+
+def test_migrate_rebuilds_and_swaps_with_writers_stopped():
+    client = FakeBigQuery([_statements_table()])
+    layouts = {"statements": replace(TABLE_LAYOUTS["statements"], require_partition_filter=True)}
+    manager = BigQueryLayoutManager(client, "analytics", layouts, backup_days=3)
+
+    # A rebuild is refused until the writers are confirmed stopped
+    refused = manager.migrate("statements")
+    assert refused["migrated"] is False and "--writers-stopped" in refused["error"]
+    assert client.queries == []
+
+    result = manager.migrate("statements", writers_stopped=True)
+    assert result["migrated"] is True
+    assert result["rows_copied"] == 42
+    ctas, rename_old, rename_new, expire = client.queries
+    staged = re.search(r"CREATE TABLE `test\.analytics\.(statements__layout_\w+)`", ctas).group(1)
+    assert "CLUSTER BY actor_id, verb_id, object_id, normalized_user_id" in ctas
+    assert "require_partition_filter=TRUE" in ctas
+    assert ctas.endswith("AS SELECT * FROM `test.analytics.statements`")
+    assert rename_old == f"ALTER TABLE `test.analytics.statements` RENAME TO {result['backup']}"
+    assert rename_new == f"ALTER TABLE `test.analytics.{staged}` RENAME TO statements"
+    assert "INTERVAL 3 DAY" in expire
+    assert set(client.tables) == {"statements", result["backup"]}
+
+    # A dry run only lists the steps
+    client = FakeBigQuery([_statements_table()])
+    dry = BigQueryLayoutManager(client, "analytics").migrate("statements", dry_run=True)
+    assert len(dry["steps"]) == 4 and not dry["migrated"]
+    assert client.queries == []
+
+
+def test_migrate_aborts_when_the_table_changes_during_the_copy():
+    def writer(client):
+        client.tables["statements"]._properties["lastModifiedTime"] = "1735689660000"
+
+    client = FakeBigQuery([_statements_table()])
+    client.on_copy = writer
+    result = BigQueryLayoutManager(client, "analytics").migrate("statements", writers_stopped=True)
+
+    assert result["migrated"] is False and "modified while it was copied" in result["error"]
+    assert client.queries[-1].startswith("DROP TABLE `test.analytics.statements__layout_")
+    assert not any("RENAME" in sql for sql in client.queries)
+    assert set(client.tables) == {"statements"}
+
+    # So does a table with rows still in its streaming buffer
+    client = FakeBigQuery([_statements_table()])
+    client.tables["statements"]._properties["streamingBuffer"] = {"estimatedRows": "5"}
+    result = BigQueryLayoutManager(client, "analytics").migrate("statements", writers_stopped=True)
+    assert "streaming buffer" in result["error"] and client.queries == []
+
+
+def test_report_compares_bytes_scanned_by_dashboard_queries():
+    client = FakeBigQuery([_statements_table()])
+    report = BigQueryLayoutManager(client, "analytics").report(
+        "statements", "statements", "statements__layout_x", day="2025-01-07"
+    )
+    assert report["executed"] is False
+    assert len(report["queries"]) == 5
+    assert all(query["reduction_pct"] == 90.0 for query in report["queries"])
+    assert (report["total_before_bytes"], report["total_after_bytes"]) == (5000, 500)
+
+    learner = next(
+        config for sql, config in zip(client.queries, client.job_configs)
+        if "statements__layout_x" in sql and "@actor_id" in sql
+    )
+    parameters = {parameter.name: (parameter.type_, parameter.value) for parameter in learner.query_parameters}
+    assert parameters["actor_id"] == ("STRING", "a-1")
+    assert parameters["week_start"] == ("DATE", date(2025, 1, 1))
+    assert parameters["day"] == ("DATE", date(2025, 1, 7))
+    assert report["day"] == "2025-01-07"
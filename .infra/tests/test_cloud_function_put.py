@@ -51,12 +51,12 @@ class TestCloudFunctionPUTSupport:
     def test_put_method_accepts_valid_single_statement(self):
         """Test that PUT method accepts valid single xAPI statement."""
         # Mock the entire publish_to_pubsub function to avoid JSON serialization issues
-        with patch('cloud_function_ingestion.publish_to_pubsub') as mock_publish:
-            mock_publish.return_value = {
+        with patch('cloud_function_ingestion.publish_batch_to_pubsub') as mock_publish:
+            mock_publish.return_value = [{
                 "success": True,
                 "message_id": "test-message-id",
                 "topic": "projects/taps-data/topics/xapi-ingestion-topic"
-            }
+            }]
             
             mock_request = self.create_mock_request('PUT', self.valid_xapi_statement)
             
@@ -73,12 +73,15 @@ class TestCloudFunctionPUTSupport:
     def test_put_method_accepts_valid_batch_statements(self):
         """Test that PUT method accepts valid batch xAPI statements."""
         # Mock the entire publish_to_pubsub function to avoid JSON serialization issues
-        with patch('cloud_function_ingestion.publish_to_pubsub') as mock_publish:
-            mock_publish.return_value = {
-                "success": True,
-                "message_id": "test-message-id",
-                "topic": "projects/taps-data/topics/xapi-ingestion-topic"
-            }
+        with patch('cloud_function_ingestion.publish_batch_to_pubsub') as mock_publish:
+            mock_publish.return_value = [
+                {
+                    "success": True,
+                    "message_id": f"test-message-id-{i}",
+                    "topic": "projects/taps-data/topics/xapi-ingestion-topic"
+                }
+                for i in range(2)
+            ]
             
             mock_request = self.create_mock_request('PUT', self.batch_xapi_statements)
             
@@ -164,12 +167,12 @@ class TestCloudFunctionPUTSupport:
     def test_put_method_publishes_to_pubsub_successfully(self):
         """Test that PUT method successfully publishes to Pub/Sub."""
         # Mock the entire publish_to_pubsub function to avoid JSON serialization issues
-        with patch('cloud_function_ingestion.publish_to_pubsub') as mock_publish:
-            mock_publish.return_value = {
+        with patch('cloud_function_ingestion.publish_batch_to_pubsub') as mock_publish:
+            mock_publish.return_value = [{
                 "success": True,
                 "message_id": "test-message-id-123",
                 "topic": "projects/taps-data/topics/xapi-ingestion-topic"
-            }
+            }]
             
             mock_request = self.create_mock_request('PUT', self.valid_xapi_statement)
             
@@ -178,18 +181,18 @@ class TestCloudFunctionPUTSupport:
             assert status_code == 200
             response_data = json.loads(response_json)
             
-            # Verify publish_to_pubsub was called
-            mock_publish.assert_called_once_with(self.valid_xapi_statement, source='cloud_function_http')
+            # Verify the batch was published once
+            mock_publish.assert_called_once_with([self.valid_xapi_statement], source='cloud_function_http')
 
     def test_put_vs_post_identical_behavior(self):
         """Test that PUT and POST methods behave identically."""
         # Mock the entire publish_to_pubsub function to avoid JSON serialization issues
-        with patch('cloud_function_ingestion.publish_to_pubsub') as mock_publish:
-            mock_publish.return_value = {
+        with patch('cloud_function_ingestion.publish_batch_to_pubsub') as mock_publish:
+            mock_publish.return_value = [{
                 "success": True,
                 "message_id": "test-message-id",
                 "topic": "projects/taps-data/topics/xapi-ingestion-topic"
-            }
+            }]
             
             # Test POST
             post_request = self.create_mock_request('POST', self.valid_xapi_statement)
@@ -218,7 +221,9 @@ class TestCloudFunctionPUTSupport:
 
     @patch('cloud_function_ingestion.publisher', None)
     @patch('cloud_function_ingestion.topic_path', None)
-    def test_put_method_handles_pubsub_failure(self):
+    @patch('cloud_function_ingestion.publisher_service.get_client',
+           side_effect=RuntimeError('Pub/Sub client not initialized: no credentials'))
+    def test_put_method_handles_pubsub_failure(self, mock_get_client):
         """Test that PUT method handles Pub/Sub publishing failures gracefully."""
         mock_request = self.create_mock_request('PUT', self.valid_xapi_statement)
         
@@ -242,12 +247,12 @@ class TestCloudFunctionPUTSupport:
 
     def test_put_method_response_includes_timestamp(self):
         """Test that PUT method response includes timestamp."""
-        with patch('cloud_function_ingestion.publish_to_pubsub') as mock_publish:
-            mock_publish.return_value = {
+        with patch('cloud_function_ingestion.publish_batch_to_pubsub') as mock_publish:
+            mock_publish.return_value = [{
                 "success": True,
                 "message_id": "test-message-id",
                 "topic": "projects/taps-data/topics/xapi-ingestion-topic"
-            }
+            }]
             
             mock_request = self.create_mock_request('PUT', self.valid_xapi_statement)
             
@@ -0,0 +1,83 @@
+"""Tests for the columnar (Arrow/Parquet) statement transform."""
+
+import io
+
+import pyarrow.parquet as pq
+import pytest
+
+from app.config.bigquery_schema import BigQuerySchema
+from app.etl import columnar_transform
+from app.etl.pubsub_bigquery_processor import PubSubBigQueryProcessor
+
+STATEMENTS = [
+    {
+        "id": "s1",
+        "timestamp": "2025-01-01T10:00:00.250Z",
+        "actor": {"name": "Ann", "mbox": "mailto:ann@example.com"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/answered", "display": {"en-US": "answered"}},
+        "object": {"id": "lesson-1", "definition": {"name": {"en-US": "Lesson 1"}, "type": "cmi.interaction"}},
+        "result": {"score": {"raw": 7, "scaled": 0.7}, "success": True, "response": "über 😊"},
+        "context": {"platform": "7taps", "instructor": {"account": {"name": "coach"}}},
+    },
+    {
+        "id": "s2",
+        "timestamp": "2025-01-01T10:00:00+02:00",
+        "actor": {"account": {"name": "learner-2", "homePage": "https://7taps.com"}, "objectType": "Group"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/completed"},
+        "object": "not-a-dict",
+        "result": {"response": "dropped: no score"},
+    },
+    {"id": "s3", "actor": {}, "verb": {}, "object": {"objectType": "StatementRef", "id": "s1"}},
+]
+
+
+def _dict_rows(statements):
+    processor = object.__new__(PubSubBigQueryProcessor)
+    return [processor.transform_xapi_to_bigquery_row(statement, "m") for statement in statements]
+
+
+def test_columns_match_the_per_row_transform():
+    columns = columnar_transform.statement_columns(STATEMENTS, stored="2025-02-01T00:00:00+00:00")
+
+    for index, row in enumerate(_dict_rows(STATEMENTS)):
+        for name, values in columns.items():
+            if name in ("stored", "timestamp") and name not in STATEMENTS[index]:
+                continue  # both default to "now"
+            assert values[index] == row[name], name
+
+
+def test_record_batch_matches_statements_table_schema():
+    batch = columnar_transform.statements_to_record_batch(STATEMENTS)
+
+    assert [field.name for field in batch.schema] == [
+        field.name for field in BigQuerySchema.get_statements_table_schema()
+    ]
+    assert batch.num_rows == 3
+    timestamps = batch.column("timestamp").to_pylist()
+    assert timestamps[0].isoformat() == "2025-01-01T10:00:00.250000+00:00"
+    assert timestamps[1].isoformat() == "2025-01-01T08:00:00+00:00"
+    assert batch.column("result_score_raw").to_pylist() == [7.0, None, None]
+
+
+def test_odd_values_are_coerced_per_value():
+    batch = columnar_transform.rows_to_record_batch([
+        {"statement_id": "a", "timestamp": "2025-01-01 00:00:00", "result_score_raw": "7", "result_response": {"a": 1}},
+        {"statement_id": "b", "timestamp": None, "result_score_raw": "n/a", "result_success": "yes"},
+    ])
+
+    assert batch.column("timestamp").to_pylist()[0].isoformat() == "2025-01-01T00:00:00+00:00"
+    assert batch.column("result_score_raw").to_pylist() == [7.0, None]
+    assert batch.column("result_response").to_pylist() == ['{"a":1}', None]
+    assert batch.column("result_success").to_pylist() == [None, None]
+
+
+def test_parquet_round_trip():
+    batch = columnar_transform.statements_to_record_batch(STATEMENTS)
+    table = pq.read_table(io.BytesIO(columnar_transform.to_parquet_bytes(batch)))
+
+    assert table.to_pylist() == batch.to_pylist()
+
+
+def test_unknown_bigquery_type_is_rejected():
+    with pytest.raises(ValueError):
+        columnar_transform._arrow_type("GEOGRAPHY")
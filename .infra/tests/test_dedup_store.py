@@ -0,0 +1,171 @@
+"""Tests for the ingest-edge statement-id dedup store."""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.api import seventaps, xapi
+from app.services.dedup_store import InMemoryDedupStore, RedisDedupStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Implements the subset of redis-py used by ``RedisDedupStore``."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.keys = {}
+        self.pipelines = 0
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            def set(self, key, value, nx=False, ex=None):
+                self.commands.append((key, value, ex))
+
+            def execute(self):
+                if redis.fail:
+                    raise ConnectionError("redis down")
+                redis.pipelines += 1
+                results = []
+                for key, value, ex in self.commands:
+                    if key in redis.keys:
+                        results.append(None)
+                    else:
+                        redis.keys[key] = ex
+                        results.append(True)
+                return results
+
+        return Pipeline()
+
+    def delete(self, *keys):
+        for key in keys:
+            self.keys.pop(key, None)
+
+
+def test_memory_store_expires_entries_after_ttl():
+    clock = FakeClock()
+    store = InMemoryDedupStore(ttl_seconds=60, max_entries=100, clock=clock)
+
+    assert store.claim_many(["a", "b", "a"]) == [True, True, False]
+    clock.now += 61
+    assert store.claim_many(["a"]) == [True]
+    assert store.metrics["hits"] == 1
+    assert store.metrics["misses"] == 3
+
+
+def test_memory_store_evicts_least_recent_instead_of_clearing():
+    store = InMemoryDedupStore(ttl_seconds=60, max_entries=3)
+
+    store.claim_many(["a", "b", "c"])
+    store.claim("a")  # refresh a
+    store.claim("d")  # evicts b only
+
+    assert "a" in store and "c" in store and "d" in store
+    assert "b" not in store
+    assert store.metrics["evictions"] == 1
+
+
+def test_redis_store_checks_whole_request_in_one_round_trip():
+    fake = FakeRedis()
+    store = RedisDedupStore(
+        "redis://test", ttl_seconds=3600,
+        fallback=InMemoryDedupStore(ttl_seconds=3600, max_entries=10), client=fake,
+    )
+
+    assert store.claim_many(["a", "b"]) == [True, True]
+    assert store.claim_many(["a", "c"]) == [False, True]
+    assert fake.pipelines == 2
+    assert fake.keys["xapi:dedup:a"] == 3600
+
+    store.release(["a"])
+    assert store.claim("a") is True
+    assert store.get_status()["metrics"]["hits"] == 1
+
+
+def test_redis_outage_falls_back_to_local_store():
+    fake = FakeRedis()
+    store = RedisDedupStore(
+        "redis://test", ttl_seconds=3600,
+        fallback=InMemoryDedupStore(ttl_seconds=3600, max_entries=10), client=fake,
+    )
+    store.claim_many(["a"])
+
+    fake.fail = True
+    assert store.claim_many(["a", "b"]) == [False, True]
+    assert store.metrics["errors"] == 1
+    assert store.metrics["fallback_checks"] == 2
+
+
+def test_7taps_releases_ids_whose_publish_failed():
+    store = InMemoryDedupStore(ttl_seconds=60, max_entries=100)
+    statements = [
+        {
+            "id": statement_id,
+            "actor": {"mbox": "mailto:x@example.com"},
+            "verb": {"id": "http://adlnet.gov/expapi/verbs/completed"},
+            "object": {"id": "http://example.com/activity"},
+        }
+        for statement_id in ("ok", "fails")
+    ]
+
+    def publish(payloads, source):
+        return [
+            {"success": payload["id"] == "ok", "message_id": "m", "error": "boom"}
+            for payload in payloads
+        ]
+
+    with patch.object(seventaps, "get_dedup_store", return_value=store), \
+            patch.object(xapi, "_publish_payloads", publish):
+        asyncio.run(seventaps._publish_7taps_statements(statements, source="test"))
+
+    assert "ok" in store
+    assert "fails" not in store
+    assert store.metrics["released"] == 1
+
+
+def test_7taps_releases_ids_that_were_invalid_or_never_published():
+    store = InMemoryDedupStore(ttl_seconds=60, max_entries=100)
+    valid = {
+        "id": "ok",
+        "actor": {"mbox": "mailto:x@example.com"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/completed"},
+        "object": {"id": "http://example.com/activity"},
+    }
+    invalid = {"id": "no-verb", "actor": {"mbox": "mailto:x@example.com"}}
+
+    def publish(payloads, source):
+        return [{"success": True, "message_id": "m"} for _ in payloads]
+
+    with patch.object(seventaps, "get_dedup_store", return_value=store), \
+            patch.object(xapi, "_publish_payloads", publish):
+        processed = asyncio.run(seventaps._publish_7taps_statements([valid, invalid], source="test"))
+
+    assert processed[1]["status"] == "invalid"
+    assert "ok" in store
+    assert "no-verb" not in store
+
+    # A pipeline that raises leaves no claim behind
+    async def broken_pipeline(*args, **kwargs):
+        raise RuntimeError("executor shut down")
+
+    store = InMemoryDedupStore(ttl_seconds=60, max_entries=100)
+    with patch.object(seventaps, "get_dedup_store", return_value=store), \
+            patch.object(seventaps, "run_ingest_pipeline", broken_pipeline):
+        with pytest.raises(RuntimeError, match="executor shut down"):
+            asyncio.run(seventaps._publish_7taps_statements([dict(valid, id="retry-me")], source="test"))
+
+    assert "retry-me" not in store
+    assert store.metrics["released"] == 1
@@ -0,0 +1,79 @@
+"""Tests for the coalescing ETL wake-up bus."""
+
+import time
+from unittest.mock import Mock, patch
+
+from app.services.etl_wakeup import EtlWakeupBus
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_burst_of_notifications_wakes_local_listener_once_per_window():
+    bus = EtlWakeupBus(debounce_seconds=0.2)
+    listener = Mock()
+    bus.register_listener(listener)
+
+    bus.notify(source="api")
+    assert _wait_for(lambda: listener.call_count == 1)
+
+    for _ in range(200):
+        bus.notify(source="7taps")
+    time.sleep(0.05)
+    assert listener.call_count == 1
+
+    assert _wait_for(lambda: listener.call_count == 2)
+    assert "7taps" in listener.call_args.args[0]
+    assert bus.metrics["notifications"] == 201
+    assert bus.metrics["local_wakeups"] == 2
+    assert bus.metrics["remote_wakeups"] == 0
+
+
+def test_remote_fallback_uses_single_pooled_call_without_local_listener():
+    bus = EtlWakeupBus(debounce_seconds=5.0, remote_url="http://etl.internal")
+    http_client = Mock()
+    http_client.post.return_value = Mock(status_code=200)
+    bus._http_client = http_client
+
+    bus.notify(source="api")
+    assert _wait_for(lambda: http_client.post.call_count == 1)
+    for _ in range(50):
+        bus.notify(source="api")
+    bus.flush()
+
+    assert http_client.post.call_count == 2
+    http_client.post.assert_called_with("http://etl.internal/api/etl/trigger-processing")
+    assert bus.metrics["coalesced"] == 49
+
+
+def test_remote_failure_is_counted_not_raised():
+    bus = EtlWakeupBus(debounce_seconds=0.0, remote_url="http://etl.internal")
+    http_client = Mock()
+    http_client.post.side_effect = RuntimeError("connection refused")
+    bus._http_client = http_client
+
+    bus.notify()
+    assert _wait_for(lambda: bus.metrics["remote_failures"] == 1)
+    assert bus.get_status()["mode"] == "remote"
+
+
+def test_wakeup_listener_is_only_registered_by_the_processor_owner():
+    from app.api import etl_control
+
+    bus = EtlWakeupBus(debounce_seconds=0.0)
+    with patch.object(etl_control, "etl_wakeup_bus", bus), patch.object(etl_control, "settings") as settings:
+        settings.APP_RUN_MODE, settings.ETL_UNIFIED_CONSUMER_ENABLED = "api", False
+        assert etl_control.register_etl_wakeup_listener() is False
+        settings.APP_RUN_MODE, settings.ETL_UNIFIED_CONSUMER_ENABLED = "all", True
+        assert etl_control.register_etl_wakeup_listener() is False
+        assert bus.get_status()["mode"] == "remote"
+
+        settings.APP_RUN_MODE, settings.ETL_UNIFIED_CONSUMER_ENABLED = "all", False
+        assert etl_control.register_etl_wakeup_listener() is True
+        assert bus.get_status()["mode"] == "local"
@@ -0,0 +1,102 @@
+"""Tests for the bounded-concurrency ingest pipeline behind the batch routes."""
+
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import seventaps, xapi
+from app.services.dedup_store import get_dedup_store
+
+
+def _statement(statement_id, valid=True):
+    statement = {
+        "id": statement_id,
+        "actor": {"mbox": f"mailto:{statement_id}@example.com"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/completed"},
+        "object": {"id": "http://example.com/activity"},
+    }
+    if not valid:
+        del statement["verb"]
+    return statement
+
+
+class SlowPublisher:
+    """Stand-in for ``_publish_payloads`` that tracks overlapping calls."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.batches = []
+
+    def __call__(self, payloads, source):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.batches.append([payload["id"] for payload in payloads])
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return [{"success": True, "message_id": f"msg-{payload['id']}"} for payload in payloads]
+
+
+def test_pipeline_overlaps_chunks_and_keeps_input_order():
+    publisher = SlowPublisher()
+    statements = [_statement(f"s{i}", valid=(i != 3)) for i in range(9)]
+
+    with patch.object(xapi, "_publish_payloads", publisher):
+        outcomes = asyncio.run(xapi.run_ingest_pipeline(
+            statements,
+            lambda data: xapi.build_statement_context(xapi.validate_xapi_statement(data), source="test"),
+            source="test",
+            concurrency=2,
+            chunk_size=2,
+        ))
+
+    assert publisher.max_in_flight == 2
+    assert len(publisher.batches) == 5
+    assert outcomes[3][0] is None
+    assert outcomes[3][1]["success"] is False
+    assert [outcome["message_id"] for context, outcome in outcomes if context] == [
+        f"msg-s{i}" for i in range(9) if i != 3
+    ]
+
+
+def test_7taps_pipeline_keeps_dedup_and_reports_invalid_per_index():
+    get_dedup_store().clear()
+    get_dedup_store().claim("seen-before")
+    statements = [
+        _statement("a"),
+        _statement("seen-before"),
+        _statement("bad", valid=False),
+        _statement("a"),
+        _statement("b"),
+    ]
+
+    with patch.object(xapi, "_publish_payloads", SlowPublisher(delay=0)), \
+            patch.object(xapi.settings, "INGEST_PIPELINE_CHUNK_SIZE", 1):
+        processed = asyncio.run(seventaps._publish_7taps_statements(statements, source="test"))
+
+    assert processed[0]["message_id"] == "msg-a"
+    assert processed[1]["status"] == "duplicate"
+    assert processed[2]["status"] == "invalid"
+    assert processed[3]["status"] == "duplicate"
+    assert processed[4]["message_id"] == "msg-b"
+    assert all(statement_id in get_dedup_store() for statement_id in ("a", "b"))
+    # The invalid statement's claim is released, so a corrected retry is accepted
+    assert "bad" not in get_dedup_store()
+
+
+def test_7taps_request_with_only_invalid_statements_still_fails():
+    get_dedup_store().clear()
+
+    with patch.object(xapi, "_publish_payloads", SlowPublisher(delay=0)):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(seventaps._publish_7taps_statements([_statement("x", valid=False)], source="test"))
+
+    assert exc_info.value.status_code == 422
@@ -0,0 +1,233 @@
+"""Tests for the durable ingest spool used when Pub/Sub is unavailable."""
+
+import os
+import time
+from concurrent.futures import Future
+from unittest.mock import patch
+
+import pytest
+
+from app.api import cloud_function_ingestion
+from app.services.ingest_spool import IngestSpool, SpoolConfig
+
+
+class FlakyPublisher:
+    """Publish callable that fails until ``healthy`` is set."""
+
+    def __init__(self):
+        self.healthy = False
+        self.delivered = []
+
+    def __call__(self, payloads, attributes):
+        if not self.healthy:
+            return [{"success": False, "error": "unavailable"} for _ in payloads]
+        self.delivered.extend(
+            (payload["id"], attrs["source"]) for payload, attrs in zip(payloads, attributes)
+        )
+        return [{"success": True, "message_id": f"msg-{payload['id']}"} for payload in payloads]
+
+
+def _config(tmp_path, **overrides):
+    values = dict(directory=str(tmp_path), drain_batch_size=2, poll_interval=0.01,
+                  backoff_initial=0.01, backoff_max=0.05)
+    values.update(overrides)
+    return SpoolConfig(**values)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_outage_spools_then_drains_to_zero_depth(tmp_path):
+    publisher = FlakyPublisher()
+    drained_counts = []
+    spool = IngestSpool(_config(tmp_path), publisher, on_drained=drained_counts.append)
+
+    spool.append([({"id": f"s{i}"}, "7taps_webhook") for i in range(5)])
+    assert spool.metrics["depth_records"] == 5
+    assert spool.metrics["fsyncs"] == 1
+
+    spool.start_drainer()
+    try:
+        assert _wait_for(lambda: spool.metrics["drain_failures"] >= 2)
+        assert spool.metrics["depth_records"] == 5
+
+        publisher.healthy = True
+        assert _wait_for(lambda: spool.metrics["depth_records"] == 0)
+    finally:
+        spool.stop_drainer()
+
+    assert publisher.delivered == [(f"s{i}", "7taps_webhook") for i in range(5)]
+    assert sum(drained_counts) == 5
+    assert spool.get_status()["segments"] == 0
+
+
+def test_partial_drain_resumes_after_restart(tmp_path):
+    calls = {"count": 0}
+
+    def publish(payloads, attributes):
+        calls["count"] += 1
+        # First batch succeeds, then the publisher goes away mid-drain
+        ok = calls["count"] == 1
+        return [{"success": ok, "message_id": "m", "error": "down"} for _ in payloads]
+
+    spool = IngestSpool(_config(tmp_path), publish)
+    spool.append([({"id": f"s{i}"}, "api_ingest") for i in range(5)])
+    with pytest.raises(RuntimeError):
+        spool.drain_once()
+    assert spool.metrics["depth_records"] == 3
+
+    # A new process recovers the remaining depth from the ack offset
+    publisher = FlakyPublisher()
+    publisher.healthy = True
+    restarted = IngestSpool(_config(tmp_path), publisher)
+    assert restarted.metrics["depth_records"] == 3
+    assert restarted.drain_once() == 3
+    assert [statement_id for statement_id, _ in publisher.delivered] == ["s2", "s3", "s4"]
+
+
+def test_publish_batch_spools_failures_and_acknowledges(tmp_path):
+    spool = IngestSpool(_config(tmp_path), FlakyPublisher())
+
+    def publish_batch(statements, source, timeout=None, on_unresolved=None):
+        assert timeout == spool.config.latency_budget
+        return [
+            {"success": statement["id"] == "ok", "message_id": "msg-ok", "error": "timed out", "topic": "t"}
+            for statement in statements
+        ]
+
+    statements = [
+        {"id": statement_id, "actor": {}, "verb": {"id": "v"}, "object": {"id": "o"}}
+        for statement_id in ("ok", "slow")
+    ]
+    with patch.object(cloud_function_ingestion, "get_ingest_spool", return_value=spool), \
+            patch.object(cloud_function_ingestion, "get_pubsub_client"), \
+            patch.object(cloud_function_ingestion.publisher_service, "publish_batch", side_effect=publish_batch), \
+            patch.object(cloud_function_ingestion, "wake_etl_processors"):
+        results = cloud_function_ingestion.publish_batch_to_pubsub(statements, source="test")
+
+    assert results[0] == {"success": True, "message_id": "msg-ok", "error": "timed out", "topic": "t"}
+    assert results[1] == {"success": True, "spooled": True, "message_id": None, "topic": "t"}
+    assert spool.metrics["depth_records"] == 1
+
+
+def test_client_outage_without_spool_still_raises():
+    with patch.object(cloud_function_ingestion, "get_ingest_spool", return_value=None), \
+            patch.object(cloud_function_ingestion, "get_pubsub_client", side_effect=RuntimeError("no client")):
+        with pytest.raises(RuntimeError):
+            cloud_function_ingestion.publish_batch_to_pubsub([{"id": "x"}], source="test")
+
+
+def test_segments_of_a_live_writer_are_left_alone_until_it_exits(tmp_path):
+    import subprocess
+    import sys
+
+    # Another process spools two statements and keeps running until told to exit
+    writer = subprocess.Popen(
+        [sys.executable, "-c", (
+            "import sys\n"
+            "from app.services.ingest_spool import IngestSpool, SpoolConfig\n"
+            f"spool = IngestSpool(SpoolConfig(directory={str(tmp_path)!r}), lambda p, a: [])\n"
+            "spool.append([({'id': 'w0'}, 'api_ingest'), ({'id': 'w1'}, 'api_ingest')])\n"
+            "print('ready', flush=True)\n"
+            "sys.stdin.readline()\n"
+        )],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert any(line.strip() == "ready" for line in writer.stdout)  # skips the writer's log lines
+        publisher = FlakyPublisher()
+        publisher.healthy = True
+        spool = IngestSpool(_config(tmp_path), publisher)
+        spool.append([({"id": "own"}, "api_ingest")])
+
+        assert spool.drain_once() == 1
+        assert publisher.delivered == [("own", "api_ingest")]
+        writer_dirs = [path for path in tmp_path.iterdir() if path.name != f"owner-{os.getpid()}"]
+        assert len(writer_dirs) == 1 and list(writer_dirs[0].glob("segment-*.ndjson"))
+    finally:
+        writer.communicate("\n", timeout=10)
+
+    # Once the writer has exited its sealed segments are adopted and drained
+    assert spool._claim_orphans() == 2
+    assert spool.drain_once() == 2
+    assert [statement_id for statement_id, _ in publisher.delivered] == ["own", "w0", "w1"]
+    assert [path.name for path in tmp_path.iterdir()] == [f"owner-{os.getpid()}"]
+    assert spool.metrics["depth_records"] == 0
+
+
+def test_torn_and_corrupt_lines_are_quarantined_not_retried(tmp_path):
+    spool = IngestSpool(_config(tmp_path), FlakyPublisher())
+    spool.append([({"id": "s0"}, "api_ingest"), ({"id": "s1"}, "api_ingest")])
+    segment = spool._segments()[0]
+    with open(segment, "ab") as f:
+        f.write(b"not json\n")
+        f.write(b'{"source": "api_ingest", "payload": {"id": "s2"')  # crash mid-append
+    spool._seal_active_locked()
+
+    publisher = FlakyPublisher()
+    publisher.healthy = True
+    restarted = IngestSpool(_config(tmp_path), publisher)
+    assert restarted.metrics["depth_records"] == 4
+    assert restarted.drain_once() == 2
+    assert publisher.delivered == [("s0", "api_ingest"), ("s1", "api_ingest")]
+    assert restarted.metrics["records_quarantined"] == 2
+    assert restarted.metrics["depth_records"] == 0
+    assert restarted.get_status()["segments"] == 0
+    quarantined = (tmp_path / "quarantine.ndjson").read_bytes().splitlines()
+    assert quarantined == [b"not json", b'{"source": "api_ingest", "payload": {"id": "s2"']
+
+
+def test_unresolved_publish_is_awaited_instead_of_republished(tmp_path):
+    publisher = FlakyPublisher()
+    publisher.healthy = True
+    spool = IngestSpool(_config(tmp_path, unresolved_wait=5.0), publisher)
+    landed, lost = Future(), Future()
+
+    def publish_batch(statements, source, timeout=None, on_unresolved=None):
+        # Both publishes are still in flight at the latency budget
+        on_unresolved(0, landed)
+        on_unresolved(1, lost)
+        return [
+            {"success": False, "outcome_unknown": True, "error": "unresolved", "topic": "t"}
+            for _ in statements
+        ]
+
+    with patch.object(cloud_function_ingestion, "get_ingest_spool", return_value=spool), \
+            patch.object(cloud_function_ingestion, "get_pubsub_client"), \
+            patch.object(cloud_function_ingestion.publisher_service, "publish_batch", side_effect=publish_batch), \
+            patch.object(cloud_function_ingestion, "wake_etl_processors"):
+        results = cloud_function_ingestion.publish_batch_to_pubsub(
+            [{"id": statement_id, "actor": {}, "verb": {"id": "v"}, "object": {"id": "o"}}
+             for statement_id in ("landed", "lost")],
+            source="test",
+        )
+    assert all(result["spooled"] for result in results)
+
+    landed.set_result("msg-late")
+    lost.set_exception(RuntimeError("deadline exceeded"))
+    assert spool.drain_once() == 2
+    assert publisher.delivered == [("lost", "test")]  # the landed one is not sent twice
+    assert spool.metrics["records_published_late"] == 1
+    assert spool.metrics["depth_records"] == 0
+
+
+def test_unresolved_publishes_of_a_batch_are_awaited_together(tmp_path):
+    publisher = FlakyPublisher()
+    publisher.healthy = True
+    spool = IngestSpool(_config(tmp_path, drain_batch_size=8, unresolved_wait=0.3), publisher)
+    hanging = [Future() for _ in range(6)]
+    spool.append([({"id": f"s-{i}"}, "test") for i in range(6)], futures=hanging)
+    hanging[0].set_result("msg-late")
+
+    started = time.monotonic()
+    assert spool.drain_once() == 6
+    # One shared wait for the batch, not one unresolved_wait per record
+    assert time.monotonic() - started < 1.0
+    assert [statement_id for statement_id, _ in publisher.delivered] == [f"s-{i}" for i in range(1, 6)]
+    assert spool.metrics["records_published_late"] == 1
@@ -0,0 +1,58 @@
+"""Tests for the shared JSON codec and its stdlib fallback."""
+
+import json
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+from app.utils import json_codec
+
+STATEMENT = {
+    "id": "s1",
+    "actor": {"name": "Zoë", "mbox": "mailto:zoe@example.com"},
+    "result": {"response": "über 😊", "score": {"raw": 7, "scaled": 0.7}},
+    "context": {"extensions": {1: "numeric key"}},
+}
+
+
+@pytest.fixture(params=["fast", "stdlib"])
+def backend(request):
+    if request.param == "stdlib":
+        with patch.object(json_codec, "orjson", None):
+            yield request.param
+    else:
+        yield request.param
+
+
+def test_round_trip_matches_stdlib_semantics(backend):
+    encoded = json_codec.dumps(STATEMENT)
+
+    assert "über 😊" in encoded  # UTF-8 output, not \u escapes
+    assert json.loads(encoded) == json.loads(json.dumps(STATEMENT))
+    assert json_codec.loads(encoded.encode("utf-8")) == json_codec.loads(encoded)
+    assert json_codec.dumps({"b": 1, "a": 2}, sort_keys=True) == '{"a":2,"b":1}'
+    assert json_codec.dumps({"a": [1]}, indent=True) == '{\n  "a": [\n    1\n  ]\n}'
+
+
+def test_to_jsonable_stringifies_unknown_types(backend):
+    stamp = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    result = json_codec.to_jsonable({"at": stamp, "ids": {"x"}})
+
+    assert result["at"].startswith("2025-01-01")
+    assert result["ids"] == "{'x'}"
+
+
+def test_invalid_input_raises_stdlib_error_type(backend):
+    with pytest.raises(json.JSONDecodeError):
+        json_codec.loads(b"{not json")
+
+
+def test_wide_integers_fall_back_to_stdlib():
+    assert json_codec.loads(json_codec.dumps({"n": 2 ** 70})) == {"n": 2 ** 70}
+
+
+def test_fast_response_renders_through_codec():
+    response = json_codec.FastJSONResponse({"response": "über", "at": datetime(2025, 1, 1)})
+    assert json.loads(response.body) == {"response": "über", "at": "2025-01-01T00:00:00"}
+    assert response.media_type == "application/json"
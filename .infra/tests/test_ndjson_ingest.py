@@ -0,0 +1,133 @@
+"""Tests for streamed NDJSON (optionally gzip) bulk ingest."""
+
+import asyncio
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import xapi
+from app.utils.ndjson_stream import NDJSONBodyTooLarge, iter_ndjson_batches
+
+app = FastAPI()
+app.include_router(xapi.router)
+client = TestClient(app)
+
+
+def _statement(statement_id):
+    return {
+        "id": statement_id,
+        "actor": {"mbox": f"mailto:{statement_id}@example.com"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/completed"},
+        "object": {"id": "http://example.com/activity"},
+    }
+
+
+def _ndjson(lines):
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _publish_all(payloads, source):
+    return [{"success": True, "message_id": f"msg-{payload['id']}"} for payload in payloads]
+
+
+async def _collect(byte_chunks, **kwargs):
+    async def stream():
+        for chunk in byte_chunks:
+            yield chunk
+    return [batch async for batch in iter_ndjson_batches(stream(), **kwargs)]
+
+
+def test_parser_handles_split_lines_blank_lines_and_bad_json():
+    body = b'{"a": 1}\n\n{"b": 2}\nnot json\n{"c": 3}'
+    batches = asyncio.run(_collect([body[:5], body[5:13], body[13:]], batch_size=2))
+
+    lines = [item for batch in batches for item in batch]
+    assert [number for number, _ in lines] == [1, 3, 4, 5]
+    assert lines[0][1] == {"a": 1}
+    assert isinstance(lines[2][1], ValueError)
+    assert lines[3][1] == {"c": 3}
+    assert [len(batch) for batch in batches] == [2, 2]
+
+
+def test_parser_decompresses_gzip_incrementally_and_rejects_huge_lines():
+    body = gzip.compress(_ndjson([json.dumps({"n": i}) for i in range(3)]))
+    batches = asyncio.run(_collect([body[i:i + 7] for i in range(0, len(body), 7)], batch_size=10, gzipped=True))
+    assert [value for _, value in batches[0]] == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+    huge = b'{"x": "' + b"y" * 64 + b'"}\n{"ok": true}\n'
+    batches = asyncio.run(_collect([huge[:40], huge[40:]], batch_size=10, max_line_bytes=32))
+    values = [value for _, value in batches[0]]
+    assert isinstance(values[0], ValueError)
+    assert values[1] == {"ok": True}
+
+
+def test_stream_endpoint_reports_summary_and_line_errors():
+    lines = [json.dumps(_statement(f"s{i}")) for i in range(4)] + ["{broken", json.dumps({"id": "no-verb"})]
+
+    with patch.object(xapi, "_publish_payloads", side_effect=_publish_all) as mock_publish, \
+            patch.object(xapi.settings, "INGEST_PIPELINE_CHUNK_SIZE", 2):
+        response = client.post(
+            "/api/xapi/ingest/stream",
+            content=gzip.compress(_ndjson(lines)),
+            headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+        )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["summary"] == {"total": 6, "successful": 4, "failed": 2}
+    assert [error["line"] for error in sorted(data["errors"], key=lambda e: e["line"])] == [5, 6]
+    assert mock_publish.call_count == 2  # the last chunk had no valid statements
+
+
+def test_stream_endpoint_rejects_other_content_types():
+    response = client.post("/api/xapi/ingest/stream", json=[_statement("s1")])
+    assert response.status_code == 415
+
+
+def test_publishing_starts_before_stream_ends():
+    published_before_end = []
+
+    async def batches():
+        yield [(1, _statement("early"))]
+        await asyncio.sleep(0.05)
+        published_before_end.append(bool(xapi.recent_statements.get("early")))
+        yield [(2, _statement("late"))]
+
+    def build(item):
+        return xapi.build_statement_context(xapi.validate_xapi_statement(item[1]), source="test")
+
+    outcomes = []
+    with patch.object(xapi, "_publish_payloads", side_effect=_publish_all):
+        asyncio.run(xapi.run_streaming_ingest(
+            batches(), build, source="test",
+            on_batch=lambda batch, results: outcomes.extend(results),
+        ))
+
+    assert published_before_end == [True]
+    assert len(outcomes) == 2
+
+
+def test_parser_reads_every_gzip_member_and_caps_inflation():
+    members = [gzip.compress(_ndjson([json.dumps({"n": i})])) for i in range(3)]
+    body = b"".join(members)  # what `cat a.gz b.gz c.gz` or pigz produces
+    batches = asyncio.run(_collect([body[i:i + 5] for i in range(0, len(body), 5)], batch_size=10, gzipped=True))
+    assert [value for _, value in batches[0]] == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+    # A small body that inflates far past the cap is refused without inflating it all
+    bomb = gzip.compress(b"\n" * (8 * 1024 * 1024))
+    assert len(bomb) < 64 * 1024
+    with pytest.raises(NDJSONBodyTooLarge):
+        asyncio.run(_collect([bomb], batch_size=10, gzipped=True, max_decompressed_bytes=1024 * 1024))
+
+    with patch.object(xapi.settings, "INGEST_STREAM_MAX_DECOMPRESSED_BYTES", 1024 * 1024):
+        response = client.post(
+            "/api/xapi/ingest/stream",
+            content=bomb,
+            headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"},
+        )
+    assert response.status_code == 413
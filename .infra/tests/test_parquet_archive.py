@@ -0,0 +1,149 @@
+"""Tests for the Parquet archive tier writer, reader and JSON-tier rebuild."""
+
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from app.etl.archive_segments import ArchiveSegmentConfig, SegmentArchiveWriter
+from app.etl.parquet_archive import (
+    ParquetArchiveConfig,
+    ParquetArchiveWriter,
+    build_parquet_day,
+    parquet_objects,
+    read_parquet_archive,
+)
+
+PUBLISHED = datetime(2025, 1, 1, 13, 15, tzinfo=timezone.utc)
+ANSWERED = "http://adlnet.gov/expapi/verbs/answered"
+
+
+class FakeBlob:
+    def __init__(self, bucket, name, data=b""):
+        self.bucket = bucket
+        self.name = name
+        self.data = data
+        self.metadata = None
+
+    def upload_from_string(self, data, content_type=None):
+        self.data = data.encode() if isinstance(data, str) else data
+        self.bucket.objects[self.name] = self
+
+    def download_as_bytes(self):
+        return self.data
+
+    def open(self, mode="rb", chunk_size=None):
+        bucket = self.bucket
+
+        class Reader(io.BytesIO):
+            def read(self, size=-1):
+                chunk = super().read(size)
+                bucket.bytes_read += len(chunk)
+                return chunk
+
+        return Reader(self.data)
+
+    def delete(self):
+        del self.bucket.objects[self.name]
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+        self.bytes_read = 0
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix=""):
+        return [blob for name, blob in list(self.objects.items()) if name.startswith(prefix)]
+
+
+def _statement(i, verb=ANSWERED):
+    return {
+        "id": f"s-{i}",
+        "timestamp": (PUBLISHED + timedelta(minutes=i)).isoformat(),
+        "actor": {"name": "Learner", "mbox": "mailto:learner@example.com"},
+        "verb": {"id": verb, "display": {"en-US": "answered"}},
+        "object": {"id": "https://7taps.com/lessons/1", "objectType": "Activity"},
+        "result": {"score": {"raw": i}, "response": f"reflection {i}"},
+        "context": {"extensions": {"https://7taps.com/payload": os.urandom(256).hex()}},
+    }
+
+
+def _config(**overrides):
+    return ParquetArchiveConfig(**{"max_age": 60.0, "retry_backoff": 0.0, "read_threads": 2, **overrides})
+
+
+def test_files_follow_the_statements_schema_sorted_by_timestamp():
+    bucket = FakeBucket()
+    writer = ParquetArchiveWriter(bucket, _config(), writer_id="test")
+    for i in (3, 1, 2):
+        writer.append(_statement(i), PUBLISHED)
+    writer.append(_statement(9), PUBLISHED + timedelta(days=1))
+    writer.close()
+
+    (first_day,) = parquet_objects(bucket, "2025-01-01", config=_config())
+    assert first_day.name.startswith("xapi-parquet/dt=2025-01-01/part-")
+    assert first_day.metadata["records"] == "3"
+
+    table = read_parquet_archive(bucket, "2025-01-01", config=_config())
+    assert table.column("statement_id").to_pylist() == ["s-1", "s-2", "s-3"]
+    assert table.column("stored").to_pylist()[0] == PUBLISHED
+    assert "raw_json" in table.column_names
+    assert read_parquet_archive(bucket, "2025-01-01", "2025-01-02", config=_config()).num_rows == 4
+
+
+def test_reader_projects_columns_and_pushes_filters_to_row_groups():
+    bucket = FakeBucket()
+    writer = ParquetArchiveWriter(bucket, _config(row_group_size=50), writer_id="test")
+    for i in range(500):
+        writer.append(_statement(i, ANSWERED if i % 5 else "http://adlnet.gov/expapi/verbs/completed"), PUBLISHED)
+    writer.close()
+    config = _config()
+
+    full = read_parquet_archive(bucket, "2025-01-01", config=config)
+    full_bytes, bucket.bytes_read = bucket.bytes_read, 0
+
+    columns = ["statement_id", "timestamp", "result_response"]
+    projected = read_parquet_archive(bucket, "2025-01-01", columns=columns, config=config)
+    assert projected.column_names == columns and projected.num_rows == full.num_rows
+    projected_bytes, bucket.bytes_read = bucket.bytes_read, 0
+    assert projected_bytes < full_bytes / 2
+
+    cutoff = PUBLISHED + timedelta(minutes=100)
+    recent = read_parquet_archive(
+        bucket, "2025-01-01", columns=["statement_id"], filters=[("timestamp", "<", pa.scalar(cutoff))], config=config
+    )
+    assert recent.num_rows == 100
+    assert bucket.bytes_read < projected_bytes  # later row groups skipped on their statistics
+
+    completed = read_parquet_archive(
+        bucket, "2025-01-01", columns=["statement_id"], filters=[("verb_id", "!=", ANSWERED)], config=config
+    )
+    assert completed.num_rows == 100
+
+
+def test_empty_range_returns_an_empty_projected_table():
+    table = read_parquet_archive(FakeBucket(), "2025-01-01", columns=["statement_id", "timestamp"], config=_config())
+    assert table.num_rows == 0 and table.column_names == ["statement_id", "timestamp"]
+
+
+def test_build_rewrites_a_day_from_the_json_tier():
+    bucket = FakeBucket()
+    segments = SegmentArchiveWriter(bucket, ArchiveSegmentConfig(retry_backoff=0.0), writer_id="test")
+    for i in range(5):
+        segments.append(_statement(i), lambda ok: None, PUBLISHED)
+    segments.close()
+    config = _config()
+
+    assert build_parquet_day(bucket, "2025-01-01", config) == {"statements": 5, "replaced": 0, "failed": 0}
+    assert build_parquet_day(bucket, "2025-01-01", config) == {"statements": 5, "replaced": 1, "failed": 0}
+
+    assert len(parquet_objects(bucket, "2025-01-01", config=config)) == 1
+    table = read_parquet_archive(bucket, "2025-01-01", columns=["statement_id", "stored"], config=config)
+    assert sorted(table.column("statement_id").to_pylist()) == [f"s-{i}" for i in range(5)]
+    assert table.column("stored").to_pylist()[0] == PUBLISHED.replace(minute=0)
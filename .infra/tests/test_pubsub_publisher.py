@@ -0,0 +1,123 @@
+"""Tests for the batched Pub/Sub publisher service used by the ingest routes."""
+
+import json
+from concurrent.futures import Future
+from unittest.mock import patch
+
+import pytest
+
+from app.services.pubsub_publisher import PublisherConfig, PubSubPublisherService
+
+
+class FakePublisherClient:
+    """Minimal stand-in for ``pubsub_v1.PublisherClient``."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = set(fail_on or [])
+        self.published = []
+
+    def topic_path(self, project_id, topic_name):
+        return f"projects/{project_id}/topics/{topic_name}"
+
+    def publish(self, topic, data, **attributes):
+        index = len(self.published)
+        self.published.append((topic, json.loads(data), attributes))
+        future = Future()
+        if index in self.fail_on:
+            future.set_exception(RuntimeError(f"publish {index} failed"))
+        else:
+            future.set_result(f"msg-{index}")
+        return future
+
+
+def _service(client):
+    return PubSubPublisherService(
+        "test-project",
+        "xapi-topic",
+        config=PublisherConfig(publish_timeout=1.0),
+        client_factory=lambda config: client,
+    )
+
+
+def _statements(count):
+    return [
+        {
+            "id": f"stmt-{i}",
+            "actor": {"mbox": f"mailto:user{i}@example.com"},
+            "verb": {"id": "http://adlnet.gov/expapi/verbs/completed"},
+            "object": {"id": "http://example.com/activity"},
+        }
+        for i in range(count)
+    ]
+
+
+def test_publish_batch_returns_results_in_input_order():
+    client = FakePublisherClient()
+    results = _service(client).publish_batch(_statements(5), source="test")
+
+    assert [result["message_id"] for result in results] == [f"msg-{i}" for i in range(5)]
+    assert all(result["success"] for result in results)
+    assert [payload["id"] for _, payload, _ in client.published] == [f"stmt-{i}" for i in range(5)]
+    assert client.published[0][2]["source"] == "test"
+
+
+def test_publish_batch_reports_per_statement_failures():
+    client = FakePublisherClient(fail_on={1, 3})
+    service = _service(client)
+    results = service.publish_batch(_statements(4), source="test")
+
+    assert [result["success"] for result in results] == [True, False, True, False]
+    assert "publish 1 failed" in results[1]["error"]
+    assert results[1]["error_type"] == "RuntimeError"
+    assert service.metrics["messages_published"] == 2
+    assert service.metrics["messages_failed"] == 2
+
+
+def test_publish_batch_times_out_unresolved_futures():
+    class HangingClient(FakePublisherClient):
+        def publish(self, topic, data, **attributes):
+            return Future()
+
+    service = PubSubPublisherService(
+        "test-project",
+        "xapi-topic",
+        config=PublisherConfig(publish_timeout=0.01),
+        client_factory=lambda config: HangingClient(),
+    )
+    unresolved = {}
+    results = service.publish_batch(_statements(2), source="test", on_unresolved=unresolved.__setitem__)
+
+    assert [result["success"] for result in results] == [False, False]
+    assert results[0]["error_type"] == "TimeoutError"
+    assert all(result["outcome_unknown"] for result in results)
+
+    # The futures are left running: the message may still be delivered
+    assert sorted(unresolved) == [0, 1] and not any(future.cancelled() for future in unresolved.values())
+    unresolved[0].set_result("msg-late")
+    unresolved[1].set_exception(RuntimeError("deadline exceeded"))
+    assert (service.metrics["late_publishes"], service.metrics["late_failures"]) == (1, 1)
+
+
+def test_client_initialization_failure_raises():
+    def broken_factory(config):
+        raise ValueError("no credentials")
+
+    service = PubSubPublisherService("p", "t", client_factory=broken_factory)
+    with pytest.raises(RuntimeError, match="Pub/Sub client not initialized"):
+        service.publish_batch(_statements(1), source="test")
+
+
+def test_publish_to_pubsub_wraps_single_statement_batch():
+    from app.api import cloud_function_ingestion
+
+    client = FakePublisherClient(fail_on={1})
+    with patch.object(cloud_function_ingestion, "publisher_service", _service(client)), \
+            patch.object(cloud_function_ingestion, "publisher", None), \
+            patch.object(cloud_function_ingestion, "wake_etl_processors") as mock_wake:
+        result = cloud_function_ingestion.publish_to_pubsub(_statements(1)[0], source="test")
+        assert result["message_id"] == "msg-0"
+
+        with pytest.raises(Exception, match="Pub/Sub publishing failed"):
+            cloud_function_ingestion.publish_to_pubsub(_statements(1)[0], source="test")
+
+    assert mock_wake.call_count == 1
@@ -0,0 +1,136 @@
+"""Tests for the retry policy shared by the Pub/Sub consumers."""
+
+import json
+
+from google.api_core import exceptions as gcp_exceptions
+
+from app.etl.retry_policy import (
+    PERMANENT,
+    TRANSIENT,
+    ErrorLog,
+    FailureRouter,
+    MessageRetryHandler,
+    PermanentError,
+    RetryPolicy,
+    TransientError,
+)
+
+
+class FakeMessage:
+    def __init__(self, message_id="m-1", data=b"{}", delivery_attempt=None):
+        self.message_id = message_id
+        self.data = data
+        self.delivery_attempt = delivery_attempt
+        self.acked = 0
+        self.nacked = 0
+
+    def ack(self):
+        self.acked += 1
+
+    def nack(self):
+        self.nacked += 1
+
+
+def _handler(record_batch=None, max_attempts=3, batch_size=10):
+    router = FailureRouter(record_batch=record_batch or (lambda failures: len(failures)), batch_size=batch_size)
+    return MessageRetryHandler(
+        "test_stage",
+        policy=RetryPolicy(min_backoff=10, max_backoff=600, max_attempts=max_attempts),
+        router=router,
+        error_log=ErrorLog(size=5),
+    )
+
+
+def test_classify_separates_transient_and_permanent_errors():
+    policy = RetryPolicy()
+    assert policy.classify(gcp_exceptions.ServiceUnavailable("down")) == TRANSIENT
+    assert policy.classify(gcp_exceptions.TooManyRequests("slow down")) == TRANSIENT
+    assert policy.classify(TimeoutError()) == TRANSIENT
+    assert policy.classify(TransientError("retry me")) == TRANSIENT
+    assert policy.classify(RuntimeError("unknown")) == TRANSIENT
+
+    assert policy.classify(json.JSONDecodeError("bad", "x", 0)) == PERMANENT
+    assert policy.classify(gcp_exceptions.BadRequest("invalid row")) == PERMANENT
+    assert policy.classify(PermanentError("rejected")) == PERMANENT
+
+
+def test_backoff_doubles_up_to_the_ceiling():
+    policy = RetryPolicy(min_backoff=10, max_backoff=60)
+    assert [policy.backoff(attempt) for attempt in range(1, 6)] == [10, 20, 40, 60, 60]
+    assert policy.subscription_retry_policy() == {
+        "minimum_backoff": {"seconds": 10},
+        "maximum_backoff": {"seconds": 60},
+    }
+
+
+def test_error_log_is_bounded_and_counts_by_class():
+    log = ErrorLog(size=3)
+    for i in range(5):
+        log.record(f"timeout {i}", TimeoutError())
+    log.record("bad json", ValueError())
+
+    status = log.get_status()
+    assert status["recent"] == ["timeout 3", "timeout 4", "bad json"]
+    assert status["counts"] == {"TimeoutError": 5, "ValueError": 1}
+    assert status["total"] == 6
+    assert len(log) == 3
+
+
+def test_transient_failure_under_the_limit_is_nacked():
+    handler = _handler()
+    message = FakeMessage()
+
+    assert handler.handle_failure(message, TimeoutError("slow")) == TRANSIENT
+    assert message.nacked == 1 and message.acked == 0
+    assert handler.metrics["retried"] == 1
+    assert handler.router.metrics["routed"] == 0
+
+
+def test_transient_failure_is_dead_lettered_after_max_attempts():
+    handler = _handler(max_attempts=2)
+    message = FakeMessage(delivery_attempt=2)
+
+    assert handler.handle_failure(message, TimeoutError("still slow")) == PERMANENT
+    handler.router.flush()
+    assert message.acked == 1 and message.nacked == 0
+    assert handler.metrics["dead_lettered"] == 1
+
+
+def test_permanent_failures_are_recorded_in_one_batch_then_acked():
+    batches = []
+    handler = _handler(record_batch=lambda failures: batches.append(failures) or len(failures))
+    messages = [FakeMessage(f"m-{i}", data=b"not json") for i in range(3)]
+
+    for message in messages:
+        handler.handle_failure(message, ValueError("bad payload"), raw_statement={"id": message.message_id})
+    assert all(message.acked == 0 for message in messages)
+
+    assert handler.router.flush() == 3
+    assert len(batches) == 1
+    assert [failure["statement_id"] for failure in batches[0]] == ["m-0", "m-1", "m-2"]
+    assert batches[0][0]["processing_stage"] == "test_stage"
+    assert batches[0][0]["error_type"] == "ValueError"
+    assert all(message.acked == 1 for message in messages)
+
+
+def test_failed_recording_nacks_instead_of_dropping():
+    def broken(failures):
+        raise RuntimeError("error table unavailable")
+
+    handler = _handler(record_batch=broken)
+    message = FakeMessage()
+    handler.handle_failure(message, PermanentError("rejected"))
+
+    assert handler.router.flush() == 0
+    assert message.nacked == 1 and message.acked == 0
+    assert handler.router.metrics["batch_failures"] == 1
+
+
+def test_attempts_fall_back_to_a_local_count():
+    handler = _handler(max_attempts=3)
+    message = FakeMessage()
+
+    for _ in range(2):
+        assert handler.handle_failure(message, TimeoutError()) == TRANSIENT
+    assert handler.handle_failure(message, TimeoutError()) == PERMANENT
+    assert handler.get_status()["errors"]["counts"] == {"TimeoutError": 3}
@@ -0,0 +1,98 @@
+"""Tests for moving AI safety analysis off the ingest path into the safety consumer."""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, Mock, patch
+
+from app.api.xapi import _prepare_statement_payload
+from app.etl.pubsub_safety_consumer import PubSubSafetyConsumer
+from app.models import xAPIStatement
+
+
+def _statement(response: str) -> xAPIStatement:
+    return xAPIStatement(**{
+        "actor": {"mbox": "mailto:learner@example.com", "name": "Learner"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/responded"},
+        "object": {"id": "https://7taps.com/lessons/lesson-3"},
+        "result": {"response": response},
+    })
+
+
+def _message(payload):
+    message = Mock()
+    message.data = json.dumps(payload).encode("utf-8")
+    message.message_id = "msg-1"
+    return message
+
+
+def test_ingest_uses_local_rules_without_ai_analysis():
+    with patch("app.api.batch_ai_safety.batch_processor.process_content", new=AsyncMock()) as mock_ai:
+        payload = _prepare_statement_payload(_statement("I feel hopeless lately"), source="test")
+
+    mock_ai.assert_not_called()
+    verdict = payload["ai_content_analysis"]
+    assert verdict["is_flagged"] is True
+    assert verdict["severity"] == "medium"
+    assert verdict["analysis_metadata"]["analysis_method"] == "local_rules"
+    assert verdict["analysis_metadata"]["ai_analysis"] == "pending"
+    assert "immediate_alert_sent" not in verdict["analysis_metadata"]
+
+
+def test_critical_local_hit_alerts_immediately():
+    persistence = Mock()
+    persistence.send_immediate_alert = AsyncMock()
+
+    async def ingest():
+        payload = _prepare_statement_payload(_statement("I want to end my life"), source="test")
+        await asyncio.sleep(0)
+        return payload
+
+    with patch("app.services.flagged_content_persistence.flagged_content_persistence", persistence):
+        payload = asyncio.run(ingest())
+
+    persistence.send_immediate_alert.assert_awaited_once()
+    assert payload["ai_content_analysis"]["severity"] == "critical"
+    assert payload["ai_content_analysis"]["analysis_metadata"]["immediate_alert_sent"] is True
+
+
+def test_consumer_persists_ai_result_without_repeating_immediate_alert():
+    analysis = {"is_flagged": True, "severity": "critical", "flagged_reasons": ["self harm"]}
+    persistence = Mock()
+    persistence.persist_flagged_content = AsyncMock(return_value=True)
+    consumer = PubSubSafetyConsumer(
+        subscriber=Mock(), analyzer=AsyncMock(return_value=analysis), persistence=persistence
+    )
+    payload = {
+        "id": "stmt-1",
+        "actor": {"mbox": "mailto:learner@example.com"},
+        "result": {"response": "I want to end my life"},
+        "ai_content_analysis": {"severity": "critical", "analysis_metadata": {"immediate_alert_sent": True}},
+    }
+    message = _message(payload)
+
+    consumer.process_message(message)
+
+    message.ack.assert_called_once()
+    kwargs = persistence.persist_flagged_content.await_args.kwargs
+    assert kwargs["statement_id"] == "stmt-1"
+    assert kwargs["actor_id"] == "learner@example.com"
+    assert kwargs["analysis_result"] is analysis
+    assert kwargs["send_alert"] is False
+    assert consumer.metrics["messages_flagged"] == 1
+    assert consumer.get_status()["consumer_name"].endswith("-safety-analyzer")
+
+
+def test_consumer_nacks_when_analysis_fails():
+    persistence = Mock()
+    persistence.persist_flagged_content = AsyncMock()
+    consumer = PubSubSafetyConsumer(
+        subscriber=Mock(), analyzer=AsyncMock(side_effect=RuntimeError("gemini down")), persistence=persistence
+    )
+    message = _message({"id": "stmt-2", "result": {"response": "fine"}})
+
+    consumer.process_message(message)
+
+    message.nack.assert_called_once()
+    message.ack.assert_not_called()
+    persistence.persist_flagged_content.assert_not_called()
+    assert consumer.metrics["messages_failed"] == 1
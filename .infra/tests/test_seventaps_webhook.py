@@ -53,9 +53,9 @@ def _sample_payload() -> dict:
     }
 
 
-@patch("app.api.seventaps.publish_statement_async", new_callable=AsyncMock)
+@patch("app.api.xapi.publish_contexts_async", new_callable=AsyncMock)
 def test_post_webhook_accepts_basic_auth(mock_publish: AsyncMock):
-    mock_publish.return_value = {"message_id": "pubsub-1"}
+    mock_publish.return_value = [{"success": True, "message_id": "pubsub-1"}]
 
     response = client.post(
         "/statements",
@@ -70,9 +70,9 @@ def test_post_webhook_accepts_basic_auth(mock_publish: AsyncMock):
     mock_publish.assert_called_once()
 
 
-@patch("app.api.seventaps.publish_statement_async", new_callable=AsyncMock)
+@patch("app.api.xapi.publish_contexts_async", new_callable=AsyncMock)
 def test_put_webhook_uses_statement_id_override(mock_publish: AsyncMock):
-    mock_publish.return_value = {"message_id": "pubsub-2"}
+    mock_publish.return_value = [{"success": True, "message_id": "pubsub-2"}]
 
     response = client.put(
         "/statements",
@@ -85,7 +85,7 @@ def test_put_webhook_uses_statement_id_override(mock_publish: AsyncMock):
     data = response.json()
     assert data["processed_count"] == 1
     mock_publish.assert_called_once()
-    published_statement = mock_publish.call_args.args[0]
+    published_statement = mock_publish.call_args.args[0][0].statement
     assert published_statement.id == "fixed-id"
 
 
@@ -0,0 +1,72 @@
+"""Tests for the staged pipeline that drives the BigQuery processor."""
+
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from app.etl.staged_pipeline import Stage, StagedPipeline
+
+
+def test_items_flow_through_sync_and_async_stages_on_one_loop():
+    loops = set()
+    results = []
+    errors = []
+
+    async def enrich(item):
+        loops.add(id(asyncio.get_running_loop()))
+        await asyncio.sleep(0.001)
+        if item == 3:
+            raise ValueError("bad item")
+        return item * 10
+
+    def transform(item):
+        loops.add(id(asyncio.get_running_loop()))
+        return None if item == 20 else item + 1
+
+    pipeline = StagedPipeline(
+        [
+            Stage("enrich", enrich, workers=4),
+            Stage("transform", transform),
+            Stage("sink", results.append),
+        ],
+        on_error=lambda stage, item, error: errors.append((stage, item, str(error))),
+    )
+    pipeline.start()
+    for item in range(1, 6):
+        pipeline.submit(item)
+    pipeline.stop()
+
+    assert sorted(results) == [11, 41, 51]
+    assert errors == [("enrich", 3, "bad item")]
+    assert len(loops) == 1
+    stages = {stage["name"]: stage for stage in pipeline.get_status()["stages"]}
+    assert stages["enrich"]["failed"] == 1
+    assert stages["transform"]["dropped"] == 1
+    assert not pipeline.running
+
+
+def test_full_queue_blocks_submitters():
+    release = threading.Event()
+
+    async def slow(item):
+        await asyncio.get_running_loop().run_in_executor(None, release.wait)
+        return item
+
+    pipeline = StagedPipeline([Stage("slow", slow, workers=1, queue_size=1)])
+    pipeline.start()
+    pipeline.submit(1)  # taken by the worker
+    pipeline.submit(2)  # fills the queue
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        pipeline.submit(3, timeout=0.1)
+
+    release.set()
+    pipeline.stop()
+
+
+def test_submit_requires_a_running_pipeline():
+    pipeline = StagedPipeline([Stage("noop", lambda item: item)])
+    with pytest.raises(RuntimeError):
+        pipeline.submit(1)
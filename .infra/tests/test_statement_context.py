@@ -0,0 +1,58 @@
+"""Tests for single-pass statement analysis in the 7taps webhook publishing path."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from app.api import batch_ai_safety, seventaps, xapi
+from app.services.dedup_store import get_dedup_store
+
+
+def _statement(statement_id, response):
+    return {
+        "id": statement_id,
+        "actor": {"mbox": "mailto:Learner@Example.com", "name": "learner@example.com"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/responded"},
+        "object": {"id": "https://7taps.com/lessons/lesson-3"},
+        "result": {"response": response},
+    }
+
+
+def test_7taps_publish_analyzes_each_statement_once():
+    get_dedup_store().clear()
+    statements = [
+        _statement("ctx-1", "Walking helped me focus"),
+        _statement("ctx-2", "I feel hopeless"),
+        _statement("ctx-1", "duplicate in batch"),
+    ]
+    check = batch_ai_safety.check_obvious_flags
+
+    with patch.object(batch_ai_safety, "check_obvious_flags", side_effect=check) as mock_check, \
+            patch.object(batch_ai_safety.batch_processor, "process_content", new=AsyncMock()) as mock_ai, \
+            patch.object(xapi, "publish_contexts_async", new_callable=AsyncMock) as mock_publish:
+        mock_publish.return_value = [
+            {"success": True, "message_id": "m-1"},
+            {"success": True, "message_id": "m-2"},
+        ]
+        processed = asyncio.run(seventaps._publish_7taps_statements(statements, source="test"))
+
+    assert mock_check.call_count == 2
+    mock_ai.assert_not_called()
+
+    contexts = mock_publish.call_args.args[0]
+    assert [context.statement_id for context in contexts] == ["ctx-1", "ctx-2"]
+    assert contexts[0].statement.actor.mbox == "mailto:learner@example.com"
+    assert contexts[1].response_text == "I feel hopeless"
+    assert contexts[1].is_flagged
+    assert contexts[1].payload["ai_content_analysis"] is contexts[1].verdict
+    assert [entry.get("message_id") for entry in processed] == ["m-1", "m-2", None]
+    assert processed[2]["status"] == "duplicate"
+
+
+def test_prepare_statement_payload_matches_context_payload():
+    statement = xapi.validate_xapi_statement(_statement("ctx-3", "fine"))
+    context = xapi.build_statement_context(statement, source="test")
+
+    assert context.payload["id"] == "ctx-3"
+    assert context.payload["ingestion_source"] == "test"
+    assert context.full_content.startswith("Response: fine")
+    assert context.verdict["is_flagged"] is False
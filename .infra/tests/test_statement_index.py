@@ -0,0 +1,36 @@
+"""Tests for the Bloom filter + LRU statement-id membership index."""
+
+import uuid
+
+from app.services.statement_index import BloomFilter, StatementIdIndex
+
+
+def test_bloom_filter_sizing_and_false_positive_rate():
+    bloom = BloomFilter(capacity=10_000_000, error_rate=0.01)
+    assert bloom.num_hashes == 7
+    assert 11.9 < bloom.memory_bytes / 1_000_000 < 12.1  # ~12 MB for 10M ids
+
+    small = BloomFilter(capacity=5000, error_rate=0.01)
+    members = [str(uuid.uuid4()) for _ in range(5000)]
+    for member in members:
+        small.add(member)
+    assert all(member in small for member in members)
+    false_positives = sum(str(uuid.uuid4()) in small for _ in range(20000))
+    assert false_positives / 20000 < 0.02
+
+
+def test_index_classifies_known_maybe_and_new():
+    index = StatementIdIndex(capacity=1000, error_rate=0.001, lru_size=2)
+    index.bootstrap(["bootstrapped"])
+    index.add_many(["a", "b", "c"])  # "a" falls out of the LRU but stays in the Bloom filter
+
+    known, maybe, new = index.classify(["c", "a", "bootstrapped", "never-seen"])
+
+    assert known == ["c"]
+    assert maybe == ["a", "bootstrapped"]
+    assert new == ["never-seen"]
+    assert index.ready
+
+    index.record_lookup(maybe, ["a"])
+    assert index.classify(["a"])[0] == ["a"]
+    assert index.metrics["false_positives"] == 1
@@ -0,0 +1,192 @@
+"""Tests for the unified consumer's sinks and fan-out."""
+
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.etl.adaptive_flow_control import AdaptiveFlowConfig, AdaptiveFlowController
+from app.etl.archive_segments import ArchiveSegmentConfig, SegmentArchiveWriter
+from app.etl.unified_consumer import ArchiveSink, ConsumerSink, DimensionTablesSink, SinkFanout, UnifiedConsumer
+
+
+def _item(statement_id="s-1", actor="mailto:learner@example.com", object_id="https://7taps.com/lessons/1"):
+    data = {
+        "id": statement_id,
+        "actor": {"mbox": actor, "name": "Learner"},
+        "verb": {"id": "http://adlnet.gov/expapi/verbs/completed", "display": {"en-US": "completed"}},
+        "object": {"id": object_id, "definition": {"name": {"en-US": "Lesson 1"}}},
+    }
+    return SimpleNamespace(message=SimpleNamespace(message_id=f"msg-{statement_id}"), data=data, statement=data, row={})
+
+
+class ManualSink(ConsumerSink):
+    """Holds callbacks until the test settles them."""
+
+    def __init__(self, name, required=True):
+        super().__init__(required)
+        self.name = name
+        self.pending = []
+
+    def write(self, item, done):
+        self.metrics["written"] += 1
+        self.pending.append(done)
+
+
+class FakeBigQuery:
+    def __init__(self, errors=None):
+        self.inserted = {}
+        self.errors = errors or []
+
+    def dataset(self, dataset_id):
+        return SimpleNamespace(table=lambda name: name)
+
+    def get_table(self, ref):
+        return ref
+
+    def insert_rows(self, table, rows):
+        self.inserted.setdefault(table, []).extend(rows)
+        return self.errors
+
+
+class FakeBlob:
+    def __init__(self, bucket, path):
+        self.bucket = bucket
+        self.path = path
+        self.metadata = None
+
+    def upload_from_string(self, data, content_type=None):
+        if self.bucket.fail:
+            raise ConnectionError("gcs unavailable")
+        self.bucket.objects[self.path] = data
+
+
+class FakeBucket:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.objects = {}
+
+    def blob(self, path):
+        return FakeBlob(self, path)
+
+
+def test_completes_once_required_sinks_commit():
+    statements, archive, dimensions = ManualSink("statements"), ManualSink("archive"), ManualSink("dimensions", False)
+    fanout = SinkFanout([statements, dimensions, archive])
+    results = []
+
+    fanout.dispatch(_item(), results.append)
+    statements.pending[0](True)
+    dimensions.pending[0](False)  # optional sinks never hold the ack
+    assert results == []
+
+    archive.pending[0](True)
+    assert results == [[]]
+    assert dimensions.metrics["failed"] == 1
+
+
+def test_reports_failed_required_sinks():
+    statements, archive = ManualSink("statements"), ManualSink("archive")
+    fanout = SinkFanout([statements, archive])
+    results = []
+
+    fanout.dispatch(_item(), results.append)
+    statements.pending[0](True)
+    archive.pending[0](False)
+    assert results == [["archive"]]
+
+
+def test_fanout_needs_a_required_sink():
+    with pytest.raises(ValueError):
+        SinkFanout([ManualSink("dimensions", required=False)])
+
+
+def test_dimension_rows_are_deduplicated_per_batch():
+    client = FakeBigQuery()
+    sink = DimensionTablesSink(client, "analytics", batch_size=100, flush_interval=60)
+    committed = []
+
+    for i in range(3):
+        sink.write(_item(f"s-{i}"), committed.append)
+    sink.write(_item("s-3", actor="mailto:other@example.com"), committed.append)
+
+    assert sink.flush() == 4  # two actors, one verb, one activity
+    assert [row["actor_id"] for row in client.inserted["actors"]] == [
+        "mailto:learner@example.com",
+        "mailto:other@example.com",
+    ]
+    assert len(client.inserted["verbs"]) == 1
+    assert len(client.inserted["activities"]) == 1
+    assert committed == [True] * 4
+    assert sink.metrics["duplicates_skipped"] == 8
+    sink.close()
+
+
+def test_dimension_insert_errors_fail_the_batch():
+    sink = DimensionTablesSink(FakeBigQuery(errors=[{"index": 0, "errors": [{"reason": "invalid"}]}]), "analytics")
+    committed = []
+    sink.write(_item(), committed.append)
+    assert sink.flush() == 0
+    assert committed == [False]
+    sink.close()
+
+
+def test_archive_sink_uploads_off_the_caller_thread():
+    bucket = FakeBucket()
+    sink = ArchiveSink(bucket, upload_threads=2)
+    done = threading.Event()
+    committed = []
+
+    sink.write(_item(), lambda ok: (committed.append(ok), done.set()))
+    assert done.wait(5)
+    sink.close()
+
+    assert committed == [True]
+    (path,) = bucket.objects
+    assert path.endswith("msg-s-1.json")
+    assert "learner@example.com" in path
+
+
+def test_archive_sink_reports_upload_failures():
+    sink = ArchiveSink(FakeBucket(fail=True), upload_threads=1)
+    committed = []
+    sink.write(_item(), committed.append)
+    sink.close()
+    assert committed == [False]
+
+
+def test_required_segment_archive_keeps_a_segment_in_the_flow_window():
+    # Ceiling and floor well below one segment, as with the processor's defaults
+    controller = AdaptiveFlowController(AdaptiveFlowConfig(max_messages=50, max_bytes=50_000, min_messages=10))
+    bucket = FakeBucket()
+    writer = SegmentArchiveWriter(bucket, ArchiveSegmentConfig(max_records=100, max_age=60.0, max_bytes=1_000_000))
+    consumer = object.__new__(UnifiedConsumer)
+    consumer.flow_max_messages, consumer.flow_max_bytes = 50, 50_000
+    consumer.flow_controller = controller
+    consumer.fanout = SinkFanout([ArchiveSink(bucket, writer=writer)])
+    consumer._fit_flow_window_to_segments()
+
+    assert (consumer.flow_max_messages, consumer.flow_max_bytes) == (200, 1_000_000)
+    assert (controller.window, controller.config.min_messages) == (200, 100)
+
+    # A brownout halves the window, but never below one segment
+    controller.observe_flush(duration=60.0, rows=1, committed=True)
+    controller.adjust()
+    assert controller.window == 100
+    assert controller.byte_window >= writer.config.max_bytes
+
+    # Two and a half segments flow through on record rolls alone: a window that
+    # cannot hold a segment would block here until the 60s age roll
+    published_at = datetime(2025, 1, 1, 13, 15, tzinfo=timezone.utc)
+    acked = []
+    for i in range(250):
+        assert controller.acquire(size=200, timeout=5), f"flow window stalled at message {i}"
+        item = _item(f"s-{i}")
+        item.message.publish_time = published_at
+        consumer.fanout.dispatch(item, lambda failed: (acked.append(failed), controller.release(size=200)))
+    writer.flush()
+    consumer.fanout.close()
+
+    assert len(acked) == 250 and not any(acked)
+    assert sum(path.endswith(".ndjson.gz") for path in bucket.objects) == 3
@@ -0,0 +1,167 @@
+"""Tests for cached user lookups and buffered activity MERGEs in normalization."""
+
+import asyncio
+from unittest.mock import Mock, patch
+
+from app.services.user_activity import ActivityBufferConfig, UserActivityBuffer
+from app.services.user_cache import InMemoryUserCache, RedisUserCache
+from app.services.user_normalization import UserNormalizationService
+from app.utils import json_codec
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Implements the subset of redis-py used by ``RedisUserCache``."""
+
+    def __init__(self):
+        self.values = {}
+        self.mgets = 0
+
+    def mget(self, keys):
+        self.mgets += 1
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            def set(self, key, value, ex=None):
+                self.commands.append((key, value))
+
+            def execute(self):
+                redis.values.update(self.commands)
+
+        return Pipeline()
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+
+class FakeBigQuery:
+    """Serves ``users`` lookups from memory and records every query."""
+
+    def __init__(self, users=()):
+        self.users = list(users)
+        self.queries = []
+
+    def query(self, sql, job_config=None):
+        self.queries.append((sql, job_config))
+        if "MERGE" in sql:
+            return Mock()
+        params = {param.name: param.value for param in job_config.query_parameters}
+        return [
+            user for user in self.users
+            if (params["user_id"] and user["user_id"] == params["user_id"])
+            or (params["email"] and user["email"] == params["email"])
+        ][:1]
+
+
+def _service(client):
+    gcp_config = Mock(bigquery_client=client, bigquery_dataset="ds")
+    buffer = UserActivityBuffer(client, "ds", config=ActivityBufferConfig(flush_interval=60, max_pending=1000))
+    with patch("app.services.user_normalization.get_gcp_config", return_value=gcp_config):
+        return UserNormalizationService(
+            user_cache=InMemoryUserCache(ttl_seconds=60, max_entries=100),
+            activity_buffer=buffer,
+        )
+
+
+def _statement(email, timestamp="2025-01-01T00:00:00Z"):
+    return {"id": "s", "timestamp": timestamp, "actor": {"mbox": f"mailto:{email}", "name": "Ann"}}
+
+
+def test_memory_cache_expires_and_caches_absent_users():
+    clock = FakeClock()
+    cache = InMemoryUserCache(ttl_seconds=60, max_entries=100, clock=clock)
+    cache.put_many({"a@example.com": {"user_id": "a@example.com"}, "ghost@example.com": None})
+
+    assert cache.get_many(["a@example.com", "ghost@example.com", "b@example.com"]) == {
+        "a@example.com": {"user_id": "a@example.com"},
+        "ghost@example.com": None,
+    }
+    clock.now += 61
+    assert cache.get_many(["a@example.com"]) == {}
+    assert cache.metrics["negative_hits"] == 1
+    assert cache.metrics["misses"] == 2
+
+
+def test_redis_cache_shares_profiles_between_instances():
+    redis = FakeRedis()
+    first = RedisUserCache("redis://", 60, InMemoryUserCache(60, 100), client=redis)
+    second = RedisUserCache("redis://", 60, InMemoryUserCache(60, 100), client=redis)
+
+    first.put_many({"a@example.com": {"user_id": "a@example.com"}, "ghost@example.com": None})
+    assert second.get_many(["a@example.com", "ghost@example.com"]) == {
+        "a@example.com": {"user_id": "a@example.com"},
+        "ghost@example.com": None,
+    }
+    # Now held by the local fallback: no further round trip
+    second.get_many(["a@example.com"])
+    assert redis.mgets == 1
+
+
+def test_steady_state_normalization_runs_no_bigquery_jobs():
+    client = FakeBigQuery(users=[{
+        "user_id": "ann@example.com",
+        "email": "ann@example.com",
+        "name": "Ann",
+        "csv_data": [json_codec.dumps({"Team": "Blue", "Group": "A", "ID": "7"})],
+    }])
+    service = _service(client)
+
+    first = asyncio.run(service.normalize_xapi_statement(_statement("Ann@Example.com")))
+    assert len(client.queries) == 1  # one lookup on the cold miss
+    for _ in range(5):
+        result = asyncio.run(service.normalize_xapi_statement(_statement("ann@example.com")))
+    asyncio.run(service.normalize_xapi_statement(_statement("new@example.com")))
+    asyncio.run(service.normalize_xapi_statement(_statement("new@example.com")))
+
+    assert len(client.queries) == 2  # plus one for the unknown learner, then cached as absent
+    for normalized in (first, result):
+        metadata = normalized["context"]["extensions"]["https://7taps.com/csv-metadata"]
+        assert metadata["cohort_id"] == "a_blue"
+
+
+def test_activity_is_folded_per_user_into_one_merge():
+    client = FakeBigQuery()
+    service = _service(client)
+    service.activity_buffer.record(service.extract_user_info_from_xapi(_statement("ann@example.com", "2025-01-02T00:00:00Z")))
+    service.activity_buffer.record(service.extract_user_info_from_xapi(_statement("ann@example.com", "2025-01-01T00:00:00Z")))
+    service.activity_buffer.record(service.extract_user_info_from_xapi(_statement("bob@example.com")))
+
+    assert service.activity_buffer.flush() == 2
+    service.activity_buffer.close()
+
+    merges = [(sql, config) for sql, config in client.queries if "MERGE" in sql]
+    assert len(merges) == 1
+    rows = {row["user_id"]: row for row in json_codec.loads(merges[0][1].query_parameters[0].value)}
+    assert rows["ann@example.com"]["activity_count"] == 2
+    assert rows["ann@example.com"]["first_seen"].startswith("2025-01-01")
+    assert rows["ann@example.com"]["last_seen"].startswith("2025-01-02")
+    assert rows["bob@example.com"]["sources"] == ["xapi"]
+
+
+def test_failed_activity_flush_keeps_deltas_for_the_next_one():
+    client = Mock()
+    client.query.side_effect = [RuntimeError("quota"), Mock()]
+    buffer = UserActivityBuffer(client, "ds", config=ActivityBufferConfig(flush_interval=60, max_pending=1000))
+    buffer.record({"user_id": "ann@example.com", "source": "xapi", "activity_count": 1})
+
+    assert buffer.flush() == 0
+    buffer.record({"user_id": "ann@example.com", "source": "xapi", "activity_count": 1})
+    assert buffer.flush() == 1
+
+    rows = json_codec.loads(client.query.call_args.kwargs["job_config"].query_parameters[0].value)
+    assert rows[0]["activity_count"] == 2
+    buffer.close()
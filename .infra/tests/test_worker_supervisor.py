@@ -0,0 +1,92 @@
+"""Tests for the worker supervisor and worker health reporting."""
+
+import multiprocessing
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from app.workers.health import FileWorkerHealthStore, worker_health_summary
+from app.workers.supervisor import WorkerSupervisor, default_components
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="uses the fork start method")
+
+
+def _exit_immediately(name, heartbeat_interval):
+    sys.exit(3)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_health_reports_round_trip_and_go_stale(tmp_path):
+    store = FileWorkerHealthStore(str(tmp_path))
+    store.report("processor", {"state": "running", "status": {"messages_processed": 3}})
+    store.report("storage", {"state": "stopped"})
+
+    reports = store.read_all()
+    assert reports["processor"]["status"] == {"messages_processed": 3}
+    reported_at = reports["processor"]["reported_at"]
+
+    summary = worker_health_summary(store, stale_after=60, now=reported_at + 5)
+    assert summary["workers"]["processor"]["healthy"] is True
+    assert summary["workers"]["storage"]["healthy"] is False
+    assert summary["healthy"] is False
+
+    summary = worker_health_summary(store, stale_after=60, now=reported_at + 120)
+    assert summary["workers"]["processor"]["healthy"] is False
+
+
+def test_empty_health_store_is_unhealthy(tmp_path):
+    summary = worker_health_summary(FileWorkerHealthStore(str(tmp_path / "missing")), stale_after=60)
+    assert summary == {"backend": "file", "healthy": False, "workers": {}}
+
+
+def test_crashed_worker_is_restarted_with_backoff(tmp_path):
+    clock = FakeClock()
+    supervisor = WorkerSupervisor(
+        ["processor"],
+        store=FileWorkerHealthStore(str(tmp_path)),
+        restart_backoff=2.0,
+        max_restart_backoff=60.0,
+        target=_exit_immediately,
+        context=multiprocessing.get_context("fork"),
+        clock=clock,
+    )
+    supervisor.start()
+    child = supervisor.children["processor"]
+    child.process.join(5)
+
+    assert supervisor.check() == []  # exit noticed, restart scheduled
+    assert child.last_exitcode == 3
+    clock.now += 2.0
+    assert supervisor.check() == ["processor"]
+
+    child.process.join(5)
+    supervisor.check()
+    assert child.next_start == clock.now + 4.0  # consecutive crash doubles the delay
+    supervisor.stop(timeout=5)
+    assert supervisor.get_status()["children"]["processor"]["restarts"] == 1
+
+
+def test_rejects_unknown_components():
+    with pytest.raises(ValueError):
+        WorkerSupervisor(["processor", "nope"], store=FileWorkerHealthStore("/tmp/unused"))
+
+
+def test_default_components_follow_the_etl_mode():
+    with patch("app.workers.supervisor.settings") as settings:
+        settings.WORKER_COMPONENTS = ""
+        settings.ETL_UNIFIED_CONSUMER_ENABLED = True
+        assert default_components() == ["unified", "safety"]
+
+        settings.ETL_UNIFIED_CONSUMER_ENABLED = False
+        assert default_components() == ["processor", "storage", "migration", "safety"]
+
+        settings.WORKER_COMPONENTS = "processor, storage"
+        assert default_components() == ["processor", "storage"]
@@ -56,11 +56,11 @@ def test_ingest_statement_publishes_to_pubsub(mock_publish: Mock):
     assert recent_data["statements"][0]["message_id"] == "mock-message-1"
 
 
-@patch("app.api.xapi._publish_payload")
+@patch("app.api.xapi._publish_payloads")
 def test_batch_ingest_reports_failed_messages(mock_publish: Mock):
-    mock_publish.side_effect = [
-        {"message_id": "batch-success", "topic": "projects/test/topics/xapi"},
-        Exception("publish failed"),
+    mock_publish.return_value = [
+        {"success": True, "message_id": "batch-success", "topic": "projects/test/topics/xapi"},
+        {"success": False, "error": "publish failed", "topic": "projects/test/topics/xapi"},
     ]
 
     batch_payload = [_sample_statement(), _sample_statement("mailto:second@example.com")]
@@ -71,7 +71,8 @@ def test_batch_ingest_reports_failed_messages(mock_publish: Mock):
     assert data["summary"]["total"] == 2
     assert data["summary"]["successful"] == 1
     assert data["summary"]["failed"] == 1
-    assert mock_publish.call_count == 2
+    mock_publish.assert_called_once()
+    assert len(mock_publish.call_args.args[0]) == 2
 
     error_entries = [entry for entry in data["batch_results"] if entry.get("success") is False]
     assert error_entries, "Expected at least one failed entry"
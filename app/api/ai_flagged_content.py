@@ -119,6 +119,111 @@ def _fallback_keyword_analysis(content: str) -> Dict[str, Any]:
     }
 
 
+def extract_statement_text(statement: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Extract analysable text from an xAPI statement.
+    
+    Returns:
+        Tuple of (response_text, full_content). ``response_text`` is the raw
+        ``result.response`` used for obvious flag detection; ``full_content``
+        joins response, activity name and long string extensions for AI analysis.
+    """
+    content_parts = []
+    
+    # Check result.response (common for reflection responses)
+    result = statement.get("result") or {}
+    if result.get("response"):
+        content_parts.append(f"Response: {result['response']}")
+    
+    # Check object definition name/description
+    obj_def = (statement.get("object") or {}).get("definition") or {}
+    if (obj_def.get("name") or {}).get("en-US"):
+        content_parts.append(f"Activity: {obj_def['name']['en-US']}")
+    
+    # Check extensions for additional text
+    extensions = result.get("extensions") or {}
+    for ext_key, ext_value in extensions.items():
+        if isinstance(ext_value, str) and len(ext_value) > 10:
+            content_parts.append(f"Extension {ext_key}: {ext_value}")
+    
+    # Extract just the response text for obvious flag detection (without prefixes)
+    response_text = result.get("response", "") if result.get("response") else ""
+    return response_text, " | ".join(content_parts)
+
+
+def _statement_context(statement: Dict[str, Any]) -> str:
+    verb_id = (statement.get("verb") or {}).get("id", "")
+    if "responded" in verb_id or "answered" in verb_id:
+        return "response"
+    elif "completed" in verb_id:
+        return "completion"
+    return "general"
+
+
+def _statement_metadata(statement: Dict[str, Any], full_content: str) -> Dict[str, Any]:
+    return {
+        "statement_id": statement.get("id"),
+        "verb_id": (statement.get("verb") or {}).get("id", ""),
+        "actor_name": (statement.get("actor") or {}).get("name"),
+        "timestamp": statement.get("timestamp"),
+        "content_length": len(full_content)
+    }
+
+
+def local_rules_verdict(
+    statement: Dict[str, Any],
+    text: Optional[Tuple[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Lightweight safety verdict for the ingest path.
+    
+    Runs only the local obvious-flag rules (no AI, no network), so ingest
+    latency does not depend on Gemini or the batch processor.  The full AI
+    analysis happens later in the safety consumer
+    (``app.etl.pubsub_safety_consumer``).
+    
+    Args:
+        statement: xAPI statement payload
+        text: ``extract_statement_text`` result if the caller already has it
+    """
+    from app.api.batch_ai_safety import check_obvious_flags
+    
+    response_text, full_content = text if text is not None else extract_statement_text(statement)
+    if not full_content.strip():
+        return {
+            "is_flagged": False,
+            "severity": "low",
+            "flagged_reasons": [],
+            "confidence_score": 1.0,
+            "suggested_actions": [],
+            "analysis_metadata": {"analysis_method": "local_rules", "no_text_content": True}
+        }
+    
+    obvious = check_obvious_flags(response_text or full_content)
+    metadata = {
+        **_statement_metadata(statement, full_content),
+        "analysis_method": "local_rules",
+        "ai_analysis": "pending",
+    }
+    if obvious["is_obvious"]:
+        return {
+            "is_flagged": True,
+            "severity": obvious["severity"],
+            "flagged_reasons": obvious["flagged_reasons"],
+            "confidence_score": obvious["confidence"],
+            "suggested_actions": obvious["suggested_actions"],
+            "analysis_metadata": metadata
+        }
+    return {
+        "is_flagged": False,
+        "severity": "low",
+        "flagged_reasons": [],
+        "confidence_score": 0.5,
+        "suggested_actions": [],
+        "analysis_metadata": metadata
+    }
+
+
 async def analyze_xapi_statement_content(statement: Dict[str, Any]) -> Dict[str, Any]:
     """
     Analyze xAPI statement content for flagged language.
@@ -130,30 +235,7 @@ async def analyze_xapi_statement_content(statement: Dict[str, Any]) -> Dict[str,
         Analysis results with flagged status
     """
     try:
-        # Extract text content from xAPI statement
-        content_parts = []
-        
-        # Check result.response (common for reflection responses)
-        result = statement.get("result", {})
-        if result.get("response"):
-            content_parts.append(f"Response: {result['response']}")
-        
-        # Check object definition name/description
-        obj_def = statement.get("object", {}).get("definition", {})
-        if obj_def.get("name", {}).get("en-US"):
-            content_parts.append(f"Activity: {obj_def['name']['en-US']}")
-        
-        # Check extensions for additional text
-        extensions = statement.get("result", {}).get("extensions", {})
-        for ext_key, ext_value in extensions.items():
-            if isinstance(ext_value, str) and len(ext_value) > 10:
-                content_parts.append(f"Extension {ext_key}: {ext_value}")
-        
-        # Combine all content
-        full_content = " | ".join(content_parts)
-        
-        # Extract just the response text for obvious flag detection (without prefixes)
-        response_text = result.get("response", "") if result.get("response") else ""
+        response_text, full_content = extract_statement_text(statement)
         
         if not full_content.strip():
             return {
@@ -165,28 +247,18 @@ async def analyze_xapi_statement_content(statement: Dict[str, Any]) -> Dict[str,
                 "analysis_metadata": {"no_text_content": True}
             }
         
-        # Determine context
-        verb_id = statement.get("verb", {}).get("id", "")
-        if "responded" in verb_id or "answered" in verb_id:
-            context = "response"
-        elif "completed" in verb_id:
-            context = "completion"
-        else:
-            context = "general"
-        
         # Analyze with Gemini - use response_text for obvious flag detection, full_content for AI analysis
         # The batch processor will check obvious flags on the content we pass
         # So pass the raw response text (without "Response: " prefix) for better pattern matching
-        analysis = await analyze_content_with_gemini(response_text if response_text else full_content, context)
+        analysis = await analyze_content_with_gemini(
+            response_text if response_text else full_content,
+            _statement_context(statement)
+        )
         
         # Add statement metadata
         analysis["analysis_metadata"] = {
             **analysis.get("analysis_metadata", {}),
-            "statement_id": statement.get("id"),
-            "verb_id": verb_id,
-            "actor_name": statement.get("actor", {}).get("name"),
-            "timestamp": statement.get("timestamp"),
-            "content_length": len(full_content)
+            **_statement_metadata(statement, full_content)
         }
         
         return analysis
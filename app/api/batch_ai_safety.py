@@ -21,6 +21,7 @@ from datetime import datetime, timezone, timedelta
 from dataclasses import dataclass, field
 from collections import deque
 import hashlib
+import re
 
 from app.config import settings
 from app.logging_config import get_logger
@@ -47,6 +48,49 @@ class BatchConfig:
     max_items: int = 50       # Max items per batch
     immediate_threshold: float = 0.9  # Confidence for immediate processing
 
+# Local rules, ordered by severity. Patterns are matched against lowercased content.
+# Note: Using simpler patterns that don't rely on word boundaries for phrases
+OBVIOUS_FLAG_RULES: List[Tuple[str, float, str, str, List[re.Pattern]]] = [
+    # Critical patterns - always flag immediately
+    ("critical", 0.95, "Critical safety concern detected", "Immediate intervention required", [
+        re.compile(r"(kill myself|suicide|end my life|end it all|ending everything|ending it all)"),
+        re.compile(r"(hurt(ing|s)? myself|self harm|self-harm|hurting myself)"),
+        re.compile(r"(want to die|don't want to live)"),
+        re.compile(r"(thoughts about (hurting|ending)|serious thoughts about (hurting|ending))"),
+    ]),
+    # High patterns - flag immediately
+    ("high", 0.9, "High-risk content detected", "Urgent review required", [
+        re.compile(r"\b(rape|raped|abuse|abused)\b"),
+        re.compile(r"\b(hurt you|kill you|threaten)\b"),
+    ]),
+    # Medium patterns - add to batch for AI confirmation
+    ("medium", 0.8, "Potential mental health concern", "Monitor and review", [
+        re.compile(r"\b(depressed|depression|hopeless|hopelessness)\b"),
+        re.compile(r"\b(empty inside|nothing matters|pointless)\b"),
+    ]),
+]
+
+
+def check_obvious_flags(content: str) -> Dict[str, Any]:
+    """
+    Check for obvious flags using local rules only.
+
+    Pure CPU work with no I/O, so it is safe to call on the ingest path.
+    """
+    content_lower = content.lower()
+    for severity, confidence, reason, action, patterns in OBVIOUS_FLAG_RULES:
+        for pattern in patterns:
+            if pattern.search(content_lower):
+                return {
+                    "is_obvious": True,
+                    "severity": severity,
+                    "confidence": confidence,
+                    "flagged_reasons": [reason],
+                    "suggested_actions": [action]
+                }
+    return {"is_obvious": False}
+
+
 class BatchProcessor:
     """Handles batching and AI analysis."""
     
@@ -199,65 +243,7 @@ class BatchProcessor:
     
     async def _check_obvious_flags(self, content: str) -> Dict[str, Any]:
         """Check for obvious flags using local rules."""
-        import re
-        
-        content_lower = content.lower()
-        
-        # Critical patterns - always flag immediately
-        # Note: Using simpler patterns that don't rely on word boundaries for phrases
-        critical_patterns = [
-            r"(kill myself|suicide|end my life|end it all|ending everything|ending it all)",
-            r"(hurt(ing|s)? myself|self harm|self-harm|hurting myself)",
-            r"(want to die|don't want to live)",
-            r"(thoughts about (hurting|ending)|serious thoughts about (hurting|ending))"
-        ]
-        
-        # High patterns - flag immediately
-        high_patterns = [
-            r"\b(rape|raped|abuse|abused)\b",
-            r"\b(hurt you|kill you|threaten)\b"
-        ]
-        
-        # Medium patterns - add to batch for AI confirmation
-        medium_patterns = [
-            r"\b(depressed|depression|hopeless|hopelessness)\b",
-            r"\b(empty inside|nothing matters|pointless)\b"
-        ]
-        
-        # Check critical
-        for pattern in critical_patterns:
-            if re.search(pattern, content_lower):
-                return {
-                    "is_obvious": True,
-                    "severity": "critical",
-                    "confidence": 0.95,
-                    "flagged_reasons": ["Critical safety concern detected"],
-                    "suggested_actions": ["Immediate intervention required"]
-                }
-        
-        # Check high
-        for pattern in high_patterns:
-            if re.search(pattern, content_lower):
-                return {
-                    "is_obvious": True,
-                    "severity": "high",
-                    "confidence": 0.9,
-                    "flagged_reasons": ["High-risk content detected"],
-                    "suggested_actions": ["Urgent review required"]
-                }
-        
-        # Check medium
-        for pattern in medium_patterns:
-            if re.search(pattern, content_lower):
-                return {
-                    "is_obvious": True,
-                    "severity": "medium",
-                    "confidence": 0.8,
-                    "flagged_reasons": ["Potential mental health concern"],
-                    "suggested_actions": ["Monitor and review"]
-                }
-        
-        return {"is_obvious": False}
+        return check_obvious_flags(content)
     
     async def _run_immediate_ai_analysis(self, content: str, context: str) -> Dict[str, Any]:
         """Run AI analysis immediately for safety concerns."""
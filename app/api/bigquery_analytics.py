@@ -16,12 +16,13 @@ from app.config.gcp_config import get_gcp_config
 from app.config.bigquery_schema import get_bigquery_schema
 from google.cloud import bigquery
 from google.api_core import exceptions as google_exceptions
+from app.utils.json_codec import FastJSONResponse
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)  # large analytics payloads
 
 # Caching removed - using Pub/Sub for real-time data
 # Cache configuration kept for future use if needed
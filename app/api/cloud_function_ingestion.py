@@ -6,15 +6,16 @@ Receives xAPI statements via HTTP POST and publishes them to Pub/Sub for process
 import json
 import logging
 import os
-from typing import Dict, Any, Optional
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone
 
-# Google Cloud imports
-from google.cloud import pubsub_v1
-from google.api_core import exceptions as gcp_exceptions
-from google.auth import default
-
 from app.api.trigger_word_alerts import trigger_word_alert_manager
+from app.config import settings
+from app.services.admission_control import AdmissionConfig, AdmissionController
+from app.services.etl_wakeup import etl_wakeup_bus
+from app.services.ingest_spool import IngestSpool, SpoolConfig
+from app.services.pubsub_publisher import PubSubPublisherService
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,112 +26,189 @@ PROJECT_ID = os.environ.get('GCP_PROJECT_ID', 'taps-data')
 PUBSUB_TOPIC = os.environ.get('PUBSUB_TOPIC', 'xapi-ingestion-topic')
 STORAGE_BUCKET = os.environ.get('STORAGE_BUCKET', 'taps-data-raw-xapi')
 
-# Initialize Pub/Sub client lazily
+# Shared batched publisher (client is initialized lazily)
+publisher_service = PubSubPublisherService(PROJECT_ID, PUBSUB_TOPIC)
 publisher = None
 topic_path = None
+ingest_spool: Optional[IngestSpool] = None
+admission_controller: Optional[AdmissionController] = None
 
 def get_pubsub_client():
     """Get or initialize Pub/Sub client."""
     global publisher, topic_path
     if publisher is None:
-        try:
-            credentials, project = default()
-            publisher = pubsub_v1.PublisherClient(credentials=credentials)
-            topic_path = publisher.topic_path(PROJECT_ID, PUBSUB_TOPIC)
-            logger.info(f"Initialized Pub/Sub client for topic: {topic_path}")
-        except Exception as e:
-            logger.error(f"Failed to initialize Pub/Sub client: {e}")
-            raise RuntimeError(f"Pub/Sub client not initialized: {e}") from e
+        publisher, topic_path = publisher_service.get_client()
     return publisher, topic_path
 
 
+def get_admission_controller() -> AdmissionController:
+    """Per-source admission control for the ingest routes, shedding on publisher load."""
+    global admission_controller
+    if admission_controller is None:
+        admission_controller = AdmissionController(
+            AdmissionConfig.from_settings(),
+            load_probe=publisher_service.get_load,
+        )
+    return admission_controller
+
+
+def _publish_spooled(payloads: List[Dict[str, Any]], attributes: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Replay spooled statements; ``attributes`` carries each one's original source."""
+    return publisher_service.publish_batch(payloads, source="spool", attributes=attributes)
+
+
+def get_ingest_spool() -> Optional[IngestSpool]:
+    """Return the durable ingest spool, or None when ``INGEST_SPOOL_ENABLED`` is off."""
+    global ingest_spool
+    if not settings.INGEST_SPOOL_ENABLED:
+        return None
+    if ingest_spool is None:
+        ingest_spool = IngestSpool(
+            SpoolConfig.from_settings(),
+            _publish_spooled,
+            on_drained=lambda count: wake_etl_processors("spool"),
+        )
+    return ingest_spool
+
+
+def start_ingest_spool_background() -> Optional[IngestSpool]:
+    """Start draining the spool to Pub/Sub in a background thread (if enabled)."""
+    spool = get_ingest_spool()
+    if spool is not None:
+        spool.start_drainer()
+    return spool
+
+
+def _spool_failed_results(
+    spool: IngestSpool,
+    statements: List[Dict[str, Any]],
+    results: List[Dict[str, Any]],
+    source: str,
+    unresolved: Optional[Dict[int, Future]] = None,
+) -> List[Dict[str, Any]]:
+    """Write unpublished statements to the spool and report them as accepted.
+
+    ``unresolved`` maps statement index to a publish that timed out but may
+    still land; the spool waits on it rather than publishing the statement twice.
+    """
+    failed = [index for index, result in enumerate(results) if not result["success"]]
+    if not failed:
+        return results
+    unresolved = unresolved or {}
+    try:
+        spool.append(
+            [(statements[index], source) for index in failed],
+            futures=[unresolved.get(index) for index in failed],
+        )
+    except OSError as e:
+        logger.error(f"Failed to spool {len(failed)} unpublished statement(s): {e}")
+        return results
+
+    results = list(results)
+    for index in failed:
+        results[index] = {
+            "success": True,
+            "spooled": True,
+            "message_id": None,
+            "topic": results[index].get("topic"),
+        }
+    return results
+
+
 def validate_xapi_statement(statement: Dict[str, Any]) -> bool:
     """Validate basic xAPI statement structure."""
     required_fields = ["actor", "verb", "object"]
     return all(field in statement for field in required_fields)
 
 
-def publish_to_pubsub(statement: Dict[str, Any], *, source: str = "cloud_function") -> Dict[str, Any]:
-    """Publish xAPI statement to Pub/Sub topic and trigger ETL processing."""
-    try:
-        # Get Pub/Sub client (lazy initialization)
-        publisher, topic_path = get_pubsub_client()
-        alert_id = trigger_word_alert_manager.evaluate_statement(statement, source=source)
+def publish_batch_to_pubsub(
+    statements: List[Dict[str, Any]], *, source: str = "cloud_function"
+) -> List[Dict[str, Any]]:
+    """Publish a list of xAPI statements concurrently and trigger ETL processing.
 
-        message_data = json.dumps(statement).encode('utf-8')
-
-        # Add metadata
-        attributes = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "source": source,
-            "statement_count": "1"
-        }
+    Returns one result per statement, in input order, with ``success`` set to
+    False (and an ``error``) for statements that could not be published.
+    """
+    if not statements:
+        return []
 
-        future = publisher.publish(
-            topic_path,
-            message_data,
-            **attributes
+    spool = get_ingest_spool()
+    try:
+        get_pubsub_client()
+    except Exception:
+        if spool is None:
+            raise
+        client_error = True
+    else:
+        client_error = False
+
+    unresolved: Dict[int, Future] = {}
+    alert_ids = [
+        trigger_word_alert_manager.evaluate_statement(statement, source=source)
+        for statement in statements
+    ]
+
+    if client_error:
+        results = [
+            {"success": False, "error": "Pub/Sub client not initialized", "topic": None}
+            for _ in statements
+        ]
+    elif spool is not None:
+        # Spool instead of holding the request past the latency budget
+        results = publisher_service.publish_batch(
+            statements, source=source, timeout=spool.config.latency_budget, on_unresolved=unresolved.__setitem__
         )
+    else:
+        results = publisher_service.publish_batch(statements, source=source)
 
-        message_id = future.result()
-        logger.info(f"Published message {message_id} to topic {topic_path}")
+    if spool is not None:
+        results = _spool_failed_results(spool, statements, results, source, unresolved)
 
-        trigger_word_alert_manager.attach_publish_metadata(
-            alert_id,
-            message_id=message_id,
-            topic=topic_path,
-        )
+    for alert_id, result in zip(alert_ids, results):
+        if result.get("spooled"):
+            continue
+        if result["success"]:
+            trigger_word_alert_manager.attach_publish_metadata(
+                alert_id,
+                message_id=result["message_id"],
+                topic=result["topic"],
+            )
+        else:
+            logger.error(f"Failed to publish to Pub/Sub: {result['error']}")
 
-        # Wake ETL processors immediately after publishing
-        wake_etl_processors()
+    # Wake ETL processors once for the whole batch (spooled statements wake them when drained)
+    if any(result["success"] and not result.get("spooled") for result in results):
+        wake_etl_processors(source)
+
+    return results
 
-        return {
-            "success": True,
-            "message_id": message_id,
-            "topic": topic_path
-        }
 
-    except gcp_exceptions.NotFound:
-        logger.error(f"Pub/Sub topic {topic_path} not found")
-        raise Exception(f"Pub/Sub topic not found: {PUBSUB_TOPIC}")
+def publish_to_pubsub(statement: Dict[str, Any], *, source: str = "cloud_function") -> Dict[str, Any]:
+    """Publish xAPI statement to Pub/Sub topic and trigger ETL processing."""
+    try:
+        result = publish_batch_to_pubsub([statement], source=source)[0]
     except Exception as e:
         logger.error(f"Failed to publish to Pub/Sub: {str(e)}")
         raise Exception(f"Pub/Sub publishing failed: {str(e)}")
 
+    if not result["success"]:
+        if result.get("error_type") == "NotFound":
+            logger.error(f"Pub/Sub topic {result['topic']} not found")
+            raise Exception(f"Pub/Sub topic not found: {PUBSUB_TOPIC}")
+        raise Exception(f"Pub/Sub publishing failed: {result['error']}")
+
+    logger.info(f"Published message {result['message_id']} to topic {result['topic']}")
+    return result
+
 
-def wake_etl_processors():
-    """Trigger ETL processors to wake up and process any pending messages."""
+def wake_etl_processors(source: str = "cloud_function") -> None:
+    """Signal ETL processors that new messages are pending.
+
+    Signals are coalesced by the in-process wake-up bus, so a burst of
+    publishes produces at most one wake-up per debounce window.
+    """
     try:
-        import httpx
-        import asyncio
-        
-        # Get the Cloud Run service URL
-        service_url = os.environ.get('CLOUD_RUN_SERVICE_URL', 'https://taps-analytics-ui-zz2ztq5bjq-uc.a.run.app')
-        
-        async def trigger_etl():
-            try:
-                async with httpx.AsyncClient(timeout=5.0) as client:
-                    # Trigger ETL processing via a lightweight endpoint
-                    response = await client.post(f"{service_url}/api/etl/trigger-processing")
-                    if response.status_code == 200:
-                        logger.info("Successfully triggered ETL processors")
-                    else:
-                        logger.warning(f"ETL trigger returned status {response.status_code}")
-            except Exception as e:
-                logger.warning(f"Failed to trigger ETL processors: {e}")
-        
-        # Run the async function in a new event loop
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If we're already in an event loop, create a task
-                asyncio.create_task(trigger_etl())
-            else:
-                loop.run_until_complete(trigger_etl())
-        except RuntimeError:
-            # No event loop running, create a new one
-            asyncio.run(trigger_etl())
-            
+        etl_wakeup_bus.notify(source=source)
     except Exception as e:
         logger.warning(f"Failed to wake ETL processors: {e}")
         # Don't fail the main operation if ETL wake fails
@@ -198,11 +276,16 @@ def cloud_ingest_xapi(request) -> tuple[str, int]:
                 'required_fields': ['actor', 'verb', 'object']
             }), 400
 
-        # Publish statements to Pub/Sub
-        results = []
-        for statement in statements:
-            result = publish_to_pubsub(statement, source="cloud_function_http")
-            results.append(result)
+        # Publish all statements to Pub/Sub in one concurrent batch
+        results = publish_batch_to_pubsub(statements, source="cloud_function_http")
+        failed_indices = [i for i, result in enumerate(results) if not result["success"]]
+        if failed_indices:
+            return json.dumps({
+                'error': 'Pub/Sub publishing failed',
+                'message': f'Statements at indices {failed_indices} could not be published',
+                'results': results,
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            }), 500
 
         # Prepare response
         response_data = {
@@ -237,7 +320,8 @@ def get_cloud_function_status() -> tuple[str, int]:
             "publisher_initialized": publisher is not None,
             "topic_path": topic_path,
             "project_id": PROJECT_ID,
-            "topic_name": PUBSUB_TOPIC
+            "topic_name": PUBSUB_TOPIC,
+            "publisher": publisher_service.get_status()
         }
 
         # Additional Cloud Function specific checks
@@ -245,7 +329,8 @@ def get_cloud_function_status() -> tuple[str, int]:
             "function_name": "cloud_ingest_xapi",
             "runtime": "python39",
             "last_check": datetime.now(timezone.utc).isoformat(),
-            "pubsub_status": pubsub_status
+            "pubsub_status": pubsub_status,
+            "spool_status": ingest_spool.get_status() if ingest_spool else {"enabled": settings.INGEST_SPOOL_ENABLED},
         }
 
         # Determine overall health
@@ -7,8 +7,11 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException
 from typing import Dict, Any
 
+from app.config import settings
+from app.etl import pubsub_bigquery_processor
 from app.etl.pubsub_bigquery_processor import get_processor, start_processor_background, stop_processor
 from app.logging_config import get_logger
+from app.services.etl_wakeup import etl_wakeup_bus
 
 router = APIRouter()
 logger = get_logger("etl_control")
@@ -18,6 +21,39 @@ _processor_thread = None
 _processor_running = False
 
 
+def _ensure_processor_running() -> None:
+    """Start the BigQuery processor in this process if it is not already running."""
+    global _processor_running
+
+    local_processor = pubsub_bigquery_processor._processor
+    if _processor_running or (local_processor is not None and local_processor.running):
+        _processor_running = True
+        return
+
+    logger.info("ETL processors not running, starting them...")
+    start_processor_background()
+    _processor_running = True
+
+
+def owns_legacy_processor() -> bool:
+    """True when this process runs the Pub/Sub → BigQuery processor (not API-only, not unified)."""
+    return settings.APP_RUN_MODE != "api" and not settings.ETL_UNIFIED_CONSUMER_ENABLED
+
+
+def _on_etl_wakeup(reason: str) -> None:
+    """Wake-up bus listener: the processor runs in this instance, so wake it directly."""
+    logger.debug(f"ETL wake-up received ({reason})")
+    _ensure_processor_running()
+
+
+def register_etl_wakeup_listener() -> bool:
+    """Wake the local processor on ingest, if this process owns it; otherwise the bus wakes it remotely."""
+    if not owns_legacy_processor():
+        return False
+    etl_wakeup_bus.register_listener(_on_etl_wakeup)
+    return True
+
+
 @router.post("/etl/start-bigquery-processor")
 async def start_bigquery_processor() -> Dict[str, Any]:
     """Start the Pub/Sub → BigQuery ETL processor."""
@@ -78,14 +114,15 @@ async def stop_bigquery_processor() -> Dict[str, Any]:
 @router.post("/etl/trigger-processing")
 async def trigger_etl_processing() -> Dict[str, Any]:
     """Trigger ETL processors to wake up and process pending messages."""
-    global _processor_running
-    
+    if not owns_legacy_processor():
+        return {
+            "status": "not_owned",
+            "message": "ETL consumers run in worker processes or the unified consumer, not in this process",
+            "processor_running": _processor_running,
+        }
     try:
         # Ensure processors are running
-        if not _processor_running:
-            logger.info("ETL processors not running, starting them...")
-            start_processor_background()
-            _processor_running = True
+        _ensure_processor_running()
         
         # Get processor status
         processor = get_processor()
@@ -191,6 +228,7 @@ async def get_etl_status() -> Dict[str, Any]:
             "available_processors": [
                 "bigquery_processor"
             ],
+            "wakeup_bus": etl_wakeup_bus.get_status(),
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         
@@ -15,6 +15,7 @@ import pandas as pd
 from fastapi import APIRouter, HTTPException, Query
 
 from app.config import settings
+from app.utils.json_codec import FastJSONResponse
 
 # Lesson normalizer embedded directly
 class LessonNormalizer:
@@ -46,7 +47,7 @@ class LessonNormalizer:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)  # large analytics payloads
 
 class GroupAnalyticsManager:
     """Manages group-based analytics."""
@@ -224,3 +224,17 @@ async def get_circuit_breaker_status() -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Error getting circuit breaker status: {e}")
         raise HTTPException(status_code=500, detail="Failed to get circuit breaker status")
+
+@router.get("/admission")
+async def get_admission_status() -> Dict[str, Any]:
+    """Get per-source ingest admission counters and current load shedding."""
+    try:
+        from app.api.cloud_function_ingestion import get_admission_controller
+
+        return {
+            "admission_control": get_admission_controller().get_status(),
+            "timestamp": get_current_central_time_str()
+        }
+    except Exception as e:
+        logger.error(f"Error getting admission control status: {e}")
+        raise HTTPException(status_code=500, detail="Failed to get admission control status")
@@ -10,13 +10,18 @@ import hashlib
 import hmac
 import base64
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 
-from app.api.xapi import publish_statement_async, validate_xapi_statement
-from app.api.ai_flagged_content import analyze_xapi_statement_content
+from app.api.xapi import (
+    build_statement_context,
+    enforce_admission,
+    run_ingest_pipeline,
+    validate_xapi_statement,
+)
 from app.logging_config import get_logger
+from app.services.dedup_store import get_dedup_store
 
 router = APIRouter()
 logger = get_logger("seventaps")
@@ -34,9 +39,6 @@ webhook_stats = {
 all_incoming_statements = []
 MAX_STATEMENTS_LOG = 1000  # Keep last 1000 statements
 
-# Global statement deduplication cache (in production, use Redis)
-processed_statements = set()
-MAX_CACHE_SIZE = 10000  # Prevent memory leaks
 
 # 7taps Basic Authentication credentials
 SEVENTAPS_USERNAME = os.getenv("SEVENTAPS_USERNAME", "7taps.team")
@@ -164,6 +166,15 @@ def verify_basic_auth(request: Request) -> bool:
         return False
 
 
+def _basic_auth_username(request: Request) -> str:
+    """Username from an (already verified) Basic Authorization header."""
+    try:
+        credentials = base64.b64decode(request.headers.get("Authorization", "")[6:]).decode('utf-8')
+        return credentials.split(':', 1)[0] or "anonymous"
+    except Exception:
+        return "anonymous"
+
+
 def verify_webhook_secret(request_body: str, signature: str) -> bool:
     """
     Verify webhook secret using HMAC (fallback method).
@@ -223,15 +234,62 @@ async def authenticate_7taps_request(request: Request) -> bool:
 async def _publish_7taps_statements(
     statements: List[Dict[str, Any]], *, source: str
 ) -> List[Dict[str, Any]]:
-    """Validate and publish statements originating from 7taps."""
-    processed: List[Dict[str, Any]] = []
+    """Validate and publish statements originating from 7taps.
+
+    Deduplication and email normalization run first, in input order; all ids
+    in the request are checked against the dedup store in one call. Accepted
+    statements then go through the bounded-concurrency ingest pipeline, where
+    each is validated and analyzed exactly once into a ``StatementContext``
+    and published in overlapping chunks. Results keep input order; a statement
+    that fails validation gets a per-index error, and the request only fails
+    with 422 when no accepted statement was valid. Dedup claims of statements
+    that were not published (invalid, failed, or the pipeline raised) are
+    released, so 7taps retries of them are not dropped as duplicates.
+    """
     seen_statement_ids = set()
+    batch_duplicates = set()
+
+    # Duplicates within this batch: the first occurrence wins. Statements
+    # without an id get a fresh uuid later, so they can never be duplicates.
+    for index, statement_data in enumerate(statements):
+        statement_id = statement_data.get("id")
+        if statement_id is None:
+            continue
+        if statement_id in seen_statement_ids:
+            batch_duplicates.add(index)
+        seen_statement_ids.add(statement_id)
 
-    for statement_data in statements:
+    # One dedup-store round trip for every distinct id in the request
+    candidate_ids = [
+        statement_data["id"]
+        for index, statement_data in enumerate(statements)
+        if statement_data.get("id") is not None and index not in batch_duplicates
+    ]
+    newly_claimed = dict(zip(candidate_ids, get_dedup_store().claim_many(candidate_ids)))
+    # Claims not (yet) backed by a successful publish; released below so 7taps retries get through
+    unpublished = {statement_id for statement_id, is_new in newly_claimed.items() if is_new}
+    try:
+        return await _publish_claimed_statements(statements, batch_duplicates, newly_claimed, unpublished, source)
+    finally:
+        get_dedup_store().release(sorted(unpublished))
+
+
+async def _publish_claimed_statements(
+    statements: List[Dict[str, Any]],
+    batch_duplicates: Set[int],
+    newly_claimed: Dict[str, bool],
+    unpublished: Set[str],
+    source: str,
+) -> List[Dict[str, Any]]:
+    """Normalize and publish the statements this request claimed; successes leave ``unpublished``."""
+    processed: List[Dict[str, Any]] = []
+    pending: List[Tuple[int, Dict[str, Any]]] = []
+
+    for index, statement_data in enumerate(statements):
         statement_id = statement_data.get("id")
         
         # Check for duplicate statement IDs in this batch
-        if statement_id in seen_statement_ids:
+        if index in batch_duplicates:
             logger.warning(f"Duplicate statement ID detected in batch: {statement_id}, skipping")
             processed.append({
                 "statement_id": statement_id,
@@ -241,7 +299,7 @@ async def _publish_7taps_statements(
             continue
         
         # Check for globally processed statements
-        if statement_id in processed_statements:
+        if statement_id is not None and not newly_claimed[statement_id]:
             logger.warning(f"Statement ID already processed globally: {statement_id}, skipping")
             processed.append({
                 "statement_id": statement_id,
@@ -250,15 +308,6 @@ async def _publish_7taps_statements(
             })
             continue
         
-        seen_statement_ids.add(statement_id)
-        processed_statements.add(statement_id)
-        
-        # Prevent memory leaks by limiting cache size
-        if len(processed_statements) > MAX_CACHE_SIZE:
-            # Remove oldest entries (simple approach - in production use Redis with TTL)
-            processed_statements.clear()
-            logger.info("Cleared statement deduplication cache to prevent memory leaks")
-        
         # Normalize user email addresses
         if "actor" in statement_data and "mbox" in statement_data["actor"]:
             mbox = statement_data["actor"]["mbox"]
@@ -272,57 +321,68 @@ async def _publish_7taps_statements(
                     name_email = statement_data["actor"]["name"].lower()
                     if name_email == email:
                         statement_data["actor"]["name"] = email
-        try:
-            statement = validate_xapi_statement(statement_data)
-            publish_result = await publish_statement_async(statement, source=source)
-
-            processed.append(
-                {
-                    "statement_id": statement.id,
-                    "message_id": publish_result.get("message_id"),
-                    "timestamp": (
-                        statement.timestamp.isoformat()
-                        if statement.timestamp
-                        else datetime.now(timezone.utc).isoformat()
-                    ),
-                }
-            )
-        except HTTPException:
-            raise
-        except Exception as exc:  # pragma: no cover - defensive logging
-            processed.append(
-                {
-                    "statement_id": statement_data.get("id", "unknown"),
-                    "error": str(exc),
-                }
-            )
 
-    # Wake ETL processors after publishing all statements
-    if processed:
-        await _wake_etl_processors()
+        pending.append((len(processed), statement_data))
+        processed.append({})
+
+    outcomes = await run_ingest_pipeline(
+        [statement_data for _, statement_data in pending],
+        lambda statement_data: build_statement_context(
+            validate_xapi_statement(statement_data), source=source
+        ),
+        source=source,
+    )
+
+    invalid: List[Exception] = []
+    for (position, statement_data), (context, outcome) in zip(pending, outcomes):
+        if context is None:
+            invalid.append(outcome.get("exception"))
+            processed[position] = {
+                "statement_id": statement_data.get("id") or "unknown",
+                "status": "invalid",
+                "error": outcome.get("error"),
+            }
+            continue
+
+        statement = context.statement
+        if outcome.get("success"):
+            unpublished.discard(statement_data.get("id"))
+            processed[position] = {
+                "statement_id": statement.id,
+                "message_id": outcome.get("message_id"),
+                "timestamp": (
+                    statement.timestamp.isoformat()
+                    if statement.timestamp
+                    else datetime.now(timezone.utc).isoformat()
+                ),
+            }
+        else:
+            processed[position] = {
+                "statement_id": statement.id or "unknown",
+                "error": outcome.get("error"),
+            }
+
+    if pending and len(invalid) == len(pending) and invalid[0] is not None:
+        raise invalid[0]
 
     return processed
 
 
-async def _wake_etl_processors():
-    """Trigger ETL processors to wake up and process any pending messages."""
-    try:
-        import httpx
+def _log_incoming_statements(statements: List[Dict[str, Any]], method: str) -> None:
+    """Print a one-line summary of each incoming statement for debugging."""
+    print(f"🔍 [7TAPS DEBUG] Received {len(statements)} statement(s) via {method}")
+    for i, statement in enumerate(statements):
+        verb_id = statement.get("verb", {}).get("id", "unknown")
+        object_id = statement.get("object", {}).get("id", "unknown")
+        actor_name = statement.get("actor", {}).get("name", "unknown")
+        statement_id = statement.get("id", f"no-id-{i}")
         
-        # Get the service URL (same service, internal call)
-        service_url = "https://taps-analytics-ui-zz2ztq5bjq-uc.a.run.app"
+        print(f"  📝 Statement {i+1}: {verb_id} | {object_id} | Actor: {actor_name} | ID: {statement_id}")
         
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            # Trigger ETL processing via a lightweight endpoint
-            response = await client.post(f"{service_url}/api/etl/trigger-processing")
-            if response.status_code == 200:
-                logger.info("Successfully triggered ETL processors from 7taps webhook")
-            else:
-                logger.warning(f"ETL trigger returned status {response.status_code}")
-                
-    except Exception as e:
-        logger.warning(f"Failed to trigger ETL processors from 7taps webhook: {e}")
-        # Don't fail the main operation if ETL wake fails
+        # Special logging for completion statements
+        if "completed" in verb_id.lower():
+            print(f"  ✅ COMPLETION DETECTED: {statement_id}")
+            print(f"     Full statement: {statement}")
 
 
 @router.post("/statements")
@@ -369,30 +429,12 @@ async def receive_7taps_webhook(request: Request):
                 # Direct xAPI statement
                 statements = [body]
         
-        # Log all incoming statements for debugging
-        print(f"🔍 [7TAPS DEBUG] Received {len(statements)} statement(s) via POST")
-        for i, statement in enumerate(statements):
-            verb_id = statement.get("verb", {}).get("id", "unknown")
-            object_id = statement.get("object", {}).get("id", "unknown")
-            actor_name = statement.get("actor", {}).get("name", "unknown")
-            statement_id = statement.get("id", f"no-id-{i}")
-            
-            print(f"  📝 Statement {i+1}: {verb_id} | {object_id} | Actor: {actor_name} | ID: {statement_id}")
-            
-            # Run AI content analysis on each statement
-            try:
-                ai_analysis = await analyze_xapi_statement_content(statement)
-                if ai_analysis.get("is_flagged", False):
-                    print(f"  🚨 FLAGGED CONTENT: {statement_id}")
-                    print(f"     Severity: {ai_analysis.get('severity', 'unknown')}")
-                    print(f"     Reasons: {ai_analysis.get('flagged_reasons', [])}")
-            except Exception as e:
-                print(f"  ⚠️ AI analysis failed for {statement_id}: {e}")
-            
-            # Special logging for completion statements
-            if "completed" in verb_id.lower():
-                print(f"  ✅ COMPLETION DETECTED: {statement_id}")
-                print(f"     Full statement: {statement}")
+        # Per-user admission control before any validation or analysis work
+        enforce_admission(f"7taps:{_basic_auth_username(request)}", cost=len(statements))
+
+        # Log all incoming statements for debugging (safety verdicts are logged
+        # once per statement when its context is built during publishing)
+        _log_incoming_statements(statements, "POST")
         
         processed_statements = await _publish_7taps_statements(
             statements, source="7taps_webhook_post"
@@ -467,30 +509,10 @@ async def receive_7taps_webhook_put(request: Request, statementId: str = None):
             for statement in statements:
                 statement.setdefault("id", statementId)
 
+        enforce_admission(f"7taps:{_basic_auth_username(request)}", cost=len(statements))
+
         # Log all incoming statements for debugging
-        print(f"🔍 [7TAPS DEBUG] Received {len(statements)} statement(s) via PUT")
-        for i, statement in enumerate(statements):
-            verb_id = statement.get("verb", {}).get("id", "unknown")
-            object_id = statement.get("object", {}).get("id", "unknown")
-            actor_name = statement.get("actor", {}).get("name", "unknown")
-            statement_id = statement.get("id", f"no-id-{i}")
-            
-            print(f"  📝 Statement {i+1}: {verb_id} | {object_id} | Actor: {actor_name} | ID: {statement_id}")
-            
-            # Run AI content analysis on each statement
-            try:
-                ai_analysis = await analyze_xapi_statement_content(statement)
-                if ai_analysis.get("is_flagged", False):
-                    print(f"  🚨 FLAGGED CONTENT: {statement_id}")
-                    print(f"     Severity: {ai_analysis.get('severity', 'unknown')}")
-                    print(f"     Reasons: {ai_analysis.get('flagged_reasons', [])}")
-            except Exception as e:
-                print(f"  ⚠️ AI analysis failed for {statement_id}: {e}")
-            
-            # Special logging for completion statements
-            if "completed" in verb_id.lower():
-                print(f"  ✅ COMPLETION DETECTED: {statement_id}")
-                print(f"     Full statement: {statement}")
+        _log_incoming_statements(statements, "PUT")
 
         processed_statements = await _publish_7taps_statements(
             statements, source="7taps_webhook_put"
@@ -557,6 +579,7 @@ async def get_webhook_stats():
     """
     return {
         "webhook_stats": webhook_stats,
+        "dedup": get_dedup_store().get_status(),
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "success_rate": (
             webhook_stats["successful_requests"] / webhook_stats["total_requests"]
@@ -2,7 +2,6 @@
 
 from __future__ import annotations
 
-import json
 import os
 import smtplib
 import ssl
@@ -18,6 +17,7 @@ from google.cloud import bigquery
 
 from app.config.gcp_config import get_gcp_config
 from app.logging_config import get_logger
+from app.utils import json_codec
 
 logger = get_logger("trigger_word_alerts")
 
@@ -218,7 +218,7 @@ class TriggerWordAlertManager:
             for key in unique_keys:
                 self._statement_word_index[key] = alert_id
 
-            safe_statement = json.loads(json.dumps(statement, default=str)) if not is_raw_record else statement
+            safe_statement = json_codec.to_jsonable(statement) if not is_raw_record else statement
 
             alert_record = {
                 "alert_id": alert_id,
@@ -242,23 +242,23 @@ class TriggerWordAlertManager:
             parts: List[str] = []
             actor = statement.get("actor") or {}
             if actor:
-                parts.append(json.dumps(actor))
+                parts.append(json_codec.dumps(actor))
             verb = statement.get("verb") or {}
             if verb:
-                parts.append(json.dumps(verb))
+                parts.append(json_codec.dumps(verb))
             obj = statement.get("object") or {}
             if obj:
-                parts.append(json.dumps(obj))
+                parts.append(json_codec.dumps(obj))
             result = statement.get("result") or {}
             if result:
-                parts.append(json.dumps(result))
+                parts.append(json_codec.dumps(result))
             context = statement.get("context") or {}
             if context:
-                parts.append(json.dumps(context))
+                parts.append(json_codec.dumps(context))
             if statement.get("raw_json"):
                 parts.append(statement["raw_json"])
             if statement.get("statement"):
-                parts.append(json.dumps(statement.get("statement")))
+                parts.append(json_codec.dumps(statement.get("statement")))
             return " \n ".join(parts).lower()
         except Exception as exc:  # pragma: no cover - defensive logging
             logger.warning("Failed to extract searchable text", error=str(exc))
@@ -298,7 +298,7 @@ class TriggerWordAlertManager:
         statement_id = alert.get("statement_id")
         detected_at = alert.get("detected_at")
         matches = ", ".join(alert.get("matches", []))
-        snippet = json.dumps(alert.get("statement", {}))[:500]
+        snippet = json_codec.dumps(alert.get("statement", {}))[:500]
 
         body = (
             "Safety alert detected.\n\n"
@@ -361,8 +361,8 @@ class TriggerWordAlertManager:
             for row in results:
                 raw_json = row.get("raw_json")
                 try:
-                    statement = json.loads(raw_json) if raw_json else {}
-                except json.JSONDecodeError:
+                    statement = json_codec.loads(raw_json) if raw_json else {}
+                except json_codec.JSONDecodeError:
                     statement = {"raw_json": raw_json}
                 statement.setdefault("id", row.get("statement_id"))
                 timestamp_value = row.get("timestamp")
@@ -3,20 +3,29 @@ xAPI Ingestion Endpoint for receiving and publishing learning statements.
 """
 
 import asyncio
+import math
 import uuid
+import zlib
 from collections import OrderedDict
 from copy import deepcopy
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, ValidationError
 
-from app.api.cloud_function_ingestion import publish_to_pubsub
+from app.api.cloud_function_ingestion import (
+    get_admission_controller,
+    publish_batch_to_pubsub,
+    publish_to_pubsub,
+)
 from app.api.trigger_word_alerts import trigger_word_alert_manager
-from app.api.ai_flagged_content import analyze_xapi_statement_content
+from app.api.ai_flagged_content import extract_statement_text, local_rules_verdict
+from app.config import settings
 from app.config.gcp_config import get_gcp_config
 from app.logging_config import get_logger
+from app.utils.ndjson_stream import NDJSONBodyTooLarge, iter_ndjson_batches
 from app.models import (
     xAPIStatement,
     xAPIIngestionResponse,
@@ -30,6 +39,11 @@ logger = get_logger("xapi_ingestion")
 router = APIRouter()
 
 MAX_RECENT_STATEMENTS = 100
+MAX_STREAM_ERRORS = 100
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+INGEST_SOURCE_HEADER = "X-Ingest-Source"  # allow-listed importers get their own rate-limit bucket
+
+T = TypeVar("T")
 
 ingestion_stats = {
     "total_statements": 0,
@@ -45,6 +59,74 @@ class TriggerWordUpdateRequest(BaseModel):
     mode: Optional[str] = "append"
 
 
+def client_address(request: Request) -> str:
+    """Caller address as seen by the last trusted proxy (``INGEST_ADMISSION_TRUSTED_PROXY_HOPS``).
+
+    Entries left of the trusted hops are supplied by the client and ignored.
+    """
+    hops = settings.INGEST_ADMISSION_TRUSTED_PROXY_HOPS
+    forwarded = [
+        entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",") if entry.strip()
+    ]
+    if hops > 0 and len(forwarded) >= hops:
+        return forwarded[-hops]
+    return request.client.host if request.client else "unknown"
+
+
+def admission_source(request: Request, kind: str = "api") -> str:
+    """Admission-control key for a caller: an allow-listed ``X-Ingest-Source``, else its address."""
+    declared = request.headers.get(INGEST_SOURCE_HEADER)
+    if declared and declared in settings.INGEST_ADMISSION_DECLARED_SOURCES:
+        return f"{kind}:{declared}"
+    return f"{kind}:{client_address(request)}"
+
+
+def _rate_limited(source: str, retry_after: float, **detail: Any) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail={
+            "message": "Ingest rate limit exceeded",
+            "source": source,
+            "retry_after": round(retry_after, 2),
+            **detail,
+        },
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def enforce_admission(source: str, cost: int = 1) -> None:
+    """Raise 429 with ``Retry-After`` when ``source`` is over its ingest rate."""
+    decision = get_admission_controller().admit(source, cost)
+    if not decision.allowed:
+        raise _rate_limited(source, decision.retry_after)
+
+
+class _StreamThrottled(Exception):
+    """A streamed batch could not be admitted within ``INGEST_STREAM_ADMISSION_MAX_WAIT``."""
+
+    def __init__(self, retry_after: float, next_line: int):
+        super().__init__(f"retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.next_line = next_line
+
+
+async def _admitted_batches(batches: AsyncIterator[List[Any]], source: str) -> AsyncIterator[List[Any]]:
+    """Admit each streamed batch before it is published, waiting briefly for tokens."""
+    controller = get_admission_controller()
+    async for batch in batches:
+        waited = 0.0
+        while True:
+            decision = controller.admit(source, len(batch))
+            if decision.allowed:
+                break
+            if waited + decision.retry_after > settings.INGEST_STREAM_ADMISSION_MAX_WAIT:
+                raise _StreamThrottled(decision.retry_after, batch[0][0])
+            # Not reading the body meanwhile pushes back on the uploader
+            await asyncio.sleep(decision.retry_after)
+            waited += decision.retry_after
+        yield batch
+
+
 def _serialize_alert(alert: Dict[str, Any]) -> Dict[str, Any]:
     serialized = dict(alert)
     detected_at = serialized.get("detected_at")
@@ -84,8 +166,33 @@ def validate_xapi_statement(statement_data: Dict[str, Any]) -> xAPIStatement:
         )
 
 
-async def _prepare_statement_payload(statement: xAPIStatement, *, source: str) -> Dict[str, Any]:
-    """Convert statement to a Pub/Sub payload with metadata and AI content analysis."""
+@dataclass
+class StatementContext:
+    """Everything ingest derives from one statement, computed exactly once.
+
+    Built by ``build_statement_context`` after validation; the extracted text,
+    safety verdict and Pub/Sub payload are then carried through logging and
+    publishing so no detector has to run a second time.
+    """
+
+    statement: xAPIStatement
+    source: str
+    payload: Dict[str, Any]
+    response_text: str = ""
+    full_content: str = ""
+    verdict: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def statement_id(self) -> str:
+        return self.statement.id
+
+    @property
+    def is_flagged(self) -> bool:
+        return bool(self.verdict.get("is_flagged", False))
+
+
+def build_statement_context(statement: xAPIStatement, *, source: str) -> StatementContext:
+    """Build the payload, extracted text and local-rules safety verdict for a statement."""
     if not statement.id:
         statement.id = str(uuid.uuid4())
 
@@ -93,85 +200,55 @@ async def _prepare_statement_payload(statement: xAPIStatement, *, source: str) -
     payload["id"] = statement.id
     payload["ingested_at"] = datetime.now(timezone.utc).isoformat()
     payload["ingestion_source"] = source
-    
-    # Run AI content analysis for flagged language detection
+
+    context = StatementContext(statement=statement, source=source, payload=payload)
+
+    # Local rules only; the safety consumer runs the full AI analysis after publish
     try:
-        ai_analysis = await analyze_xapi_statement_content(payload)
-        payload["ai_content_analysis"] = ai_analysis
-        
-        # Log flagged content for immediate attention
-        if ai_analysis.get("is_flagged", False):
-            print(f"🚨 FLAGGED CONTENT DETECTED: {statement.id}")
-            print(f"   Severity: {ai_analysis.get('severity', 'unknown')}")
-            print(f"   Reasons: {ai_analysis.get('flagged_reasons', [])}")
-            print(f"   Confidence: {ai_analysis.get('confidence_score', 0)}")
-            
-            # Persist flagged content to BigQuery
-            try:
-                from app.services.flagged_content_persistence import flagged_content_persistence
-                
-                # Extract content from statement
-                content = ""
-                result = payload.get("result", {})
-                if result.get("response"):
-                    content = result["response"]
-                
-                # Extract actor info
-                actor = payload.get("actor", {})
-                actor_id = actor.get("mbox", actor.get("mbox_sha1sum", actor.get("openid", "unknown")))
-                if actor_id.startswith("mailto:"):
-                    actor_id = actor_id[7:]
-                actor_name = actor.get("name", None)
-                
-                # Extract cohort from context extensions
-                context = payload.get("context", {})
-                extensions = context.get("extensions", {})
-                cohort = extensions.get("https://7taps.com/cohort", None)
-                
-                # Extract timestamp
-                timestamp = payload.get("timestamp")
-                if isinstance(timestamp, str):
-                    try:
-                        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                    except:
-                        timestamp = datetime.now(timezone.utc)
-                elif isinstance(timestamp, datetime):
-                    pass  # Already a datetime
-                elif timestamp is None:
-                    timestamp = datetime.now(timezone.utc)
-                
-                # Persist asynchronously
-                import asyncio
-                try:
-                    loop = asyncio.get_running_loop()
-                    loop.create_task(
-                        flagged_content_persistence.persist_flagged_content(
-                            statement_id=statement.id,
-                            timestamp=timestamp,
-                            actor_id=actor_id,
-                            actor_name=actor_name,
-                            content=content,
-                            analysis_result=ai_analysis,
-                            cohort=cohort
-                        )
-                    )
-                except RuntimeError:
-                    # No event loop, skip persistence (shouldn't happen in async context)
-                    logger.warning(f"No event loop for persistence, skipping BigQuery write for {statement.id}")
-            except Exception as persist_error:
-                logger.error(f"Failed to persist flagged content for {statement.id}: {persist_error}")
-            
+        context.response_text, context.full_content = extract_statement_text(payload)
+        verdict = local_rules_verdict(payload, text=(context.response_text, context.full_content))
     except Exception as e:
-        print(f"⚠️ AI content analysis failed for statement {statement.id}: {e}")
-        payload["ai_content_analysis"] = {
+        logger.warning(f"Local safety rules failed for statement {statement.id}: {e}")
+        verdict = {
             "is_flagged": False,
             "severity": "low",
             "flagged_reasons": ["Analysis failed"],
             "confidence_score": 0.0,
             "error": str(e)
         }
-    
-    return payload
+    context.verdict = verdict
+    payload["ai_content_analysis"] = verdict
+
+    if context.is_flagged:
+        print(f"🚨 FLAGGED CONTENT DETECTED: {statement.id}")
+        print(f"   Severity: {verdict.get('severity', 'unknown')}")
+        print(f"   Reasons: {verdict.get('flagged_reasons', [])}")
+
+    if verdict.get("severity") == "critical":
+        _alert_critical_statement(payload, verdict)
+
+    return context
+
+
+def _prepare_statement_payload(statement: xAPIStatement, *, source: str) -> Dict[str, Any]:
+    """Convert statement to a Pub/Sub payload with metadata and a local-rules safety verdict."""
+    return build_statement_context(statement, source=source).payload
+
+
+def _alert_critical_statement(payload: Dict[str, Any], verdict: Dict[str, Any]) -> None:
+    """Send the alert for a critical local-rule hit without waiting for AI analysis."""
+    try:
+        from app.services.flagged_content_persistence import flagged_content_persistence
+
+        loop = asyncio.get_running_loop()
+        loop.create_task(flagged_content_persistence.send_immediate_alert(payload, verdict))
+        # Tell the safety consumer not to email again when it persists the AI result
+        verdict.setdefault("analysis_metadata", {})["immediate_alert_sent"] = True
+    except RuntimeError:
+        # No event loop (sync caller); the safety consumer will alert instead
+        logger.warning(f"No event loop for immediate alert on {payload.get('id')}, deferring to safety consumer")
+    except Exception as e:
+        logger.error(f"Failed to send immediate alert for {payload.get('id')}: {e}")
 
 
 def _record_ingestion(payload: Dict[str, Any], publish_result: Dict[str, Any]) -> None:
@@ -195,6 +272,11 @@ def _publish_payload(payload: Dict[str, Any], *, source: str) -> Dict[str, Any]:
     return publish_to_pubsub(payload, source=source)
 
 
+def _publish_payloads(payloads: List[Dict[str, Any]], *, source: str) -> List[Dict[str, Any]]:
+    """Publish payloads to Pub/Sub as one concurrent batch (results in input order)."""
+    return publish_batch_to_pubsub(payloads, source=source)
+
+
 def publish_statement(statement: xAPIStatement, *, source: str = "api_ingest") -> Dict[str, Any]:
     """Publish a statement to Pub/Sub synchronously."""
     payload = _prepare_statement_payload(statement, source=source)
@@ -210,7 +292,7 @@ def publish_statement(statement: xAPIStatement, *, source: str = "api_ingest") -
 
 async def publish_statement_async(statement: xAPIStatement, *, source: str = "api_ingest") -> Dict[str, Any]:
     """Asynchronously publish a statement to Pub/Sub with AI content analysis."""
-    payload = await _prepare_statement_payload(statement, source=source)
+    payload = _prepare_statement_payload(statement, source=source)
     loop = asyncio.get_running_loop()
     try:
         publish_result = await loop.run_in_executor(
@@ -225,9 +307,143 @@ async def publish_statement_async(statement: xAPIStatement, *, source: str = "ap
     return publish_result
 
 
+async def publish_statements_async(
+    statements: List[xAPIStatement], *, source: str = "api_ingest"
+) -> List[Dict[str, Any]]:
+    """Publish several statements to Pub/Sub in a single concurrent batch.
+
+    Returns one publish result per statement, in input order. Statements that
+    could not be published get ``success: False`` and an ``error`` instead of
+    raising, so callers can report per-statement outcomes.
+    """
+    contexts = [build_statement_context(statement, source=source) for statement in statements]
+    return await publish_contexts_async(contexts, source=source)
+
+
+async def publish_contexts_async(
+    contexts: List[StatementContext], *, source: str = "api_ingest"
+) -> List[Dict[str, Any]]:
+    """Publish already-built statement contexts as one batch (results in input order)."""
+    if not contexts:
+        return []
+
+    payloads = [context.payload for context in contexts]
+    loop = asyncio.get_running_loop()
+    try:
+        publish_results = await loop.run_in_executor(
+            None,
+            lambda: _publish_payloads(payloads, source=source),
+        )
+    except Exception as exc:
+        publish_results = [{"success": False, "error": str(exc)} for _ in payloads]
+
+    for payload, publish_result in zip(payloads, publish_results):
+        if publish_result.get("success"):
+            _record_ingestion(payload, publish_result)
+        else:
+            ingestion_stats["error_count"] += 1
+
+    return publish_results
+
+
+async def run_ingest_pipeline(
+    items: Sequence[T],
+    build: Callable[[T], StatementContext],
+    *,
+    source: str,
+    concurrency: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> List[Tuple[Optional[StatementContext], Dict[str, Any]]]:
+    """Validate, analyze and publish a multi-statement request as overlapping chunks.
+
+    ``build`` turns one input item into a ``StatementContext`` (validation and
+    analysis); it runs on the event loop so critical alerts can be scheduled.
+    Items are split into chunks of ``chunk_size``; while one chunk's Pub/Sub
+    publish is in flight on the executor, the next chunk is being built.  A
+    semaphore caps how many chunks are in flight at once.
+
+    Returns one ``(context, result)`` pair per item, in input order. Items that
+    failed to build have ``context=None``; failures never raise.
+    """
+    concurrency = max(1, concurrency or settings.INGEST_PIPELINE_CONCURRENCY)
+    chunk_size = max(1, chunk_size or settings.INGEST_PIPELINE_CHUNK_SIZE)
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes: List[Optional[Tuple[Optional[StatementContext], Dict[str, Any]]]] = [None] * len(items)
+
+    async def process_chunk(start: int) -> None:
+        async with semaphore:
+            chunk = items[start:start + chunk_size]
+            outcomes[start:start + len(chunk)] = await _build_and_publish_chunk(chunk, build, source=source)
+
+    await asyncio.gather(*(process_chunk(start) for start in range(0, len(items), chunk_size)))
+    return outcomes
+
+
+async def _build_and_publish_chunk(
+    items: Sequence[T],
+    build: Callable[[T], StatementContext],
+    *,
+    source: str,
+) -> List[Tuple[Optional[StatementContext], Dict[str, Any]]]:
+    """Build contexts for one chunk and publish them as a single batch."""
+    outcomes: List[Tuple[Optional[StatementContext], Dict[str, Any]]] = [None] * len(items)
+    built: List[Tuple[int, StatementContext]] = []
+    for index, item in enumerate(items):
+        try:
+            built.append((index, build(item)))
+        except Exception as exc:
+            outcomes[index] = (None, {"success": False, "error": str(exc), "exception": exc})
+        # Let chunks waiting on Pub/Sub resolve between statements
+        await asyncio.sleep(0)
+
+    publish_results = await publish_contexts_async(
+        [context for _, context in built], source=source
+    )
+    for (index, context), publish_result in zip(built, publish_results):
+        outcomes[index] = (context, publish_result)
+    return outcomes
+
+
+async def run_streaming_ingest(
+    batches: AsyncIterator[Sequence[T]],
+    build: Callable[[T], StatementContext],
+    *,
+    source: str,
+    on_batch: Callable[[Sequence[T], List[Tuple[Optional[StatementContext], Dict[str, Any]]]], None],
+    concurrency: Optional[int] = None,
+) -> None:
+    """Feed batches from an async source into the ingest pipeline as they arrive.
+
+    At most ``concurrency`` batches are in flight; pulling the next batch
+    waits for a free slot, so a slow Pub/Sub applies backpressure to the
+    reader (and, for request bodies, to the client upload) instead of
+    buffering. ``on_batch`` is called with each batch and its outcomes as soon
+    as that batch has been published; batches may complete out of order.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency or settings.INGEST_PIPELINE_CONCURRENCY))
+    in_flight: set = set()
+
+    async def process(batch: Sequence[T]) -> None:
+        try:
+            on_batch(batch, await _build_and_publish_chunk(batch, build, source=source))
+        finally:
+            semaphore.release()
+
+    try:
+        async for batch in batches:
+            await semaphore.acquire()
+            task = asyncio.create_task(process(batch))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+    finally:
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+
 @router.post("/api/xapi/ingest", response_model=xAPIIngestionResponse)
-async def ingest_xapi_statement(statement_data: Dict[str, Any]):
+async def ingest_xapi_statement(statement_data: Dict[str, Any], request: Request):
     """Ingest xAPI statement and publish for downstream ETL processing."""
+    enforce_admission(admission_source(request))
     try:
         statement = validate_xapi_statement(statement_data)
         publish_result = await publish_statement_async(statement, source="api_ingest_single")
@@ -283,35 +499,38 @@ async def get_xapi_ingestion_status():
 
 
 @router.post("/api/xapi/ingest/batch")
-async def ingest_xapi_batch(statements: List[Dict[str, Any]]):
+async def ingest_xapi_batch(statements: List[Dict[str, Any]], request: Request):
     """Ingest multiple xAPI statements in batch."""
-    results: List[Dict[str, Any]] = []
-    success_count = 0
-    error_count = 0
+    enforce_admission(admission_source(request), cost=len(statements))
+    outcomes = await run_ingest_pipeline(
+        statements,
+        lambda statement_data: build_statement_context(
+            validate_xapi_statement(statement_data), source="api_ingest_batch"
+        ),
+        source="api_ingest_batch",
+    )
 
-    for index, statement_data in enumerate(statements):
-        try:
-            statement = validate_xapi_statement(statement_data)
-            publish_result = await publish_statement_async(statement, source="api_ingest_batch")
-
-            results.append(
-                {
-                    "index": index,
-                    "success": True,
-                    "statement_id": statement.id,
-                    "message_id": publish_result.get("message_id"),
-                }
-            )
-            success_count += 1
-        except Exception as exc:
-            results.append(
-                {
-                    "index": index,
-                    "success": False,
-                    "error": str(exc),
-                }
-            )
-            error_count += 1
+    results: List[Dict[str, Any]] = []
+    for index, (context, outcome) in enumerate(outcomes):
+        if context is None:
+            results.append({"index": index, "success": False, "error": outcome.get("error")})
+        elif outcome.get("success"):
+            results.append({
+                "index": index,
+                "success": True,
+                "statement_id": context.statement_id,
+                "message_id": outcome.get("message_id"),
+            })
+        else:
+            results.append({
+                "index": index,
+                "success": False,
+                "statement_id": context.statement_id,
+                "error": outcome.get("error"),
+            })
+
+    success_count = sum(1 for result in results if result["success"])
+    error_count = len(results) - success_count
 
     return {
         "batch_results": results,
@@ -323,6 +542,90 @@ async def ingest_xapi_batch(statements: List[Dict[str, Any]]):
     }
 
 
+@router.post("/api/xapi/ingest/stream")
+async def ingest_xapi_stream(request: Request):
+    """Bulk-ingest newline-delimited xAPI statements from a streamed request body.
+
+    Accepts ``application/x-ndjson`` (one statement per line), optionally with
+    ``Content-Encoding: gzip``. The body is parsed incrementally and statements
+    are published in chunks while the upload is still in progress, so memory
+    stays bounded regardless of upload size. Only the first
+    ``MAX_STREAM_ERRORS`` per-line errors are returned.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Expected one of {', '.join(sorted(NDJSON_CONTENT_TYPES))}, got '{content_type or 'none'}'",
+        )
+    gzipped = "gzip" in request.headers.get("content-encoding", "").lower()
+    # The statement count is unknown up front: each batch is admitted before it is published
+    source_key = admission_source(request)
+    enforce_admission(source_key)
+
+    summary = {"total": 0, "successful": 0, "failed": 0}
+    errors: List[Dict[str, Any]] = []
+
+    def build(item: Tuple[int, Any]) -> StatementContext:
+        _, value = item
+        if isinstance(value, Exception):
+            raise value
+        if not isinstance(value, dict):
+            raise ValueError("Each line must be a JSON object")
+        return build_statement_context(validate_xapi_statement(value), source="api_ingest_stream")
+
+    def on_batch(batch, outcomes) -> None:
+        for (line_number, _), (context, outcome) in zip(batch, outcomes):
+            summary["total"] += 1
+            if outcome.get("success"):
+                summary["successful"] += 1
+                continue
+            summary["failed"] += 1
+            if len(errors) < MAX_STREAM_ERRORS:
+                errors.append({
+                    "line": line_number,
+                    "statement_id": context.statement_id if context else None,
+                    "error": outcome.get("error"),
+                })
+
+    try:
+        await run_streaming_ingest(
+            _admitted_batches(
+                iter_ndjson_batches(
+                    request.stream(),
+                    batch_size=settings.INGEST_PIPELINE_CHUNK_SIZE,
+                    gzipped=gzipped,
+                    max_decompressed_bytes=settings.INGEST_STREAM_MAX_DECOMPRESSED_BYTES,
+                ),
+                source_key,
+            ),
+            build,
+            source="api_ingest_stream",
+            on_batch=on_batch,
+        )
+    except zlib.error as exc:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Invalid gzip body", "error": str(exc), "summary": summary},
+        )
+    except _StreamThrottled as exc:
+        # Batches before ``resume_from_line`` were published; the client resends the rest
+        raise _rate_limited(
+            source_key, exc.retry_after, summary=summary, errors=errors, resume_from_line=exc.next_line
+        )
+    except NDJSONBodyTooLarge as exc:
+        raise HTTPException(
+            status_code=413,
+            detail={"message": "Decompressed body too large", "error": str(exc), "summary": summary},
+        )
+
+    return {
+        "summary": summary,
+        "errors": errors,
+        "errors_truncated": summary["failed"] > len(errors),
+    }
+
+
 @router.get("/api/xapi/statements/{statement_id}")
 async def get_statement_status(statement_id: str):
     """Return the most recent publication metadata for a statement id."""
@@ -10,13 +10,13 @@ import json
 import base64
 import logging
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 
-from app.api.xapi import publish_statement_async, validate_xapi_statement
+from app.api.xapi import publish_statements_async, validate_xapi_statement
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -88,7 +88,7 @@ async def post_statements(
         )
     
     try:
-        processed_statements = []
+        validated_statements = []
 
         for statement in statements:
             statement_payload = statement.model_dump()
@@ -101,9 +101,18 @@ async def post_statements(
             if not validated_statement.stored:
                 validated_statement.stored = datetime.now(timezone.utc)
 
-            publish_result = await publish_statement_async(
-                validated_statement, source="xapi_lrs_post"
-            )
+            validated_statements.append(validated_statement)
+
+        publish_results = await publish_statements_async(
+            validated_statements, source="xapi_lrs_post"
+        )
+
+        processed_statements = []
+        for validated_statement, publish_result in zip(validated_statements, publish_results):
+            if not publish_result.get("success"):
+                raise Exception(
+                    f"Failed to publish statement {validated_statement.id}: {publish_result.get('error')}"
+                )
 
             processed_statements.append(
                 {
@@ -117,9 +126,7 @@ async def post_statements(
                 }
             )
 
-            logger.info(
-                "Published xAPI statement %s to Pub/Sub via LRS", validated_statement.id
-            )
+        logger.info(f"Published {len(processed_statements)} xAPI statements to Pub/Sub via LRS")
 
         return {
             "status": "success",
@@ -1,7 +1,7 @@
 import os
 import json
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -65,6 +65,141 @@ class Settings(BaseSettings):
     GCP_PUBSUB_TOPIC: str = "xapi-ingestion-topic"
     GCP_STORAGE_BUCKET: str = "xapi-raw-data"
 
+    # Pub/Sub publisher batching and flow control (ingest path)
+    PUBSUB_BATCH_MAX_MESSAGES: int = 100
+    PUBSUB_BATCH_MAX_BYTES: int = 1024 * 1024
+    PUBSUB_BATCH_MAX_LATENCY: float = 0.01  # seconds
+    PUBSUB_FLOW_CONTROL_MAX_MESSAGES: int = 1000
+    PUBSUB_FLOW_CONTROL_MAX_BYTES: int = 10 * 1024 * 1024
+    PUBSUB_PUBLISH_TIMEOUT: float = 30.0  # seconds per published batch
+
+    # Multi-statement ingest pipeline (batch routes and 7taps bursts)
+    INGEST_PIPELINE_CONCURRENCY: int = 4  # chunks validated/published at once
+    INGEST_PIPELINE_CHUNK_SIZE: int = 50  # statements per published chunk
+    INGEST_STREAM_MAX_DECOMPRESSED_BYTES: int = 1024 * 1024 * 1024  # cap on an inflated gzip upload
+
+    # Statement-id dedup at the ingest edge ("memory" or "redis")
+    INGEST_DEDUP_BACKEND: str = "memory"
+    INGEST_DEDUP_TTL_SECONDS: float = 24 * 60 * 60
+    INGEST_DEDUP_MAX_ENTRIES: int = 100000  # per-process LRU bound
+
+    # Durable local spool used when Pub/Sub is slow or unavailable
+    INGEST_SPOOL_ENABLED: bool = False
+    INGEST_SPOOL_DIR: str = "/tmp/xapi-ingest-spool"
+    INGEST_SPOOL_SEGMENT_MAX_BYTES: int = 16 * 1024 * 1024
+    INGEST_SPOOL_LATENCY_BUDGET: float = 2.0  # seconds before a publish is spooled
+    INGEST_SPOOL_DRAIN_BATCH_SIZE: int = 100
+    INGEST_SPOOL_BACKOFF_MAX: float = 60.0  # seconds between drain retries
+
+    # Per-source admission control on the ingest routes (statements/sec token buckets)
+    INGEST_ADMISSION_ENABLED: bool = True
+    INGEST_ADMISSION_RATE: float = 100.0
+    INGEST_ADMISSION_BURST: float = 1000.0
+    # e.g. {"7taps:importer": {"rate": 20, "burst": 200}, "api:*": {"rate": 50}}
+    INGEST_ADMISSION_SOURCE_LIMITS: Dict[str, Dict[str, float]] = {}
+    INGEST_ADMISSION_LATENCY_TARGET_MS: float = 500.0  # publish latency before shedding
+    INGEST_ADMISSION_MIN_RATE_FRACTION: float = 0.1
+    # Callers are keyed by client address: the X-Forwarded-For entry added by the
+    # last trusted proxy (Cloud Run's front end = 1 hop; 0 = use the socket peer)
+    INGEST_ADMISSION_TRUSTED_PROXY_HOPS: int = 1
+    # X-Ingest-Source values honoured as their own bucket; any other value is ignored
+    INGEST_ADMISSION_DECLARED_SOURCES: List[str] = []
+    INGEST_STREAM_ADMISSION_MAX_WAIT: float = 5.0  # seconds a streamed batch waits for tokens before 429
+
+    # ETL wake-up coalescing
+    ETL_WAKEUP_DEBOUNCE_SECONDS: float = 2.0
+    ETL_WAKEUP_REMOTE_URL: Optional[str] = None  # defaults to CLOUD_RUN_SERVICE_URL
+
+    # Micro-batched BigQuery sink (staging load + one MERGE per flush)
+    BIGQUERY_SINK_BATCH_SIZE: int = 500  # rows per flush
+    BIGQUERY_SINK_MAX_LATENCY: float = 2.0  # seconds a row may wait before a flush
+    BIGQUERY_SINK_STAGING_TTL_HOURS: int = 1  # expiry for staging tables left by a crash
+    BIGQUERY_SINK_LOAD_FORMAT: str = "json"  # staging load format: "json" or "parquet" (pyarrow)
+
+    # Statement-id membership index in front of the sink (Bloom filter + exact LRU)
+    STATEMENT_INDEX_ENABLED: bool = True
+    STATEMENT_INDEX_CAPACITY: int = 10_000_000  # ~12 MB of Bloom bits at 1% error
+    STATEMENT_INDEX_ERROR_RATE: float = 0.01
+    STATEMENT_INDEX_LRU_SIZE: int = 100_000
+
+    # BigQuery processor pipeline (decode -> enrich -> transform -> sink on one event loop)
+    BIGQUERY_PROCESSOR_DECODE_WORKERS: int = 1
+    BIGQUERY_PROCESSOR_ENRICH_WORKERS: int = 16  # concurrent enrichments awaiting cache misses
+    BIGQUERY_PROCESSOR_TRANSFORM_WORKERS: int = 1
+    BIGQUERY_PROCESSOR_SINK_WORKERS: int = 1
+    BIGQUERY_PROCESSOR_QUEUE_SIZE: int = 500  # bounded queue in front of each stage
+    BIGQUERY_PROCESSOR_IO_THREADS: int = 4  # executor for blocking calls made by stages
+    BIGQUERY_PROCESSOR_FLOW_MAX_MESSAGES: int = 0  # 0 = twice BIGQUERY_SINK_BATCH_SIZE
+    BIGQUERY_PROCESSOR_FLOW_MAX_BYTES: int = 100 * 1024 * 1024
+    BIGQUERY_PROCESSOR_FLOW_MAX_LEASE_SECONDS: int = 600
+
+    # AIMD flow control for the BigQuery processor, driven by sink flush latency/errors
+    ETL_ADAPTIVE_FLOW_ENABLED: bool = True
+    ETL_ADAPTIVE_FLOW_MIN_MESSAGES: int = 50  # floor of the in-flight window
+    ETL_ADAPTIVE_FLOW_MIN_BATCH_SIZE: int = 50
+    ETL_ADAPTIVE_FLOW_INCREASE_STEP: int = 50  # additive increase per healthy interval
+    ETL_ADAPTIVE_FLOW_DECREASE_FACTOR: float = 0.5  # multiplicative decrease on degradation
+    ETL_ADAPTIVE_FLOW_LATENCY_TARGET: float = 10.0  # seconds per sink flush
+    ETL_ADAPTIVE_FLOW_ERROR_RATE_TARGET: float = 0.05
+    ETL_ADAPTIVE_FLOW_INTERVAL: float = 5.0  # seconds between adjustments
+    ETL_ACK_EXTENSION_AFTER: float = 30.0  # seconds held before the ack deadline is pushed out
+    ETL_ACK_EXTENSION_SECONDS: int = 60
+
+    # Retry policy shared by the Pub/Sub consumers
+    ETL_RETRY_MIN_BACKOFF: float = 10.0  # seconds before the first redelivery
+    ETL_RETRY_MAX_BACKOFF: float = 600.0  # Pub/Sub maximum
+    ETL_RETRY_MAX_ATTEMPTS: int = 5  # deliveries before a transient failure is dead-lettered
+    ETL_ERROR_LOG_SIZE: int = 100  # recent errors kept per consumer
+    ETL_DEAD_LETTER_BATCH_SIZE: int = 50
+    ETL_DEAD_LETTER_FLUSH_INTERVAL: float = 5.0
+
+    # Unified consumer: one subscription fanned out to pluggable sinks
+    ETL_UNIFIED_CONSUMER_ENABLED: bool = False  # replaces the processor, storage subscriber and migration
+    ETL_UNIFIED_SINKS: str = "statements,dimensions,archive"
+    ETL_UNIFIED_REQUIRED_SINKS: str = "statements,archive"  # the message is acked once these commit
+    ETL_ARCHIVE_UPLOAD_THREADS: int = 8
+
+    # Raw statement archive: rolling NDJSON.gz segments per hour partition
+    ARCHIVE_SEGMENTS_ENABLED: bool = True  # False = one JSON object per statement under xapi-statements/
+    ARCHIVE_SEGMENT_PREFIX: str = "xapi-archive"
+    ARCHIVE_SEGMENT_MAX_BYTES: int = 64 * 1024 * 1024  # uncompressed
+    ARCHIVE_SEGMENT_MAX_RECORDS: int = 10000
+    ARCHIVE_SEGMENT_MAX_AGE: float = 60.0  # seconds before a partial segment is uploaded
+    ARCHIVE_SEGMENT_UPLOAD_THREADS: int = 4
+    ARCHIVE_FLOW_MAX_MESSAGES: int = 0  # 0 = twice ARCHIVE_SEGMENT_MAX_RECORDS
+    ARCHIVE_INDEX_ENABLED: bool = True  # per-day counts in one object instead of listing the bucket
+    ARCHIVE_INDEX_OBJECT: str = "xapi-archive/_index.json"
+    ARCHIVE_INDEX_FLUSH_INTERVAL: float = 30.0  # seconds between index writes
+    ARCHIVE_INDEX_CACHE_TTL: float = 10.0
+    ARCHIVE_INDEX_RECONCILE_INTERVAL: float = 6 * 3600.0  # full listing to correct drift; 0 = off
+    PARQUET_ARCHIVE_ENABLED: bool = True  # also write archived statements as Parquet (needs pyarrow)
+    PARQUET_ARCHIVE_PREFIX: str = "xapi-parquet"
+    PARQUET_ARCHIVE_MAX_RECORDS: int = 50000  # rows per Parquet file
+    PARQUET_ARCHIVE_MAX_AGE: float = 300.0  # seconds before a partial file is written
+    PARQUET_ARCHIVE_ROW_GROUP_SIZE: int = 10000
+
+    # Process layout: "all" runs the pipelines inside the web process, "api" leaves
+    # them to `python -m app.workers.supervisor`
+    APP_RUN_MODE: str = "all"
+    WORKER_COMPONENTS: str = ""  # comma-separated; empty = what "all" mode would start
+    WORKER_HEALTH_BACKEND: str = "file"  # "file" or "redis"
+    WORKER_HEALTH_DIR: str = "/tmp/7taps-workers"
+    WORKER_HEARTBEAT_INTERVAL: float = 10.0
+    WORKER_HEALTH_STALE_AFTER: float = 60.0  # seconds without a report before a worker is unhealthy
+    WORKER_RESTART_BACKOFF: float = 1.0  # doubles per crash, reset after a stable run
+    WORKER_MAX_RESTART_BACKOFF: float = 60.0
+
+    # User profile cache and buffered activity updates for statement normalization
+    USER_CACHE_BACKEND: str = "memory"  # "memory" or "redis"
+    USER_CACHE_TTL_SECONDS: float = 15 * 60  # bounds staleness after another instance's CSV import
+    USER_CACHE_MAX_ENTRIES: int = 50000  # per-process LRU bound
+    USER_ACTIVITY_FLUSH_INTERVAL: float = 5.0  # seconds between activity MERGEs
+    USER_ACTIVITY_MAX_PENDING: int = 5000  # distinct users buffered before an early flush
+
+    # AI safety consumer (full analysis runs off the ingest path)
+    SAFETY_CONSUMER_MAX_MESSAGES: int = 10  # concurrent analyses per instance
+    SAFETY_ANALYSIS_TIMEOUT: float = 120.0  # seconds per statement
+
     # Port Configuration (use PORT env var for Cloud Run)
     APP_PORT: int = int(os.getenv("PORT", "8000"))
     REDIS_PORT: int = 6379
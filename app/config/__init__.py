@@ -19,6 +19,7 @@ get_lesson_url = config_module.get_lesson_url
 get_lesson_name = config_module.get_lesson_name
 get_lesson_by_url = config_module.get_lesson_by_url
 get_lesson_by_number = config_module.get_lesson_by_number
+get_redis_url = config_module.get_redis_url
 
 # Create instances for easier access (lazy-loaded)
 _gcp_config = None
@@ -46,5 +47,5 @@ __all__ = [
     'GCPConfig', 'BigQuerySchema', 'gcp_config', 'bigquery_schema', 
     'get_gcp_config', 'get_bigquery_schema_instance', 'settings',
     'get_extension_key', 'get_lesson_url', 'get_lesson_name',
-    'get_lesson_by_url', 'get_lesson_by_number'
+    'get_lesson_by_url', 'get_lesson_by_number', 'get_redis_url'
 ]
@@ -0,0 +1,89 @@
+"""
+Declared partitioning and clustering for the BigQuery tables.
+
+``BigQuerySchema.create_table_if_not_exists`` applies these layouts to new
+tables, and ``app.etl.bigquery_layout_manager`` compares them with live
+tables and migrates the ones that drifted.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from google.cloud import bigquery
+
+
+@dataclass
+class TableLayout:
+    """Partitioning, clustering and partition-filter policy for one table."""
+    partition_field: Optional[str] = None  # TIMESTAMP/DATE column; None = unpartitioned
+    partition_type: str = "DAY"
+    clustering: List[str] = field(default_factory=list)  # at most 4 columns, most selective first
+    require_partition_filter: bool = False
+
+    def apply(self, table: bigquery.Table) -> bigquery.Table:
+        """Set this layout's options on a table that is about to be created."""
+        if self.partition_field:
+            table.time_partitioning = bigquery.TimePartitioning(
+                type_=self.partition_type, field=self.partition_field
+            )
+            table.require_partition_filter = self.require_partition_filter
+        table.clustering_fields = list(self.clustering) or None
+        return table
+
+    @classmethod
+    def from_table(cls, table: bigquery.Table) -> "TableLayout":
+        """The layout a live table actually has."""
+        partitioning = table.time_partitioning
+        return cls(
+            partition_field=partitioning.field if partitioning else None,
+            partition_type=partitioning.type_ if partitioning else "DAY",
+            clustering=list(table.clustering_fields or []),
+            require_partition_filter=bool(table.require_partition_filter),
+        )
+
+    def ddl_options(self) -> str:
+        """``PARTITION BY ... CLUSTER BY ... OPTIONS(...)`` for a CREATE TABLE statement."""
+        clauses = []
+        if self.partition_field:
+            unit = self.partition_type.upper()
+            clauses.append(
+                f"PARTITION BY DATE({self.partition_field})" if unit == "DAY"
+                else f"PARTITION BY TIMESTAMP_TRUNC({self.partition_field}, {unit})"
+            )
+        if self.clustering:
+            clauses.append(f"CLUSTER BY {', '.join(self.clustering)}")
+        if self.partition_field:
+            clauses.append(f"OPTIONS(require_partition_filter={'TRUE' if self.require_partition_filter else 'FALSE'})")
+        return "\n".join(clauses)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "partition_field": self.partition_field,
+            "partition_type": self.partition_type,
+            "clustering": list(self.clustering),
+            "require_partition_filter": self.require_partition_filter,
+        }
+
+
+# Dashboards filter statements by day, then by learner, verb or lesson.
+# require_partition_filter stays off where existing queries (feed totals,
+# user matching, cohort sync) still read the table without a date filter.
+TABLE_LAYOUTS: Dict[str, TableLayout] = {
+    "statements": TableLayout(
+        partition_field="timestamp",
+        clustering=["actor_id", "verb_id", "object_id", "normalized_user_id"],
+    ),
+    "actors": TableLayout(partition_field="first_seen", clustering=["actor_id"]),
+    "verbs": TableLayout(partition_field="first_seen", clustering=["verb_id"]),
+    "activities": TableLayout(partition_field="first_seen", clustering=["activity_id"]),
+    "flagged_content": TableLayout(partition_field="flagged_at", clustering=["severity", "actor_id"]),
+    "positive_language": TableLayout(partition_field="detected_at", clustering=["actor_id"]),
+    # Small lookup tables: no time column worth partitioning on
+    "alert_emails": TableLayout(clustering=["email"]),
+    "gmail_oauth_tokens": TableLayout(clustering=["email"]),
+}
+
+
+def get_table_layout(table_name: str) -> TableLayout:
+    """Declared layout for ``table_name`` (unpartitioned and unclustered when undeclared)."""
+    return TABLE_LAYOUTS.get(table_name, TableLayout())
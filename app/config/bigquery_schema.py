@@ -5,6 +5,7 @@ Defines tables for actors, verbs, objects, contexts, and results.
 
 from google.cloud import bigquery
 from typing import List, Dict, Any
+from app.config.bigquery_layout import get_table_layout
 from app.config.gcp_config import gcp_config
 
 
@@ -16,7 +17,8 @@ class BigQuerySchema:
         self.project_id = gcp_config.project_id
         self.client = gcp_config.bigquery_client
 
-    def get_statements_table_schema(self) -> List[bigquery.SchemaField]:
+    @staticmethod
+    def get_statements_table_schema() -> List[bigquery.SchemaField]:
         """Schema for the main statements table."""
         return [
             bigquery.SchemaField("statement_id", "STRING", mode="REQUIRED",
@@ -71,6 +73,8 @@ class BigQuerySchema:
                                description="Language of the context"),
             bigquery.SchemaField("raw_json", "STRING", mode="NULLABLE",
                                description="Complete raw xAPI statement as JSON"),
+            bigquery.SchemaField("normalized_user_id", "STRING", mode="NULLABLE",
+                               description="Matched user id from user normalization"),
         ]
 
     def get_actors_table_schema(self) -> List[bigquery.SchemaField]:
@@ -296,16 +300,8 @@ class BigQuerySchema:
             table_ref = self.client.dataset(self.dataset_id).table(table_name)
             table = bigquery.Table(table_ref, schema=schema)
 
-            # Set table options
-            table.time_partitioning = bigquery.TimePartitioning(
-                type_=bigquery.TimePartitioningType.DAY,
-                field=(
-                    "timestamp" if table_name == "statements" 
-                    else "flagged_at" if table_name == "flagged_content"
-                    else "detected_at" if table_name == "positive_language"
-                    else "first_seen"
-                )
-            )
+            # Partitioning and clustering come from the declared layout
+            get_table_layout(table_name).apply(table)
 
             try:
                 self.client.get_table(table_ref)
@@ -0,0 +1,207 @@
+"""
+AIMD flow control for the BigQuery processor.
+
+Pub/Sub's ``FlowControl`` is fixed for the life of a streaming pull, so it is
+used as the ceiling and this controller enforces an adaptive window beneath
+it: the subscriber callback ``acquire``s a slot before a message enters the
+pipeline and ``release``s it once the message is acked or nacked.
+
+Every ``interval`` seconds the controller looks at the sink flushes observed
+since the last adjustment:
+
+* slowest flush above ``latency_target`` or error rate above
+  ``error_rate_target`` -> multiply the message window (and, on errors, the
+  sink batch size) by ``decrease_factor``;
+* otherwise, if anything flushed -> add ``increase_step`` messages (and grow
+  the batch size back by the same step) up to the ceilings.
+
+The byte window scales with the message window.  During a BigQuery brownout
+the number of leased, uncommitted messages therefore shrinks quickly, and
+recovery ramps back linearly instead of releasing the whole backlog at once.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger("adaptive_flow_control")
+
+
+@dataclass
+class AdaptiveFlowConfig:
+    """Bounds and gains for the AIMD controller."""
+    max_messages: int = 1000  # ceiling, normally the subscriber FlowControl limit
+    max_bytes: int = 100 * 1024 * 1024
+    min_messages: int = 50
+    max_batch_size: int = 500
+    min_batch_size: int = 50
+    increase_step: int = 50
+    decrease_factor: float = 0.5
+    latency_target: float = 10.0  # seconds per sink flush
+    error_rate_target: float = 0.05  # failed flushes / flushes
+    interval: float = 5.0  # seconds between adjustments
+
+    @classmethod
+    def from_settings(cls, max_messages: int, max_bytes: int, max_batch_size: int) -> "AdaptiveFlowConfig":
+        return cls(
+            max_messages=max_messages,
+            max_bytes=max_bytes,
+            min_messages=min(settings.ETL_ADAPTIVE_FLOW_MIN_MESSAGES, max_messages),
+            max_batch_size=max_batch_size,
+            min_batch_size=min(settings.ETL_ADAPTIVE_FLOW_MIN_BATCH_SIZE, max_batch_size),
+            increase_step=settings.ETL_ADAPTIVE_FLOW_INCREASE_STEP,
+            decrease_factor=settings.ETL_ADAPTIVE_FLOW_DECREASE_FACTOR,
+            latency_target=settings.ETL_ADAPTIVE_FLOW_LATENCY_TARGET,
+            error_rate_target=settings.ETL_ADAPTIVE_FLOW_ERROR_RATE_TARGET,
+            interval=settings.ETL_ADAPTIVE_FLOW_INTERVAL,
+        )
+
+
+class AdaptiveFlowController:
+    """Adaptive in-flight message window plus sink batch size."""
+
+    def __init__(self, config: AdaptiveFlowConfig, clock=time.monotonic):
+        self.config = config
+        self._clock = clock
+        self._condition = threading.Condition()
+
+        self.window = config.max_messages
+        self.batch_size = config.max_batch_size
+        self.in_flight = 0
+        self.in_flight_bytes = 0
+
+        # Flushes observed since the last adjustment
+        self._flushes = 0
+        self._failures = 0
+        self._max_latency = 0.0
+
+        self.metrics = {
+            "increases": 0,
+            "decreases": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "last_decision": None,
+            "last_adjusted": None,
+        }
+
+    @property
+    def byte_window(self) -> int:
+        return max(1, int(self.config.max_bytes * self.window / self.config.max_messages))
+
+    def fit(self, floor: int, ceiling: int, floor_bytes: int = 0) -> None:
+        """Keep the window at ``floor`` messages or more and raise the ceiling to ``ceiling``.
+
+        For sinks that ack in groups, such as archive segments: a window
+        smaller than one group fills up and then waits for the group's age
+        roll on every cycle.  The byte ceiling grows with the message
+        ceiling, and at the floor the byte window still fits ``floor_bytes``.
+        """
+        with self._condition:
+            ceiling = max(ceiling, floor)
+            if ceiling > self.config.max_messages:
+                at_ceiling = self.window >= self.config.max_messages
+                self.config.max_bytes = int(self.config.max_bytes * ceiling / self.config.max_messages)
+                self.config.max_messages = ceiling
+                if at_ceiling:
+                    self.window = ceiling
+            if floor_bytes:
+                self.config.max_bytes = max(
+                    self.config.max_bytes, -(-floor_bytes * self.config.max_messages // floor)
+                )
+            self.config.min_messages = max(self.config.min_messages, floor)
+            self.window = max(self.window, self.config.min_messages)
+            self._condition.notify_all()
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    def _has_room(self, size: int) -> bool:
+        if self.in_flight == 0:
+            return True  # always admit one message, however large
+        return self.in_flight < self.window and self.in_flight_bytes + size <= self.byte_window
+
+    def acquire(self, size: int = 0, timeout: Optional[float] = None) -> bool:
+        """Block until the message fits in the window; ``False`` on timeout."""
+        with self._condition:
+            if not self._has_room(size):
+                self.metrics["waits"] += 1
+                started = self._clock()
+                admitted = self._condition.wait_for(lambda: self._has_room(size), timeout)
+                self.metrics["wait_seconds"] += self._clock() - started
+                if not admitted:
+                    return False
+            self.in_flight += 1
+            self.in_flight_bytes += size
+            return True
+
+    def release(self, size: int = 0) -> None:
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.in_flight_bytes = max(0, self.in_flight_bytes - size)
+            self._condition.notify_all()
+
+    # ------------------------------------------------------------------
+    # Feedback
+    # ------------------------------------------------------------------
+
+    def observe_flush(self, duration: float, rows: int, committed: bool) -> None:
+        """Record one sink flush attempt (hooked up as the sink's ``on_flush``)."""
+        with self._condition:
+            self._flushes += 1
+            if not committed:
+                self._failures += 1
+            self._max_latency = max(self._max_latency, duration)
+
+    def adjust(self) -> str:
+        """Apply one AIMD step from the flushes seen since the last call."""
+        with self._condition:
+            flushes, failures, max_latency = self._flushes, self._failures, self._max_latency
+            self._flushes = self._failures = 0
+            self._max_latency = 0.0
+
+            error_rate = failures / flushes if flushes else 0.0
+            if error_rate > self.config.error_rate_target or max_latency > self.config.latency_target:
+                decision = "decrease"
+                self.window = max(self.config.min_messages, int(self.window * self.config.decrease_factor))
+                if failures:
+                    self.batch_size = max(
+                        self.config.min_batch_size, int(self.batch_size * self.config.decrease_factor)
+                    )
+                self.metrics["decreases"] += 1
+            elif flushes:
+                decision = "increase"
+                self.window = min(self.config.max_messages, self.window + self.config.increase_step)
+                self.batch_size = min(self.config.max_batch_size, self.batch_size + self.config.increase_step)
+                self.metrics["increases"] += 1
+            else:
+                decision = "hold"
+            self.metrics["last_decision"] = decision
+            self.metrics["last_adjusted"] = self._clock()
+            # A larger window may admit waiting callbacks
+            self._condition.notify_all()
+
+        if decision == "decrease":
+            logger.warning(
+                f"Sink degraded (max flush {max_latency:.1f}s, error rate {error_rate:.0%}); "
+                f"window -> {self.window} messages, batch size -> {self.batch_size}"
+            )
+        return decision
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "byte_window": self.byte_window,
+            "batch_size": self.batch_size,
+            "in_flight": self.in_flight,
+            "in_flight_bytes": self.in_flight_bytes,
+            "max_messages": self.config.max_messages,
+            "min_messages": self.config.min_messages,
+            "latency_target": self.config.latency_target,
+            "error_rate_target": self.config.error_rate_target,
+            "metrics": dict(self.metrics),
+        }
@@ -0,0 +1,392 @@
+"""
+Incrementally maintained index of the raw statement archive.
+
+Listing the bucket to answer "how much is archived" costs time linear in
+the archive.  Instead the archive writers record each upload here (objects,
+bytes, statements, first/last publish time per UTC day), and the totals live
+in one small JSON object next to the archive::
+
+    xapi-archive/_index.json
+    {"version": 1, "updated_at": ..., "reconciled_at": ...,
+     "days": {"2025-01-01": {"objects": 12, "bytes": 3145728, "records": 52000,
+                             "first_at": "...", "last_at": "..."}}}
+
+Deltas are buffered in memory and merged into the object every
+``flush_interval`` seconds with a generation precondition, so concurrent
+writers on several instances never overwrite each other's counts.  Reads
+cost one GET (cached for ``cache_ttl`` seconds) regardless of archive size.
+
+A background reconcile (every ``reconcile_interval``, or
+``python -m app.etl.archive_index reconcile``) lists the archive and
+replaces the entries of completed days, correcting drift from writers that
+died before flushing.  The current day is left to the live deltas unless
+``include_today`` is set.  The interval runs from the index's stored
+``reconciled_at``, so restarts do not postpone it, and an index that was
+never reconciled (or does not exist yet) is reconciled as soon as the
+background thread starts.
+"""
+
+import argparse
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.api_core import exceptions as gcp_exceptions
+
+from app.config import settings
+from app.etl.archive_segments import LEGACY_PREFIX, SEGMENT_SUFFIX, legacy_published_at
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("archive_index")
+
+INDEX_VERSION = 1
+
+
+@dataclass
+class ArchiveIndexConfig:
+    """Where the index lives and how often it is flushed and reconciled."""
+    index_object: str = "xapi-archive/_index.json"
+    segment_prefix: str = "xapi-archive"
+    flush_interval: float = 30.0  # seconds between merges of buffered deltas
+    cache_ttl: float = 10.0  # seconds a read of the index is reused
+    reconcile_interval: float = 6 * 3600.0  # 0 disables the background reconcile
+    write_attempts: int = 5
+
+    @classmethod
+    def from_settings(cls) -> "ArchiveIndexConfig":
+        return cls(
+            index_object=settings.ARCHIVE_INDEX_OBJECT,
+            segment_prefix=settings.ARCHIVE_SEGMENT_PREFIX,
+            flush_interval=settings.ARCHIVE_INDEX_FLUSH_INTERVAL,
+            cache_ttl=settings.ARCHIVE_INDEX_CACHE_TTL,
+            reconcile_interval=settings.ARCHIVE_INDEX_RECONCILE_INTERVAL,
+        )
+
+
+def _empty_day() -> Dict[str, Any]:
+    return {"objects": 0, "bytes": 0, "records": 0, "first_at": None, "last_at": None}
+
+
+def _merge_day(day: Dict[str, Any], delta: Dict[str, Any]) -> None:
+    for key in ("objects", "bytes", "records"):
+        day[key] = day.get(key, 0) + delta[key]
+    if delta["first_at"] and (not day.get("first_at") or delta["first_at"] < day["first_at"]):
+        day["first_at"] = delta["first_at"]
+    if delta["last_at"] and (not day.get("last_at") or delta["last_at"] > day["last_at"]):
+        day["last_at"] = delta["last_at"]
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+class ArchiveIndex:
+    """Per-day archive counters kept in one JSON object, updated with optimistic concurrency."""
+
+    def __init__(self, bucket, config: Optional[ArchiveIndexConfig] = None):
+        self.bucket = bucket
+        self.config = config or ArchiveIndexConfig.from_settings()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flushing: Dict[str, Dict[str, Any]] = {}  # taken by an in-progress flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._cached: Optional[Dict[str, Any]] = None
+        self._cached_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_reconcile: Optional[float] = None  # monotonic time; None until read from the index
+
+        self.metrics = {
+            "deltas_recorded": 0,
+            "flushes": 0,
+            "flush_conflicts": 0,
+            "flush_failures": 0,
+            "reconciles": 0,
+            "last_flush_time": None,
+            "last_reconcile_time": None,
+        }
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def record(
+        self,
+        first_at: datetime,
+        last_at: Optional[datetime] = None,
+        objects: int = 1,
+        size: int = 0,
+        records: int = 1,
+    ) -> None:
+        """Count an uploaded archive object under the UTC day of ``first_at``."""
+        first, last = _iso(first_at), _iso(last_at or first_at)
+        day = first[:10]
+        with self._lock:
+            _merge_day(
+                self._pending.setdefault(day, _empty_day()),
+                {"objects": objects, "bytes": size, "records": records, "first_at": first, "last_at": last},
+            )
+            self.metrics["deltas_recorded"] += 1
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _load(self) -> Tuple[Dict[str, Any], int]:
+        """Stored index and its generation (0 when it does not exist yet)."""
+        blob = self.bucket.get_blob(self.config.index_object)
+        if blob is None:
+            return {"version": INDEX_VERSION, "days": {}}, 0
+        generation = blob.generation
+        try:
+            data = blob.download_as_bytes(if_generation_match=generation)
+        except gcp_exceptions.NotFound:
+            return {"version": INDEX_VERSION, "days": {}}, 0
+        index = json_codec.loads(data)
+        index.setdefault("days", {})
+        return index, generation
+
+    def _store(self, index: Dict[str, Any], generation: int) -> None:
+        index["version"] = INDEX_VERSION
+        index["updated_at"] = datetime.now(timezone.utc).isoformat()
+        self.bucket.blob(self.config.index_object).upload_from_string(
+            json_codec.dumps(index), content_type="application/json", if_generation_match=generation
+        )
+        with self._lock:
+            self._cached = index
+            self._cached_at = time.monotonic()
+
+    def _update(self, change) -> bool:
+        """Read-modify-write the index, retrying on generation conflicts."""
+        for attempt in range(1, self.config.write_attempts + 1):
+            try:
+                index, generation = self._load()
+                change(index)
+                self._store(index, generation)
+                return True
+            except gcp_exceptions.PreconditionFailed:
+                self.metrics["flush_conflicts"] += 1
+                time.sleep(min(1.0, 0.05 * (2 ** attempt)))
+        return False
+
+    def flush(self) -> bool:
+        """Merge buffered deltas into the stored index; on failure they stay buffered."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushing = pending
+            if not pending:
+                return True
+
+            def apply(index: Dict[str, Any]) -> None:
+                for day, delta in pending.items():
+                    _merge_day(index["days"].setdefault(day, _empty_day()), delta)
+
+            try:
+                stored = self._update(apply)
+            except Exception as e:
+                logger.warning(f"Archive index flush failed: {e}")
+                stored = False
+            with self._lock:
+                self._flushing = {}
+                if not stored:
+                    for day, delta in pending.items():
+                        _merge_day(self._pending.setdefault(day, _empty_day()), delta)
+            if not stored:
+                self.metrics["flush_failures"] += 1
+                return False
+            self.metrics["flushes"] += 1
+            self.metrics["last_flush_time"] = datetime.now(timezone.utc).isoformat()
+            return True
+
+    def read(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """The stored index plus this process's unflushed deltas."""
+        max_age = self.config.cache_ttl if max_age is None else max_age
+        with self._lock:
+            cached = self._cached if time.monotonic() - self._cached_at <= max_age else None
+        if cached is None:
+            cached, _ = self._load()
+            with self._lock:
+                self._cached = cached
+                self._cached_at = time.monotonic()
+        days = {day: dict(entry) for day, entry in cached.get("days", {}).items()}
+        with self._lock:
+            for delta_days in (self._flushing, self._pending):
+                for day, delta in delta_days.items():
+                    _merge_day(days.setdefault(day, _empty_day()), delta)
+        return {**cached, "days": days}
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals and per-day entries, newest day first."""
+        index = self.read()
+        days = dict(sorted(index["days"].items(), reverse=True))
+        firsts = [entry["first_at"] for entry in days.values() if entry.get("first_at")]
+        lasts = [entry["last_at"] for entry in days.values() if entry.get("last_at")]
+        return {
+            "total_objects": sum(entry["objects"] for entry in days.values()),
+            "total_size_bytes": sum(entry["bytes"] for entry in days.values()),
+            "total_statements": sum(entry["records"] for entry in days.values()),
+            "first_at": min(firsts) if firsts else None,
+            "last_at": max(lasts) if lasts else None,
+            "days": days,
+            "updated_at": index.get("updated_at"),
+            "reconciled_at": index.get("reconciled_at"),
+        }
+
+    # ------------------------------------------------------------------
+    # Reconciliation
+    # ------------------------------------------------------------------
+
+    def scan(self) -> Dict[str, Dict[str, Any]]:
+        """Per-day entries rebuilt from a full listing (legacy objects and segments)."""
+        days: Dict[str, Dict[str, Any]] = {}
+        for blob in self.bucket.list_blobs(prefix=LEGACY_PREFIX):
+            published_at = legacy_published_at(blob.name)
+            if published_at is None or not blob.name.endswith(".json"):
+                continue
+            at = published_at.isoformat()
+            _merge_day(
+                days.setdefault(at[:10], _empty_day()),
+                {"objects": 1, "bytes": blob.size or 0, "records": 1, "first_at": at, "last_at": at},
+            )
+        for blob in self.bucket.list_blobs(prefix=f"{self.config.segment_prefix}/"):
+            if not blob.name.endswith(SEGMENT_SUFFIX):
+                continue
+            # Segment metadata carries the manifest's counts, so no manifest reads are needed
+            metadata = blob.metadata or {}
+            partition = blob.name[len(self.config.segment_prefix) + 1:].split("/", 1)[0]
+            day = partition[len("dt="):] if partition.startswith("dt=") else None
+            if not day:
+                continue
+            _merge_day(
+                days.setdefault(day, _empty_day()),
+                {
+                    "objects": 1,
+                    "bytes": blob.size or 0,
+                    "records": int(metadata.get("records", 0)),
+                    "first_at": metadata.get("min_published_at"),
+                    "last_at": metadata.get("max_published_at"),
+                },
+            )
+        return days
+
+    def reconcile(self, include_today: bool = False) -> Dict[str, Any]:
+        """Replace completed days (and today with ``include_today``) with a fresh listing."""
+        scanned = self.scan()
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+        def apply(index: Dict[str, Any]) -> None:
+            days = index["days"]
+            for day in list(days):
+                if day < today or include_today:
+                    days.pop(day)
+            for day, entry in scanned.items():
+                if day < today or include_today:
+                    days[day] = entry
+            index["reconciled_at"] = datetime.now(timezone.utc).isoformat()
+
+        if not self._update(apply):
+            raise RuntimeError("Archive index reconcile lost every write race")
+        self.metrics["reconciles"] += 1
+        self.metrics["last_reconcile_time"] = datetime.now(timezone.utc).isoformat()
+        records = sum(entry["records"] for entry in scanned.values())
+        logger.info(f"Reconciled archive index: {len(scanned)} day(s), {records} statement(s)")
+        return scanned
+
+    # ------------------------------------------------------------------
+    # Background maintenance
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Flush deltas every ``flush_interval`` and reconcile every ``reconcile_interval``."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="archive-index", daemon=True)
+        self._thread.start()
+
+    def _reconcile_due(self) -> bool:
+        """True when the index was never reconciled, or not within ``reconcile_interval``."""
+        interval = self.config.reconcile_interval
+        if self._last_reconcile is None:
+            index, _ = self._load()
+            reconciled_at = index.get("reconciled_at")
+            if not reconciled_at:
+                return True
+            age = (datetime.now(timezone.utc) - datetime.fromisoformat(reconciled_at)).total_seconds()
+            self._last_reconcile = time.monotonic() - max(age, 0.0)
+        return bool(interval) and time.monotonic() - self._last_reconcile >= interval
+
+    def _reconcile_if_due(self) -> None:
+        try:
+            if not self._reconcile_due():
+                return
+            self._last_reconcile = time.monotonic()
+            self.reconcile()
+        except Exception as e:
+            logger.error(f"Archive index reconcile failed: {e}")
+
+    def _run(self) -> None:
+        self._reconcile_if_due()
+        while not self._stop.wait(self.config.flush_interval):
+            self.flush()
+            self._reconcile_if_due()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = sum(delta["objects"] for delta in self._pending.values())
+        return {"index_object": self.config.index_object, "pending_objects": pending, "metrics": dict(self.metrics)}
+
+
+# Global index instance (lazy-loaded)
+_archive_index: Optional[ArchiveIndex] = None
+_archive_index_lock = threading.Lock()
+
+
+def get_archive_index() -> Optional[ArchiveIndex]:
+    """Index for the configured storage bucket, or None when ``ARCHIVE_INDEX_ENABLED`` is off."""
+    global _archive_index
+    if not settings.ARCHIVE_INDEX_ENABLED:
+        return None
+    if _archive_index is None:
+        with _archive_index_lock:
+            if _archive_index is None:
+                from app.config.gcp_config import get_gcp_config
+
+                gcp_config = get_gcp_config()
+                _archive_index = ArchiveIndex(gcp_config.storage_client.bucket(gcp_config.storage_bucket))
+    return _archive_index
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Archive index maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    reconcile = commands.add_parser("reconcile", help="rebuild day entries from a full listing")
+    reconcile.add_argument("--include-today", action="store_true")
+    commands.add_parser("show", help="print the index summary")
+    args = parser.parse_args(argv)
+
+    index = get_archive_index()
+    if index is None:
+        parser.error("ARCHIVE_INDEX_ENABLED is off")
+    if args.command == "reconcile":
+        index.reconcile(include_today=args.include_today)
+    print(json_codec.dumps(index.summary(), indent=True))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,443 @@
+"""
+Parallel replay of the Cloud Storage archive into BigQuery.
+
+Rebuilds ``statements`` (or a new table after a schema change) from the raw
+archive without going back through Pub/Sub:
+
+1. the date range is split into hour partitions: the segments under
+   ``xapi-archive/dt=YYYY-MM-DD/hour=HH/`` plus the legacy
+   ``xapi-statements/`` objects published in that hour,
+2. each partition's objects are downloaded and decoded on a bounded thread
+   pool, and its statements go through the columnar transform that mirrors
+   ``PubSubBigQueryProcessor.transform_xapi_to_bigquery_row``,
+3. the rows are bulk-loaded into a staging table with one load job and
+   merged into the target with the sink's ``MERGE`` (insert statement ids
+   not already present), so replaying a partition twice inserts nothing
+   new.
+
+Partitions are staged concurrently but merged one at a time, so two
+partitions holding the same statement id cannot both insert it.  Every
+merged partition is written to a checkpoint file; an interrupted replay
+re-run with the same checkpoint skips them.
+
+``--source-dir`` replays from a local directory laid out like the bucket
+(e.g. ``gsutil -m cp -r gs://<bucket>/xapi-archive .``), and ``--dry-run``
+reads and transforms without touching BigQuery::
+
+    python -m app.etl.archive_replay --start 2025-01-01 --end 2025-01-07
+    python -m app.etl.archive_replay --start 2025-01-01 --source-dir ./archive --dry-run
+"""
+
+import argparse
+import gzip
+import io
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from google.cloud import bigquery
+
+from app.etl import columnar_transform
+from app.etl.archive_segments import LEGACY_PREFIX, SEGMENT_SUFFIX, ArchiveSegmentConfig, legacy_published_at
+from app.etl.bigquery_batch_sink import STATEMENT_COLUMNS, build_merge_query, staging_row
+from app.etl.pubsub_bigquery_processor import PubSubBigQueryProcessor
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("archive_replay")
+
+STAGING_SCHEMA = [bigquery.SchemaField(name, column_type) for name, column_type in STATEMENT_COLUMNS]
+
+
+@dataclass
+class ReplayConfig:
+    """Concurrency and load settings for an archive replay."""
+    table_id: str = "statements"
+    read_threads: int = 16  # concurrent object downloads across all partitions
+    partition_threads: int = 4  # partitions decoded and staged at once
+    load_format: str = "parquet"  # "parquet" (needs pyarrow) or "json"
+    partition_attempts: int = 3
+    staging_ttl_hours: int = 1
+
+
+# ----------------------------------------------------------------------
+# Sources
+# ----------------------------------------------------------------------
+
+
+class DirectoryBlob:
+    """Read-only stand-in for a GCS blob backed by a local file."""
+
+    def __init__(self, root: str, name: str):
+        self.name = name
+        self.path = os.path.join(root, name)
+        self.size = os.path.getsize(self.path)
+        self.metadata = None
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        with open(self.path, "rb") as handle:
+            return handle.read()
+
+    def open(self, mode: str = "rb", **kwargs):
+        return open(self.path, mode)
+
+
+class DirectoryBucket:
+    """A local directory laid out like the archive bucket, for offline replays."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.name = f"file://{self.root}"
+
+    def list_blobs(self, prefix: str = "", **kwargs) -> List[DirectoryBlob]:
+        base = os.path.join(self.root, os.path.dirname(prefix))
+        blobs = []
+        for directory, _, files in os.walk(base):
+            for filename in files:
+                name = os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    blobs.append(DirectoryBlob(self.root, name))
+        return sorted(blobs, key=lambda blob: blob.name)
+
+
+@dataclass
+class ArchivePartition:
+    """One hour of the archive: its segments and legacy objects."""
+    key: str  # "YYYY-MM-DDTHH"
+    blobs: List[Any] = field(default_factory=list)
+
+    @property
+    def bytes(self) -> int:
+        return sum(blob.size or 0 for blob in self.blobs)
+
+
+def _days(start_day: str, end_day: Optional[str]) -> List[str]:
+    start = date.fromisoformat(start_day)
+    end = date.fromisoformat(end_day or start_day)
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+
+def list_partitions(
+    bucket,
+    start_day: str,
+    end_day: Optional[str] = None,
+    segment_config: Optional[ArchiveSegmentConfig] = None,
+) -> List[ArchivePartition]:
+    """Hour partitions with archived objects between ``start_day`` and ``end_day`` (inclusive)."""
+    segment_config = segment_config or ArchiveSegmentConfig.from_settings()
+    partitions: Dict[str, ArchivePartition] = {}
+    for day in _days(start_day, end_day):
+        for blob in bucket.list_blobs(prefix=f"{segment_config.prefix}/dt={day}/"):
+            if not blob.name.endswith(SEGMENT_SUFFIX):
+                continue
+            hour = blob.name[len(segment_config.prefix) + 1:].split("/")[1][len("hour="):]
+            key = f"{day}T{hour}"
+            partitions.setdefault(key, ArchivePartition(key)).blobs.append(blob)
+        for blob in bucket.list_blobs(prefix=LEGACY_PREFIX + day.replace("-", "/") + "/"):
+            published_at = legacy_published_at(blob.name)
+            if published_at is None or not blob.name.endswith(".json"):
+                continue
+            key = f"{published_at:%Y-%m-%dT%H}"
+            partitions.setdefault(key, ArchivePartition(key)).blobs.append(blob)
+    return [partitions[key] for key in sorted(partitions)]
+
+
+def read_object(blob) -> List[Dict[str, Any]]:
+    """Statements in one archive object (a segment or a legacy per-statement object)."""
+    data = blob.download_as_bytes()
+    if blob.name.endswith(SEGMENT_SUFFIX):
+        return [json_codec.loads(line) for line in gzip.decompress(data).splitlines() if line]
+    statement = json_codec.loads(data)
+    return [statement] if isinstance(statement, dict) else []
+
+
+# ----------------------------------------------------------------------
+# Replay
+# ----------------------------------------------------------------------
+
+
+class ArchiveReplay:
+    """Replays archive partitions into a BigQuery table with staged, idempotent MERGEs."""
+
+    def __init__(
+        self,
+        bucket,
+        client: Optional[bigquery.Client],
+        dataset_id: str,
+        config: Optional[ReplayConfig] = None,
+        checkpoint_path: Optional[str] = None,
+        segment_config: Optional[ArchiveSegmentConfig] = None,
+        dry_run: bool = False,
+    ):
+        self.bucket = bucket
+        self.client = client
+        self.dataset_id = dataset_id
+        self.config = config or ReplayConfig()
+        self.checkpoint_path = checkpoint_path
+        self.segment_config = segment_config
+        self.dry_run = dry_run
+        if self.config.load_format == "parquet" and not columnar_transform.ARROW_AVAILABLE:
+            logger.warning("Replay load format 'parquet' needs pyarrow; staging as JSON instead")
+            self.config.load_format = "json"
+
+        self._merge_lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._checkpoint: Dict[str, Any] = {"table": self.target_table, "partitions": {}}
+        self._readers = ThreadPoolExecutor(max_workers=self.config.read_threads, thread_name_prefix="replay-read")
+
+        self.metrics = {
+            "partitions_total": 0,
+            "partitions_skipped": 0,
+            "partitions_replayed": 0,
+            "partitions_failed": 0,
+            "objects_read": 0,
+            "bytes_read": 0,
+            "statements_read": 0,
+            "statements_without_id": 0,
+            "duplicates": 0,
+            "rows_inserted": 0,
+            "load_jobs": 0,
+            "merge_jobs": 0,
+        }
+
+    @property
+    def target_table(self) -> str:
+        return f"{self.dataset_id}.{self.config.table_id}"
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+
+    def load_checkpoint(self) -> None:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, "rb") as handle:
+            checkpoint = json_codec.loads(handle.read())
+        if checkpoint.get("table") != self.target_table:
+            raise ValueError(
+                f"Checkpoint {self.checkpoint_path} is for {checkpoint.get('table')}, not {self.target_table}"
+            )
+        self._checkpoint = checkpoint
+        logger.info(f"Resuming replay: {len(checkpoint['partitions'])} partition(s) already merged")
+
+    def _save_checkpoint(self, key: str, result: Dict[str, Any]) -> None:
+        with self._checkpoint_lock:
+            self._checkpoint["partitions"][key] = result
+            if not self.checkpoint_path:
+                return
+            # Write-then-rename so an interrupted replay never leaves a torn checkpoint
+            temporary = f"{self.checkpoint_path}.tmp"
+            with open(temporary, "w") as handle:
+                handle.write(json_codec.dumps(self._checkpoint, indent=True))
+            os.replace(temporary, self.checkpoint_path)
+
+    def completed(self) -> Dict[str, Any]:
+        return dict(self._checkpoint["partitions"])
+
+    # ------------------------------------------------------------------
+    # Partitions
+    # ------------------------------------------------------------------
+
+    def read_partition(self, partition: ArchivePartition) -> List[Dict[str, Any]]:
+        """Decode every object of ``partition`` on the shared reader pool."""
+        statements = []
+        for objects in self._readers.map(read_object, partition.blobs):
+            statements.extend(objects)
+        self.metrics["objects_read"] += len(partition.blobs)
+        self.metrics["bytes_read"] += partition.bytes
+        self.metrics["statements_read"] += len(statements)
+        return statements
+
+    def _unique(self, statements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """First copy of each statement id; MERGE needs unique source keys."""
+        unique: Dict[str, Dict[str, Any]] = {}
+        for statement in statements:
+            statement_id = statement.get("id")
+            if not statement_id:
+                self.metrics["statements_without_id"] += 1
+            elif statement_id in unique:
+                self.metrics["duplicates"] += 1
+            else:
+                unique[statement_id] = statement
+        return list(unique.values())
+
+    def transform(self, statements: List[Dict[str, Any]]) -> Any:
+        """Staging payload: Parquet bytes, or transformed rows for a JSON load."""
+        if self.config.load_format == "parquet":
+            batch = columnar_transform.columns_to_record_batch(
+                columnar_transform.statement_columns(statements), STAGING_SCHEMA
+            )
+            return columnar_transform.to_parquet_bytes(batch)
+        # The processor's transform uses no client state
+        processor = object.__new__(PubSubBigQueryProcessor)
+        return [staging_row(processor.transform_xapi_to_bigquery_row(statement, "")) for statement in statements]
+
+    def _stage(self, payload: Any, staging_table_id: str) -> None:
+        table = bigquery.Table(self._qualified(staging_table_id), schema=STAGING_SCHEMA)
+        table.expires = datetime.now(timezone.utc) + timedelta(hours=self.config.staging_ttl_hours)
+        self.client.create_table(table)
+        if self.config.load_format == "parquet":
+            job = self.client.load_table_from_file(
+                io.BytesIO(payload),
+                self._qualified(staging_table_id),
+                job_config=columnar_transform.parquet_load_config(),
+            )
+        else:
+            job = self.client.load_table_from_json(
+                payload,
+                self._qualified(staging_table_id),
+                job_config=bigquery.LoadJobConfig(
+                    schema=STAGING_SCHEMA, write_disposition=bigquery.WriteDisposition.WRITE_APPEND
+                ),
+            )
+        job.result()
+        self.metrics["load_jobs"] += 1
+
+    def replay_partition(self, partition: ArchivePartition) -> Dict[str, Any]:
+        """Read, stage and merge one partition; returns its checkpoint entry."""
+        started = time.perf_counter()
+        statements = self._unique(self.read_partition(partition))
+        inserted = 0
+        payload = self.transform(statements) if statements else None
+        if statements and not self.dry_run:
+            staging_table_id = f"{self.target_table}_replay_{uuid.uuid4().hex[:12]}"
+            try:
+                self._stage(payload, staging_table_id)
+                with self._merge_lock:
+                    job = self.client.query(build_merge_query(self.target_table, staging_table_id))
+                    job.result()
+                inserted = job.num_dml_affected_rows or 0
+                self.metrics["merge_jobs"] += 1
+            finally:
+                try:
+                    self.client.delete_table(self._qualified(staging_table_id), not_found_ok=True)
+                except Exception as e:
+                    logger.warning(f"Failed to drop staging table {staging_table_id}: {e}")
+        self.metrics["rows_inserted"] += inserted
+        return {
+            "objects": len(partition.blobs),
+            "statements": len(statements),
+            "inserted": inserted,
+            "seconds": round(time.perf_counter() - started, 3),
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def _replay_with_retries(self, partition: ArchivePartition) -> Optional[Dict[str, Any]]:
+        for attempt in range(1, self.config.partition_attempts + 1):
+            try:
+                return self.replay_partition(partition)
+            except Exception as e:
+                if attempt == self.config.partition_attempts:
+                    logger.error(f"Replay of partition {partition.key} failed after {attempt} attempt(s): {e}")
+                    return None
+                logger.warning(f"Replay of partition {partition.key} failed ({e}); retrying")
+                time.sleep(min(30.0, 2.0 ** attempt))
+        return None
+
+    def run(self, start_day: str, end_day: Optional[str] = None) -> Dict[str, Any]:
+        """Replay every partition from ``start_day`` to ``end_day`` not already in the checkpoint."""
+        started = time.perf_counter()
+        self.load_checkpoint()
+        done = self.completed()
+        partitions = list_partitions(self.bucket, start_day, end_day, self.segment_config)
+        pending = [partition for partition in partitions if partition.key not in done]
+        self.metrics["partitions_total"] = len(partitions)
+        self.metrics["partitions_skipped"] = len(partitions) - len(pending)
+        logger.info(
+            f"Replaying {len(pending)} of {len(partitions)} partition(s) into {self.target_table}"
+            f"{' (dry run)' if self.dry_run else ''}"
+        )
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=self.config.partition_threads, thread_name_prefix="replay-partition"
+            ) as executor:
+                futures = {executor.submit(self._replay_with_retries, partition): partition for partition in pending}
+                for future in as_completed(futures):
+                    partition = futures[future]
+                    result = future.result()
+                    if result is None:
+                        self.metrics["partitions_failed"] += 1
+                        continue
+                    self.metrics["partitions_replayed"] += 1
+                    if not self.dry_run:
+                        self._save_checkpoint(partition.key, result)
+                    logger.info(
+                        f"Partition {partition.key}: {result['statements']} statement(s), "
+                        f"{result['inserted']} inserted in {result['seconds']:.1f}s"
+                    )
+        finally:
+            self._readers.shutdown(wait=True)
+
+        elapsed = time.perf_counter() - started
+        return {
+            **self.metrics,
+            "target_table": self.target_table,
+            "dry_run": self.dry_run,
+            "seconds": round(elapsed, 3),
+            "statements_per_sec": round(self.metrics["statements_read"] / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def _qualified(self, table_id: str) -> str:
+        project = getattr(self.client, "project", None)
+        return f"{project}.{table_id}" if project else table_id
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay the Cloud Storage archive into BigQuery.")
+    parser.add_argument("--start", required=True, help="first archive day, YYYY-MM-DD")
+    parser.add_argument("--end", help="last archive day (default: --start)")
+    parser.add_argument("--table", default="statements", help="target table in the configured dataset")
+    parser.add_argument("--dataset", help="defaults to GCP_BIGQUERY_DATASET")
+    parser.add_argument("--source-dir", help="replay from a local copy of the bucket instead of GCS")
+    parser.add_argument("--checkpoint", help="progress file (default: replay-<table>-<start>-<end>.json)")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="read and transform only; no BigQuery jobs")
+    parser.add_argument("--create-table", action="store_true", help="create the target from the statements schema")
+    parser.add_argument("--read-threads", type=int, default=ReplayConfig.read_threads)
+    parser.add_argument("--partition-threads", type=int, default=ReplayConfig.partition_threads)
+    parser.add_argument("--load-format", choices=["parquet", "json"], default=ReplayConfig.load_format)
+    args = parser.parse_args(argv)
+
+    from app.config.gcp_config import get_gcp_config
+
+    gcp_config = get_gcp_config()
+    if args.source_dir:
+        bucket = DirectoryBucket(args.source_dir)
+    else:
+        bucket = gcp_config.storage_client.bucket(gcp_config.storage_bucket)
+    dataset_id = args.dataset or gcp_config.bigquery_dataset
+    client = None if args.dry_run else gcp_config.bigquery_client
+
+    if args.create_table and not args.dry_run:
+        from app.config.bigquery_schema import BigQuerySchema
+
+        schema = BigQuerySchema()
+        schema.dataset_id = dataset_id
+        if not schema.create_table_if_not_exists(args.table, schema.get_statements_table_schema()):
+            sys.exit(1)
+
+    checkpoint = args.checkpoint or f"replay-{args.table}-{args.start}-{args.end or args.start}.json"
+    if args.fresh and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    config = ReplayConfig(
+        table_id=args.table,
+        read_threads=args.read_threads,
+        partition_threads=args.partition_threads,
+        load_format=args.load_format,
+    )
+    replay = ArchiveReplay(bucket, client, dataset_id, config, checkpoint_path=checkpoint, dry_run=args.dry_run)
+    summary = replay.run(args.start, args.end)
+    print(json_codec.dumps(summary, indent=True))
+    if summary["partitions_failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
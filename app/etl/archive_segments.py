@@ -0,0 +1,464 @@
+"""
+Rolling NDJSON.gz archive segments in Cloud Storage.
+
+Instead of one pretty-printed object per statement, statements are buffered
+per hour partition and uploaded as gzip-compressed NDJSON segments, one raw
+statement per line::
+
+    xapi-archive/dt=2025-01-01/hour=13/segment-20250101T131502Z-<writer>-000042.ndjson.gz
+    xapi-archive/dt=2025-01-01/hour=13/segment-20250101T131502Z-<writer>-000042.manifest.json
+
+A partition's open segment is rolled when it reaches ``max_bytes``
+(uncompressed) or ``max_records``, or when its oldest record has waited
+``max_age`` seconds.  Rolled segments are compressed and uploaded on a small
+thread pool; the manifest (record count, sizes, checksum, publish-time
+range) is written after the segment, so a manifest always describes a
+complete segment.
+
+Every appended record carries a callback that fires with ``True`` only once
+the segment and its manifest are uploaded, so Pub/Sub messages are acked
+only when durably archived.  A segment that still fails after
+``upload_attempts`` fires ``False`` and its messages are redelivered into a
+later segment.
+
+``python -m app.etl.archive_segments compact`` rewrites the legacy
+per-message objects under ``xapi-statements/`` into segments.
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("archive_segments")
+
+LEGACY_PREFIX = "xapi-statements/"
+SEGMENT_SUFFIX = ".ndjson.gz"
+MANIFEST_SUFFIX = ".manifest.json"
+
+DurableCallback = Callable[[bool], None]
+
+
+@dataclass
+class ArchiveSegmentConfig:
+    """Roll triggers and upload settings for archive segments."""
+    prefix: str = "xapi-archive"
+    max_bytes: int = 64 * 1024 * 1024  # uncompressed NDJSON per segment
+    max_records: int = 10000
+    max_age: float = 60.0  # seconds the oldest record may wait
+    upload_threads: int = 4
+    upload_attempts: int = 3
+    retry_backoff: float = 1.0  # seconds, doubled per attempt
+    compression_level: int = 6
+
+    @classmethod
+    def from_settings(cls) -> "ArchiveSegmentConfig":
+        return cls(
+            prefix=settings.ARCHIVE_SEGMENT_PREFIX,
+            max_bytes=settings.ARCHIVE_SEGMENT_MAX_BYTES,
+            max_records=settings.ARCHIVE_SEGMENT_MAX_RECORDS,
+            max_age=settings.ARCHIVE_SEGMENT_MAX_AGE,
+            upload_threads=settings.ARCHIVE_SEGMENT_UPLOAD_THREADS,
+        )
+
+
+def partition_for(published_at: datetime) -> str:
+    """Hour partition (``dt=YYYY-MM-DD/hour=HH``, UTC) for a publish time."""
+    if published_at.tzinfo is None:
+        published_at = published_at.replace(tzinfo=timezone.utc)
+    published_at = published_at.astimezone(timezone.utc)
+    return f"dt={published_at:%Y-%m-%d}/hour={published_at:%H}"
+
+
+@dataclass
+class _Segment:
+    partition: str
+    opened_at: float
+    lines: List[bytes] = field(default_factory=list)
+    callbacks: List[DurableCallback] = field(default_factory=list)
+    raw_bytes: int = 0
+    min_published_at: Optional[datetime] = None
+    max_published_at: Optional[datetime] = None
+
+    def add(self, line: bytes, on_durable: DurableCallback, published_at: datetime) -> None:
+        self.lines.append(line)
+        self.callbacks.append(on_durable)
+        self.raw_bytes += len(line)
+        if self.min_published_at is None or published_at < self.min_published_at:
+            self.min_published_at = published_at
+        if self.max_published_at is None or published_at > self.max_published_at:
+            self.max_published_at = published_at
+
+
+class SegmentArchiveWriter:
+    """Buffers statements per hour partition and uploads them as NDJSON.gz segments."""
+
+    def __init__(
+        self,
+        bucket,
+        config: Optional[ArchiveSegmentConfig] = None,
+        writer_id: Optional[str] = None,
+        source: str = "pubsub_storage_subscriber",
+        index=None,
+    ):
+        self.bucket = bucket
+        self.config = config or ArchiveSegmentConfig.from_settings()
+        self.source = source
+        self.index = index  # ArchiveIndex updated after every uploaded segment
+        # Unique per process so concurrent writers never collide on segment names
+        self.writer_id = writer_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._open: Dict[str, _Segment] = {}
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._uploads: Dict[Future, int] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.upload_threads, thread_name_prefix="archive-segment-upload"
+        )
+        self._flusher: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.metrics = {
+            "records_buffered": 0,
+            "records_archived": 0,
+            "records_failed": 0,
+            "segments_uploaded": 0,
+            "segments_failed": 0,
+            "upload_retries": 0,
+            "bytes_uncompressed": 0,
+            "bytes_uploaded": 0,
+            "last_segment": None,
+            "last_upload_ms": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Buffering
+    # ------------------------------------------------------------------
+
+    def append(
+        self,
+        statement: Dict[str, Any],
+        on_durable: DurableCallback,
+        published_at: Optional[datetime] = None,
+    ) -> None:
+        """Buffer a statement; ``on_durable(True/False)`` fires once its segment is uploaded (or given up on)."""
+        published_at = published_at or datetime.now(timezone.utc)
+        line = json_codec.dumps_bytes(statement) + b"\n"
+        partition = partition_for(published_at)
+        self._ensure_flusher()
+        with self._condition:
+            segment = self._open.get(partition)
+            if segment is None:
+                segment = self._open[partition] = _Segment(partition, time.monotonic())
+            segment.add(line, on_durable, published_at)
+            self.metrics["records_buffered"] += 1
+            if segment.raw_bytes >= self.config.max_bytes or len(segment.lines) >= self.config.max_records:
+                self._roll(partition)
+
+    def _roll(self, partition: str) -> None:
+        """Close ``partition``'s open segment and queue its upload (caller holds the condition)."""
+        segment = self._open.pop(partition)
+        self._sequence += 1
+        name = f"segment-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{self.writer_id}-{self._sequence:06d}"
+        self.metrics["records_buffered"] -= len(segment.lines)
+        future = self._executor.submit(self._upload, segment, f"{self.config.prefix}/{partition}/{name}")
+        self._uploads[future] = len(segment.lines)
+        future.add_done_callback(self._upload_done)
+
+    def _upload_done(self, future: Future) -> None:
+        with self._condition:
+            self._uploads.pop(future, None)
+            self._condition.notify_all()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._condition:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._stopping = False
+            self._flusher = threading.Thread(target=self._flush_loop, name="archive-segment-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        """Roll segments whose oldest record has waited ``max_age``."""
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                for partition, segment in list(self._open.items()):
+                    if now - segment.opened_at >= self.config.max_age:
+                        self._roll(partition)
+                oldest = min((segment.opened_at for segment in self._open.values()), default=None)
+                wait_for = self.config.max_age if oldest is None else max(0.0, oldest + self.config.max_age - now)
+                self._condition.wait(wait_for)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Roll every open segment and wait for all pending uploads."""
+        with self._condition:
+            for partition in list(self._open):
+                self._roll(partition)
+            pending = list(self._uploads)
+        wait(pending, timeout=timeout)
+
+    def close(self) -> None:
+        """Upload everything buffered and stop the flusher and upload threads."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    # ------------------------------------------------------------------
+    # Uploading
+    # ------------------------------------------------------------------
+
+    def _manifest(self, segment: _Segment, path: str, data: bytes) -> Dict[str, Any]:
+        return {
+            "segment": path,
+            "partition": segment.partition,
+            "format": "ndjson.gz",
+            "records": len(segment.lines),
+            "uncompressed_bytes": segment.raw_bytes,
+            "compressed_bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "min_published_at": segment.min_published_at.isoformat() if segment.min_published_at else None,
+            "max_published_at": segment.max_published_at.isoformat() if segment.max_published_at else None,
+            "writer": self.writer_id,
+            "source": self.source,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    def write_segment(self, segment: _Segment, path: str) -> Dict[str, Any]:
+        """Compress and upload ``segment`` then its manifest; raises on failure."""
+        data = gzip.compress(b"".join(segment.lines), compresslevel=self.config.compression_level)
+        manifest = self._manifest(segment, path + SEGMENT_SUFFIX, data)
+        blob = self.bucket.blob(path + SEGMENT_SUFFIX)
+        # Listing returns metadata, so the index can be reconciled without reading manifests
+        blob.metadata = {
+            "records": str(manifest["records"]),
+            "min_published_at": manifest["min_published_at"] or "",
+            "max_published_at": manifest["max_published_at"] or "",
+        }
+        blob.upload_from_string(data, content_type="application/gzip")
+        self.bucket.blob(path + MANIFEST_SUFFIX).upload_from_string(
+            json_codec.dumps(manifest), content_type="application/json"
+        )
+        if self.index is not None:
+            self.index.record(
+                segment.min_published_at, segment.max_published_at, size=len(data), records=len(segment.lines)
+            )
+        return manifest
+
+    def _upload(self, segment: _Segment, path: str) -> None:
+        started = time.perf_counter()
+        committed = False
+        for attempt in range(1, self.config.upload_attempts + 1):
+            try:
+                manifest = self.write_segment(segment, path)
+                committed = True
+                break
+            except Exception as e:
+                if attempt == self.config.upload_attempts:
+                    logger.error(f"Archive segment {path} failed after {attempt} attempt(s): {e}")
+                    break
+                self.metrics["upload_retries"] += 1
+                delay = self.config.retry_backoff * (2 ** (attempt - 1))
+                logger.warning(f"Archive segment {path} upload failed ({e}); retrying in {delay:.0f}s")
+                time.sleep(delay)
+
+        if committed:
+            self.metrics["segments_uploaded"] += 1
+            self.metrics["records_archived"] += manifest["records"]
+            self.metrics["bytes_uncompressed"] += manifest["uncompressed_bytes"]
+            self.metrics["bytes_uploaded"] += manifest["compressed_bytes"]
+            self.metrics["last_segment"] = manifest["segment"]
+            self.metrics["last_upload_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            logger.info(
+                f"Archived {manifest['records']} statement(s) to {manifest['segment']} "
+                f"({manifest['compressed_bytes']} bytes)"
+            )
+        else:
+            self.metrics["segments_failed"] += 1
+            self.metrics["records_failed"] += len(segment.lines)
+        for on_durable in segment.callbacks:
+            try:
+                on_durable(committed)
+            except Exception as e:
+                logger.warning(f"Archive segment callback failed: {e}")
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._condition:
+            open_segments = {
+                partition: {"records": len(segment.lines), "bytes": segment.raw_bytes}
+                for partition, segment in self._open.items()
+            }
+            uploading = sum(self._uploads.values())
+        return {
+            "prefix": self.config.prefix,
+            "writer": self.writer_id,
+            "open_segments": open_segments,
+            "records_uploading": uploading,
+            "max_bytes": self.config.max_bytes,
+            "max_records": self.config.max_records,
+            "max_age": self.config.max_age,
+            "metrics": dict(self.metrics),
+        }
+
+
+# ----------------------------------------------------------------------
+# Reading
+# ----------------------------------------------------------------------
+
+
+def iter_archived_statements(
+    bucket,
+    day: str,
+    config: Optional[ArchiveSegmentConfig] = None,
+) -> Iterator[Tuple[Dict[str, Any], datetime]]:
+    """Yield ``(statement, published_at)`` for every archived statement of ``YYYY-MM-DD``.
+
+    Segments report their partition hour as the publish time; legacy
+    objects the second encoded in their path.
+    """
+    config = config or ArchiveSegmentConfig.from_settings()
+    for blob in bucket.list_blobs(prefix=f"{config.prefix}/dt={day}/"):
+        if not blob.name.endswith(SEGMENT_SUFFIX):
+            continue
+        hour = blob.name[len(config.prefix) + 1:].split("/")[1][len("hour="):]
+        published_at = datetime.strptime(f"{day}{hour}", "%Y-%m-%d%H").replace(tzinfo=timezone.utc)
+        for line in gzip.decompress(blob.download_as_bytes()).splitlines():
+            if line:
+                yield json_codec.loads(line), published_at
+    for blob in bucket.list_blobs(prefix=LEGACY_PREFIX + day.replace("-", "/") + "/"):
+        published_at = legacy_published_at(blob.name)
+        if published_at is None or not blob.name.endswith(".json"):
+            continue
+        try:
+            statement = json_codec.loads(blob.download_as_bytes())
+        except Exception as e:
+            logger.warning(f"Skipping unreadable archive object {blob.name}: {e}")
+            continue
+        if isinstance(statement, dict):
+            yield statement, published_at
+
+
+# ----------------------------------------------------------------------
+# Compaction of legacy per-message objects
+# ----------------------------------------------------------------------
+
+
+def legacy_published_at(blob_name: str) -> Optional[datetime]:
+    """Timestamp encoded in ``xapi-statements/YYYY/MM/DD/<actor>/HHMMSS_<id>.json``."""
+    parts = blob_name[len(LEGACY_PREFIX):].split("/")
+    if len(parts) < 5:
+        return None
+    try:
+        return datetime.strptime(
+            f"{parts[0]}{parts[1]}{parts[2]}{parts[-1][:6]}", "%Y%m%d%H%M%S"
+        ).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def compact_legacy_objects(
+    bucket,
+    config: Optional[ArchiveSegmentConfig] = None,
+    day: Optional[str] = None,
+    delete: bool = False,
+    download_threads: int = 16,
+) -> Dict[str, int]:
+    """Rewrite legacy per-message objects (optionally one ``YYYY-MM-DD``) into segments.
+
+    Source objects are deleted (with ``delete``) only after the segment
+    holding them is uploaded.  Re-running without ``delete`` archives the
+    same statements again; replays dedupe on statement id.
+    """
+    prefix = LEGACY_PREFIX + (day.replace("-", "/") + "/" if day else "")
+    writer = SegmentArchiveWriter(bucket, config, source="compaction")
+    counts = {"objects": 0, "compacted": 0, "skipped": 0, "deleted": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def count(key: str) -> None:
+        with lock:
+            counts[key] += 1
+
+    def on_durable(blob) -> DurableCallback:
+        def done(committed: bool) -> None:
+            if not committed:
+                count("failed")
+                return
+            count("compacted")
+            if delete:
+                try:
+                    blob.delete()
+                    count("deleted")
+                except Exception as e:
+                    logger.warning(f"Could not delete {blob.name} after compaction: {e}")
+        return done
+
+    def compact(blob) -> None:
+        published_at = legacy_published_at(blob.name)
+        try:
+            statement = json_codec.loads(blob.download_as_bytes())
+        except Exception as e:
+            logger.warning(f"Skipping unreadable archive object {blob.name}: {e}")
+            count("skipped")
+            return
+        if published_at is None or not isinstance(statement, dict):
+            count("skipped")
+            return
+        writer.append(statement, on_durable(blob), published_at)
+
+    with ThreadPoolExecutor(max_workers=download_threads, thread_name_prefix="archive-compaction") as executor:
+        for blob in bucket.list_blobs(prefix=prefix):
+            if not blob.name.endswith(".json"):
+                continue
+            counts["objects"] += 1
+            executor.submit(compact, blob)
+    writer.close()
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Archive segment maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact = commands.add_parser("compact", help="rewrite legacy per-message objects into segments")
+    compact.add_argument("--day", help="only compact YYYY-MM-DD")
+    compact.add_argument("--delete", action="store_true", help="delete source objects once their segment is uploaded")
+    compact.add_argument("--bucket", help="defaults to the configured storage bucket")
+    args = parser.parse_args(argv)
+
+    from app.config.gcp_config import gcp_config
+
+    bucket = gcp_config.storage_client.bucket(args.bucket or gcp_config.storage_bucket)
+    counts = compact_legacy_objects(bucket, day=args.day, delete=args.delete)
+    print(json_codec.dumps(counts))
+    if counts["compacted"] and not args.bucket:
+        # Compaction moves counts between object kinds; rebuild the index's completed days
+        from app.etl.archive_index import get_archive_index
+
+        index = get_archive_index()
+        if index is not None:
+            index.reconcile()
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,383 @@
+"""
+Micro-batched BigQuery sink for transformed xAPI statement rows.
+
+Rows are buffered and flushed when ``batch_size`` rows are waiting or the
+oldest row has waited ``max_latency`` seconds.  Each flush:
+
+1. loads the rows into a fresh staging table with a load job (free, and not
+   subject to DML quotas or the streaming buffer),
+2. runs one set-based ``MERGE`` from the staging table into ``statements``
+   (insert when the statement id is not already present), and
+3. drops the staging table.
+
+Every buffered row carries a commit callback; callbacks fire with ``True``
+only after the MERGE for that row's flush has completed, so Pub/Sub messages
+are acked only once their rows are committed.  A flush rejected for its data
+(``BadRequest``, or a row that cannot be encoded) is retried in halves so one
+bad row cannot keep a whole batch from committing; any other failure
+(5xx, rate limits, timeouts) fails the batch once so its messages are nacked
+and redelivered instead of multiplying requests during an outage.
+
+With a ``StatementIdIndex`` attached, ids already known to be committed are
+acked without staging, and Bloom-positive ids are checked with one batched
+``IN UNNEST(@ids)`` lookup per flush; a flush whose rows all exist runs no
+load or MERGE at all.
+"""
+
+import io
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud import bigquery
+
+from app.config import settings
+from app.etl import columnar_transform
+from app.logging_config import get_logger
+from app.services.statement_index import StatementIdIndex
+from app.utils import json_codec
+
+logger = get_logger("bigquery_batch_sink")
+
+# Columns written to ``statements`` (name, BigQuery type), in MERGE order
+STATEMENT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("statement_id", "STRING"),
+    ("timestamp", "TIMESTAMP"),
+    ("stored", "TIMESTAMP"),
+    ("version", "STRING"),
+    ("actor_id", "STRING"),
+    ("actor_name", "STRING"),
+    ("actor_type", "STRING"),
+    ("verb_id", "STRING"),
+    ("verb_display", "STRING"),
+    ("object_id", "STRING"),
+    ("object_name", "STRING"),
+    ("object_type", "STRING"),
+    ("object_definition_type", "STRING"),
+    ("result_score_scaled", "FLOAT"),
+    ("result_score_raw", "FLOAT"),
+    ("result_score_min", "FLOAT"),
+    ("result_score_max", "FLOAT"),
+    ("result_success", "BOOLEAN"),
+    ("result_completion", "BOOLEAN"),
+    ("result_response", "STRING"),
+    ("result_duration", "STRING"),
+    ("context_registration", "STRING"),
+    ("context_instructor_id", "STRING"),
+    ("context_platform", "STRING"),
+    ("context_language", "STRING"),
+    ("raw_json", "STRING"),
+)
+
+# Failures caused by the rows themselves; only these are worth bisecting
+DATA_ERRORS = (gcp_exceptions.BadRequest, ValueError, TypeError, KeyError)
+
+CommitCallback = Callable[[bool], None]
+FlushObserver = Callable[[float, int, bool], None]  # (seconds, rows, committed)
+
+
+@dataclass
+class SinkConfig:
+    """Flush triggers for the BigQuery sink."""
+    batch_size: int = 500
+    max_latency: float = 2.0  # seconds
+    staging_ttl_hours: int = 1
+    load_format: str = "json"  # "json" or "parquet" (needs pyarrow)
+
+    @classmethod
+    def from_settings(cls) -> "SinkConfig":
+        return cls(
+            batch_size=settings.BIGQUERY_SINK_BATCH_SIZE,
+            max_latency=settings.BIGQUERY_SINK_MAX_LATENCY,
+            staging_ttl_hours=settings.BIGQUERY_SINK_STAGING_TTL_HOURS,
+            load_format=settings.BIGQUERY_SINK_LOAD_FORMAT,
+        )
+
+
+def staging_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Project a transformed row onto the staging schema."""
+    staged = {}
+    for name, column_type in STATEMENT_COLUMNS:
+        value = row.get(name)
+        if column_type == "STRING" and value is not None and not isinstance(value, str):
+            value = json_codec.dumps(value, default=str)
+        staged[name] = value
+    staged["statement_id"] = staged["statement_id"] or ""
+    return staged
+
+
+def build_merge_query(table_id: str, staging_table_id: str) -> str:
+    """Set-based MERGE inserting staged statements that are not already present."""
+    columns = ", ".join(name for name, _ in STATEMENT_COLUMNS)
+    values = ", ".join(f"S.{name}" for name, _ in STATEMENT_COLUMNS)
+    return f"""
+    MERGE `{table_id}` T
+    USING `{staging_table_id}` S
+    ON T.statement_id = S.statement_id
+    WHEN NOT MATCHED THEN
+      INSERT ({columns})
+      VALUES ({values})
+    """
+
+
+class BigQueryBatchSink:
+    """Buffers rows and commits them to BigQuery in set-based flushes."""
+
+    def __init__(
+        self,
+        client: bigquery.Client,
+        dataset_id: str,
+        table_id: str = "statements",
+        config: Optional[SinkConfig] = None,
+        index: Optional[StatementIdIndex] = None,
+        on_flush: Optional[FlushObserver] = None,
+    ):
+        self.client = client
+        self.dataset_id = dataset_id
+        self.table_id = table_id
+        self.config = config or SinkConfig.from_settings()
+        self.index = index
+        self.on_flush = on_flush
+        self.schema = [bigquery.SchemaField(name, column_type) for name, column_type in STATEMENT_COLUMNS]
+        if self.config.load_format == "parquet" and not columnar_transform.ARROW_AVAILABLE:
+            logger.warning("BigQuery sink load format 'parquet' needs pyarrow; staging as JSON instead")
+            self.config.load_format = "json"
+
+        self._buffer: List[Tuple[Dict[str, Any], CommitCallback]] = []
+        self._oldest: Optional[float] = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.metrics = {
+            "rows_buffered": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "rows_committed": 0,
+            "rows_inserted": 0,
+            "rows_failed": 0,
+            "duplicates_in_batch": 0,
+            "rows_skipped_existing": 0,
+            "last_flush_size": 0,
+            "last_flush_ms": 0.0,
+            "last_flush_time": None,
+        }
+
+    @property
+    def target_table(self) -> str:
+        return f"{self.dataset_id}.{self.table_id}"
+
+    # ------------------------------------------------------------------
+    # Buffering
+    # ------------------------------------------------------------------
+
+    def add(self, row: Dict[str, Any], on_commit: CommitCallback) -> None:
+        """Buffer a row; ``on_commit(True/False)`` fires once its flush finishes."""
+        self._ensure_flusher()
+        with self._condition:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append((row, on_commit))
+            self.metrics["rows_buffered"] = len(self._buffer)
+            if len(self._buffer) >= self.config.batch_size:
+                self._condition.notify()
+
+    def _take_batch(self) -> List[Tuple[Dict[str, Any], CommitCallback]]:
+        batch = self._buffer[:self.config.batch_size]
+        self._buffer = self._buffer[self.config.batch_size:]
+        self._oldest = time.monotonic() if self._buffer else None
+        self.metrics["rows_buffered"] = len(self._buffer)
+        return batch
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._condition:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._stopping = False
+            self._flusher = threading.Thread(target=self._flush_loop, name="bigquery-sink-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    if len(self._buffer) >= self.config.batch_size:
+                        break
+                    if self._buffer and time.monotonic() - self._oldest >= self.config.max_latency:
+                        break
+                    wait = self.config.max_latency
+                    if self._buffer:
+                        wait = max(0.0, self.config.max_latency - (time.monotonic() - self._oldest))
+                    self._condition.wait(wait)
+                if self._stopping and not self._buffer:
+                    return
+                batch = self._take_batch()
+            self._commit(batch)
+
+    def flush(self) -> None:
+        """Synchronously commit everything currently buffered."""
+        while True:
+            with self._condition:
+                if not self._buffer:
+                    return
+                batch = self._take_batch()
+            self._commit(batch)
+
+    def close(self) -> None:
+        """Flush remaining rows and stop the background flusher."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=60)
+        self.flush()
+
+    # ------------------------------------------------------------------
+    # Committing
+    # ------------------------------------------------------------------
+
+    def _commit(self, batch: List[Tuple[Dict[str, Any], CommitCallback]]) -> None:
+        with self._flush_lock:
+            self._commit_with_split(batch)
+
+    def _commit_with_split(self, batch: List[Tuple[Dict[str, Any], CommitCallback]]) -> None:
+        started = time.perf_counter()
+        try:
+            inserted = self.write_batch([row for row, _ in batch])
+        except Exception as e:
+            self._observe(time.perf_counter() - started, len(batch), False)
+            self.metrics["flush_failures"] += 1
+            logger.error(f"BigQuery sink flush of {len(batch)} row(s) failed: {e}")
+            if len(batch) > 1 and isinstance(e, DATA_ERRORS):
+                middle = len(batch) // 2
+                self._commit_with_split(batch[:middle])
+                self._commit_with_split(batch[middle:])
+                return
+            self.metrics["rows_failed"] += len(batch)
+            self._notify(batch, False)
+            return
+
+        self._observe(time.perf_counter() - started, len(batch), True)
+        self.metrics["rows_committed"] += len(batch)
+        self.metrics["rows_inserted"] += inserted
+        self._notify(batch, True)
+
+    def _observe(self, duration: float, rows: int, committed: bool) -> None:
+        if self.on_flush is None:
+            return
+        try:
+            self.on_flush(duration, rows, committed)
+        except Exception as e:
+            logger.warning(f"BigQuery sink flush observer failed: {e}")
+
+    @staticmethod
+    def _notify(batch: List[Tuple[Dict[str, Any], CommitCallback]], committed: bool) -> None:
+        for _, on_commit in batch:
+            try:
+                on_commit(committed)
+            except Exception as e:
+                logger.warning(f"BigQuery sink commit callback failed: {e}")
+
+    def write_batch(self, rows: List[Dict[str, Any]]) -> int:
+        """Stage ``rows`` and MERGE them into the target table; returns rows inserted."""
+        started = time.perf_counter()
+        staged: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            prepared = staging_row(row)
+            # Keep the first copy of a statement id; MERGE needs unique source keys
+            if prepared["statement_id"] in staged:
+                self.metrics["duplicates_in_batch"] += 1
+                continue
+            staged[prepared["statement_id"]] = prepared
+
+        if self.index is not None:
+            for statement_id in self._existing_ids(list(staged)):
+                del staged[statement_id]
+                self.metrics["rows_skipped_existing"] += 1
+            if not staged:
+                logger.debug(f"All {len(rows)} row(s) already in {self.target_table}; nothing to merge")
+                return 0
+
+        staging_table_id = f"{self.target_table}_staging_{uuid.uuid4().hex[:12]}"
+        staging_table = bigquery.Table(self._qualified(staging_table_id), schema=self.schema)
+        staging_table.expires = datetime.now(timezone.utc) + timedelta(hours=self.config.staging_ttl_hours)
+        self.client.create_table(staging_table)
+        try:
+            self._load_staging(list(staged.values()), self._qualified(staging_table_id))
+
+            query_job = self.client.query(build_merge_query(self.target_table, staging_table_id))
+            query_job.result()
+            inserted = query_job.num_dml_affected_rows or 0
+            if self.index is not None:
+                self.index.add_many(staged)
+        finally:
+            try:
+                self.client.delete_table(self._qualified(staging_table_id), not_found_ok=True)
+            except Exception as e:
+                logger.warning(f"Failed to drop staging table {staging_table_id}: {e}")
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        self.metrics["flushes"] += 1
+        self.metrics["last_flush_size"] = len(rows)
+        self.metrics["last_flush_ms"] = round(duration_ms, 2)
+        self.metrics["last_flush_time"] = datetime.now(timezone.utc).isoformat()
+        logger.info(
+            f"Committed {len(rows)} row(s) to {self.target_table} "
+            f"({inserted} new) in {duration_ms:.1f}ms"
+        )
+        return inserted
+
+    def _load_staging(self, rows: List[Dict[str, Any]], staging_table_id: str) -> None:
+        if self.config.load_format == "parquet":
+            batch = columnar_transform.rows_to_record_batch(rows, self.schema)
+            self.client.load_table_from_file(
+                io.BytesIO(columnar_transform.to_parquet_bytes(batch)),
+                staging_table_id,
+                job_config=columnar_transform.parquet_load_config(),
+            ).result()
+            return
+        load_config = bigquery.LoadJobConfig(
+            schema=self.schema,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        )
+        self.client.load_table_from_json(rows, staging_table_id, job_config=load_config).result()
+
+    def _existing_ids(self, statement_ids: List[str]) -> List[str]:
+        """Ids already committed: LRU hits plus Bloom positives confirmed by one lookup."""
+        known, maybe, _ = self.index.classify(statement_ids)
+        if not maybe:
+            return known
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("ids", "STRING", maybe)]
+        )
+        query = f"SELECT statement_id FROM `{self.target_table}` WHERE statement_id IN UNNEST(@ids)"
+        try:
+            existing = [row["statement_id"] for row in self.client.query(query, job_config=job_config).result()]
+        except Exception as e:
+            # The MERGE is still idempotent; just stage the uncertain ids
+            logger.warning(f"Statement id lookup failed, merging {len(maybe)} uncertain row(s): {e}")
+            return known
+        self.index.record_lookup(maybe, existing)
+        return known + existing
+
+    def _qualified(self, table_id: str) -> str:
+        project = getattr(self.client, "project", None)
+        return f"{project}.{table_id}" if project else table_id
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "target_table": self.target_table,
+            "batch_size": self.config.batch_size,
+            "max_latency": self.config.max_latency,
+            "load_format": self.config.load_format,
+            "flusher_running": self._flusher is not None and self._flusher.is_alive(),
+            "index": self.index.get_status() if self.index is not None else None,
+            "metrics": dict(self.metrics),
+        }
@@ -0,0 +1,384 @@
+"""
+Partition and clustering layout manager for the BigQuery tables.
+
+Compares the layouts declared in ``app.config.bigquery_layout`` with the
+live tables and migrates the ones that drifted:
+
+* only ``require_partition_filter`` differs: the table is updated in place;
+* partitioning or clustering differs: CTAS-and-swap.  BigQuery cannot
+  re-partition a table in place, and new clustering only applies to newly
+  written data, so the table is rebuilt:
+
+  1. ``CREATE TABLE t__layout_<ts> PARTITION BY ... CLUSTER BY ... AS SELECT * FROM t``
+  2. optionally, bytes scanned by the standard dashboard queries on both tables
+  3. ``t`` is renamed to ``t__pre_layout_<ts>`` and the new table to ``t``
+  4. the old table is kept as a backup for ``backup_days`` days
+
+A rebuild needs the table's writers stopped for its whole duration: rows
+inserted or updated while the copy runs would not reach the new table, and
+the table does not exist between the two renames.  Stop the ETL consumers
+(``POST /api/etl/stop-bigquery-processor``, or scale the worker pool to
+zero); ingest keeps publishing and Pub/Sub holds the messages until they
+are restarted.  ``migrate`` refuses to rebuild without ``--writers-stopped``,
+and aborts before the swap if the table still has a streaming buffer, was
+modified while the copy ran, or the copy's row count differs.
+
+    python -m app.etl.bigquery_layout_manager plan
+    python -m app.etl.bigquery_layout_manager migrate --table statements --report --execute --writers-stopped
+    python -m app.etl.bigquery_layout_manager report --table statements --against statements__pre_layout_20250101T000000
+"""
+
+import argparse
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud import bigquery
+
+from app.config.bigquery_layout import TABLE_LAYOUTS, TableLayout, get_table_layout
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("bigquery_layout_manager")
+
+# Representative dashboard reads of ``statements`` (daily analytics, learner
+# and lesson drill-downs, verb breakdowns), used for the bytes-scanned report
+DASHBOARD_QUERIES: Dict[str, Dict[str, str]] = {
+    "statements": {
+        "daily_activity": """
+            SELECT actor_id, actor_name, object_name, verb_display, result_completion, timestamp
+            FROM `{table}`
+            WHERE DATE(timestamp) = @day AND verb_display IN ('completed', 'answered')
+        """,
+        "daily_verb_counts": """
+            SELECT verb_id, COUNT(*) AS statements
+            FROM `{table}`
+            WHERE DATE(timestamp) = @day
+            GROUP BY verb_id
+        """,
+        "learner_week": """
+            SELECT statement_id, verb_display, object_name, result_response, timestamp
+            FROM `{table}`
+            WHERE DATE(timestamp) BETWEEN @week_start AND @day AND actor_id = @actor_id
+        """,
+        "lesson_responses": """
+            SELECT actor_id, result_response, result_score_scaled
+            FROM `{table}`
+            WHERE DATE(timestamp) BETWEEN @week_start AND @day AND object_id = @object_id
+        """,
+        "verb_week": """
+            SELECT COUNT(DISTINCT COALESCE(normalized_user_id, actor_id)) AS learners
+            FROM `{table}`
+            WHERE DATE(timestamp) BETWEEN @week_start AND @day AND verb_id = @verb_id
+        """,
+    },
+}
+
+# Report query parameters that are dates; the rest are strings
+DATE_PARAMETERS = ("day", "week_start")
+
+
+def compare_layouts(declared: TableLayout, live: TableLayout) -> List[Dict[str, Any]]:
+    """Options where ``live`` differs from ``declared``."""
+    differences = []
+    for option in ("partition_field", "partition_type", "clustering", "require_partition_filter"):
+        if option == "partition_type" and not declared.partition_field:
+            continue
+        if option == "require_partition_filter" and not declared.partition_field:
+            continue
+        expected, actual = getattr(declared, option), getattr(live, option)
+        if expected != actual:
+            differences.append({"option": option, "declared": expected, "live": actual})
+    return differences
+
+
+class BigQueryLayoutManager:
+    """Detects layout drift and migrates tables to their declared layout."""
+
+    def __init__(
+        self,
+        client: bigquery.Client,
+        dataset_id: str,
+        layouts: Optional[Dict[str, TableLayout]] = None,
+        backup_days: int = 7,
+        maximum_bytes_billed: Optional[int] = 50 * 1024 ** 3,
+    ):
+        self.client = client
+        self.dataset_id = dataset_id
+        self.layouts = layouts if layouts is not None else TABLE_LAYOUTS
+        self.backup_days = backup_days
+        self.maximum_bytes_billed = maximum_bytes_billed
+
+    def table_ref(self, table_name: str) -> str:
+        project = getattr(self.client, "project", None)
+        return f"{project}.{self.dataset_id}.{table_name}" if project else f"{self.dataset_id}.{table_name}"
+
+    def _run(self, sql: str) -> bigquery.QueryJob:
+        job = self.client.query(sql)
+        job.result()
+        return job
+
+    # ------------------------------------------------------------------
+    # Drift
+    # ------------------------------------------------------------------
+
+    def check(self, table_name: str) -> Dict[str, Any]:
+        """Drift of one table: status ``ok``, ``drift``, ``invalid`` or ``missing`` and the needed action."""
+        declared = self.layouts.get(table_name) or get_table_layout(table_name)
+        try:
+            table = self.client.get_table(self.table_ref(table_name))
+        except gcp_exceptions.NotFound:
+            return {"table": table_name, "status": "missing", "action": "create", "differences": []}
+
+        differences = compare_layouts(declared, TableLayout.from_table(table))
+        columns = {field.name for field in table.schema}
+        unknown = [
+            name for name in [declared.partition_field, *declared.clustering]
+            if name and name not in columns
+        ]
+        if unknown:
+            status, action = "invalid", f"add column(s) {', '.join(unknown)} first"
+        elif not differences:
+            status, action = "ok", None
+        elif all(difference["option"] == "require_partition_filter" for difference in differences):
+            status, action = "drift", "update"
+        else:
+            status, action = "drift", "rebuild"
+        return {
+            "table": table_name,
+            "status": status,
+            "action": action,
+            "differences": differences,
+            "declared": declared.to_dict(),
+            "rows": table.num_rows,
+            "bytes": table.num_bytes,
+        }
+
+    def plan(self) -> List[Dict[str, Any]]:
+        """Drift report for every declared table."""
+        return [self.check(table_name) for table_name in self.layouts]
+
+    # ------------------------------------------------------------------
+    # Bytes-scanned report
+    # ------------------------------------------------------------------
+
+    def bytes_scanned(self, sql: str, execute: bool = False, parameters: Optional[Dict[str, Any]] = None) -> int:
+        """Bytes a query processes: a dry-run estimate, or the actual figure with ``execute``.
+
+        Dry runs account for partition pruning only; clustering savings
+        show up when the query is executed (cache disabled).
+        """
+        job_config = bigquery.QueryJobConfig(dry_run=not execute, use_query_cache=False)
+        job_config.query_parameters = self._bind(parameters or {})
+        if execute and self.maximum_bytes_billed:
+            job_config.maximum_bytes_billed = self.maximum_bytes_billed
+        job = self.client.query(sql, job_config=job_config)
+        if execute:
+            job.result()
+        return job.total_bytes_processed or 0
+
+    @staticmethod
+    def _bind(parameters: Dict[str, Any]) -> List[bigquery.ScalarQueryParameter]:
+        return [
+            bigquery.ScalarQueryParameter(name, "DATE" if name in DATE_PARAMETERS else "STRING", value)
+            for name, value in parameters.items()
+        ]
+
+    def _query_parameters(self, table_name: str, day: Optional[str]) -> Dict[str, Any]:
+        report_day = date.fromisoformat(day) if day else datetime.now(timezone.utc).date() - timedelta(days=1)
+        parameters: Dict[str, Any] = {
+            "day": report_day,
+            "week_start": report_day - timedelta(days=6),
+            "actor_id": "",
+            "verb_id": "",
+            "object_id": "",
+        }
+        # Filter values that actually occur, so the drill-down queries match rows
+        sample = f"""
+            SELECT actor_id, verb_id, object_id FROM `{self.table_ref(table_name)}`
+            WHERE DATE(timestamp) = @day LIMIT 1
+        """
+        try:
+            job_config = bigquery.QueryJobConfig(query_parameters=self._bind({"day": report_day}))
+            for row in self.client.query(sample, job_config=job_config).result():
+                parameters.update({key: str(row[key] or "") for key in ("actor_id", "verb_id", "object_id")})
+        except Exception as e:
+            logger.warning(f"Could not sample filter values from {table_name}: {e}")
+        return parameters
+
+    def report(
+        self,
+        table_name: str,
+        before: str,
+        after: str,
+        day: Optional[str] = None,
+        execute: bool = False,
+    ) -> Dict[str, Any]:
+        """Bytes scanned by the dashboard queries on table ``before`` vs table ``after``."""
+        queries = DASHBOARD_QUERIES.get(table_name, {})
+        parameters = self._query_parameters(before, day) if queries else {}
+        results = []
+        for name, template in queries.items():
+            before_bytes = self.bytes_scanned(template.format(table=self.table_ref(before)), execute, parameters)
+            after_bytes = self.bytes_scanned(template.format(table=self.table_ref(after)), execute, parameters)
+            results.append({
+                "query": name,
+                "before_bytes": before_bytes,
+                "after_bytes": after_bytes,
+                "reduction_pct": round(100 * (1 - after_bytes / before_bytes), 1) if before_bytes else 0.0,
+            })
+        total_before = sum(result["before_bytes"] for result in results)
+        total_after = sum(result["after_bytes"] for result in results)
+        return {
+            "table": table_name,
+            "before": before,
+            "after": after,
+            "day": parameters["day"].isoformat() if parameters else None,
+            "executed": execute,
+            "queries": results,
+            "total_before_bytes": total_before,
+            "total_after_bytes": total_after,
+            "reduction_pct": round(100 * (1 - total_after / total_before), 1) if total_before else 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Migration
+    # ------------------------------------------------------------------
+
+    def migrate(
+        self,
+        table_name: str,
+        dry_run: bool = False,
+        report: bool = False,
+        execute_report: bool = False,
+        day: Optional[str] = None,
+        writers_stopped: bool = False,
+    ) -> Dict[str, Any]:
+        """Bring ``table_name`` to its declared layout (see the module docstring)."""
+        check = self.check(table_name)
+        result: Dict[str, Any] = {"table": table_name, "check": check, "steps": []}
+        if check["action"] in (None, "create") or check["status"] == "invalid":
+            result["migrated"] = False
+            return result
+
+        declared = self.layouts.get(table_name) or get_table_layout(table_name)
+        target = self.table_ref(table_name)
+        if check["action"] == "update":
+            result["steps"].append(f"set require_partition_filter={declared.require_partition_filter}")
+            if not dry_run:
+                self._set_partition_filter(target, declared.require_partition_filter)
+            result["migrated"] = not dry_run
+            return result
+
+        suffix = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        staged_name, backup_name = f"{table_name}__layout_{suffix}", f"{table_name}__pre_layout_{suffix}"
+        staged, backup = self.table_ref(staged_name), self.table_ref(backup_name)
+        ctas = f"CREATE TABLE `{staged}`\n{declared.ddl_options()}\nAS SELECT * FROM `{target}`"
+        steps = [
+            ctas,
+            f"ALTER TABLE `{target}` RENAME TO {backup_name}",
+            f"ALTER TABLE `{staged}` RENAME TO {table_name}",
+            f"ALTER TABLE `{backup}` SET OPTIONS("
+            f"expiration_timestamp=TIMESTAMP_ADD(CURRENT_TIMESTAMP(), INTERVAL {self.backup_days} DAY))",
+        ]
+        result["steps"] = steps
+        if dry_run:
+            result["migrated"] = False
+            return result
+        if not writers_stopped:
+            return self._abort(result, f"stop the writers of {table_name} before rebuilding it (--writers-stopped)")
+
+        source = self.client.get_table(target)
+        modified = source.modified
+        if source.streaming_buffer is not None:
+            return self._abort(result, f"{table_name} still has a streaming buffer; its writers are not stopped")
+
+        logger.info(f"Rebuilding {target} with layout {declared.to_dict()}")
+        self._run(ctas)
+        result["rows_copied"] = self.client.get_table(staged).num_rows
+        if report:
+            result["report"] = self.report(table_name, table_name, staged_name, day, execute_report)
+
+        # Writers were supposed to be stopped; anything they changed since would be lost by the swap
+        current = self.client.get_table(target)
+        if current.modified != modified or current.streaming_buffer is not None:
+            self._run(f"DROP TABLE `{staged}`")
+            return self._abort(result, f"{table_name} was modified while it was copied; stop its writers and retry")
+        if result["rows_copied"] != current.num_rows:
+            self._run(f"DROP TABLE `{staged}`")
+            return self._abort(result, f"copied {result['rows_copied']} of {current.num_rows} rows of {table_name}")
+
+        self._run(steps[1])
+        try:
+            self._run(steps[2])
+        except Exception:
+            logger.error(f"Swap failed; restoring {table_name} from {backup_name}")
+            self._run(f"ALTER TABLE `{backup}` RENAME TO {table_name}")
+            raise
+        self._run(steps[3])
+
+        result["backup"] = backup_name
+        result["migrated"] = True
+        logger.info(f"Migrated {table_name}; previous table kept as {backup_name} for {self.backup_days} day(s)")
+        return result
+
+    @staticmethod
+    def _abort(result: Dict[str, Any], error: str) -> Dict[str, Any]:
+        logger.error(f"Not migrating {result['table']}: {error}")
+        result["error"] = error
+        result["migrated"] = False
+        return result
+
+    def _set_partition_filter(self, table_ref: str, required: bool) -> None:
+        table = self.client.get_table(table_ref)
+        table.require_partition_filter = required
+        self.client.update_table(table, ["require_partition_filter"])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="BigQuery partition and clustering layout manager.")
+    parser.add_argument("--dataset", help="defaults to GCP_BIGQUERY_DATASET")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("plan", help="show drift between declared and live layouts")
+    migrate = commands.add_parser("migrate", help="bring a table to its declared layout")
+    migrate.add_argument("--table", required=True)
+    migrate.add_argument("--dry-run", action="store_true", help="print the steps only")
+    migrate.add_argument("--report", action="store_true", help="bytes scanned before/after, ahead of the swap")
+    migrate.add_argument("--execute", action="store_true", help="run report queries instead of dry-running them")
+    migrate.add_argument("--day", help="report day, YYYY-MM-DD (default: yesterday)")
+    migrate.add_argument("--backup-days", type=int, default=7)
+    migrate.add_argument(
+        "--writers-stopped", action="store_true",
+        help="confirm the table's writers (ETL consumers) are stopped; required for a rebuild",
+    )
+    report = commands.add_parser("report", help="bytes scanned by the dashboard queries")
+    report.add_argument("--table", required=True)
+    report.add_argument("--against", required=True, help="table to compare with, e.g. a migration backup")
+    report.add_argument("--execute", action="store_true")
+    report.add_argument("--day")
+    args = parser.parse_args(argv)
+
+    from app.config.gcp_config import get_gcp_config
+
+    gcp_config = get_gcp_config()
+    manager = BigQueryLayoutManager(
+        gcp_config.bigquery_client,
+        args.dataset or gcp_config.bigquery_dataset,
+        backup_days=getattr(args, "backup_days", 7),
+    )
+    if args.command == "plan":
+        output: Any = manager.plan()
+    elif args.command == "migrate":
+        output = manager.migrate(
+            args.table, args.dry_run, args.report, args.execute, args.day, writers_stopped=args.writers_stopped
+        )
+    else:
+        output = manager.report(args.table, args.against, args.table, args.day, args.execute)
+    print(json_codec.dumps(output, indent=True, default=str))
+    if args.command == "migrate" and (output["check"]["status"] == "invalid" or "error" in output):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -19,6 +19,7 @@ from google.cloud import storage
 # Local imports
 from app.config.gcp_config import gcp_config
 from app.config.bigquery_schema import get_bigquery_schema
+from app.etl.retry_policy import MessageRetryHandler, PermanentError, TransientError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -44,6 +45,9 @@ class BigQuerySchemaMigration:
         self.subscription_path = None
         self.executor = ThreadPoolExecutor(max_workers=4)
 
+        # Transient failures are nacked with backoff, permanent ones dead-lettered in batches
+        self.retry = MessageRetryHandler("bigquery_migration")
+
         # Metrics and status
         self.metrics = {
             "messages_received": 0,
@@ -52,7 +56,7 @@ class BigQuerySchemaMigration:
             "bq_rows_inserted": 0,
             "last_message_time": None,
             "start_time": datetime.now(timezone.utc),
-            "errors": []
+            "errors": self.retry.error_log.entries  # bounded ring buffer
         }
 
     def ensure_subscription_exists(self) -> bool:
@@ -68,6 +72,7 @@ class BigQuerySchemaMigration:
             try:
                 self.subscriber.get_subscription(request={"subscription": self.subscription_path})
                 logger.info(f"BigQuery subscription already exists")
+                self.retry.policy.apply_to_subscription(self.subscriber, self.subscription_path)
                 return True
             except gcp_exceptions.NotFound:
                 # Create new subscription
@@ -75,7 +80,8 @@ class BigQuerySchemaMigration:
                     "name": self.subscription_path,
                     "topic": topic_path,
                     "ack_deadline_seconds": 300,  # 5 minutes for complex processing
-                    "enable_message_ordering": False
+                    "enable_message_ordering": False,
+                    "retry_policy": self.retry.policy.subscription_retry_policy()
                 }
                 self.subscriber.create_subscription(request)
                 logger.info(f"Created BigQuery subscription")
@@ -84,7 +90,7 @@ class BigQuerySchemaMigration:
         except Exception as e:
             error_msg = f"Failed to ensure subscription exists: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
+            self.retry.record_error(error_msg, e)
             return False
 
     def ensure_tables_exist(self) -> bool:
@@ -99,16 +105,17 @@ class BigQuerySchemaMigration:
             else:
                 error_msg = f"Failed to create tables: {results}"
                 logger.error(error_msg)
-                self.metrics["errors"].append(error_msg)
+                self.retry.record_error(error_msg)
                 return False
 
         except Exception as e:
             error_msg = f"Error ensuring tables exist: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
+            self.retry.record_error(error_msg, e)
             return False
 
-    def extract_actor_info(self, actor: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def extract_actor_info(actor: Dict[str, Any]) -> Dict[str, Any]:
         """Extract actor information from xAPI statement."""
         actor_info = {
             "actor_id": None,
@@ -143,7 +150,8 @@ class BigQuerySchemaMigration:
 
         return actor_info
 
-    def extract_verb_info(self, verb: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def extract_verb_info(verb: Dict[str, Any]) -> Dict[str, Any]:
         """Extract verb information from xAPI statement."""
         verb_info = {
             "verb_id": verb.get("id"),
@@ -162,7 +170,8 @@ class BigQuerySchemaMigration:
 
         return verb_info
 
-    def extract_activity_info(self, obj: Dict[str, Any]) -> Dict[str, Any]:
+    @staticmethod
+    def extract_activity_info(obj: Dict[str, Any]) -> Dict[str, Any]:
         """Extract activity information from xAPI statement."""
         activity_info = {
             "activity_id": obj.get("id"),
@@ -352,67 +361,75 @@ class BigQuerySchemaMigration:
     def insert_into_bigquery(self, data: Dict[str, Any]) -> bool:
         """Insert transformed data into BigQuery tables."""
         try:
-            # Insert statement
-            if "statement" in data:
-                table_ref = self.bq_client.dataset(self.dataset_id).table("statements")
-                table = self.bq_client.get_table(table_ref)
-
-                errors = self.bq_client.insert_rows(table, [data["statement"]])
-                if errors:
-                    logger.error(f"BigQuery insert errors: {errors}")
-                    return False
-
-            # Insert/update actor (upsert logic would be handled by BigQuery scheduled queries)
-            if "actor" in data:
-                table_ref = self.bq_client.dataset(self.dataset_id).table("actors")
-                table = self.bq_client.get_table(table_ref)
-
-                # For now, just insert - deduplication would be handled by scheduled queries
-                try:
-                    errors = self.bq_client.insert_rows(table, [data["actor"]])
-                    if errors:
-                        logger.debug(f"Actor insert errors (expected for duplicates): {errors}")
-                except Exception:
-                    # Ignore duplicate key errors for actors
-                    pass
-
-            # Insert/update verb
-            if "verb" in data:
-                table_ref = self.bq_client.dataset(self.dataset_id).table("verbs")
-                table = self.bq_client.get_table(table_ref)
-
-                try:
-                    errors = self.bq_client.insert_rows(table, [data["verb"]])
-                    if errors:
-                        logger.debug(f"Verb insert errors (expected for duplicates): {errors}")
-                except Exception:
-                    # Ignore duplicate key errors for verbs
-                    pass
-
-            # Insert/update activity
-            if "activity" in data and data["activity"]:
-                table_ref = self.bq_client.dataset(self.dataset_id).table("activities")
-                table = self.bq_client.get_table(table_ref)
-
-                try:
-                    errors = self.bq_client.insert_rows(table, [data["activity"]])
-                    if errors:
-                        logger.debug(f"Activity insert errors (expected for duplicates): {errors}")
-                except Exception:
-                    # Ignore duplicate key errors for activities
-                    pass
-
-            self.metrics["bq_rows_inserted"] += 1
+            self.write_to_bigquery(data)
             return True
 
         except Exception as e:
             error_msg = f"BigQuery insert error: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
+            self.retry.record_error(error_msg, e)
             return False
 
+    def write_to_bigquery(self, data: Dict[str, Any]) -> None:
+        """Insert transformed data into BigQuery tables; raises on a failed statement insert."""
+        # Insert statement
+        if "statement" in data:
+            table_ref = self.bq_client.dataset(self.dataset_id).table("statements")
+            table = self.bq_client.get_table(table_ref)
+
+            errors = self.bq_client.insert_rows(table, [data["statement"]])
+            if errors:
+                reasons = {error.get("reason") for row in errors for error in row.get("errors", [])}
+                # Rows BigQuery rejects as invalid will be rejected again on redelivery
+                if reasons == {"invalid"}:
+                    raise PermanentError(f"BigQuery rejected statement row: {errors}")
+                raise TransientError(f"BigQuery insert errors: {errors}")
+
+        # Insert/update actor (upsert logic would be handled by BigQuery scheduled queries)
+        if "actor" in data:
+            table_ref = self.bq_client.dataset(self.dataset_id).table("actors")
+            table = self.bq_client.get_table(table_ref)
+
+            # For now, just insert - deduplication would be handled by scheduled queries
+            try:
+                errors = self.bq_client.insert_rows(table, [data["actor"]])
+                if errors:
+                    logger.debug(f"Actor insert errors (expected for duplicates): {errors}")
+            except Exception:
+                # Ignore duplicate key errors for actors
+                pass
+
+        # Insert/update verb
+        if "verb" in data:
+            table_ref = self.bq_client.dataset(self.dataset_id).table("verbs")
+            table = self.bq_client.get_table(table_ref)
+
+            try:
+                errors = self.bq_client.insert_rows(table, [data["verb"]])
+                if errors:
+                    logger.debug(f"Verb insert errors (expected for duplicates): {errors}")
+            except Exception:
+                # Ignore duplicate key errors for verbs
+                pass
+
+        # Insert/update activity
+        if "activity" in data and data["activity"]:
+            table_ref = self.bq_client.dataset(self.dataset_id).table("activities")
+            table = self.bq_client.get_table(table_ref)
+
+            try:
+                errors = self.bq_client.insert_rows(table, [data["activity"]])
+                if errors:
+                    logger.debug(f"Activity insert errors (expected for duplicates): {errors}")
+            except Exception:
+                # Ignore duplicate key errors for activities
+                pass
+
+        self.metrics["bq_rows_inserted"] += 1
+
     def process_message(self, message) -> None:
         """Process a single Pub/Sub message."""
+        message_data = None
         try:
             self.metrics["messages_received"] += 1
 
@@ -426,42 +443,27 @@ class BigQuerySchemaMigration:
             structured_data = self.transform_xapi_to_structured(message_data)
 
             # Insert into BigQuery
-            if self.insert_into_bigquery(structured_data):
-                self.metrics["messages_processed"] += 1
-                self.metrics["last_message_time"] = datetime.now(timezone.utc)
+            self.write_to_bigquery(structured_data)
+            self.metrics["messages_processed"] += 1
+            self.metrics["last_message_time"] = datetime.now(timezone.utc)
 
-                # Acknowledge the message
-                message.ack()
-                logger.info(f"Successfully processed and inserted message {message_id}")
-            else:
-                # Don't acknowledge failed messages - they'll be retried
-                logger.warning(f"Failed to insert message {message_id}, not acknowledging")
+            # Acknowledge the message
+            message.ack()
+            self.retry.forget(message)
+            logger.info(f"Successfully processed and inserted message {message_id}")
 
         except json.JSONDecodeError as e:
             error_msg = f"Invalid JSON in message {message.message_id}: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
             self.metrics["messages_failed"] += 1
+            self.retry.handle_failure(message, e, error_msg)
         except Exception as e:
             error_msg = f"Unexpected error processing message {message.message_id}: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
             self.metrics["messages_failed"] += 1
-            
-            # Record failed statement for retry
-            try:
-                from app.etl.error_recovery import get_error_recovery
-                error_recovery = get_error_recovery()
-                error_recovery.record_failed_statement(
-                    statement_id=message.message_id,
-                    raw_statement=message_data,
-                    error_message=str(e),
-                    error_type=type(e).__name__,
-                    processing_stage="bigquery_migration",
-                    message_id=message.message_id
-                )
-            except Exception as recovery_error:
-                logger.error(f"Failed to record error for retry: {recovery_error}")
+
+            # Nacked for a backed-off retry, or recorded for recovery once it keeps failing
+            self.retry.handle_failure(message, e, error_msg, raw_statement=message_data)
 
     def start_migration(self) -> None:
         """Start the BigQuery migration subscription loop."""
@@ -506,6 +508,7 @@ class BigQuerySchemaMigration:
 
         # Convert datetime objects to ISO strings for JSON serialization
         metrics_copy = self.metrics.copy()
+        metrics_copy["errors"] = list(metrics_copy["errors"])[-10:]
         if metrics_copy.get("last_message_time"):
             metrics_copy["last_message_time"] = metrics_copy["last_message_time"].isoformat()
         metrics_copy["start_time"] = metrics_copy["start_time"].isoformat()
@@ -518,6 +521,7 @@ class BigQuerySchemaMigration:
             "uptime_seconds": uptime.total_seconds(),
             "subscription_path": self.subscription_path,
             "metrics": metrics_copy,
+            "retry": self.retry.get_status(),
             "last_check": datetime.now(timezone.utc).isoformat()
         }
 
@@ -0,0 +1,268 @@
+"""
+Columnar transform from xAPI statements to Arrow record batches and Parquet.
+
+The per-message path (``transform_xapi_to_bigquery_row``) builds one dict per
+statement.  Bulk paths - sink staging loads, archive replays, CSV imports -
+instead extract straight into one Python list per column and hand the lists
+to Arrow, which converts each column in a single call.  The Arrow schema is
+derived from BigQuery ``SchemaField``s, so the output matches
+``BigQuerySchema.get_statements_table_schema()`` (or any table's schema) and
+can be loaded with ``source_format=PARQUET``.
+
+``pyarrow`` is optional: ``ARROW_AVAILABLE`` tells callers whether to use
+this module or stay on their JSON path.
+"""
+
+import io
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from google.cloud import bigquery
+
+from app.config.bigquery_schema import BigQuerySchema
+from app.utils import json_codec
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = None
+    pq = None
+
+ARROW_AVAILABLE = pa is not None
+
+# Values the dict path fills in when the statement omits them
+DEFAULT_VERSION = "1.0.3"
+DEFAULT_ACTOR_TYPE = "Agent"
+DEFAULT_OBJECT_TYPE = "Activity"
+
+
+def _require_arrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is required for columnar transforms (pip install pyarrow)")
+
+
+def _arrow_type(field_type: str):
+    field_type = field_type.upper()
+    if field_type in ("STRING", "JSON"):
+        return pa.string()
+    if field_type == "TIMESTAMP":
+        return pa.timestamp("us", tz="UTC")
+    if field_type in ("FLOAT", "FLOAT64", "NUMERIC"):
+        return pa.float64()
+    if field_type in ("INTEGER", "INT64"):
+        return pa.int64()
+    if field_type in ("BOOLEAN", "BOOL"):
+        return pa.bool_()
+    if field_type == "DATE":
+        return pa.date32()
+    raise ValueError(f"No Arrow mapping for BigQuery type {field_type}")
+
+
+def arrow_schema(fields: Optional[Sequence[bigquery.SchemaField]] = None):
+    """Arrow schema for BigQuery ``fields`` (default: the statements table)."""
+    _require_arrow()
+    fields = fields or BigQuerySchema.get_statements_table_schema()
+    return pa.schema([
+        pa.field(field.name, _arrow_type(field.field_type), nullable=field.mode != "REQUIRED")
+        for field in fields
+    ])
+
+
+def statement_columns(
+    statements: Iterable[Dict[str, Any]],
+    stored: Optional[str] = None,
+) -> Dict[str, List[Any]]:
+    """Extract statements into one list per statements-table column.
+
+    Field rules mirror ``PubSubBigQueryProcessor.transform_xapi_to_bigquery_row``.
+    """
+    stored = stored or datetime.now(timezone.utc).isoformat()
+    statement_id, timestamp, stored_at, version = [], [], [], []
+    actor_id, actor_name, actor_type = [], [], []
+    verb_id, verb_display = [], []
+    object_id, object_name, object_type, object_definition_type = [], [], [], []
+    score_scaled, score_raw, score_min, score_max = [], [], [], []
+    success, completion, response, duration = [], [], [], []
+    registration, instructor_id, platform, language = [], [], [], []
+    raw_json = []
+
+    for statement in statements:
+        statement_id.append(statement.get("id", ""))
+        timestamp.append(statement.get("timestamp") or stored)
+        stored_at.append(stored)
+        version.append(statement.get("version", DEFAULT_VERSION))
+
+        actor = statement.get("actor") or {}
+        if "account" in actor and actor["account"]:
+            actor_id.append(actor["account"].get("name", ""))
+            actor_name.append(actor.get("name"))
+        elif "mbox" in actor:
+            actor_id.append(actor["mbox"])
+            actor_name.append(actor.get("name"))
+        else:
+            actor_id.append("")
+            actor_name.append(None)
+        actor_type.append(actor.get("objectType", DEFAULT_ACTOR_TYPE))
+
+        verb = statement.get("verb") or {}
+        verb_id.append(verb.get("id", ""))
+        display = verb.get("display")
+        verb_display.append(display["en-US"] if display and "en-US" in display else None)
+
+        obj = statement.get("object") or {}
+        name = definition_type = None
+        if isinstance(obj, dict):
+            object_id.append(obj.get("id", ""))
+            object_type.append(obj.get("objectType", DEFAULT_OBJECT_TYPE))
+            definition = obj.get("definition")
+            if definition and isinstance(definition, dict):
+                names = definition.get("name")
+                if names and isinstance(names, dict):
+                    name = names.get("en-US")
+                definition_type = definition.get("type")
+        else:
+            object_id.append("")
+            object_type.append(DEFAULT_OBJECT_TYPE)
+        object_name.append(name)
+        object_definition_type.append(definition_type)
+
+        # Like the dict path, result fields are only read when a score is present
+        result = statement.get("result") or {}
+        score = result.get("score") if result else None
+        if score:
+            score_scaled.append(score.get("scaled"))
+            score_raw.append(score.get("raw"))
+            score_min.append(score.get("min"))
+            score_max.append(score.get("max"))
+            success.append(result.get("success"))
+            completion.append(result.get("completion"))
+            response.append(result.get("response"))
+            duration.append(result.get("duration"))
+        else:
+            for column in (score_scaled, score_raw, score_min, score_max, success, completion, response, duration):
+                column.append(None)
+
+        context = statement.get("context") or {}
+        registration.append(context.get("registration"))
+        platform.append(context.get("platform"))
+        language.append(context.get("language"))
+        instructor = context.get("instructor")
+        if instructor and "account" in instructor and instructor["account"]:
+            instructor_id.append(instructor["account"].get("name"))
+        elif instructor and "mbox" in instructor:
+            instructor_id.append(instructor["mbox"])
+        else:
+            instructor_id.append(None)
+
+        raw_json.append(json_codec.dumps(statement))
+
+    return {
+        "statement_id": statement_id,
+        "timestamp": timestamp,
+        "stored": stored_at,
+        "version": version,
+        "actor_id": actor_id,
+        "actor_name": actor_name,
+        "actor_type": actor_type,
+        "verb_id": verb_id,
+        "verb_display": verb_display,
+        "object_id": object_id,
+        "object_name": object_name,
+        "object_type": object_type,
+        "object_definition_type": object_definition_type,
+        "result_score_scaled": score_scaled,
+        "result_score_raw": score_raw,
+        "result_score_min": score_min,
+        "result_score_max": score_max,
+        "result_success": success,
+        "result_completion": completion,
+        "result_response": response,
+        "result_duration": duration,
+        "context_registration": registration,
+        "context_instructor_id": instructor_id,
+        "context_platform": platform,
+        "context_language": language,
+        "raw_json": raw_json,
+    }
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed is not None and parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _coerce(value: Any, arrow_type) -> Any:
+    if value is None:
+        return None
+    if pa.types.is_string(arrow_type):
+        return value if isinstance(value, str) else json_codec.dumps(value, default=str)
+    if pa.types.is_floating(arrow_type) or pa.types.is_integer(arrow_type):
+        try:
+            return float(value) if pa.types.is_floating(arrow_type) else int(value)
+        except (TypeError, ValueError):
+            return None
+    if pa.types.is_boolean(arrow_type):
+        return value if isinstance(value, bool) else None
+    if pa.types.is_timestamp(arrow_type):
+        return _parse_timestamp(value)
+    return value
+
+
+def _column_array(values: List[Any], arrow_type):
+    """Convert a column in one Arrow call; fall back to per-value coercion for odd inputs."""
+    try:
+        if pa.types.is_timestamp(arrow_type) and not any(isinstance(value, datetime) for value in values):
+            return pa.array(values, pa.string()).cast(arrow_type)
+        return pa.array(values, arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError, OverflowError):
+        return pa.array([_coerce(value, arrow_type) for value in values], arrow_type)
+
+
+def columns_to_record_batch(columns: Dict[str, List[Any]], fields: Optional[Sequence[bigquery.SchemaField]] = None):
+    """Build a RecordBatch from per-column lists; missing columns become nulls."""
+    schema = arrow_schema(fields)
+    num_rows = max((len(values) for values in columns.values()), default=0)
+    arrays = [
+        _column_array(columns.get(field.name) or [None] * num_rows, field.type)
+        for field in schema
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def statements_to_record_batch(statements: Iterable[Dict[str, Any]], stored: Optional[str] = None):
+    """Decoded xAPI statements -> RecordBatch matching the statements table."""
+    return columns_to_record_batch(statement_columns(statements, stored))
+
+
+def rows_to_record_batch(rows: List[Dict[str, Any]], fields: Optional[Sequence[bigquery.SchemaField]] = None):
+    """Row dicts (e.g. already-transformed sink rows) -> RecordBatch for ``fields``."""
+    _require_arrow()
+    names = [field.name for field in (fields or BigQuerySchema.get_statements_table_schema())]
+    return columns_to_record_batch({name: [row.get(name) for row in rows] for name in names}, fields)
+
+
+def to_parquet_bytes(batch, compression: str = "snappy", row_group_size: Optional[int] = None) -> bytes:
+    """Serialize a RecordBatch to an in-memory Parquet file."""
+    _require_arrow()
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_batches([batch]), buffer, compression=compression, row_group_size=row_group_size)
+    return buffer.getvalue()
+
+
+def parquet_load_config(**overrides) -> bigquery.LoadJobConfig:
+    """Load job config for appending Parquet produced by this module."""
+    options = {
+        "source_format": bigquery.SourceFormat.PARQUET,
+        "write_disposition": bigquery.WriteDisposition.WRITE_APPEND,
+    }
+    options.update(overrides)
+    return bigquery.LoadJobConfig(**options)
@@ -120,49 +120,71 @@ class ErrorRecoverySystem:
         message_id: Optional[str] = None
     ) -> bool:
         """Record a failed statement for later retry."""
+        recorded = self.record_failed_statements([{
+            "statement_id": statement_id,
+            "raw_statement": raw_statement,
+            "error_message": error_message,
+            "error_type": error_type,
+            "processing_stage": processing_stage,
+            "message_id": message_id,
+        }])
+        return recorded == 1
+
+    def record_failed_statements(self, failures: List[Dict[str, Any]]) -> int:
+        """Record a batch of failed statements with one insert; returns how many were recorded."""
+        if not failures:
+            return 0
         try:
-            failed_statement = FailedStatement(
-                statement_id=statement_id,
-                raw_statement=raw_statement,
-                error_message=error_message,
-                error_type=error_type,
-                failed_at=datetime.now(timezone.utc).isoformat(),
-                processing_stage=processing_stage,
-                message_id=message_id
-            )
+            failed_statements = [
+                FailedStatement(
+                    statement_id=failure["statement_id"],
+                    raw_statement=failure["raw_statement"],
+                    error_message=failure["error_message"],
+                    error_type=failure["error_type"],
+                    failed_at=failure.get("failed_at") or datetime.now(timezone.utc).isoformat(),
+                    retry_count=failure.get("retry_count", 0),
+                    processing_stage=failure.get("processing_stage", "unknown"),
+                    message_id=failure.get("message_id")
+                )
+                for failure in failures
+            ]
             
             # Store in BigQuery
             table_id = f"{self.project_id}.{self.dataset_id}.failed_statements"
             table = self.bq_client.get_table(table_id)
             
             # Convert to BigQuery row format
-            row = {
-                "statement_id": failed_statement.statement_id,
-                "raw_statement": json.dumps(failed_statement.raw_statement),
-                "error_message": failed_statement.error_message,
-                "error_type": failed_statement.error_type,
-                "failed_at": failed_statement.failed_at,
-                "retry_count": failed_statement.retry_count,
-                "last_retry_at": failed_statement.last_retry_at,
-                "processing_stage": failed_statement.processing_stage,
-                "message_id": failed_statement.message_id,
-                "resolved_at": None
-            }
+            rows = [
+                {
+                    "statement_id": failed_statement.statement_id,
+                    "raw_statement": json.dumps(failed_statement.raw_statement, default=str),
+                    "error_message": failed_statement.error_message,
+                    "error_type": failed_statement.error_type,
+                    "failed_at": failed_statement.failed_at,
+                    "retry_count": failed_statement.retry_count,
+                    "last_retry_at": failed_statement.last_retry_at,
+                    "processing_stage": failed_statement.processing_stage,
+                    "message_id": failed_statement.message_id,
+                    "resolved_at": None
+                }
+                for failed_statement in failed_statements
+            ]
             
-            errors = self.bq_client.insert_rows(table, [row])
+            errors = self.bq_client.insert_rows(table, rows)
             if errors:
-                logger.error(f"Failed to record failed statement: {errors}")
-                return False
+                logger.error(f"Failed to record failed statements: {errors}")
+                return 0
             
             # Also publish to dead letter queue for immediate retry attempts
-            self._publish_to_dead_letter_queue(failed_statement)
+            for failed_statement in failed_statements:
+                self._publish_to_dead_letter_queue(failed_statement)
             
-            logger.info(f"Recorded failed statement {statement_id} for retry")
-            return True
+            logger.info(f"Recorded {len(rows)} failed statement(s) for retry")
+            return len(rows)
             
         except Exception as e:
-            logger.error(f"Failed to record failed statement {statement_id}: {str(e)}")
-            return False
+            logger.error(f"Failed to record {len(failures)} failed statement(s): {str(e)}")
+            return 0
     
     def _publish_to_dead_letter_queue(self, failed_statement: FailedStatement) -> bool:
         """Publish failed statement to dead letter queue for retry."""
@@ -0,0 +1,435 @@
+"""
+Columnar Parquet tier of the raw statement archive.
+
+Next to the NDJSON.gz segments, durably archived statements are also
+written as Parquet files in the statements-table schema
+(``BigQuerySchema.get_statements_table_schema()``), one directory per
+archive (publish) day::
+
+    xapi-parquet/dt=2025-01-01/part-20250101T131502Z-<writer>-000042.parquet
+
+Rows in each file are sorted by ``timestamp`` and written in row groups of
+``row_group_size``, so the min/max statistics of every row group let
+readers skip data.  ``read_parquet_archive`` prunes by ``dt`` directory,
+reads only the requested columns and pushes ``filters`` down to row
+groups; backfills and offline scans that need three columns no longer
+parse every byte of JSON.
+
+The tier is derived data: a file that fails to upload is logged and
+counted, and ``python -m app.etl.parquet_archive build --day YYYY-MM-DD``
+rebuilds a day from the JSON tier.  ``pyarrow`` is optional; without it
+the tier is skipped.
+"""
+
+import argparse
+import io
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.config import settings
+from app.etl import columnar_transform
+from app.etl.archive_segments import ArchiveSegmentConfig, iter_archived_statements
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow
+    pa = None
+    pq = None
+
+logger = get_logger("parquet_archive")
+
+PARQUET_SUFFIX = ".parquet"
+
+# pyarrow filter expression in disjunctive normal form, e.g. [("verb_id", "=", "...")]
+Filters = List[Tuple[str, str, Any]]
+
+
+@dataclass
+class ParquetArchiveConfig:
+    """Roll triggers and layout for the Parquet archive tier."""
+    prefix: str = "xapi-parquet"
+    max_records: int = 50000
+    max_age: float = 300.0  # seconds the oldest buffered record may wait
+    row_group_size: int = 10000
+    compression: str = "zstd"
+    upload_threads: int = 2  # encoding is CPU-bound; a couple of threads is enough
+    upload_attempts: int = 3
+    retry_backoff: float = 1.0
+    read_threads: int = 8
+    read_chunk_size: int = 1024 * 1024  # ranged reads per GCS request
+
+    @classmethod
+    def from_settings(cls) -> "ParquetArchiveConfig":
+        return cls(
+            prefix=settings.PARQUET_ARCHIVE_PREFIX,
+            max_records=settings.PARQUET_ARCHIVE_MAX_RECORDS,
+            max_age=settings.PARQUET_ARCHIVE_MAX_AGE,
+            row_group_size=settings.PARQUET_ARCHIVE_ROW_GROUP_SIZE,
+        )
+
+
+def _utc(value: Optional[datetime]) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+@dataclass
+class _Part:
+    day: str
+    opened_at: float
+    statements: List[Dict[str, Any]] = field(default_factory=list)
+    stored: List[str] = field(default_factory=list)
+
+
+class ParquetArchiveWriter:
+    """Buffers archived statements per day and uploads them as sorted Parquet files."""
+
+    def __init__(
+        self,
+        bucket,
+        config: Optional[ParquetArchiveConfig] = None,
+        writer_id: Optional[str] = None,
+        source: str = "pubsub_storage_subscriber",
+    ):
+        self.bucket = bucket
+        self.config = config or ParquetArchiveConfig.from_settings()
+        self.source = source
+        self.writer_id = writer_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._open: Dict[str, _Part] = {}
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._uploads: Dict[Future, int] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.upload_threads, thread_name_prefix="parquet-archive-upload"
+        )
+        self._flusher: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.metrics = {
+            "records_buffered": 0,
+            "records_written": 0,
+            "records_failed": 0,
+            "files_uploaded": 0,
+            "files_failed": 0,
+            "bytes_uploaded": 0,
+            "last_file": None,
+            "last_encode_ms": 0.0,
+        }
+
+    def append(self, statement: Dict[str, Any], published_at: Optional[datetime] = None) -> None:
+        """Buffer a durably archived statement under its publish day."""
+        published_at = _utc(published_at)
+        day = f"{published_at:%Y-%m-%d}"
+        self._ensure_flusher()
+        with self._condition:
+            part = self._open.get(day)
+            if part is None:
+                part = self._open[day] = _Part(day, time.monotonic())
+            part.statements.append(statement)
+            part.stored.append(published_at.isoformat())
+            self.metrics["records_buffered"] += 1
+            if len(part.statements) >= self.config.max_records:
+                self._roll(day)
+
+    def _roll(self, day: str) -> None:
+        """Close ``day``'s open part and queue its upload (caller holds the condition)."""
+        part = self._open.pop(day)
+        self._sequence += 1
+        name = f"part-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{self.writer_id}-{self._sequence:06d}"
+        self.metrics["records_buffered"] -= len(part.statements)
+        future = self._executor.submit(self._upload, part, f"{self.config.prefix}/dt={day}/{name}{PARQUET_SUFFIX}")
+        self._uploads[future] = len(part.statements)
+        future.add_done_callback(self._upload_done)
+
+    def _upload_done(self, future: Future) -> None:
+        with self._condition:
+            self._uploads.pop(future, None)
+            self._condition.notify_all()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._condition:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._stopping = False
+            self._flusher = threading.Thread(target=self._flush_loop, name="parquet-archive-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        """Roll parts whose oldest record has waited ``max_age``."""
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                for day, part in list(self._open.items()):
+                    if now - part.opened_at >= self.config.max_age:
+                        self._roll(day)
+                oldest = min((part.opened_at for part in self._open.values()), default=None)
+                wait_for = self.config.max_age if oldest is None else max(0.0, oldest + self.config.max_age - now)
+                self._condition.wait(wait_for)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Roll every open part and wait for all pending uploads."""
+        with self._condition:
+            for day in list(self._open):
+                self._roll(day)
+            pending = list(self._uploads)
+        wait(pending, timeout=timeout)
+
+    def close(self) -> None:
+        """Upload everything buffered and stop the flusher and upload threads."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def encode(self, part: _Part) -> Tuple[bytes, Dict[str, str]]:
+        """Parquet bytes for ``part``, rows sorted by ``timestamp``, plus blob metadata."""
+        columns = columnar_transform.statement_columns(part.statements)
+        columns["stored"] = part.stored
+        batch = columnar_transform.columns_to_record_batch(columns).sort_by("timestamp")
+        timestamps = batch.column("timestamp")
+        data = columnar_transform.to_parquet_bytes(
+            batch, compression=self.config.compression, row_group_size=self.config.row_group_size
+        )
+        metadata = {
+            "records": str(batch.num_rows),
+            "min_timestamp": str(timestamps[0]) if batch.num_rows else "",
+            "max_timestamp": str(timestamps[-1]) if batch.num_rows else "",
+            "source": self.source,
+        }
+        return data, metadata
+
+    def _upload(self, part: _Part, path: str) -> None:
+        started = time.perf_counter()
+        try:
+            data, metadata = self.encode(part)
+        except Exception as e:
+            logger.error(f"Could not encode Parquet archive file {path}: {e}")
+            self.metrics["files_failed"] += 1
+            self.metrics["records_failed"] += len(part.statements)
+            return
+        self.metrics["last_encode_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        for attempt in range(1, self.config.upload_attempts + 1):
+            try:
+                blob = self.bucket.blob(path)
+                blob.metadata = metadata
+                blob.upload_from_string(data, content_type="application/vnd.apache.parquet")
+                break
+            except Exception as e:
+                if attempt == self.config.upload_attempts:
+                    logger.error(
+                        f"Parquet archive file {path} failed after {attempt} attempt(s): {e}; "
+                        f"rebuild dt={part.day} with `python -m app.etl.parquet_archive build`"
+                    )
+                    self.metrics["files_failed"] += 1
+                    self.metrics["records_failed"] += len(part.statements)
+                    return
+                time.sleep(self.config.retry_backoff * (2 ** (attempt - 1)))
+
+        self.metrics["files_uploaded"] += 1
+        self.metrics["records_written"] += len(part.statements)
+        self.metrics["bytes_uploaded"] += len(data)
+        self.metrics["last_file"] = path
+        logger.info(f"Wrote {len(part.statements)} statement(s) to {path} ({len(data)} bytes)")
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._condition:
+            open_parts = {day: len(part.statements) for day, part in self._open.items()}
+            uploading = sum(self._uploads.values())
+        return {
+            "prefix": self.config.prefix,
+            "writer": self.writer_id,
+            "open_parts": open_parts,
+            "records_uploading": uploading,
+            "max_records": self.config.max_records,
+            "max_age": self.config.max_age,
+            "metrics": dict(self.metrics),
+        }
+
+
+def parquet_writer_from_settings(bucket, source: str = "pubsub_storage_subscriber") -> Optional[ParquetArchiveWriter]:
+    """Writer for ``bucket`` when ``PARQUET_ARCHIVE_ENABLED`` and pyarrow is installed."""
+    if not settings.PARQUET_ARCHIVE_ENABLED:
+        return None
+    if not columnar_transform.ARROW_AVAILABLE:
+        logger.warning("Parquet archive tier needs pyarrow; archiving JSON only")
+        return None
+    return ParquetArchiveWriter(bucket, source=source)
+
+
+# ----------------------------------------------------------------------
+# Reading
+# ----------------------------------------------------------------------
+
+
+def _days(start_day: str, end_day: Optional[str]) -> List[str]:
+    start = date.fromisoformat(start_day)
+    end = date.fromisoformat(end_day or start_day)
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+
+def parquet_objects(bucket, start_day: str, end_day: Optional[str] = None, config: Optional[ParquetArchiveConfig] = None):
+    """Parquet blobs in the ``dt`` directories from ``start_day`` to ``end_day`` (inclusive)."""
+    config = config or ParquetArchiveConfig.from_settings()
+    blobs = []
+    for day in _days(start_day, end_day):
+        blobs.extend(
+            blob for blob in bucket.list_blobs(prefix=f"{config.prefix}/dt={day}/")
+            if blob.name.endswith(PARQUET_SUFFIX)
+        )
+    return blobs
+
+
+def _read_object(blob, columns: Optional[Sequence[str]], filters: Optional[Filters], config: ParquetArchiveConfig):
+    # A seekable reader lets pyarrow fetch only the footer, the projected column chunks and unpruned row groups
+    if hasattr(blob, "open"):
+        source = blob.open("rb", chunk_size=config.read_chunk_size)
+    else:
+        source = io.BytesIO(blob.download_as_bytes())
+    with source:
+        return pq.read_table(source, columns=list(columns) if columns else None, filters=filters)
+
+
+def iter_parquet_archive(
+    bucket,
+    start_day: str,
+    end_day: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Filters] = None,
+    config: Optional[ParquetArchiveConfig] = None,
+) -> Iterator[Any]:
+    """Yield one Arrow table per Parquet file, reading ``read_threads`` files at a time.
+
+    ``columns`` projects (default: all); ``filters`` uses pyarrow's DNF
+    syntax, e.g. ``[("verb_id", "=", verb), ("timestamp", ">=", since)]``,
+    and skips row groups whose statistics cannot match.
+    """
+    if pq is None:
+        raise RuntimeError("pyarrow is required to read the Parquet archive (pip install pyarrow)")
+    config = config or ParquetArchiveConfig.from_settings()
+    blobs = parquet_objects(bucket, start_day, end_day, config)
+    with ThreadPoolExecutor(max_workers=config.read_threads, thread_name_prefix="parquet-archive-read") as executor:
+        yield from executor.map(lambda blob: _read_object(blob, columns, filters, config), blobs)
+
+
+def read_parquet_archive(
+    bucket,
+    start_day: str,
+    end_day: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    filters: Optional[Filters] = None,
+    config: Optional[ParquetArchiveConfig] = None,
+):
+    """One Arrow table of the matching rows (see ``iter_parquet_archive``)."""
+    tables = [table for table in iter_parquet_archive(bucket, start_day, end_day, columns, filters, config) if table.num_rows]
+    if tables:
+        return pa.concat_tables(tables)
+    schema = columnar_transform.arrow_schema()
+    if columns:
+        schema = pa.schema([schema.field(name) for name in columns])
+    return schema.empty_table()
+
+
+# ----------------------------------------------------------------------
+# Backfill from the JSON tier
+# ----------------------------------------------------------------------
+
+
+def build_parquet_day(
+    bucket,
+    day: str,
+    config: Optional[ParquetArchiveConfig] = None,
+    segment_config: Optional[ArchiveSegmentConfig] = None,
+) -> Dict[str, int]:
+    """Rewrite ``dt=day`` of the Parquet tier from the JSON tier.
+
+    Files that existed before the rebuild are deleted only after the new
+    ones are uploaded, so re-running a day replaces it rather than
+    duplicating it.  Run it for completed days: files a live writer
+    uploads for the same day during the rebuild are deleted too.
+    """
+    config = config or ParquetArchiveConfig.from_settings()
+    previous = parquet_objects(bucket, day, config=config)
+    writer = ParquetArchiveWriter(bucket, config, source="build")
+    counts = {"statements": 0, "replaced": 0, "failed": 0}
+    try:
+        for statement, published_at in iter_archived_statements(bucket, day, segment_config):
+            writer.append(statement, published_at)
+            counts["statements"] += 1
+    finally:
+        writer.close()
+    counts["failed"] = writer.metrics["records_failed"]
+    if counts["failed"]:
+        logger.error(f"Parquet rebuild of dt={day} left {counts['failed']} statement(s) unwritten; keeping old files")
+        return counts
+    for blob in previous:
+        blob.delete()
+        counts["replaced"] += 1
+    logger.info(f"Rebuilt Parquet dt={day}: {counts['statements']} statement(s), replaced {counts['replaced']} file(s)")
+    return counts
+
+
+def _parse_where(clauses: List[str]) -> Optional[Filters]:
+    filters = []
+    for clause in clauses:
+        column, sep, value = clause.partition("=")
+        if not sep:
+            raise SystemExit(f"--where expects column=value, got {clause!r}")
+        filters.append((column.strip(), "=", value))
+    return filters or None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Parquet archive tier maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="rebuild one day of Parquet from the JSON archive")
+    build.add_argument("--day", required=True, help="YYYY-MM-DD")
+    scan = commands.add_parser("scan", help="read columns from a range of days")
+    scan.add_argument("--start", required=True, help="YYYY-MM-DD")
+    scan.add_argument("--end", help="YYYY-MM-DD (default: --start)")
+    scan.add_argument("--columns", help="comma-separated, e.g. statement_id,timestamp,result_response")
+    scan.add_argument("--where", action="append", default=[], help="column=value (repeatable, ANDed)")
+    scan.add_argument("--limit", type=int, default=10, help="rows to print")
+    args = parser.parse_args(argv)
+
+    from app.config.gcp_config import get_gcp_config
+
+    gcp_config = get_gcp_config()
+    bucket = gcp_config.storage_client.bucket(gcp_config.storage_bucket)
+    if args.command == "build":
+        counts = build_parquet_day(bucket, args.day)
+        print(json_codec.dumps(counts))
+        if counts["failed"]:
+            sys.exit(1)
+        return
+
+    columns = [name.strip() for name in args.columns.split(",")] if args.columns else None
+    table = read_parquet_archive(bucket, args.start, args.end, columns, _parse_where(args.where))
+    print(json_codec.dumps({"rows": table.num_rows, "columns": table.column_names}))
+    for row in table.slice(0, args.limit).to_pylist():
+        print(json_codec.dumps(row, default=str))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -7,34 +7,52 @@ import json
 import logging
 import threading
 import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional, List
-from concurrent.futures import ThreadPoolExecutor
 
 # Google Cloud imports
 from google.cloud import pubsub_v1
 from google.api_core import exceptions as gcp_exceptions
-from google.cloud import bigquery
 
 # Local imports
 from app.config.gcp_config import get_gcp_config
+from app.etl.adaptive_flow_control import AdaptiveFlowConfig, AdaptiveFlowController
+from app.etl.bigquery_batch_sink import BigQueryBatchSink, SinkConfig
+from app.etl.retry_policy import MessageRetryHandler
+from app.etl.staged_pipeline import Stage, StagedPipeline
+from app.config import settings
 from app.logging_config import get_logger
+from app.services.statement_index import StatementIdIndex
 from app.services.user_normalization import get_user_normalization_service
+from app.utils import json_codec
 
 # Configure logging
 logger = get_logger("pubsub_bigquery_processor")
 
 
+@dataclass
+class _InFlight:
+    """A Pub/Sub message and what the pipeline stages have derived from it."""
+    message: Any
+    data: Dict[str, Any] = field(default_factory=dict)
+    statement: Optional[Dict[str, Any]] = None
+    row: Optional[Dict[str, Any]] = None
+
+
 class PubSubBigQueryProcessor:
     """Pub/Sub subscriber that loads xAPI statements into BigQuery."""
 
+    subscription_suffix = "bigquery-processor"
+    retry_stage = "bigquery_processor"
+
     def __init__(self):
         self.gcp_config = get_gcp_config()
         self.project_id = self.gcp_config.project_id
         self.topic_name = self.gcp_config.pubsub_topic
         self.dataset_id = self.gcp_config.bigquery_dataset
         self.table_id = "statements"
-        self.subscription_name = f"{self.topic_name}-bigquery-processor"
+        self.subscription_name = f"{self.topic_name}-{self.subscription_suffix}"
 
         # Initialize clients
         self.subscriber = pubsub_v1.SubscriberClient(credentials=self.gcp_config.credentials)
@@ -44,21 +62,65 @@ class PubSubBigQueryProcessor:
         self.table_ref = self.bigquery_client.dataset(self.dataset_id).table(self.table_id)
         self.table = self.bigquery_client.get_table(self.table_ref)
 
+        # Known statement ids skip the MERGE; only Bloom positives are looked up (per flush)
+        self.statement_index = StatementIdIndex.from_settings() if settings.STATEMENT_INDEX_ENABLED else None
+
+        # Subscriber FlowControl is the ceiling; the AIMD window below it follows sink health
+        sink_config = SinkConfig.from_settings()
+        self.flow_max_messages = settings.BIGQUERY_PROCESSOR_FLOW_MAX_MESSAGES or 2 * sink_config.batch_size
+        self.flow_max_bytes = settings.BIGQUERY_PROCESSOR_FLOW_MAX_BYTES
+        self.flow_controller = None
+        if settings.ETL_ADAPTIVE_FLOW_ENABLED:
+            self.flow_controller = AdaptiveFlowController(AdaptiveFlowConfig.from_settings(
+                max_messages=self.flow_max_messages,
+                max_bytes=self.flow_max_bytes,
+                max_batch_size=sink_config.batch_size,
+            ))
+
+        # Rows are committed in micro-batches; messages are acked once their flush lands
+        self.sink = BigQueryBatchSink(
+            self.bigquery_client,
+            self.dataset_id,
+            self.table_id,
+            sink_config,
+            index=self.statement_index,
+            on_flush=self.flow_controller.observe_flush if self.flow_controller else None,
+        )
+
+        # Deliveries received but not yet acked/nacked: ack_id -> (message, received_at)
+        self._held: Dict[str, Any] = {}
+        self._held_lock = threading.Lock()
+
+        # Transient failures are nacked with backoff, permanent ones dead-lettered in batches
+        self.retry = MessageRetryHandler(self.retry_stage)
+
         # Metrics and status
         self.metrics = {
             "messages_received": 0,
             "messages_processed": 0,
             "messages_failed": 0,
             "bigquery_rows_inserted": 0,
+            "ack_extensions": 0,
             "last_message_time": None,
             "start_time": datetime.now(timezone.utc),
-            "errors": []
+            "errors": self.retry.error_log.entries  # bounded ring buffer
         }
 
         # Control flags
         self.running = False
         self.subscription_path = None
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # decode -> enrich -> transform -> sink, on one long-lived event loop
+        self.pipeline = StagedPipeline(
+            [
+                Stage("decode", self._decode, settings.BIGQUERY_PROCESSOR_DECODE_WORKERS, settings.BIGQUERY_PROCESSOR_QUEUE_SIZE),
+                Stage("enrich", self._enrich, settings.BIGQUERY_PROCESSOR_ENRICH_WORKERS, settings.BIGQUERY_PROCESSOR_QUEUE_SIZE),
+                Stage("transform", self._transform, settings.BIGQUERY_PROCESSOR_TRANSFORM_WORKERS, settings.BIGQUERY_PROCESSOR_QUEUE_SIZE),
+                Stage("sink", self._sink, settings.BIGQUERY_PROCESSOR_SINK_WORKERS, settings.BIGQUERY_PROCESSOR_QUEUE_SIZE),
+            ],
+            on_error=self._on_stage_error,
+            executor_workers=settings.BIGQUERY_PROCESSOR_IO_THREADS,
+            name=self.subscription_suffix,
+        )
 
     def ensure_subscription_exists(self) -> bool:
         """Ensure the subscription exists, create if it doesn't."""
@@ -72,6 +134,7 @@ class PubSubBigQueryProcessor:
             try:
                 self.subscriber.get_subscription(request={"subscription": self.subscription_path})
                 logger.info(f"Subscription {self.subscription_name} already exists")
+                self.retry.policy.apply_to_subscription(self.subscriber, self.subscription_path)
                 return True
             except gcp_exceptions.NotFound:
                 # Create new subscription
@@ -79,7 +142,8 @@ class PubSubBigQueryProcessor:
                     "name": self.subscription_path,
                     "topic": topic_path,
                     "ack_deadline_seconds": 60,
-                    "enable_message_ordering": False
+                    "enable_message_ordering": False,
+                    "retry_policy": self.retry.policy.subscription_retry_policy()
                 }
                 self.subscriber.create_subscription(request)
                 logger.info(f"Created subscription {self.subscription_name}")
@@ -88,7 +152,7 @@ class PubSubBigQueryProcessor:
         except Exception as e:
             error_msg = f"Failed to ensure subscription exists: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
+            self.retry.record_error(error_msg, e)
             return False
 
     def transform_xapi_to_bigquery_row(self, message_data: Dict[str, Any], message_id: str, normalized_user_id: str = "") -> Dict[str, Any]:
@@ -198,7 +262,7 @@ class PubSubBigQueryProcessor:
                 "context_instructor_id": context_instructor_id,
                 "context_platform": context_platform,
                 "context_language": context_language,
-                "raw_json": json.dumps(message_data)
+                "raw_json": json_codec.dumps(message_data)
             }
 
             return row
@@ -207,199 +271,148 @@ class PubSubBigQueryProcessor:
             logger.error(f"Failed to transform xAPI statement: {str(e)}")
             raise
 
-    async def statement_exists(self, statement_id: str) -> bool:
-        """Check if a statement already exists in BigQuery."""
-        try:
-            query = f"""
-            SELECT statement_id 
-            FROM `{self.dataset_id}.{self.table_id}`
-            WHERE statement_id = @statement_id
-            LIMIT 1
-            """
-            
-            job_config = bigquery.QueryJobConfig()
-            job_config.query_parameters = [
-                bigquery.ScalarQueryParameter("statement_id", "STRING", statement_id)
-            ]
-            
-            results = self.bigquery_client.query(query, job_config=job_config)
-            return len(list(results)) > 0
-            
-        except Exception as e:
-            logger.warning(f"Error checking if statement exists: {e}")
-            # If check fails, proceed with insert (fail-safe)
-            return False
+    def _decode(self, item: _InFlight) -> _InFlight:
+        self.metrics["messages_received"] += 1
+        item.data = json_codec.loads(item.message.data)
+        logger.debug(
+            f"Processing message {item.message.message_id} for BigQuery (statement_id: {item.data.get('id', '')})"
+        )
+        return item
+
+    async def _enrich(self, item: _InFlight) -> _InFlight:
+        # Normalize user data and enrich with CSV metadata if matched
+        user_service = get_user_normalization_service()
+        item.statement = await user_service.normalize_xapi_statement(item.data)
+
+        # Ensure normalized_statement is not None
+        if item.statement is None:
+            logger.warning(
+                f"normalize_xapi_statement returned None for statement {item.data.get('id', '')}, using original"
+            )
+            item.statement = item.data
+        return item
+
+    def _transform(self, item: _InFlight) -> _InFlight:
+        # Transform xAPI statement to BigQuery row (already enriched by normalization)
+        normalized_user_id = item.statement.get("normalized_user_id", "")
+        item.row = self.transform_xapi_to_bigquery_row(item.statement, item.message.message_id, normalized_user_id)
+        return item
+
+    def _sink(self, item: _InFlight) -> None:
+        # Buffer for the next set-based MERGE (which also handles idempotency);
+        # the message is acked only after its flush commits
+        message = item.message
+        self.sink.add(item.row, lambda committed: self._on_row_committed(message, committed))
+
+    def _on_stage_error(self, stage: str, item: _InFlight, error: Exception) -> None:
+        if isinstance(error, json_codec.JSONDecodeError):
+            error_msg = f"Invalid JSON in message {item.message.message_id}: {str(error)}"
+        else:
+            error_msg = f"Unexpected error processing message {item.message.message_id} ({stage}): {str(error)}"
+        logger.error(error_msg)
+        self.metrics["messages_failed"] += 1
+        self.retry.handle_failure(item.message, error, error_msg, raw_statement=item.data or None)
+        self._settle(item.message)
 
-    async def insert_row_to_bigquery(self, row: Dict[str, Any], message_id: str) -> bool:
-        """Insert or update row in BigQuery using MERGE for idempotency."""
+    async def process_message(self, message) -> None:
+        """Process a single Pub/Sub message through every stage inline."""
+        item = _InFlight(message)
+        stage = "decode"
         try:
-            statement_id = row.get("statement_id", "")
-            table_id = f"{self.dataset_id}.{self.table_id}"
-            
-            # Use MERGE statement for idempotent insert (only inserts if not exists)
-            # Handle NULL booleans properly - use CAST(NULL AS BOOL) in SQL when None
-            result_success_val = row.get("result_success")
-            result_completion_val = row.get("result_completion")
-            
-            merge_query = f"""
-            MERGE `{table_id}` T
-            USING (SELECT 
-                @statement_id as statement_id,
-                @timestamp as timestamp,
-                @stored as stored,
-                @version as version,
-                @actor_id as actor_id,
-                @actor_name as actor_name,
-                @actor_type as actor_type,
-                @verb_id as verb_id,
-                @verb_display as verb_display,
-                @object_id as object_id,
-                @object_name as object_name,
-                @object_type as object_type,
-                @object_definition_type as object_definition_type,
-                @result_score_scaled as result_score_scaled,
-                @result_score_raw as result_score_raw,
-                @result_score_min as result_score_min,
-                @result_score_max as result_score_max,
-                {'@result_success' if result_success_val is not None else 'CAST(NULL AS BOOL)'} as result_success,
-                {'@result_completion' if result_completion_val is not None else 'CAST(NULL AS BOOL)'} as result_completion,
-                @result_response as result_response,
-                @result_duration as result_duration,
-                @context_registration as context_registration,
-                @context_instructor_id as context_instructor_id,
-                @context_platform as context_platform,
-                @context_language as context_language,
-                @raw_json as raw_json
-            ) S
-            ON T.statement_id = S.statement_id
-            WHEN NOT MATCHED THEN
-              INSERT (statement_id, timestamp, stored, version, actor_id, actor_name, actor_type,
-                      verb_id, verb_display, object_id, object_name, object_type, object_definition_type,
-                      result_score_scaled, result_score_raw, result_score_min, result_score_max,
-                      result_success, result_completion, result_response, result_duration,
-                      context_registration, context_instructor_id, context_platform, context_language,
-                      raw_json)
-              VALUES (S.statement_id, S.timestamp, S.stored, S.version, S.actor_id, S.actor_name, S.actor_type,
-                      S.verb_id, S.verb_display, S.object_id, S.object_name, S.object_type, S.object_definition_type,
-                      S.result_score_scaled, S.result_score_raw, S.result_score_min, S.result_score_max,
-                      S.result_success, S.result_completion, S.result_response, S.result_duration,
-                      S.context_registration, S.context_instructor_id, S.context_platform, S.context_language,
-                      S.raw_json)
-            """
-            
-            job_config = bigquery.QueryJobConfig()
-            params = [
-                bigquery.ScalarQueryParameter("statement_id", "STRING", row.get("statement_id", "")),
-                bigquery.ScalarQueryParameter("timestamp", "TIMESTAMP", row.get("timestamp")),
-                bigquery.ScalarQueryParameter("stored", "TIMESTAMP", row.get("stored")),
-                bigquery.ScalarQueryParameter("version", "STRING", row.get("version")),
-                bigquery.ScalarQueryParameter("actor_id", "STRING", row.get("actor_id", "")),
-                bigquery.ScalarQueryParameter("actor_name", "STRING", row.get("actor_name")),
-                bigquery.ScalarQueryParameter("actor_type", "STRING", row.get("actor_type")),
-                bigquery.ScalarQueryParameter("verb_id", "STRING", row.get("verb_id", "")),
-                bigquery.ScalarQueryParameter("verb_display", "STRING", row.get("verb_display")),
-                bigquery.ScalarQueryParameter("object_id", "STRING", row.get("object_id", "")),
-                bigquery.ScalarQueryParameter("object_name", "STRING", row.get("object_name")),
-                bigquery.ScalarQueryParameter("object_type", "STRING", row.get("object_type")),
-                bigquery.ScalarQueryParameter("object_definition_type", "STRING", row.get("object_definition_type")),
-                bigquery.ScalarQueryParameter("result_score_scaled", "FLOAT", row.get("result_score_scaled")),
-                bigquery.ScalarQueryParameter("result_score_raw", "FLOAT", row.get("result_score_raw")),
-                bigquery.ScalarQueryParameter("result_score_min", "FLOAT", row.get("result_score_min")),
-                bigquery.ScalarQueryParameter("result_score_max", "FLOAT", row.get("result_score_max")),
-                bigquery.ScalarQueryParameter("result_response", "STRING", row.get("result_response")),
-                bigquery.ScalarQueryParameter("result_duration", "STRING", row.get("result_duration")),
-                bigquery.ScalarQueryParameter("context_registration", "STRING", row.get("context_registration")),
-                bigquery.ScalarQueryParameter("context_instructor_id", "STRING", row.get("context_instructor_id")),
-                bigquery.ScalarQueryParameter("context_platform", "STRING", row.get("context_platform")),
-                bigquery.ScalarQueryParameter("context_language", "STRING", row.get("context_language")),
-                bigquery.ScalarQueryParameter("raw_json", "STRING", row.get("raw_json", ""))
-            ]
-            
-            # Only add boolean parameters if they're not None
-            if result_success_val is not None:
-                params.append(bigquery.ScalarQueryParameter("result_success", "BOOLEAN", result_success_val))
-            if result_completion_val is not None:
-                params.append(bigquery.ScalarQueryParameter("result_completion", "BOOLEAN", result_completion_val))
-            
-            job_config.query_parameters = params
-            
-            # Execute MERGE query
-            query_job = self.bigquery_client.query(merge_query, job_config=job_config)
-            query_job.result()  # Wait for completion
-            
-            # Check if this was an insert (MERGE only inserts when not matched)
-            num_rows_affected = query_job.num_dml_affected_rows or 0
-            if num_rows_affected > 0:
-                logger.info(f"Successfully inserted statement {statement_id} (message {message_id})")
-                self.metrics["bigquery_rows_inserted"] += 1
-            else:
-                logger.debug(f"Statement {statement_id} already exists, skipped duplicate insert (idempotent)")
-            
-            return True
-
+            self._decode(item)
+            stage = "enrich"
+            await self._enrich(item)
+            stage = "transform"
+            self._transform(item)
+            stage = "sink"
+            self._sink(item)
         except Exception as e:
-            error_msg = f"Failed to insert/update message {message_id} in BigQuery: {str(e)}"
-            logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
-            return False
+            self._on_stage_error(stage, item, e)
 
-    async def process_message(self, message) -> None:
-        """Process a single Pub/Sub message."""
+    def bootstrap_statement_index(self) -> None:
+        """Load every existing statement id into the membership index's Bloom filter."""
+        if self.statement_index is None:
+            return
         try:
-            self.metrics["messages_received"] += 1
-
-            # Decode message data
-            message_data = json.loads(message.data.decode('utf-8'))
-            message_id = message.message_id
-            statement_id = message_data.get("id", "")
-
-            logger.info(f"Processing message {message_id} for BigQuery (statement_id: {statement_id})")
-
-            # Check for duplicate statement (idempotency check)
-            if statement_id and await self.statement_exists(statement_id):
-                logger.info(f"Statement {statement_id} already exists, skipping duplicate (idempotent)")
-                # Acknowledge the message since we've already processed it
-                message.ack()
-                self.metrics["messages_processed"] += 1
-                return
-
-            # Normalize user data and enrich with CSV metadata if matched
-            user_service = get_user_normalization_service()
-            normalized_statement = await user_service.normalize_xapi_statement(message_data)
-            
-            # Ensure normalized_statement is not None
-            if normalized_statement is None:
-                logger.warning(f"normalize_xapi_statement returned None for statement {statement_id}, using original")
-                normalized_statement = message_data
-            
-            normalized_user_id = normalized_statement.get("normalized_user_id", "")
-
-            # Transform xAPI statement to BigQuery row (already enriched by normalization)
-            row = self.transform_xapi_to_bigquery_row(normalized_statement, message_id, normalized_user_id)
-
-            # Insert/update into BigQuery (MERGE handles idempotency)
-            if await self.insert_row_to_bigquery(row, message_id):
-                self.metrics["messages_processed"] += 1
-                self.metrics["last_message_time"] = datetime.now(timezone.utc)
-
-                # Acknowledge the message
-                message.ack()
-                logger.info(f"Successfully processed and acknowledged message {message_id}")
-            else:
-                # Don't acknowledge failed messages - they'll be retried
-                logger.warning(f"Failed to process message {message_id}, not acknowledging")
-                self.metrics["messages_failed"] += 1
-
-        except json.JSONDecodeError as e:
-            error_msg = f"Invalid JSON in message {message.message_id}: {str(e)}"
-            logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
-            self.metrics["messages_failed"] += 1
+            started = time.perf_counter()
+            query = f"SELECT statement_id FROM `{self.dataset_id}.{self.table_id}`"
+            rows = self.bigquery_client.query(query).result(page_size=50000)
+            count = self.statement_index.bootstrap(row["statement_id"] for row in rows if row["statement_id"])
+            logger.info(
+                f"Bootstrapped statement index with {count} ids in {time.perf_counter() - started:.1f}s "
+                f"({self.statement_index.bloom.memory_bytes / 1024 / 1024:.1f} MB)"
+            )
         except Exception as e:
-            error_msg = f"Unexpected error processing message {message.message_id}: {str(e)}"
+            # The sink still works without it: new rows go straight to the idempotent MERGE
+            error_msg = f"Failed to bootstrap statement index: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
+            self.retry.record_error(error_msg, e)
+
+    def _on_row_committed(self, message, committed: bool) -> None:
+        if committed:
+            self.metrics["messages_processed"] += 1
+            self.metrics["bigquery_rows_inserted"] = self.sink.metrics["rows_inserted"]
+            self.metrics["last_message_time"] = datetime.now(timezone.utc)
+            message.ack()
+            self.retry.forget(message)
+        else:
+            # Redelivered with backoff; dead-lettered once it keeps failing
+            error_msg = f"Failed to commit message {message.message_id} to BigQuery"
+            logger.warning(error_msg)
             self.metrics["messages_failed"] += 1
+            self.retry.handle_failure(message, error_msg=error_msg)
+        self._settle(message)
+
+    @staticmethod
+    def _delivery_key(message) -> Any:
+        # A redelivery shares the message_id but gets a new ack_id, and holds its own slot
+        return getattr(message, "ack_id", None) or id(message)
+
+    def _hold(self, message) -> None:
+        key = self._delivery_key(message)
+        with self._held_lock:
+            if key in self._held:
+                return
+        if self.flow_controller is not None:
+            self.flow_controller.acquire(len(message.data))
+        with self._held_lock:
+            self._held[key] = (message, time.monotonic())
+
+    def _settle(self, message) -> None:
+        """Release the delivery's flow-control slot; only the first settle of a hold releases."""
+        with self._held_lock:
+            held = self._held.pop(self._delivery_key(message), None)
+        if held is not None and self.flow_controller is not None:
+            self.flow_controller.release(len(message.data))
+
+    def extend_ack_deadlines(self) -> int:
+        """Push out the ack deadline of messages held longer than ``ETL_ACK_EXTENSION_AFTER``.
+
+        Keeps slow-to-commit messages leased past the subscriber's own lease
+        management, so a long flush does not turn into redeliveries.
+        """
+        cutoff = time.monotonic() - settings.ETL_ACK_EXTENSION_AFTER
+        with self._held_lock:
+            stale = [message for message, received_at in self._held.values() if received_at <= cutoff]
+        for message in stale:
+            try:
+                message.modify_ack_deadline(settings.ETL_ACK_EXTENSION_SECONDS)
+            except Exception as e:
+                logger.warning(f"Failed to extend ack deadline for message {message.message_id}: {e}")
+        self.metrics["ack_extensions"] += len(stale)
+        return len(stale)
+
+    def _control_loop(self) -> None:
+        interval = self.flow_controller.config.interval if self.flow_controller else settings.ETL_ADAPTIVE_FLOW_INTERVAL
+        while self.running:
+            time.sleep(interval)
+            try:
+                if self.flow_controller is not None:
+                    self.flow_controller.adjust()
+                    self.sink.config.batch_size = self.flow_controller.batch_size
+                self.extend_ack_deadlines()
+            except Exception as e:
+                logger.error(f"Flow control step failed: {e}")
 
     def start_processing(self) -> None:
         """Start the Pub/Sub subscription loop."""
@@ -410,18 +423,35 @@ class PubSubBigQueryProcessor:
         self.running = True
         logger.info(f"Starting Pub/Sub BigQuery processor for topic {self.topic_name}")
 
+        if self.statement_index is not None and not self.statement_index.ready:
+            threading.Thread(target=self.bootstrap_statement_index, name="statement-index-bootstrap", daemon=True).start()
+
+        # Steady-state enrichment reads user profiles from the cache only
+        user_service = get_user_normalization_service()
+        threading.Thread(target=user_service.warm_user_cache, name="user-cache-warmup", daemon=True).start()
+
+        self.pipeline.start()
+        threading.Thread(target=self._control_loop, name="bigquery-processor-flow-control", daemon=True).start()
+
         def callback(message):
-            """Callback function for message processing."""
+            """Hand the message to the pipeline; blocks while the flow window or decode queue is full."""
             try:
-                import asyncio
-                # Run the async process_message in a new event loop
-                asyncio.run(self.process_message(message))
+                self._hold(message)
+                self.pipeline.submit(_InFlight(message))
             except Exception as e:
                 logger.error(f"Error in message callback: {str(e)}")
+                message.nack()
+                self._settle(message)
 
         # Start the subscription
         try:
-            future = self.subscriber.subscribe(self.subscription_path, callback)
+            # By default allow a full batch to buffer while the previous one is flushing
+            flow_control = pubsub_v1.types.FlowControl(
+                max_messages=self.flow_max_messages,
+                max_bytes=self.flow_max_bytes,
+                max_lease_duration=settings.BIGQUERY_PROCESSOR_FLOW_MAX_LEASE_SECONDS,
+            )
+            future = self.subscriber.subscribe(self.subscription_path, callback, flow_control=flow_control)
 
             # Keep the main thread alive
             try:
@@ -441,6 +471,9 @@ class PubSubBigQueryProcessor:
     def stop_processing(self) -> None:
         """Stop the processor."""
         self.running = False
+        self.pipeline.stop()
+        self.sink.close()
+        get_user_normalization_service().activity_buffer.close()
         logger.info("Stopping Pub/Sub BigQuery processor")
 
     def get_subscription_queue_size(self) -> Dict[str, Any]:
@@ -484,7 +517,13 @@ class PubSubBigQueryProcessor:
             "running": self.running,
             "uptime_seconds": uptime.total_seconds(),
             "subscription_path": self.subscription_path,
-            "metrics": self.metrics.copy(),
+            "metrics": {**self.metrics, "errors": list(self.metrics["errors"])[-10:]},
+            "retry": self.retry.get_status(),
+            "pipeline": self.pipeline.get_status(),
+            "flow_control": self.flow_controller.get_status() if self.flow_controller else None,
+            "held_messages": len(self._held),
+            "sink": self.sink.get_status(),
+            "users": get_user_normalization_service().get_status(),
             "queue_info": self.get_subscription_queue_size(),
             "last_check": datetime.now(timezone.utc).isoformat()
         }
@@ -0,0 +1,297 @@
+"""
+Pub/Sub Safety Consumer for AI content analysis.
+Consumes ingested xAPI statements from its own subscription, runs the full AI
+safety analysis off the ingest path, and persists flagged results to the
+flagged_content table.
+
+Ingest only attaches a local-rules verdict (``ai_content_analysis`` with
+``analysis_method: local_rules``) and alerts immediately on critical hits;
+everything that needs Gemini or the batch processor happens here.
+"""
+
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Google Cloud imports
+from google.cloud import pubsub_v1
+from google.api_core import exceptions as gcp_exceptions
+
+# Local imports
+from app.config import settings
+from app.config.gcp_config import get_gcp_config
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("pubsub_safety_consumer")
+
+MAX_RECORDED_ERRORS = 100
+
+
+class PubSubSafetyConsumer:
+    """Pub/Sub subscriber that runs full AI safety analysis on ingested statements."""
+
+    def __init__(
+        self,
+        subscriber: Optional[Any] = None,
+        analyzer: Optional[Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None,
+        persistence: Optional[Any] = None,
+    ):
+        self.gcp_config = get_gcp_config()
+        self.project_id = self.gcp_config.project_id
+        self.topic_name = self.gcp_config.pubsub_topic
+        self.subscription_name = f"{self.topic_name}-safety-analyzer"
+        self.analysis_timeout = settings.SAFETY_ANALYSIS_TIMEOUT
+        self.max_in_flight = settings.SAFETY_CONSUMER_MAX_MESSAGES
+
+        self._subscriber = subscriber
+        self._analyzer = analyzer
+        self._persistence = persistence
+
+        # Dedicated event loop: AI analysis is async, Pub/Sub callbacks are threads
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+        # Metrics and status
+        self.metrics = {
+            "messages_received": 0,
+            "messages_analyzed": 0,
+            "messages_flagged": 0,
+            "messages_failed": 0,
+            "alerts_already_sent": 0,
+            "last_message_time": None,
+            "start_time": datetime.now(timezone.utc),
+            "errors": []
+        }
+
+        # Control flags
+        self.running = False
+        self.subscription_path = None
+        self._streaming_future = None
+
+    @property
+    def subscriber(self):
+        if self._subscriber is None:
+            self._subscriber = pubsub_v1.SubscriberClient(credentials=self.gcp_config.credentials)
+        return self._subscriber
+
+    @property
+    def analyzer(self) -> Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]:
+        if self._analyzer is None:
+            from app.api.ai_flagged_content import analyze_xapi_statement_content
+            self._analyzer = analyze_xapi_statement_content
+        return self._analyzer
+
+    @property
+    def persistence(self):
+        if self._persistence is None:
+            from app.services.flagged_content_persistence import flagged_content_persistence
+            self._persistence = flagged_content_persistence
+        return self._persistence
+
+    def _record_error(self, error_msg: str) -> None:
+        self.metrics["errors"].append(error_msg)
+        del self.metrics["errors"][:-MAX_RECORDED_ERRORS]
+
+    def ensure_subscription_exists(self) -> bool:
+        """Ensure the subscription exists, create if it doesn't."""
+        try:
+            topic_path = self.gcp_config.get_topic_path()
+            self.subscription_path = self.subscriber.subscription_path(
+                self.project_id, self.subscription_name
+            )
+
+            # Try to get existing subscription
+            try:
+                self.subscriber.get_subscription(request={"subscription": self.subscription_path})
+                logger.info(f"Subscription {self.subscription_name} already exists")
+                return True
+            except gcp_exceptions.NotFound:
+                # AI calls can be slow, so give the analyzer a longer ack deadline
+                request = {
+                    "name": self.subscription_path,
+                    "topic": topic_path,
+                    "ack_deadline_seconds": 300,
+                    "enable_message_ordering": False
+                }
+                self.subscriber.create_subscription(request)
+                logger.info(f"Created subscription {self.subscription_name}")
+                return True
+
+        except Exception as e:
+            error_msg = f"Failed to ensure subscription exists: {str(e)}"
+            logger.error(error_msg)
+            self._record_error(error_msg)
+            return False
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name="safety-consumer-loop",
+                    daemon=True,
+                ).start()
+            return self._loop
+
+    async def analyze_statement(self, statement: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the full AI analysis for a statement and persist it if flagged."""
+        from app.services.flagged_content_persistence import statement_alert_fields
+
+        analysis = await self.analyzer(statement)
+        self.metrics["messages_analyzed"] += 1
+
+        if analysis.get("is_flagged", False):
+            self.metrics["messages_flagged"] += 1
+            local_verdict = statement.get("ai_content_analysis") or {}
+            alert_sent = bool((local_verdict.get("analysis_metadata") or {}).get("immediate_alert_sent"))
+            if alert_sent:
+                self.metrics["alerts_already_sent"] += 1
+
+            fields = statement_alert_fields(statement)
+            await self.persistence.persist_flagged_content(
+                statement_id=fields["statement_id"],
+                timestamp=fields["timestamp"],
+                actor_id=fields["actor_id"],
+                actor_name=fields["actor_name"],
+                content=fields["content"],
+                analysis_result=analysis,
+                cohort=fields["cohort"],
+                send_alert=not alert_sent
+            )
+            logger.info(
+                f"Flagged statement {fields['statement_id']} "
+                f"(severity: {analysis.get('severity')}, local: {local_verdict.get('severity', 'n/a')})"
+            )
+
+        return analysis
+
+    def process_message(self, message) -> None:
+        """Process a single Pub/Sub message."""
+        try:
+            self.metrics["messages_received"] += 1
+            statement = json_codec.loads(message.data)
+        except (json_codec.JSONDecodeError, UnicodeDecodeError) as e:
+            # Redelivery won't fix a malformed payload; the BigQuery processor records it
+            error_msg = f"Invalid JSON in message {message.message_id}: {str(e)}"
+            logger.error(error_msg)
+            self._record_error(error_msg)
+            self.metrics["messages_failed"] += 1
+            message.ack()
+            return
+
+        try:
+            future = asyncio.run_coroutine_threadsafe(self.analyze_statement(statement), self._get_loop())
+            future.result(timeout=self.analysis_timeout)
+            self.metrics["last_message_time"] = datetime.now(timezone.utc)
+            message.ack()
+        except Exception as e:
+            error_msg = f"Safety analysis failed for message {message.message_id}: {type(e).__name__}: {str(e)}"
+            logger.error(error_msg)
+            self._record_error(error_msg)
+            self.metrics["messages_failed"] += 1
+            message.nack()
+
+    def start_consuming(self) -> None:
+        """Start the Pub/Sub subscription loop."""
+        if not self.ensure_subscription_exists():
+            logger.error("Cannot start safety consumer: subscription setup failed")
+            return
+
+        self.running = True
+        logger.info(f"Starting Pub/Sub safety consumer for topic {self.topic_name}")
+
+        def callback(message):
+            """Callback function for message processing."""
+            try:
+                self.process_message(message)
+            except Exception as e:
+                logger.error(f"Error in message callback: {str(e)}")
+
+        # Bound concurrent AI analyses; extra messages stay on the subscription
+        flow_control = pubsub_v1.types.FlowControl(max_messages=self.max_in_flight)
+
+        try:
+            self._streaming_future = self.subscriber.subscribe(
+                self.subscription_path, callback, flow_control=flow_control
+            )
+
+            # Keep the thread alive
+            try:
+                self._streaming_future.result()
+            except KeyboardInterrupt:
+                logger.info("Stopping safety consumer...")
+                self._streaming_future.cancel()
+            except Exception as e:
+                logger.error(f"Safety consumer error: {str(e)}")
+
+        except Exception as e:
+            logger.error(f"Failed to start subscription: {str(e)}")
+        finally:
+            self.running = False
+            self.subscriber.close()
+
+    def stop_consuming(self) -> None:
+        """Stop the consumer."""
+        self.running = False
+        if self._streaming_future is not None:
+            self._streaming_future.cancel()
+        logger.info("Stopping Pub/Sub safety consumer")
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get consumer status and metrics."""
+        uptime = datetime.now(timezone.utc) - self.metrics["start_time"]
+        metrics = {
+            **self.metrics,
+            "errors": list(self.metrics["errors"][-10:]),
+            "start_time": self.metrics["start_time"].isoformat(),
+            "last_message_time": (
+                self.metrics["last_message_time"].isoformat()
+                if self.metrics["last_message_time"] else None
+            ),
+        }
+
+        return {
+            "consumer_name": self.subscription_name,
+            "topic": self.topic_name,
+            "running": self.running,
+            "max_in_flight": self.max_in_flight,
+            "analysis_timeout_seconds": self.analysis_timeout,
+            "uptime_seconds": uptime.total_seconds(),
+            "subscription_path": self.subscription_path,
+            "metrics": metrics,
+            "last_check": datetime.now(timezone.utc).isoformat()
+        }
+
+
+# Global consumer instance (lazy-loaded)
+_consumer = None
+
+
+def get_safety_consumer() -> PubSubSafetyConsumer:
+    """Get the global safety consumer instance (lazy-loaded)."""
+    global _consumer
+    if _consumer is None:
+        _consumer = PubSubSafetyConsumer()
+    return _consumer
+
+
+def start_safety_consumer_background() -> None:
+    """Start the safety consumer in a background thread."""
+    def run_consumer():
+        try:
+            get_safety_consumer().start_consuming()
+        except Exception as e:
+            logger.error(f"Safety consumer failed to start: {e}")
+
+    thread = threading.Thread(target=run_consumer, daemon=True)
+    thread.start()
+    logger.info("Started Pub/Sub safety consumer in background")
+
+
+def stop_safety_consumer() -> None:
+    """Stop the safety consumer."""
+    if _consumer:
+        _consumer.stop_consuming()
@@ -1,6 +1,10 @@
 """
 Pub/Sub Storage Subscriber for xAPI data archival.
 Consumes messages from Pub/Sub topic and stores raw xAPI statements in Cloud Storage.
+
+With ``ARCHIVE_SEGMENTS_ENABLED`` statements go to rolling NDJSON.gz
+segments (see ``archive_segments``) and each message is acked once its
+segment is uploaded; otherwise every statement is its own JSON object.
 """
 
 import json
@@ -17,7 +21,13 @@ from google.api_core import exceptions as gcp_exceptions
 from google.cloud import storage
 
 # Local imports
+from app.config import settings
 from app.config.gcp_config import gcp_config
+from app.etl.archive_index import get_archive_index
+from app.etl.archive_segments import ArchiveSegmentConfig, SegmentArchiveWriter
+from app.etl.parquet_archive import parquet_writer_from_settings
+from app.etl.retry_policy import MessageRetryHandler, TransientError
+from app.utils import json_codec
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +50,23 @@ class PubSubStorageSubscriber:
         # Storage bucket
         self.bucket = self.storage_client.bucket(self.bucket_name)
 
+        # Per-day archive counts, so storage metrics never list the bucket
+        self.archive_index = get_archive_index()
+
+        # Messages are held until their segment is uploaded, so the flow window must fit segments
+        self.segment_writer = None
+        self.flow_max_messages = None
+        if settings.ARCHIVE_SEGMENTS_ENABLED:
+            segment_config = ArchiveSegmentConfig.from_settings()
+            self.segment_writer = SegmentArchiveWriter(self.bucket, segment_config, index=self.archive_index)
+            self.flow_max_messages = settings.ARCHIVE_FLOW_MAX_MESSAGES or 2 * segment_config.max_records
+
+        # Columnar copy of what was durably archived, for scans that need a few columns
+        self.parquet_writer = parquet_writer_from_settings(self.bucket)
+
+        # Transient failures are nacked with backoff, permanent ones dead-lettered in batches
+        self.retry = MessageRetryHandler("storage_subscriber")
+
         # Metrics and status
         self.metrics = {
             "messages_received": 0,
@@ -48,7 +75,7 @@ class PubSubStorageSubscriber:
             "storage_objects_created": 0,
             "last_message_time": None,
             "start_time": datetime.now(timezone.utc),
-            "errors": []
+            "errors": self.retry.error_log.entries  # bounded ring buffer
         }
 
         # Control flags
@@ -68,6 +95,7 @@ class PubSubStorageSubscriber:
             try:
                 self.subscriber.get_subscription(request={"subscription": self.subscription_path})
                 logger.info(f"Subscription {self.subscription_name} already exists")
+                self.retry.policy.apply_to_subscription(self.subscriber, self.subscription_path)
                 return True
             except gcp_exceptions.NotFound:
                 # Create new subscription
@@ -75,7 +103,8 @@ class PubSubStorageSubscriber:
                     "name": self.subscription_path,
                     "topic": topic_path,
                     "ack_deadline_seconds": 60,
-                    "enable_message_ordering": False
+                    "enable_message_ordering": False,
+                    "retry_policy": self.retry.policy.subscription_retry_policy()
                 }
                 self.subscriber.create_subscription(request)
                 logger.info(f"Created subscription {self.subscription_name}")
@@ -84,7 +113,7 @@ class PubSubStorageSubscriber:
         except Exception as e:
             error_msg = f"Failed to ensure subscription exists: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
+            self.retry.record_error(error_msg, e)
             return False
 
     def ensure_bucket_exists(self) -> bool:
@@ -99,18 +128,20 @@ class PubSubStorageSubscriber:
         except Exception as e:
             error_msg = f"Failed to ensure bucket exists: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
+            self.retry.record_error(error_msg, e)
             return False
 
-    def generate_storage_path(self, message_data: Dict[str, Any], message_id: str) -> str:
+    @staticmethod
+    def generate_storage_path(message_data: Dict[str, Any], message_id: str) -> str:
         """Generate a structured storage path for the xAPI statement."""
         timestamp = datetime.now(timezone.utc)
 
         # Extract actor ID if available
         actor_id = "unknown"
         if "actor" in message_data and isinstance(message_data["actor"], dict):
-            if "account" in message_data["actor"]:
-                actor_id = message_data["actor"]["account"].get("name", "unknown")
+            # The ingest routes serialize unset actor fields as null
+            if isinstance(message_data["actor"].get("account"), dict):
+                actor_id = message_data["actor"]["account"].get("name") or "unknown"
             elif "mbox" in message_data["actor"] and message_data["actor"]["mbox"] and isinstance(message_data["actor"]["mbox"], str):
                 # Normalize email to lowercase for consistency
                 mbox_value = message_data["actor"]["mbox"]
@@ -131,88 +162,106 @@ class PubSubStorageSubscriber:
 
         return path
 
-    def store_message_to_gcs(self, message_data: Dict[str, Any], message_id: str) -> bool:
-        """Store xAPI message to Cloud Storage."""
-        try:
-            # Generate storage path
-            blob_path = self.generate_storage_path(message_data, message_id)
-
-            # Create blob
-            blob = self.bucket.blob(blob_path)
-
-            # Add metadata
-            metadata = {
-                "message_id": message_id,
-                "stored_at": datetime.now(timezone.utc).isoformat(),
-                "source": "pubsub_storage_subscriber",
-                "content_type": "application/json"
-            }
+    def upload_message(self, message_data: Dict[str, Any], message_id: str) -> str:
+        """Store xAPI message to Cloud Storage; returns the blob path and raises on failure."""
+        # Generate storage path
+        blob_path = self.generate_storage_path(message_data, message_id)
 
-            # Store the message
-            json_data = json.dumps(message_data, indent=2)
-            blob.metadata = metadata
-            blob.upload_from_string(json_data, content_type="application/json")
+        # Create blob
+        blob = self.bucket.blob(blob_path)
 
-            logger.info(f"Stored message {message_id} to gs://{self.bucket_name}/{blob_path}")
-            self.metrics["storage_objects_created"] += 1
+        # Add metadata
+        metadata = {
+            "message_id": message_id,
+            "stored_at": datetime.now(timezone.utc).isoformat(),
+            "source": "pubsub_storage_subscriber",
+            "content_type": "application/json"
+        }
+
+        # Store the message
+        json_data = json_codec.dumps(message_data, indent=True)
+        blob.metadata = metadata
+        blob.upload_from_string(json_data, content_type="application/json")
+        if self.archive_index is not None:
+            self.archive_index.record(datetime.now(timezone.utc), size=len(json_data))
+
+        logger.info(f"Stored message {message_id} to gs://{self.bucket_name}/{blob_path}")
+        self.metrics["storage_objects_created"] += 1
+        return blob_path
 
+    def store_message_to_gcs(self, message_data: Dict[str, Any], message_id: str) -> bool:
+        """Store xAPI message to Cloud Storage."""
+        try:
+            self.upload_message(message_data, message_id)
             return True
 
         except Exception as e:
             error_msg = f"Failed to store message {message_id}: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
+            self.retry.record_error(error_msg, e)
             self.metrics["messages_failed"] += 1
             return False
 
+    def archive_to_segment(self, message, message_data: Dict[str, Any]) -> None:
+        """Buffer the statement in a segment; the message is settled once the segment uploads."""
+        message_id = message.message_id
+        publish_time = getattr(message, "publish_time", None)
+
+        def on_durable(committed: bool) -> None:
+            if committed:
+                self.metrics["messages_processed"] += 1
+                self.metrics["last_message_time"] = datetime.now(timezone.utc)
+                message.ack()
+                self.retry.forget(message)
+                if self.parquet_writer is not None:
+                    self.parquet_writer.append(message_data, publish_time)
+                return
+            error_msg = f"Archive segment upload failed for message {message_id}"
+            self.metrics["messages_failed"] += 1
+            self.retry.handle_failure(message, TransientError(error_msg), error_msg, raw_statement=message_data)
+
+        self.segment_writer.append(message_data, on_durable, publish_time)
+
     def process_message(self, message) -> None:
         """Process a single Pub/Sub message."""
+        message_data = None
         try:
             self.metrics["messages_received"] += 1
 
             # Decode message data
-            message_data = json.loads(message.data.decode('utf-8'))
+            message_data = json_codec.loads(message.data)
             message_id = message.message_id
 
+            if self.segment_writer is not None:
+                self.archive_to_segment(message, message_data)
+                return
+
             logger.info(f"Processing message {message_id}")
 
             # Store to Cloud Storage
-            if self.store_message_to_gcs(message_data, message_id):
-                self.metrics["messages_processed"] += 1
-                self.metrics["last_message_time"] = datetime.now(timezone.utc)
-
-                # Acknowledge the message
-                message.ack()
-                logger.info(f"Successfully processed and acknowledged message {message_id}")
-            else:
-                # Don't acknowledge failed messages - they'll be retried
-                logger.warning(f"Failed to process message {message_id}, not acknowledging")
-
-        except json.JSONDecodeError as e:
+            self.upload_message(message_data, message_id)
+            if self.parquet_writer is not None:
+                self.parquet_writer.append(message_data, getattr(message, "publish_time", None))
+            self.metrics["messages_processed"] += 1
+            self.metrics["last_message_time"] = datetime.now(timezone.utc)
+
+            # Acknowledge the message
+            message.ack()
+            self.retry.forget(message)
+            logger.info(f"Successfully processed and acknowledged message {message_id}")
+
+        except json_codec.JSONDecodeError as e:
             error_msg = f"Invalid JSON in message {message.message_id}: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
             self.metrics["messages_failed"] += 1
+            self.retry.handle_failure(message, e, error_msg)
         except Exception as e:
             error_msg = f"Unexpected error processing message {message.message_id}: {str(e)}"
             logger.error(error_msg)
-            self.metrics["errors"].append(error_msg)
             self.metrics["messages_failed"] += 1
-            
-            # Record failed statement for retry
-            try:
-                from app.etl.error_recovery import get_error_recovery
-                error_recovery = get_error_recovery()
-                error_recovery.record_failed_statement(
-                    statement_id=message.message_id,
-                    raw_statement=message_data,
-                    error_message=str(e),
-                    error_type=type(e).__name__,
-                    processing_stage="storage_subscriber",
-                    message_id=message.message_id
-                )
-            except Exception as recovery_error:
-                logger.error(f"Failed to record error for retry: {recovery_error}")
+
+            # Nacked for a backed-off retry, or recorded for recovery once it keeps failing
+            self.retry.handle_failure(message, e, error_msg, raw_statement=message_data)
 
     def start_subscribing(self) -> None:
         """Start the Pub/Sub subscription loop."""
@@ -226,6 +275,8 @@ class PubSubStorageSubscriber:
 
         self.running = True
         logger.info(f"Starting Pub/Sub subscriber for topic {self.topic_name}")
+        if self.archive_index is not None:
+            self.archive_index.start()
 
         def callback(message):
             """Callback function for message processing."""
@@ -236,7 +287,10 @@ class PubSubStorageSubscriber:
 
         # Start the subscription
         try:
-            future = self.subscriber.subscribe(self.subscription_path, callback)
+            flow_control = None
+            if self.flow_max_messages:
+                flow_control = pubsub_v1.types.FlowControl(max_messages=self.flow_max_messages)
+            future = self.subscriber.subscribe(self.subscription_path, callback, flow_control=flow_control)
 
             # Keep the main thread alive
             try:
@@ -256,6 +310,13 @@ class PubSubStorageSubscriber:
     def stop_subscribing(self) -> None:
         """Stop the subscription."""
         self.running = False
+        if self.segment_writer is not None:
+            # Upload what is buffered so those messages are acked rather than redelivered
+            self.segment_writer.close()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+        if self.archive_index is not None:
+            self.archive_index.stop()
         logger.info("Stopping Pub/Sub storage subscriber")
 
     def get_status(self) -> Dict[str, Any]:
@@ -269,25 +330,54 @@ class PubSubStorageSubscriber:
             "running": self.running,
             "uptime_seconds": uptime.total_seconds(),
             "subscription_path": self.subscription_path,
-            "metrics": self.metrics.copy(),
+            "metrics": {**self.metrics, "errors": list(self.metrics["errors"])[-10:]},
+            "retry": self.retry.get_status(),
+            "segments": self.segment_writer.get_status() if self.segment_writer else None,
+            "archive_index": self.archive_index.get_status() if self.archive_index else None,
+            "parquet": self.parquet_writer.get_status() if self.parquet_writer else None,
             "last_check": datetime.now(timezone.utc).isoformat()
         }
 
         return status
 
     def get_storage_metrics(self) -> Dict[str, Any]:
-        """Get detailed storage metrics."""
+        """Get detailed storage metrics (from the archive index; a full listing only without one)."""
+        if self.archive_index is not None:
+            try:
+                summary = self.archive_index.summary()
+                return {
+                    "bucket_name": self.bucket_name,
+                    "total_objects": summary["total_objects"],
+                    "total_statements": summary["total_statements"],
+                    "total_size_bytes": summary["total_size_bytes"],
+                    "total_size_mb": round(summary["total_size_bytes"] / (1024 * 1024), 2),
+                    "first_archived_at": summary["first_at"],
+                    "last_archived_at": summary["last_at"],
+                    "days": summary["days"],
+                    "index_updated_at": summary["updated_at"],
+                    "index_reconciled_at": summary["reconciled_at"],
+                    "objects_created_by_subscriber": self.metrics["storage_objects_created"],
+                    "last_updated": datetime.now(timezone.utc).isoformat()
+                }
+            except Exception as e:
+                return {
+                    "error": f"Failed to read archive index: {str(e)}",
+                    "bucket_name": self.bucket_name
+                }
         try:
             # Count objects in bucket (this is expensive, so cache it)
             blobs = list(self.bucket.list_blobs(prefix="xapi-statements/"))
-            total_objects = len(blobs)
+            segment_blobs = list(self.bucket.list_blobs(prefix=f"{settings.ARCHIVE_SEGMENT_PREFIX}/"))
+            total_objects = len(blobs) + len(segment_blobs)
 
             # Calculate storage size
-            total_size = sum(blob.size for blob in blobs if blob.size)
+            total_size = sum(blob.size for blob in blobs + segment_blobs if blob.size)
 
             return {
                 "bucket_name": self.bucket_name,
                 "total_objects": total_objects,
+                "legacy_objects": len(blobs),
+                "segment_objects": len(segment_blobs),
                 "total_size_bytes": total_size,
                 "total_size_mb": round(total_size / (1024 * 1024), 2),
                 "objects_created_by_subscriber": self.metrics["storage_objects_created"],
@@ -0,0 +1,299 @@
+"""
+Retry policy shared by the Pub/Sub ETL consumers.
+
+Failures are classified as transient (BigQuery/GCS hiccups, timeouts,
+throttling) or permanent (undecodable payloads, rows BigQuery rejects):
+
+* transient failures are nacked; the subscription's ``RetryPolicy`` makes
+  Pub/Sub redeliver them with exponential backoff between
+  ``min_backoff`` and ``max_backoff`` instead of immediately;
+* permanent failures, and transient ones that reached ``max_attempts``, are
+  handed to ``ErrorRecoverySystem`` in batches and acked once recorded, so
+  they stop cycling through the subscription.
+
+Error strings go to a fixed-size ring buffer with running counts per error
+class, so a long-running consumer's error state stays bounded.
+"""
+
+import threading
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.api_core import exceptions as gcp_exceptions
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger("retry_policy")
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+
+class TransientError(Exception):
+    """Raised by consumers for failures that should be retried."""
+
+
+class PermanentError(Exception):
+    """Raised by consumers for failures that no retry can fix."""
+
+
+PERMANENT_ERRORS: Tuple[type, ...] = (
+    PermanentError,
+    ValueError,  # includes JSONDecodeError and UnicodeDecodeError
+    KeyError,
+    TypeError,
+    gcp_exceptions.BadRequest,
+    gcp_exceptions.InvalidArgument,
+)
+
+TRANSIENT_ERRORS: Tuple[type, ...] = (
+    TransientError,
+    gcp_exceptions.ServerError,
+    gcp_exceptions.TooManyRequests,
+    gcp_exceptions.DeadlineExceeded,
+    gcp_exceptions.RetryError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+@dataclass
+class RetryPolicy:
+    """Backoff bounds and attempt limit for redelivered messages."""
+    min_backoff: float = 10.0  # seconds
+    max_backoff: float = 600.0  # Pub/Sub caps redelivery backoff at 600s
+    max_attempts: int = 5
+
+    @classmethod
+    def from_settings(cls) -> "RetryPolicy":
+        return cls(
+            min_backoff=settings.ETL_RETRY_MIN_BACKOFF,
+            max_backoff=settings.ETL_RETRY_MAX_BACKOFF,
+            max_attempts=settings.ETL_RETRY_MAX_ATTEMPTS,
+        )
+
+    @staticmethod
+    def classify(error: Optional[BaseException]) -> str:
+        # Checked first so TransientError subclasses of ValueError etc. stay transient
+        if isinstance(error, TRANSIENT_ERRORS):
+            return TRANSIENT
+        if isinstance(error, PERMANENT_ERRORS):
+            return PERMANENT
+        return TRANSIENT  # unknown failures are retried, bounded by max_attempts
+
+    def backoff(self, attempt: int) -> float:
+        """Approximate redelivery delay after ``attempt`` failed deliveries."""
+        return min(self.max_backoff, self.min_backoff * (2 ** max(0, attempt - 1)))
+
+    def subscription_retry_policy(self) -> Dict[str, Any]:
+        """``retry_policy`` field for a Pub/Sub subscription create/update request."""
+        return {
+            "minimum_backoff": {"seconds": int(self.min_backoff)},
+            "maximum_backoff": {"seconds": int(min(self.max_backoff, 600))},
+        }
+
+    def apply_to_subscription(self, subscriber, subscription_path: str) -> bool:
+        """Set this policy on an existing subscription (new ones get it at creation)."""
+        try:
+            subscriber.update_subscription(request={
+                "subscription": {"name": subscription_path, "retry_policy": self.subscription_retry_policy()},
+                "update_mask": {"paths": ["retry_policy"]},
+            })
+            return True
+        except Exception as e:
+            logger.warning(f"Could not set retry policy on {subscription_path}: {e}")
+            return False
+
+
+class ErrorLog:
+    """Ring buffer of recent error messages plus counts per error class."""
+
+    def __init__(self, size: int = 100):
+        self.entries: deque = deque(maxlen=size)
+        self.counts: Counter = Counter()
+
+    def record(self, message: str, error: Optional[BaseException] = None) -> None:
+        self.entries.append(message)
+        self.counts[type(error).__name__ if error is not None else "Error"] += 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_status(self, recent: int = 10) -> Dict[str, Any]:
+        return {
+            "recent": list(self.entries)[-recent:],
+            "buffered": len(self.entries),
+            "capacity": self.entries.maxlen,
+            "counts": dict(self.counts),
+            "total": sum(self.counts.values()),
+        }
+
+
+def _record_with_error_recovery(failures: List[Dict[str, Any]]) -> int:
+    from app.etl.error_recovery import get_error_recovery
+
+    return get_error_recovery().record_failed_statements(failures)
+
+
+class FailureRouter:
+    """Batches permanent failures into ``ErrorRecoverySystem.record_failed_statements``."""
+
+    def __init__(
+        self,
+        record_batch: Optional[Callable[[List[Dict[str, Any]]], int]] = None,
+        batch_size: int = 50,
+        flush_interval: float = 5.0,
+    ):
+        self.record_batch = record_batch or _record_with_error_recovery
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[Tuple[Dict[str, Any], Callable[[bool], None]]] = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self.metrics = {"routed": 0, "recorded": 0, "batches": 0, "batch_failures": 0}
+
+    def add(self, failure: Dict[str, Any], on_recorded: Callable[[bool], None]) -> None:
+        """Queue a failure; ``on_recorded(True/False)`` fires after its batch is written."""
+        self._ensure_flusher()
+        with self._condition:
+            self._buffer.append((failure, on_recorded))
+            self.metrics["routed"] += 1
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._condition:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="failure-router", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._buffer) >= self.batch_size, self.flush_interval)
+            self.flush()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._condition:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                recorded = self.record_batch([failure for failure, _ in batch])
+                ok = recorded == len(batch)
+            except Exception as e:
+                logger.error(f"Failed to record {len(batch)} failed statement(s): {e}")
+                ok = False
+            self.metrics["batches"] += 1
+            if ok:
+                self.metrics["recorded"] += len(batch)
+            else:
+                self.metrics["batch_failures"] += 1
+            for _, on_recorded in batch:
+                try:
+                    on_recorded(ok)
+                except Exception as e:
+                    logger.warning(f"Failure router callback failed: {e}")
+            return len(batch) if ok else 0
+
+
+class MessageRetryHandler:
+    """Applies a ``RetryPolicy`` to failed Pub/Sub messages for one consumer stage."""
+
+    def __init__(
+        self,
+        stage: str,
+        policy: Optional[RetryPolicy] = None,
+        router: Optional[FailureRouter] = None,
+        error_log: Optional[ErrorLog] = None,
+        attempt_cache_size: int = 10000,
+    ):
+        self.stage = stage
+        self.policy = policy or RetryPolicy.from_settings()
+        self.router = router or FailureRouter(
+            batch_size=settings.ETL_DEAD_LETTER_BATCH_SIZE,
+            flush_interval=settings.ETL_DEAD_LETTER_FLUSH_INTERVAL,
+        )
+        self.error_log = error_log or ErrorLog(settings.ETL_ERROR_LOG_SIZE)
+        # Fallback attempt counts when the subscription has no dead-letter policy
+        self._attempts: "OrderedDict[str, int]" = OrderedDict()
+        self._attempt_cache_size = attempt_cache_size
+        self._lock = threading.Lock()
+        self.metrics = {"retried": 0, "dead_lettered": 0, TRANSIENT: 0, PERMANENT: 0}
+
+    def record_error(self, message: str, error: Optional[BaseException] = None) -> None:
+        """Keep an error that is not tied to a message (setup, status probes)."""
+        self.error_log.record(message, error)
+
+    def attempt(self, message) -> int:
+        delivery_attempt = getattr(message, "delivery_attempt", None)
+        with self._lock:
+            count = self._attempts.pop(message.message_id, 0) + 1
+            self._attempts[message.message_id] = count
+            while len(self._attempts) > self._attempt_cache_size:
+                self._attempts.popitem(last=False)
+        return delivery_attempt or count
+
+    def forget(self, message) -> None:
+        with self._lock:
+            self._attempts.pop(message.message_id, None)
+
+    def handle_failure(
+        self,
+        message,
+        error: Optional[BaseException] = None,
+        error_msg: Optional[str] = None,
+        raw_statement: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Nack for a backed-off retry or dead-letter the message; returns the kind of failure."""
+        kind = self.policy.classify(error) if error is not None else TRANSIENT
+        attempt = self.attempt(message)
+        self.metrics[kind] += 1
+        self.error_log.record(error_msg or f"{self.stage} failed for message {message.message_id}: {error}", error)
+
+        if kind == TRANSIENT and attempt < self.policy.max_attempts:
+            self.metrics["retried"] += 1
+            logger.warning(
+                f"Retrying message {message.message_id} (attempt {attempt}/{self.policy.max_attempts}, "
+                f"~{self.policy.backoff(attempt):.0f}s backoff)"
+            )
+            message.nack()
+            return kind
+
+        self.metrics["dead_lettered"] += 1
+        self.forget(message)
+        failure = {
+            "statement_id": (raw_statement or {}).get("id") or message.message_id,
+            "raw_statement": raw_statement if raw_statement is not None else {"data": _decoded(message.data)},
+            "error_message": str(error) if error is not None else (error_msg or "unknown error"),
+            "error_type": type(error).__name__ if error is not None else "CommitFailed",
+            "processing_stage": self.stage,
+            "message_id": message.message_id,
+            "retry_count": attempt - 1,
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.router.add(failure, lambda recorded: message.ack() if recorded else message.nack())
+        return PERMANENT
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "min_backoff": self.policy.min_backoff,
+            "max_backoff": self.policy.max_backoff,
+            "max_attempts": self.policy.max_attempts,
+            "metrics": dict(self.metrics),
+            "router": dict(self.router.metrics),
+            "errors": self.error_log.get_status(),
+        }
+
+
+def _decoded(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace") if isinstance(data, (bytes, bytearray)) else str(data)
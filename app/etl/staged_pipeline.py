@@ -0,0 +1,179 @@
+"""
+Staged message pipeline on one long-lived event loop.
+
+A pipeline is an ordered list of stages joined by bounded ``asyncio`` queues.
+Each stage runs ``workers`` tasks that take an item from its input queue,
+apply the stage handler (sync or ``async``) and hand the result to the next
+stage; a handler returning ``None`` drops the item.  Handler exceptions go to
+``on_error`` and the item leaves the pipeline.
+
+``submit`` is called from foreign threads (e.g. Pub/Sub callback threads) and
+blocks while the first queue is full, so a slow stage pushes back all the way
+to the subscriber's flow control instead of growing memory.
+"""
+
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from app.logging_config import get_logger
+
+logger = get_logger("staged_pipeline")
+
+ErrorHandler = Callable[[str, Any, Exception], None]
+
+
+@dataclass
+class Stage:
+    """One pipeline step and its concurrency."""
+    name: str
+    handler: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 1000
+
+
+class StagedPipeline:
+    """Runs items through ``stages`` on a dedicated event-loop thread."""
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        on_error: Optional[ErrorHandler] = None,
+        executor_workers: int = 4,
+        name: str = "pipeline",
+    ):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.on_error = on_error
+        self.name = name
+        self.executor_workers = executor_workers
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._started = threading.Event()
+
+        self.metrics: Dict[str, Dict[str, Any]] = {
+            stage.name: {"processed": 0, "dropped": 0, "failed": 0, "busy_seconds": 0.0}
+            for stage in stages
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run_loop, name=f"{self.name}-loop", daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def _run_loop(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        # Default executor of the loop, used by handlers that offload blocking calls
+        executor = ThreadPoolExecutor(max_workers=self.executor_workers, thread_name_prefix=f"{self.name}-io")
+        loop.set_default_executor(executor)
+        self._loop = loop
+        self._queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        for index, stage in enumerate(self.stages):
+            for worker in range(max(1, stage.workers)):
+                self._tasks.append(loop.create_task(self._worker(index), name=f"{self.name}-{stage.name}-{worker}"))
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+            executor.shutdown(wait=False)
+
+    async def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        queue = self._queues[index]
+        next_queue = self._queues[index + 1] if index + 1 < len(self._queues) else None
+        metrics = self.metrics[stage.name]
+        is_async = inspect.iscoroutinefunction(stage.handler)
+
+        while True:
+            item = await queue.get()
+            started = time.perf_counter()
+            try:
+                result = await stage.handler(item) if is_async else stage.handler(item)
+            except Exception as e:
+                metrics["failed"] += 1
+                self._report_error(stage.name, item, e)
+                continue
+            else:
+                if result is None:
+                    metrics["dropped"] += 1
+                    continue
+                metrics["processed"] += 1
+                if next_queue is not None:
+                    await next_queue.put(result)
+            finally:
+                metrics["busy_seconds"] += time.perf_counter() - started
+                queue.task_done()
+
+    def _report_error(self, stage_name: str, item: Any, error: Exception) -> None:
+        if self.on_error is None:
+            logger.error(f"{self.name} stage '{stage_name}' failed: {error}")
+            return
+        try:
+            self.on_error(stage_name, item, error)
+        except Exception as e:
+            logger.error(f"{self.name} error handler failed: {e}")
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> None:
+        """Enqueue ``item`` from any thread, blocking while the first stage is full."""
+        if not self.running:
+            raise RuntimeError(f"{self.name} is not running")
+        future = asyncio.run_coroutine_threadsafe(self._queues[0].put(item), self._loop)
+        try:
+            future.result(timeout)
+        except BaseException:
+            future.cancel()  # do not enqueue an item the caller has given up on
+            raise
+
+    async def _drain(self) -> None:
+        for queue in self._queues:
+            await queue.join()
+
+    async def _shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._loop.stop()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Let queued items finish (up to ``timeout``), then stop the loop."""
+        if not self.running:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"{self.name} did not drain within {timeout}s: {e}")
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        self._thread.join(timeout=timeout)
+        self._tasks = []
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "stages": [
+                {
+                    "name": stage.name,
+                    "workers": stage.workers,
+                    "queue_size": stage.queue_size,
+                    "queued": self._queues[index].qsize() if self._queues else 0,
+                    **self.metrics[stage.name],
+                }
+                for index, stage in enumerate(self.stages)
+            ],
+        }
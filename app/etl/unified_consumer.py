@@ -0,0 +1,453 @@
+"""
+Unified multi-sink consumer for the xAPI topic.
+
+``PubSubBigQueryProcessor``, ``PubSubStorageSubscriber`` and
+``BigQuerySchemaMigration`` each pull every message, decode it and run their
+own transform.  ``UnifiedConsumer`` pulls once through the processor's staged
+pipeline (decode -> enrich -> transform) and fans each message out to
+pluggable sinks:
+
+* ``statements`` - the micro-batched MERGE into the statements table;
+* ``dimensions`` - actor/verb/activity rows, deduplicated per batch;
+* ``archive``    - the raw statement in Cloud Storage (NDJSON.gz segments,
+  or one JSON object per statement with ``ARCHIVE_SEGMENTS_ENABLED`` off).
+
+A message is acked once every *required* sink has committed it; optional
+sinks are best effort, like the dimension inserts in the migration.  When a
+required sink fails the message goes to the retry policy, and on redelivery
+the idempotent statements MERGE absorbs the repeat.
+"""
+
+import json
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.etl.bigquery_batch_sink import BigQueryBatchSink
+from app.etl.archive_index import ArchiveIndex, get_archive_index
+from app.etl.archive_segments import SegmentArchiveWriter
+from app.etl.parquet_archive import ParquetArchiveWriter, parquet_writer_from_settings
+from app.etl.bigquery_schema_migration import BigQuerySchemaMigration
+from app.etl.pubsub_bigquery_processor import PubSubBigQueryProcessor
+from app.etl.pubsub_storage_subscriber import PubSubStorageSubscriber
+from app.logging_config import get_logger
+from app.services.user_normalization import get_user_normalization_service
+from app.utils import json_codec
+
+logger = get_logger("unified_consumer")
+
+SinkCallback = Callable[[bool], None]
+
+
+class ConsumerSink:
+    """A destination for processed messages.
+
+    ``write`` must not block: it queues ``item`` (an in-flight message with
+    ``data``, ``statement`` and ``row``) and calls ``done(committed)`` once the
+    write has landed or failed.
+    """
+
+    name = "sink"
+
+    def __init__(self, required: bool = True):
+        self.required = required
+        self.metrics = {"written": 0, "committed": 0, "failed": 0}
+
+    def write(self, item: Any, done: SinkCallback) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def get_status(self) -> Dict[str, Any]:
+        return {"required": self.required, "metrics": dict(self.metrics)}
+
+
+class StatementsTableSink(ConsumerSink):
+    """Statements table rows through the processor's micro-batched MERGE."""
+
+    name = "statements"
+
+    def __init__(self, sink: BigQueryBatchSink, required: bool = True):
+        super().__init__(required)
+        self.sink = sink
+
+    def write(self, item: Any, done: SinkCallback) -> None:
+        self.metrics["written"] += 1
+        self.sink.add(item.row, done)
+
+    def close(self) -> None:
+        self.sink.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {**super().get_status(), "sink": self.sink.get_status()}
+
+
+class DimensionTablesSink(ConsumerSink):
+    """Actor, verb and activity rows, inserted per table once per batch."""
+
+    name = "dimensions"
+
+    # table -> column the rows are deduplicated on within a batch
+    TABLE_KEYS = {"actors": "actor_id", "verbs": "verb_id", "activities": "activity_id"}
+
+    def __init__(
+        self,
+        client,
+        dataset_id: str,
+        required: bool = False,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+    ):
+        super().__init__(required)
+        self.client = client
+        self.dataset_id = dataset_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._tables: Dict[str, Any] = {}
+        self._buffer: List[Tuple[Dict[str, Dict[str, Any]], SinkCallback]] = []
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+        self.metrics.update({"batches": 0, "rows_inserted": 0, "duplicates_skipped": 0})
+
+    @classmethod
+    def dimension_rows(cls, data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Dimension rows for one raw statement, extracted as the schema migration does."""
+        rows = {
+            "actors": BigQuerySchemaMigration.extract_actor_info(data.get("actor") or {}),
+            "verbs": BigQuerySchemaMigration.extract_verb_info(data.get("verb") or {}),
+        }
+        obj = data.get("object") or {}
+        if isinstance(obj, dict) and obj.get("objectType", "Activity") == "Activity":
+            rows["activities"] = BigQuerySchemaMigration.extract_activity_info(obj)
+        return {table: row for table, row in rows.items() if row.get(cls.TABLE_KEYS[table])}
+
+    def write(self, item: Any, done: SinkCallback) -> None:
+        self._ensure_flusher()
+        with self._condition:
+            self._buffer.append((self.dimension_rows(item.data), done))
+            self.metrics["written"] += 1
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._condition:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="dimension-sink-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or len(self._buffer) >= self.batch_size, self.flush_interval
+                )
+            self.flush()
+
+    def _table(self, name: str):
+        if name not in self._tables:
+            self._tables[name] = self.client.get_table(self.client.dataset(self.dataset_id).table(name))
+        return self._tables[name]
+
+    def flush(self) -> int:
+        """Insert everything buffered; returns the number of rows written."""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+
+            by_table: Dict[str, Dict[str, Dict[str, Any]]] = {table: {} for table in self.TABLE_KEYS}
+            total = 0
+            for rows, _ in batch:
+                for table, row in rows.items():
+                    total += 1
+                    by_table[table].setdefault(row[self.TABLE_KEYS[table]], row)
+            unique = sum(len(rows) for rows in by_table.values())
+
+            committed = True
+            for table, rows in by_table.items():
+                if not rows:
+                    continue
+                try:
+                    errors = self.client.insert_rows(self._table(table), list(rows.values()))
+                    if errors:
+                        committed = False
+                        logger.warning(f"Dimension insert errors for {table}: {errors}")
+                except Exception as e:
+                    committed = False
+                    logger.warning(f"Dimension insert into {table} failed: {e}")
+
+            self.metrics["batches"] += 1
+            self.metrics["duplicates_skipped"] += total - unique
+            if committed:
+                self.metrics["rows_inserted"] += unique
+            for _, done in batch:
+                done(committed)
+            return unique if committed else 0
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self.flush()
+
+
+class ArchiveSink(ConsumerSink):
+    """Raw statements in Cloud Storage: NDJSON.gz segments via ``writer``, else one JSON object each."""
+
+    name = "archive"
+
+    def __init__(
+        self,
+        bucket,
+        required: bool = True,
+        upload_threads: int = 8,
+        writer: Optional[SegmentArchiveWriter] = None,
+        index: Optional[ArchiveIndex] = None,
+        parquet: Optional[ParquetArchiveWriter] = None,
+    ):
+        super().__init__(required)
+        self.bucket = bucket
+        self.writer = writer
+        self.index = index
+        self.parquet = parquet  # fed only once the JSON copy is durable
+        if index is not None:
+            index.start()
+        self._executor = ThreadPoolExecutor(max_workers=upload_threads, thread_name_prefix="archive-upload")
+        self.metrics.update({"storage_objects_created": 0})
+
+    def upload(self, data: Dict[str, Any], message_id: str) -> str:
+        blob_path = PubSubStorageSubscriber.generate_storage_path(data, message_id)
+        blob = self.bucket.blob(blob_path)
+        blob.metadata = {
+            "message_id": message_id,
+            "source": "unified_consumer",
+            "content_type": "application/json",
+        }
+        payload = json_codec.dumps(data, indent=True)
+        blob.upload_from_string(payload, content_type="application/json")
+        self.metrics["storage_objects_created"] += 1
+        if self.index is not None:
+            self.index.record(datetime.now(timezone.utc), size=len(payload))
+        return blob_path
+
+    def write(self, item: Any, done: SinkCallback) -> None:
+        self.metrics["written"] += 1
+        message_id = item.message.message_id
+        publish_time = getattr(item.message, "publish_time", None)
+
+        def archived(committed: bool) -> None:
+            if committed and self.parquet is not None:
+                self.parquet.append(item.data, publish_time)
+            done(committed)
+
+        if self.writer is not None:
+            self.writer.append(item.data, archived, publish_time)
+            return
+
+        def run():
+            try:
+                self.upload(item.data, message_id)
+                archived(True)
+            except Exception as e:
+                logger.error(f"Failed to archive message {message_id}: {e}")
+                done(False)
+
+        self._executor.submit(run)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        if self.writer is not None:
+            self.writer.close()
+        if self.parquet is not None:
+            self.parquet.close()
+        if self.index is not None:
+            self.index.stop()
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        if self.writer is not None:
+            status["segments"] = self.writer.get_status()
+        if self.index is not None:
+            status["archive_index"] = self.index.get_status()
+        if self.parquet is not None:
+            status["parquet"] = self.parquet.get_status()
+        return status
+
+
+class SinkFanout:
+    """Writes each item to every sink and reports once the required ones settle."""
+
+    def __init__(self, sinks: List[ConsumerSink]):
+        if not any(sink.required for sink in sinks):
+            raise ValueError("At least one sink must be required")
+        self.sinks = sinks
+        self.required = sum(1 for sink in sinks if sink.required)
+
+    def dispatch(self, item: Any, on_complete: Callable[[List[str]], None]) -> None:
+        """Fan ``item`` out; ``on_complete(failed_sink_names)`` fires once."""
+        state = {"pending": self.required, "failed": []}
+        lock = threading.Lock()
+
+        def done(sink: ConsumerSink, committed: bool) -> None:
+            sink.metrics["committed" if committed else "failed"] += 1
+            if not sink.required:
+                return
+            with lock:
+                state["pending"] -= 1
+                if not committed:
+                    state["failed"].append(sink.name)
+                finished = state["pending"] == 0
+            if finished:
+                on_complete(state["failed"])
+
+        for sink in self.sinks:
+            try:
+                sink.write(item, lambda committed, sink=sink: done(sink, committed))
+            except Exception as e:
+                logger.error(f"Sink {sink.name} rejected message {item.message.message_id}: {e}")
+                done(sink, False)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                logger.error(f"Failed to close sink {sink.name}: {e}")
+
+    def get_status(self) -> Dict[str, Any]:
+        return {sink.name: sink.get_status() for sink in self.sinks}
+
+
+def _names(value: str) -> List[str]:
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class UnifiedConsumer(PubSubBigQueryProcessor):
+    """One subscription, one decode/normalize per message, many sinks."""
+
+    subscription_suffix = "unified-consumer"
+    retry_stage = "unified_consumer"
+
+    def __init__(self):
+        super().__init__()
+        self.fanout = SinkFanout(self.build_sinks())
+        self._fit_flow_window_to_segments()
+
+    def _fit_flow_window_to_segments(self) -> None:
+        """A required segment archive acks a whole segment at once, so the flow window must always hold one."""
+        for sink in self.fanout.sinks:
+            if isinstance(sink, ArchiveSink) and sink.required and sink.writer is not None:
+                segment = sink.writer.config
+                needed = max(settings.ARCHIVE_FLOW_MAX_MESSAGES or 2 * segment.max_records, segment.max_records)
+                if needed > self.flow_max_messages:
+                    self.flow_max_bytes = int(self.flow_max_bytes * needed / self.flow_max_messages)
+                    self.flow_max_messages = needed
+                self.flow_max_bytes = max(self.flow_max_bytes, segment.max_bytes)
+                if self.flow_controller is not None:
+                    self.flow_controller.fit(segment.max_records, needed, segment.max_bytes)
+
+    def build_sinks(self) -> List[ConsumerSink]:
+        enabled = _names(settings.ETL_UNIFIED_SINKS)
+        required = set(_names(settings.ETL_UNIFIED_REQUIRED_SINKS))
+        sinks: List[ConsumerSink] = []
+        for name in enabled:
+            if name == StatementsTableSink.name:
+                sinks.append(StatementsTableSink(self.sink, required=name in required))
+            elif name == DimensionTablesSink.name:
+                sinks.append(DimensionTablesSink(
+                    self.bigquery_client,
+                    self.dataset_id,
+                    required=name in required,
+                    batch_size=self.sink.config.batch_size,
+                    flush_interval=self.sink.config.max_latency,
+                ))
+            elif name == ArchiveSink.name:
+                bucket = self.gcp_config.storage_client.bucket(self.gcp_config.storage_bucket)
+                index = get_archive_index()
+                writer = None
+                if settings.ARCHIVE_SEGMENTS_ENABLED:
+                    writer = SegmentArchiveWriter(bucket, source="unified_consumer", index=index)
+                sinks.append(ArchiveSink(
+                    bucket,
+                    required=name in required,
+                    upload_threads=settings.ETL_ARCHIVE_UPLOAD_THREADS,
+                    writer=writer,
+                    index=index,
+                    parquet=parquet_writer_from_settings(bucket, source="unified_consumer"),
+                ))
+            else:
+                raise ValueError(f"Unknown sink '{name}' in ETL_UNIFIED_SINKS")
+        return sinks
+
+    def _sink(self, item) -> None:
+        # Every sink reads the same decoded statement and transformed row
+        message = item.message
+        self.fanout.dispatch(item, lambda failed: self._on_fanout_complete(message, failed))
+
+    def _on_fanout_complete(self, message, failed: List[str]) -> None:
+        if not failed:
+            self._on_row_committed(message, True)
+            return
+        error_msg = f"Failed to commit message {message.message_id} to {', '.join(failed)}"
+        logger.warning(error_msg)
+        self.metrics["messages_failed"] += 1
+        self.retry.handle_failure(message, error_msg=error_msg)
+        self._settle(message)
+
+    def stop_processing(self) -> None:
+        """Stop the consumer and drain every sink."""
+        self.running = False
+        self.pipeline.stop()
+        self.fanout.close()
+        get_user_normalization_service().activity_buffer.close()
+        logger.info("Stopping unified consumer")
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status["sinks"] = self.fanout.get_status()
+        return status
+
+
+# Global consumer instance (lazy-loaded)
+_consumer = None
+
+def get_unified_consumer() -> UnifiedConsumer:
+    """Get the global unified consumer instance (lazy-loaded)."""
+    global _consumer
+    if _consumer is None:
+        _consumer = UnifiedConsumer()
+    return _consumer
+
+
+def start_unified_consumer_background() -> None:
+    """Start the unified consumer in a background thread."""
+    def run_consumer():
+        try:
+            get_unified_consumer().start_processing()
+        except Exception as e:
+            logger.error(f"Unified consumer failed to start: {e}")
+
+    thread = threading.Thread(target=run_consumer, daemon=True)
+    thread.start()
+    logger.info("Started unified Pub/Sub consumer in background")
+
+
+def stop_unified_consumer() -> None:
+    """Stop the unified consumer."""
+    if _consumer:
+        _consumer.stop_processing()
+
+
+# For testing/development
+if __name__ == "__main__":
+    print("Testing unified consumer...")
+    print("Status:", json.dumps(get_unified_consumer().get_status(), indent=2, default=str))
@@ -6,7 +6,7 @@ Professional analytics platform for Practice of Life learning data.
 import os
 import json
 from datetime import datetime, timezone
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
@@ -46,9 +46,10 @@ app = FastAPI(
 async def startup_event_early():
     """Initialize batch processor and system monitor on startup."""
     try:
-        # Start the background batch processor
-        batch_processor.start_background_processor()
-        logger.info("Batch AI safety processor started")
+        # Start the background batch processor (runs in the safety worker in API-only mode)
+        if settings.APP_RUN_MODE != "api":
+            batch_processor.start_background_processor()
+            logger.info("Batch AI safety processor started")
     except Exception as e:
         logger.error(f"Failed to start batch processor: {e}")
     
@@ -378,6 +379,7 @@ app.include_router(endpoint_tracking_router, prefix="/api", tags=["Endpoint Trac
 # ============================================================================
 
 from app.api.cloud_function_ingestion import cloud_ingest_xapi
+from app.api.xapi import admission_source, enforce_admission
 from app.api.debug import cloud_function_health
 
 @app.post("/api/xapi/cloud-ingest")
@@ -399,9 +401,15 @@ async def cloud_ingest_endpoint(request: Request):
             def method(self):
                 return 'POST'
         
+        enforce_admission(
+            admission_source(request, "cloud"),
+            cost=len(body) if isinstance(body, list) else 1,
+        )
         mock_request = MockRequest(body)
         response_data, status_code = cloud_ingest_xapi(mock_request)
         return JSONResponse(content=json.loads(response_data), status_code=status_code)
+    except HTTPException:
+        raise
     except Exception as e:
         return JSONResponse(content={
             "error": "Internal server error",
@@ -471,6 +479,44 @@ async def start_storage_subscriber_endpoint():
             "message": str(e)
         }, status_code=500)
 
+@app.get("/api/debug/unified-consumer-status")
+async def unified_consumer_status_endpoint():
+    """Get unified multi-sink consumer status and per-sink metrics."""
+    try:
+        from app.etl.unified_consumer import get_unified_consumer
+        return JSONResponse(content=get_unified_consumer().get_status(), status_code=200)
+    except Exception as e:
+        return JSONResponse(content={
+            "error": "Failed to get unified consumer status",
+            "message": str(e)
+        }, status_code=500)
+
+@app.get("/api/debug/workers-status")
+async def workers_status_endpoint():
+    """Get heartbeats reported by out-of-process pipeline workers."""
+    try:
+        from app.workers.health import worker_health_summary
+        summary = worker_health_summary()
+        summary["run_mode"] = settings.APP_RUN_MODE
+        return JSONResponse(content=summary, status_code=200 if summary["healthy"] else 503)
+    except Exception as e:
+        return JSONResponse(content={
+            "error": "Failed to get worker status",
+            "message": str(e)
+        }, status_code=500)
+
+@app.get("/api/debug/safety-consumer-status")
+async def safety_consumer_status_endpoint():
+    """Get Pub/Sub AI safety consumer status and metrics."""
+    try:
+        from app.etl.pubsub_safety_consumer import get_safety_consumer
+        return JSONResponse(content=get_safety_consumer().get_status(), status_code=200)
+    except Exception as e:
+        return JSONResponse(content={
+            "error": "Failed to get safety consumer status",
+            "message": str(e)
+        }, status_code=500)
+
 # ============================================================================
 # BIGQUERY SCHEMA MIGRATION ENDPOINTS
 # ============================================================================
@@ -712,21 +758,48 @@ async def architecture_status():
 @app.on_event("startup")
 async def startup_event_etl():
     """Start background ETL processors on application startup."""
+    # The spool is drained by the process that writes it, in every run mode
     try:
-        # Auto-start BigQuery data processor for continuous data flow
-        from app.etl.pubsub_bigquery_processor import start_processor_background
-        start_processor_background()
-        logger.info("Auto-started BigQuery data processor on app startup")
+        from app.api.cloud_function_ingestion import start_ingest_spool_background
+        if start_ingest_spool_background():
+            logger.info("Auto-started ingest spool drainer on app startup")
+    except Exception as e:
+        logger.error(f"Failed to start ingest spool drainer: {str(e)}")
+
+    if settings.APP_RUN_MODE == "api":
+        logger.info("API-only mode: pipelines run under app.workers.supervisor")
+        return
+    try:
+        if settings.ETL_UNIFIED_CONSUMER_ENABLED:
+            # One pull feeds the statements table, dimension tables and archive
+            from app.etl.unified_consumer import start_unified_consumer_background
+            start_unified_consumer_background()
+            logger.info("Auto-started unified consumer on app startup")
+        else:
+            # Auto-start BigQuery data processor for continuous data flow
+            from app.etl.pubsub_bigquery_processor import start_processor_background
+            start_processor_background()
+            logger.info("Auto-started BigQuery data processor on app startup")
+
+            # Ingest wake-ups go straight to the processor this process now owns
+            from app.api.etl_control import register_etl_wakeup_listener
+            register_etl_wakeup_listener()
+
+            # Auto-start storage subscriber for archival
+            from app.etl.pubsub_storage_subscriber import start_subscriber_background
+            start_subscriber_background()
+            logger.info("Auto-started storage subscriber on app startup")
         
-        # Auto-start storage subscriber for archival
-        from app.etl.pubsub_storage_subscriber import start_subscriber_background  
-        start_subscriber_background()
-        logger.info("Auto-started storage subscriber on app startup")
+        # Auto-start safety consumer for AI content analysis (off the ingest path)
+        from app.etl.pubsub_safety_consumer import start_safety_consumer_background
+        start_safety_consumer_background()
+        logger.info("Auto-started safety consumer on app startup")
         
-        # Also start schema migration processor
-        from app.etl.bigquery_schema_migration import start_migration_background
-        start_migration_background()
-        logger.info("Auto-started BigQuery schema migration on app startup")
+        # Also start schema migration processor (the unified consumer writes dimensions itself)
+        if not settings.ETL_UNIFIED_CONSUMER_ENABLED:
+            from app.etl.bigquery_schema_migration import start_migration_background
+            start_migration_background()
+            logger.info("Auto-started BigQuery schema migration on app startup")
         
     except Exception as e:
         logger.error(f"Failed to start ETL processors on startup: {str(e)}")
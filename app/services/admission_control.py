@@ -0,0 +1,221 @@
+"""
+Per-source admission control for the ingest routes.
+
+Each source (a 7taps basic-auth user, an API caller, an importer) gets a
+token bucket that refills at ``rate`` statements per second up to ``burst``.
+A request costs one token per statement; when the bucket cannot cover it the
+caller receives 429 with a ``Retry-After`` hint.
+
+Refill rates shrink while the Pub/Sub publisher is under pressure (messages
+in flight close to the flow-control limit, or smoothed publish latency above
+target), so a runaway importer is slowed before it saturates the shared
+publisher and analysis path for everyone else.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger("admission_control")
+
+LoadProbe = Callable[[], Dict[str, float]]
+
+
+@dataclass
+class SourceLimit:
+    """Token bucket parameters for one source."""
+    rate: float  # statements per second
+    burst: float  # bucket capacity
+
+
+@dataclass
+class AdmissionConfig:
+    """Settings for ingest admission control."""
+    enabled: bool = True
+    default_limit: SourceLimit = field(default_factory=lambda: SourceLimit(rate=100.0, burst=1000.0))
+    source_limits: Dict[str, SourceLimit] = field(default_factory=dict)
+    latency_target_ms: float = 500.0
+    queue_high_watermark: float = 0.8  # fraction of the publisher flow-control limit
+    min_rate_fraction: float = 0.1  # never shed below this share of the nominal rate
+    max_sources: int = 10000
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionConfig":
+        return cls(
+            enabled=settings.INGEST_ADMISSION_ENABLED,
+            default_limit=SourceLimit(
+                rate=settings.INGEST_ADMISSION_RATE,
+                burst=settings.INGEST_ADMISSION_BURST,
+            ),
+            source_limits={
+                source: SourceLimit(
+                    rate=float(limit["rate"]),
+                    burst=float(limit.get("burst", limit["rate"])),
+                )
+                for source, limit in settings.INGEST_ADMISSION_SOURCE_LIMITS.items()
+            },
+            latency_target_ms=settings.INGEST_ADMISSION_LATENCY_TARGET_MS,
+            min_rate_fraction=settings.INGEST_ADMISSION_MIN_RATE_FRACTION,
+        )
+
+
+@dataclass
+class AdmissionDecision:
+    """Outcome of an admission check."""
+    allowed: bool
+    source: str
+    retry_after: float = 0.0  # seconds until the request would fit
+
+
+class TokenBucket:
+    """Token bucket that may go into debt for requests larger than ``burst``."""
+
+    def __init__(self, limit: SourceLimit, now: float):
+        self.limit = limit
+        self.tokens = limit.burst
+        self.updated = now
+
+    def _refill(self, now: float, rate: float) -> None:
+        self.tokens = min(self.limit.burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def try_acquire(self, cost: float, now: float, rate_fraction: float = 1.0) -> float:
+        """Take ``cost`` tokens; returns 0 when admitted, else seconds to wait."""
+        rate = max(self.limit.rate * rate_fraction, 1e-9)
+        self._refill(now, rate)
+        # A request bigger than the whole bucket is admitted from a full bucket
+        needed = min(cost, self.limit.burst)
+        if self.tokens >= needed:
+            self.tokens -= cost
+            return 0.0
+        return (needed - self.tokens) / rate
+
+
+class AdmissionController:
+    """Keyed token buckets with load-adaptive refill."""
+
+    def __init__(
+        self,
+        config: AdmissionConfig,
+        load_probe: Optional[LoadProbe] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.config = config
+        self._load_probe = load_probe
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._counters: Dict[str, Dict[str, Any]] = {}
+        self.metrics = {
+            "admitted_requests": 0,
+            "rejected_requests": 0,
+            "shed_checks": 0,  # checks made while the refill rate was reduced
+            "probe_errors": 0,
+        }
+
+    def limit_for(self, source: str) -> SourceLimit:
+        """Configured limit for ``source``; ``"7taps:*"`` style prefixes match too."""
+        if source in self.config.source_limits:
+            return self.config.source_limits[source]
+        kind = source.split(":", 1)[0]
+        return self.config.source_limits.get(f"{kind}:*", self.config.default_limit)
+
+    def _read_load(self) -> Optional[Dict[str, float]]:
+        if self._load_probe is None:
+            return None
+        try:
+            return self._load_probe()
+        except Exception as e:
+            self.metrics["probe_errors"] += 1
+            logger.warning(f"Admission load probe failed: {e}")
+            return None
+
+    def load_fraction(self) -> float:
+        """Share of the nominal refill rate to grant under current publisher load."""
+        load = self._read_load()
+        if load is None:
+            return 1.0
+
+        pressure = 0.0
+        if self.config.latency_target_ms > 0:
+            pressure = load.get("latency_ms", 0.0) / self.config.latency_target_ms
+        queue_limit = load.get("queue_limit") or 0
+        if queue_limit:
+            pressure = max(pressure, load.get("in_flight", 0) / (queue_limit * self.config.queue_high_watermark))
+        if pressure <= 1.0:
+            return 1.0
+        return max(self.config.min_rate_fraction, 1.0 / pressure)
+
+    def _bucket(self, source: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            bucket = TokenBucket(self.limit_for(source), now)
+            self._buckets[source] = bucket
+            self._counters[source] = {
+                "admitted_requests": 0,
+                "admitted_statements": 0,
+                "rejected_requests": 0,
+                "rejected_statements": 0,
+                "last_rejected_at": None,
+            }
+            while len(self._buckets) > self.config.max_sources:
+                evicted, _ = self._buckets.popitem(last=False)
+                self._counters.pop(evicted, None)
+        else:
+            self._buckets.move_to_end(source)
+        return bucket
+
+    def admit(self, source: str, cost: int = 1) -> AdmissionDecision:
+        """Check (and on success consume) ``cost`` statements for ``source``."""
+        if not self.config.enabled:
+            return AdmissionDecision(allowed=True, source=source)
+
+        fraction = self.load_fraction()
+        now = self._clock()
+        with self._lock:
+            if fraction < 1.0:
+                self.metrics["shed_checks"] += 1
+            bucket = self._bucket(source, now)
+            retry_after = bucket.try_acquire(max(cost, 1), now, fraction)
+            counters = self._counters[source]
+            if retry_after:
+                self.metrics["rejected_requests"] += 1
+                counters["rejected_requests"] += 1
+                counters["rejected_statements"] += cost
+                counters["last_rejected_at"] = datetime.now(timezone.utc).isoformat()
+            else:
+                self.metrics["admitted_requests"] += 1
+                counters["admitted_requests"] += 1
+                counters["admitted_statements"] += cost
+
+        if retry_after:
+            logger.warning(f"Rejected {cost} statement(s) from {source}; retry after {retry_after:.1f}s")
+            return AdmissionDecision(allowed=False, source=source, retry_after=retry_after)
+        return AdmissionDecision(allowed=True, source=source)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            sources = {
+                source: {
+                    "rate": bucket.limit.rate,
+                    "burst": bucket.limit.burst,
+                    "tokens": round(bucket.tokens, 2),
+                    **self._counters[source],
+                }
+                for source, bucket in self._buckets.items()
+            }
+            metrics = dict(self.metrics)
+        return {
+            "enabled": self.config.enabled,
+            "load_fraction": round(self.load_fraction(), 3),
+            "load": self._read_load(),
+            "default_limit": {"rate": self.config.default_limit.rate, "burst": self.config.default_limit.burst},
+            "metrics": metrics,
+            "sources": sources,
+        }
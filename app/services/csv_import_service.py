@@ -9,6 +9,7 @@ import io
 import json
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone
+from app.etl import columnar_transform
 from app.logging_config import get_logger
 from app.services.user_normalization import get_user_normalization_service
 from app.services.cohort_sync import get_cohort_sync_service
@@ -109,9 +110,18 @@ class CSVImportService:
                 }
                 bigquery_rows.append(bigquery_row)
             
-            # Insert into BigQuery
             table = self.bigquery_client.get_table(table_id)
-            errors = self.bigquery_client.insert_rows_json(table, bigquery_rows)
+            if columnar_transform.ARROW_AVAILABLE:
+                # One Parquet load job instead of streaming inserts
+                batch = columnar_transform.rows_to_record_batch(bigquery_rows, table.schema)
+                self.bigquery_client.load_table_from_file(
+                    io.BytesIO(columnar_transform.to_parquet_bytes(batch)),
+                    table_id,
+                    job_config=columnar_transform.parquet_load_config(),
+                ).result()
+                errors = []
+            else:
+                errors = self.bigquery_client.insert_rows_json(table, bigquery_rows)
             
             if errors:
                 logger.error(f"BigQuery insert errors: {errors}")
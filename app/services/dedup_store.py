@@ -0,0 +1,235 @@
+"""
+Statement-id deduplication store for the ingest edge.
+
+Rejecting a duplicate before it is published saves a Pub/Sub publish, an AI
+analysis and a BigQuery MERGE.  Two backends share one interface:
+
+* ``InMemoryDedupStore`` - per-process LRU with a per-entry TTL (default).
+* ``RedisDedupStore`` - shared across Cloud Run instances; a whole request is
+  checked in one pipelined round trip of ``SET key 1 NX EX ttl`` commands.
+
+``claim_many`` is the only hot-path call: it atomically marks ids as seen and
+reports which ones were new.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger("dedup_store")
+
+
+class DedupStore:
+    """Interface shared by the dedup backends."""
+
+    backend = "base"
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "released": 0,
+            "errors": 0,
+        }
+
+    def claim_many(self, statement_ids: List[str]) -> List[bool]:
+        """Mark ids as seen; ``True`` means the id was new (not a duplicate)."""
+        claimed = self._claim_many(statement_ids)
+        new_count = sum(1 for is_new in claimed if is_new)
+        self.metrics["misses"] += new_count
+        self.metrics["hits"] += len(claimed) - new_count
+        return claimed
+
+    def claim(self, statement_id: str) -> bool:
+        return self.claim_many([statement_id])[0]
+
+    def release(self, statement_ids: Iterable[str]) -> None:
+        """Forget ids again, e.g. when their publish failed and a retry must get through."""
+        statement_ids = list(statement_ids)
+        if statement_ids:
+            self._release(statement_ids)
+            self.metrics["released"] += len(statement_ids)
+
+    def _claim_many(self, statement_ids: List[str]) -> List[bool]:
+        raise NotImplementedError
+
+    def _release(self, statement_ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def get_status(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            "backend": self.backend,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+            "metrics": dict(self.metrics),
+        }
+
+
+class InMemoryDedupStore(DedupStore):
+    """Per-process LRU of statement ids with a per-entry TTL."""
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds: float, max_entries: int, clock=time.monotonic):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, float]" = OrderedDict()  # id -> expiry
+        self._lock = threading.Lock()
+        self.metrics["evictions"] = 0
+
+    def _claim_many(self, statement_ids: List[str]) -> List[bool]:
+        now = self._clock()
+        claimed = []
+        with self._lock:
+            for statement_id in statement_ids:
+                expires_at = self._entries.get(statement_id)
+                if expires_at is not None and expires_at > now:
+                    self._entries.move_to_end(statement_id)
+                    claimed.append(False)
+                    continue
+                self._entries[statement_id] = now + self.ttl_seconds
+                self._entries.move_to_end(statement_id)
+                claimed.append(True)
+
+            # Evict least recently seen ids instead of wiping the whole cache
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics["evictions"] += 1
+        return claimed
+
+    def _release(self, statement_ids: List[str]) -> None:
+        with self._lock:
+            for statement_id in statement_ids:
+                self._entries.pop(statement_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, statement_id: str) -> bool:
+        with self._lock:
+            expires_at = self._entries.get(statement_id)
+            return expires_at is not None and expires_at > self._clock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status.update({"entries": len(self._entries), "max_entries": self.max_entries})
+        return status
+
+
+class RedisDedupStore(DedupStore):
+    """Statement-id dedup shared across instances through Redis ``SET NX EX``.
+
+    If Redis is unreachable the store degrades to the in-process fallback so
+    ingest keeps working (with per-instance dedup only).
+    """
+
+    backend = "redis"
+
+    def __init__(
+        self,
+        redis_url: str,
+        ttl_seconds: float,
+        fallback: InMemoryDedupStore,
+        key_prefix: str = "xapi:dedup:",
+        client: Optional[Any] = None,
+    ):
+        super().__init__(ttl_seconds)
+        self.redis_url = redis_url
+        self.key_prefix = key_prefix
+        self.fallback = fallback
+        self._client = client
+        self.metrics["fallback_checks"] = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(
+                self.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0
+            )
+        return self._client
+
+    def _key(self, statement_id: str) -> str:
+        return f"{self.key_prefix}{statement_id}"
+
+    def _claim_many(self, statement_ids: List[str]) -> List[bool]:
+        if not statement_ids:
+            return []
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            ttl = max(1, int(self.ttl_seconds))
+            for statement_id in statement_ids:
+                pipe.set(self._key(statement_id), 1, nx=True, ex=ttl)
+            claimed = [bool(result) for result in pipe.execute()]
+        except Exception as e:
+            self.metrics["errors"] += 1
+            self.metrics["fallback_checks"] += len(statement_ids)
+            logger.warning(f"Redis dedup check failed, using in-process fallback: {e}")
+            return self.fallback._claim_many(statement_ids)
+
+        # Keep the fallback warm so an outage does not reopen recent duplicates
+        self.fallback._claim_many(statement_ids)
+        return claimed
+
+    def _release(self, statement_ids: List[str]) -> None:
+        self.fallback._release(statement_ids)
+        try:
+            self.client.delete(*(self._key(statement_id) for statement_id in statement_ids))
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"Failed to release dedup keys in Redis: {e}")
+
+    def clear(self) -> None:
+        self.fallback.clear()
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status.update({"key_prefix": self.key_prefix, "fallback": self.fallback.get_status()})
+        return status
+
+
+def create_dedup_store(backend: Optional[str] = None) -> DedupStore:
+    """Build the dedup store selected by ``INGEST_DEDUP_BACKEND``."""
+    backend = (backend or settings.INGEST_DEDUP_BACKEND).lower()
+    memory_store = InMemoryDedupStore(
+        ttl_seconds=settings.INGEST_DEDUP_TTL_SECONDS,
+        max_entries=settings.INGEST_DEDUP_MAX_ENTRIES,
+    )
+    if backend == "redis":
+        from app.config import get_redis_url
+
+        return RedisDedupStore(
+            get_redis_url(),
+            ttl_seconds=settings.INGEST_DEDUP_TTL_SECONDS,
+            fallback=memory_store,
+        )
+    if backend != "memory":
+        logger.warning(f"Unknown dedup backend '{backend}', using in-process store")
+    return memory_store
+
+
+# Global dedup store (lazy-loaded)
+_dedup_store: Optional[DedupStore] = None
+
+
+def get_dedup_store() -> DedupStore:
+    """Get the global dedup store instance (lazy-loaded)."""
+    global _dedup_store
+    if _dedup_store is None:
+        _dedup_store = create_dedup_store()
+    return _dedup_store
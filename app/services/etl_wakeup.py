@@ -0,0 +1,152 @@
+"""
+In-process ETL wake-up bus.
+
+Publishers call ``etl_wakeup_bus.notify()`` after putting statements on
+Pub/Sub.  Notifications are coalesced so listeners see at most one wake-up
+per debounce window, however many statements were published.  When the ETL
+processor lives in this process it registers a listener and is woken
+directly; only when no local listener exists does the bus fall back to a
+single pooled HTTP call to the remote service's trigger endpoint.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from app.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger("etl_wakeup")
+
+DEFAULT_SERVICE_URL = "https://taps-analytics-ui-zz2ztq5bjq-uc.a.run.app"
+TRIGGER_PATH = "/api/etl/trigger-processing"
+
+
+class EtlWakeupBus:
+    """Debounced wake-up signal for ETL processors."""
+
+    def __init__(self, debounce_seconds: float = 2.0, remote_url: Optional[str] = None):
+        self.debounce_seconds = debounce_seconds
+        self.remote_url = remote_url
+        self._listeners: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._pending_sources: Dict[str, int] = {}
+        self._last_delivery = 0.0
+        self._http_client: Optional[httpx.Client] = None
+
+        self.metrics = {
+            "notifications": 0,
+            "coalesced": 0,
+            "local_wakeups": 0,
+            "remote_wakeups": 0,
+            "remote_failures": 0,
+            "last_wakeup_time": None,
+        }
+
+    def register_listener(self, listener: Callable[[str], None]) -> None:
+        """Register an in-process processor to be woken directly."""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def unregister_listener(self, listener: Callable[[str], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def notify(self, source: str = "publish") -> None:
+        """Record a publish event; schedules at most one wake-up per window."""
+        with self._lock:
+            self.metrics["notifications"] += 1
+            self._pending_sources[source] = self._pending_sources.get(source, 0) + 1
+            if self._timer is not None:
+                self.metrics["coalesced"] += 1
+                return
+
+            delay = max(0.0, self._last_delivery + self.debounce_seconds - time.monotonic())
+            self._timer = threading.Timer(delay, self._deliver)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """Deliver any pending wake-up immediately (used on shutdown and in tests)."""
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+        self._deliver()
+
+    def _deliver(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._last_delivery = time.monotonic()
+            sources, self._pending_sources = self._pending_sources, {}
+            listeners = list(self._listeners)
+
+        if not sources:
+            return
+
+        reason = ", ".join(f"{source}x{count}" for source, count in sources.items())
+        self.metrics["last_wakeup_time"] = datetime.now(timezone.utc).isoformat()
+
+        if listeners:
+            for listener in listeners:
+                try:
+                    listener(reason)
+                except Exception as e:
+                    logger.warning(f"ETL wake-up listener failed: {e}")
+            self.metrics["local_wakeups"] += 1
+            return
+
+        self._wake_remote()
+
+    def _get_remote_url(self) -> str:
+        return (
+            self.remote_url
+            or os.environ.get("CLOUD_RUN_SERVICE_URL")
+            or DEFAULT_SERVICE_URL
+        )
+
+    def _get_http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(
+                timeout=5.0,
+                limits=httpx.Limits(max_connections=2, max_keepalive_connections=2),
+            )
+        return self._http_client
+
+    def _wake_remote(self) -> None:
+        """Wake a processor running in another instance via its trigger endpoint."""
+        try:
+            response = self._get_http_client().post(f"{self._get_remote_url()}{TRIGGER_PATH}")
+            self.metrics["remote_wakeups"] += 1
+            if response.status_code == 200:
+                logger.info("Successfully triggered remote ETL processors")
+            else:
+                logger.warning(f"ETL trigger returned status {response.status_code}")
+        except Exception as e:
+            # Don't fail ingestion if the wake-up cannot be delivered
+            self.metrics["remote_failures"] += 1
+            logger.warning(f"Failed to trigger remote ETL processors: {e}")
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "debounce_seconds": self.debounce_seconds,
+                "mode": "local" if self._listeners else "remote",
+                "local_listeners": len(self._listeners),
+                "wakeup_pending": self._timer is not None,
+                "remote_url": None if self._listeners else self._get_remote_url(),
+                "metrics": dict(self.metrics),
+            }
+
+
+etl_wakeup_bus = EtlWakeupBus(
+    debounce_seconds=settings.ETL_WAKEUP_DEBOUNCE_SECONDS,
+    remote_url=settings.ETL_WAKEUP_REMOTE_URL,
+)
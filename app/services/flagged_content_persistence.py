@@ -17,6 +17,42 @@ from app.logging_config import get_logger
 logger = get_logger("flagged_content_persistence")
 
 
+def statement_alert_fields(statement: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract the persistence/alert fields from an xAPI statement payload."""
+    # Extract content from statement
+    result = statement.get("result") or {}
+    content = result.get("response") or ""
+    
+    # Extract actor info
+    actor = statement.get("actor") or {}
+    actor_id = actor.get("mbox") or actor.get("mbox_sha1sum") or actor.get("openid") or "unknown"
+    if actor_id.startswith("mailto:"):
+        actor_id = actor_id[7:]
+    
+    # Extract cohort from context extensions
+    extensions = (statement.get("context") or {}).get("extensions") or {}
+    cohort = extensions.get("https://7taps.com/cohort")
+    
+    # Extract timestamp
+    timestamp = statement.get("timestamp")
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            timestamp = datetime.now(timezone.utc)
+    elif not isinstance(timestamp, datetime):
+        timestamp = datetime.now(timezone.utc)
+    
+    return {
+        "statement_id": statement.get("id") or "unknown",
+        "timestamp": timestamp,
+        "actor_id": actor_id,
+        "actor_name": actor.get("name"),
+        "content": content,
+        "cohort": cohort,
+    }
+
+
 class FlaggedContentPersistence:
     """Handles persistence of flagged content to BigQuery and alerts."""
     
@@ -53,7 +89,8 @@ class FlaggedContentPersistence:
         actor_name: Optional[str],
         content: str,
         analysis_result: Dict[str, Any],
-        cohort: Optional[str] = None
+        cohort: Optional[str] = None,
+        send_alert: bool = True
     ) -> bool:
         """
         Persist flagged content to BigQuery.
@@ -66,6 +103,8 @@ class FlaggedContentPersistence:
             content: The flagged content text
             analysis_result: Complete analysis result
             cohort: Cohort identifier if available
+            send_alert: Send the email alert for flagged rows (False when an
+                immediate alert was already sent at ingest time)
             
         Returns:
             True if persisted successfully, False otherwise
@@ -73,7 +112,7 @@ class FlaggedContentPersistence:
         if not self._enabled:
             logger.debug("Persistence disabled, skipping BigQuery write")
             # Still send alerts even if persistence is disabled
-            if analysis_result.get("is_flagged", False):
+            if send_alert and analysis_result.get("is_flagged", False):
                 await self._send_email_alert(statement_id, actor_id, actor_name, content, analysis_result, cohort)
             return False
         
@@ -128,7 +167,7 @@ class FlaggedContentPersistence:
             logger.info(f"Persisted flagged content: {statement_id} (severity: {analysis_result.get('severity')})")
             
             # Send email alert for ALL flagged content
-            if analysis_result.get("is_flagged", False):
+            if send_alert and analysis_result.get("is_flagged", False):
                 await self._send_email_alert(statement_id, actor_id, actor_name, content, analysis_result, cohort)
             
             return True
@@ -137,6 +176,18 @@ class FlaggedContentPersistence:
             logger.error(f"Error persisting flagged content: {e}")
             return False
     
+    async def send_immediate_alert(self, statement: Dict[str, Any], analysis_result: Dict[str, Any]) -> None:
+        """Alert on a statement straight away, before the full AI analysis has run."""
+        fields = statement_alert_fields(statement)
+        await self._send_email_alert(
+            fields["statement_id"],
+            fields["actor_id"],
+            fields["actor_name"],
+            fields["content"],
+            analysis_result,
+            fields["cohort"]
+        )
+    
     async def _send_email_alert(
         self,
         statement_id: str,
@@ -0,0 +1,520 @@
+"""
+Durable write-ahead spool for the ingest path.
+
+When Pub/Sub publishing fails or exceeds its latency budget, statements are
+appended to a local segment file instead of being dropped, and the request
+can still be acknowledged.  A background drainer replays spooled statements
+to Pub/Sub with exponential backoff once it recovers.
+
+Layout (under ``INGEST_SPOOL_DIR``, one directory per writing process)::
+
+    owner-<pid>/.lock                               held by the writer while it runs
+    owner-<pid>/segment-000000000001.ndjson         append-only, one JSON record per line
+    owner-<pid>/segment-000000000001.ndjson.ack     byte offset drained so far
+
+Only the process that writes a directory drains it, so a segment is never
+read while another process appends to it.  When a writer dies its lock is
+released and the next spool to notice adopts the directory: every segment in
+it is sealed, so it is drained to the end and removed.
+
+Each ``append`` call writes all of its records and issues a single fsync, so
+a 500-statement burst costs one disk flush.  Delivery is at-least-once: a
+crash between publishing and writing the ack offset replays a few records,
+which downstream statement-id dedup absorbs.  A statement spooled because
+its publish was still unresolved at the latency budget keeps that publish's
+future, and the drainer waits on it before sending the spooled copy.  A line
+that cannot be decoded
+(the torn tail of a write interrupted by a crash) is copied to
+``quarantine.ndjson`` and skipped.
+"""
+
+import fcntl
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("ingest_spool")
+
+OWNER_PREFIX = "owner-"
+LOCK_NAME = ".lock"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".ndjson"
+ACK_SUFFIX = ".ack"
+QUARANTINE_NAME = "quarantine.ndjson"
+
+# publish(payloads, attributes) -> one {"success": bool, ...} result per payload
+PublishFunction = Callable[[List[Dict[str, Any]], List[Dict[str, str]]], List[Dict[str, Any]]]
+
+
+@dataclass
+class SpoolConfig:
+    """Settings for the ingest spool and its drainer."""
+    directory: str = "/tmp/xapi-ingest-spool"
+    segment_max_bytes: int = 16 * 1024 * 1024
+    latency_budget: float = 2.0  # seconds a publish may take before spooling
+    drain_batch_size: int = 100
+    poll_interval: float = 1.0  # seconds between checks while the spool is empty
+    backoff_initial: float = 1.0
+    backoff_max: float = 60.0
+    unresolved_wait: float = 30.0  # seconds a drain batch waits on its records' unresolved original publishes
+
+    @classmethod
+    def from_settings(cls) -> "SpoolConfig":
+        return cls(
+            directory=settings.INGEST_SPOOL_DIR,
+            segment_max_bytes=settings.INGEST_SPOOL_SEGMENT_MAX_BYTES,
+            latency_budget=settings.INGEST_SPOOL_LATENCY_BUDGET,
+            drain_batch_size=settings.INGEST_SPOOL_DRAIN_BATCH_SIZE,
+            backoff_max=settings.INGEST_SPOOL_BACKOFF_MAX,
+            unresolved_wait=settings.PUBSUB_PUBLISH_TIMEOUT,
+        )
+
+
+class IngestSpool:
+    """Append-only segment spool with a background drainer."""
+
+    def __init__(
+        self,
+        config: SpoolConfig,
+        publish: PublishFunction,
+        on_drained: Optional[Callable[[int], None]] = None,
+    ):
+        self.config = config
+        self._publish = publish
+        self._on_drained = on_drained
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._drainer: Optional[threading.Thread] = None
+        self._active_file = None
+        self._active_segment: Optional[str] = None
+        self._drain_window: deque = deque()  # (monotonic time, records drained)
+        self._adopted: Dict[str, Any] = {}  # orphaned directory -> its lock file
+        self._unresolved: Dict[Tuple[str, int], Future] = {}  # (segment, line offset) -> original publish
+        self.backoff_seconds = 0.0
+
+        self.metrics = {
+            "records_spooled": 0,
+            "bytes_spooled": 0,
+            "fsyncs": 0,
+            "records_drained": 0,
+            "drain_batches": 0,
+            "drain_failures": 0,
+            "records_quarantined": 0,
+            "records_published_late": 0,  # original publish landed; the spooled copy was not resent
+            "depth_records": 0,
+            "depth_bytes": 0,
+            "directories_adopted": 0,
+            "last_spool_time": None,
+            "last_drain_time": None,
+            "last_drain_error": None,
+        }
+
+        self.directory = os.path.join(self.config.directory, f"{OWNER_PREFIX}{os.getpid()}")
+        os.makedirs(self.directory, exist_ok=True)
+        self._owner_lock = self._try_lock(self.directory)
+        if self._owner_lock is None:
+            raise RuntimeError(f"Spool directory {self.directory} is locked by another process")
+        self._recover()
+        self._claim_orphans()
+
+    # ------------------------------------------------------------------
+    # Segment bookkeeping
+    # ------------------------------------------------------------------
+
+    def _segments(self, directory: Optional[str] = None) -> List[str]:
+        directory = directory or self.directory
+        try:
+            names = [
+                name for name in os.listdir(directory)
+                if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+            ]
+        except FileNotFoundError:  # an orphan another spool already drained and removed
+            return []
+        return [os.path.join(directory, name) for name in sorted(names)]
+
+    @staticmethod
+    def _try_lock(directory: str):
+        """Lock ``directory`` for this process; None while another live process holds it."""
+        lock_file = open(os.path.join(directory, LOCK_NAME), "a")
+        try:
+            # POSIX record locks belong to the process and are released when it dies
+            fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    @staticmethod
+    def _read_ack(segment: str) -> int:
+        try:
+            with open(segment + ACK_SUFFIX, "r") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    @staticmethod
+    def _write_ack(segment: str, offset: int) -> None:
+        tmp_path = segment + ACK_SUFFIX + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, segment + ACK_SUFFIX)
+
+    def _pending(self, segments: List[str]) -> Tuple[int, int]:
+        """Records and bytes not yet drained from ``segments``."""
+        records = 0
+        size = 0
+        for segment in segments:
+            offset = self._read_ack(segment)
+            with open(segment, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if line.strip():
+                        records += 1
+                        size += len(line)
+        return records, size
+
+    def _recover(self) -> None:
+        """Count records left over from a previous process with this pid so depth is accurate."""
+        records, size = self._pending(self._segments())
+        self.metrics["depth_records"] = records
+        self.metrics["depth_bytes"] = size
+        if records:
+            logger.warning(f"Recovered {records} spooled statement(s) from {self.directory}")
+
+    def _orphan_candidates(self) -> List[str]:
+        """Other writers' directories, plus the root for segments spooled before per-process directories."""
+        root = self.config.directory
+        candidates = [
+            os.path.join(root, name) for name in sorted(os.listdir(root))
+            if name.startswith(OWNER_PREFIX) and os.path.join(root, name) != self.directory
+        ]
+        if self._segments(root):
+            candidates.append(root)
+        return [directory for directory in candidates if directory not in self._adopted]
+
+    def _claim_orphans(self) -> int:
+        """Take over directories whose writer has exited; returns the records adopted."""
+        adopted = 0
+        for directory in self._orphan_candidates():
+            lock_file = self._try_lock(directory)
+            if lock_file is None:
+                continue  # writer still running; it drains its own segments
+            segments = self._segments(directory)
+            if not segments:
+                self._release_orphan(directory, lock_file)
+                continue
+            records, size = self._pending(segments)
+            with self._lock:
+                self._adopted[directory] = lock_file
+                self.metrics["directories_adopted"] += 1
+                self.metrics["depth_records"] += records
+                self.metrics["depth_bytes"] += size
+            adopted += records
+            logger.warning(f"Adopted {records} spooled statement(s) from exited writer {directory}")
+        return adopted
+
+    def _release_orphan(self, directory: str, lock_file) -> None:
+        try:
+            if directory != self.config.directory:
+                os.remove(os.path.join(directory, LOCK_NAME))
+                os.rmdir(directory)
+        except OSError as e:
+            logger.warning(f"Could not remove drained spool directory {directory}: {e}")
+        finally:
+            lock_file.close()
+
+    def _next_segment_path(self) -> str:
+        existing = self._segments()
+        last = int(os.path.basename(existing[-1])[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) if existing else 0
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{last + 1:012d}{SEGMENT_SUFFIX}")
+
+    def _seal_active_locked(self) -> None:
+        if self._active_file is not None:
+            self._active_file.close()
+        self._active_file = None
+        self._active_segment = None
+
+    # ------------------------------------------------------------------
+    # Write path
+    # ------------------------------------------------------------------
+
+    def append(
+        self,
+        records: Sequence[Tuple[Dict[str, Any], str]],
+        futures: Optional[Sequence[Optional[Future]]] = None,
+    ) -> int:
+        """
+        Durably append ``(payload, source)`` records with a single fsync.
+
+        ``futures`` optionally gives, per record, the original publish that
+        was still unresolved when it was spooled; the drainer waits on it
+        instead of publishing the record a second time.
+
+        Returns the number of records written. Raises ``OSError`` if the
+        spool cannot be written, so callers can fall back to failing the
+        request.
+        """
+        if not records:
+            return 0
+
+        spooled_at = datetime.now(timezone.utc).isoformat()
+        lines = [
+            json_codec.dumps_bytes({"source": source, "spooled_at": spooled_at, "payload": payload}) + b"\n"
+            for payload, source in records
+        ]
+        data = b"".join(lines)
+
+        with self._lock:
+            if self._active_file is None:
+                self._active_segment = self._next_segment_path()
+                self._active_file = open(self._active_segment, "ab")
+            if futures:
+                line_offset = self._active_file.tell()
+                for line, future in zip(lines, futures):
+                    if future is not None:
+                        self._unresolved[(self._active_segment, line_offset)] = future
+                    line_offset += len(line)
+            self._active_file.write(data)
+            self._active_file.flush()
+            os.fsync(self._active_file.fileno())
+
+            self.metrics["fsyncs"] += 1
+            self.metrics["records_spooled"] += len(records)
+            self.metrics["bytes_spooled"] += len(data)
+            self.metrics["depth_records"] += len(records)
+            self.metrics["depth_bytes"] += len(data)
+            self.metrics["last_spool_time"] = spooled_at
+
+            if self._active_file.tell() >= self.config.segment_max_bytes:
+                self._seal_active_locked()
+
+        logger.warning(f"Spooled {len(records)} statement(s) for later delivery")
+        self._wake.set()
+        return len(records)
+
+    # ------------------------------------------------------------------
+    # Drain path
+    # ------------------------------------------------------------------
+
+    def drain_once(self) -> int:
+        """
+        Replay spooled records to Pub/Sub until the spool is empty or a publish fails.
+
+        Returns the number of records drained. Raises the publish error when a
+        batch could not be delivered (records stay in the spool).
+        """
+        with self._lock:
+            # Seal the active segment so the drainer never reads a file being appended
+            self._seal_active_locked()
+            segments = self._segments()
+
+        drained = self._drain_segments(segments)
+        for directory, lock_file in list(self._adopted.items()):
+            drained += self._drain_segments(self._segments(directory))
+            with self._lock:
+                del self._adopted[directory]
+            self._release_orphan(directory, lock_file)
+        return drained
+
+    def _drain_segments(self, segments: List[str]) -> int:
+        drained = 0
+        for segment in segments:
+            offset = self._read_ack(segment)
+            with open(segment, "rb") as f:
+                f.seek(offset)
+                while True:
+                    batch: List[Tuple[int, bytes]] = []
+                    for _ in range(self.config.drain_batch_size):
+                        line = f.readline()
+                        if not line:
+                            break
+                        batch.append((len(line), line))
+                    if not batch:
+                        break
+
+                    drained += self._publish_spooled_batch(segment, offset, batch)
+                    offset += sum(length for length, _ in batch)
+
+            os.remove(segment)
+            try:
+                os.remove(segment + ACK_SUFFIX)
+            except FileNotFoundError:
+                pass
+        return drained
+
+    def _decode(self, segment: str, line: bytes) -> Optional[Dict[str, Any]]:
+        """The spooled record on ``line``, or None after quarantining a torn or corrupt line."""
+        try:
+            if not line.endswith(b"\n"):
+                raise ValueError("unterminated line")  # a writer crashed mid-append
+            record = json_codec.loads(line)
+            if not isinstance(record, dict) or "payload" not in record:
+                raise ValueError("not a spool record")
+            return record
+        except ValueError as e:
+            logger.error(f"Quarantining undecodable line in {segment} ({len(line)} bytes): {e}")
+            try:
+                with open(os.path.join(self.config.directory, QUARANTINE_NAME), "ab") as f:
+                    f.write(line if line.endswith(b"\n") else line + b"\n")
+            except OSError as write_error:
+                logger.error(f"Could not write spool quarantine file: {write_error}")
+            return None
+
+    def _originals_published(self, segment: str, line_offsets: Sequence[int]) -> Set[int]:
+        """Offsets whose original publish, unresolved at spool time, went through after all.
+
+        The batch's pending publishes are awaited together, so a batch waits
+        at most ``unresolved_wait`` however many of its records are unresolved.
+        """
+        futures: Dict[int, Future] = {}
+        with self._lock:
+            for line_offset in line_offsets:
+                future = self._unresolved.pop((segment, line_offset), None)
+                if future is not None:
+                    futures[line_offset] = future
+        if not futures:
+            return set()
+        wait(futures.values(), timeout=self.config.unresolved_wait)
+        # Failed or still pending: the spooled copy is published
+        published = {
+            line_offset for line_offset, future in futures.items()
+            if future.done() and not future.cancelled() and future.exception() is None
+        }
+        with self._lock:
+            self.metrics["records_published_late"] += len(published)
+        return published
+
+    def _publish_spooled_batch(self, segment: str, offset: int, batch: List[Tuple[int, bytes]]) -> int:
+        payloads: List[Dict[str, Any]] = []
+        attributes: List[Dict[str, str]] = []
+        records: List[Tuple[int, Optional[Dict[str, Any]]]] = []
+        line_offset = offset
+        for length, line in batch:
+            records.append((line_offset, self._decode(segment, line) if line.strip() else None))
+            line_offset += length
+        published = self._originals_published(
+            segment, [line_offset for line_offset, record in records if record is not None]
+        )
+
+        # Per line: "publish", "done" (original publish landed), or None (blank or quarantined)
+        actions: List[Optional[str]] = []
+        for line_offset, record in records:
+            if record is None:
+                actions.append(None)
+            elif line_offset in published:
+                actions.append("done")
+            else:
+                actions.append("publish")
+                payloads.append(record["payload"])
+                attributes.append({"source": record.get("source", "spool"), "spooled_at": record.get("spooled_at", "")})
+
+        results = self._publish(payloads, attributes) if payloads else []
+        delivered_bytes = 0
+        delivered = 0
+        republished = 0
+        quarantined = 0
+        result_iter = iter(results)
+        for (length, line), action in zip(batch, actions):
+            if action == "publish":
+                result = next(result_iter)
+                if not result.get("success"):
+                    break
+                republished += 1
+                delivered += 1
+            elif action == "done":
+                delivered += 1
+            elif line.strip():
+                quarantined += 1  # skipped, so one bad line cannot block the spool behind it
+            delivered_bytes += length
+
+        # Persist progress up to the first failure so a retry resumes there
+        self._write_ack(segment, offset + delivered_bytes)
+        with self._lock:
+            self.metrics["records_drained"] += delivered
+            self.metrics["drain_batches"] += 1
+            self.metrics["records_quarantined"] += quarantined
+            self.metrics["depth_records"] = max(0, self.metrics["depth_records"] - delivered - quarantined)
+            self.metrics["depth_bytes"] = max(0, self.metrics["depth_bytes"] - delivered_bytes)
+            self.metrics["last_drain_time"] = datetime.now(timezone.utc).isoformat()
+            self._drain_window.append((time.monotonic(), delivered))
+
+        if delivered and self._on_drained:
+            self._on_drained(delivered)
+
+        if republished < len(payloads):
+            failed = results[republished]
+            raise RuntimeError(f"Spool drain publish failed: {failed.get('error', 'unknown error')}")
+        return delivered
+
+    def _drain_loop(self) -> None:
+        while not self._stop.is_set():
+            if self.metrics["depth_records"] == 0:
+                self._wake.wait(self.config.poll_interval)
+                self._wake.clear()
+                try:
+                    self._claim_orphans()
+                except OSError as e:
+                    logger.warning(f"Could not scan {self.config.directory} for orphaned spools: {e}")
+                continue
+            try:
+                drained = self.drain_once()
+                self.backoff_seconds = 0.0
+                if drained:
+                    logger.info(f"Drained {drained} spooled statement(s) to Pub/Sub")
+            except Exception as e:
+                self.metrics["drain_failures"] += 1
+                self.metrics["last_drain_error"] = str(e)
+                self.backoff_seconds = min(
+                    self.config.backoff_max,
+                    max(self.config.backoff_initial, self.backoff_seconds * 2),
+                )
+                logger.warning(f"Spool drain failed, retrying in {self.backoff_seconds:.1f}s: {e}")
+                self._stop.wait(self.backoff_seconds)
+
+    def start_drainer(self) -> None:
+        """Start the background drainer thread if it is not running."""
+        if self._drainer is not None and self._drainer.is_alive():
+            return
+        self._stop.clear()
+        self._drainer = threading.Thread(target=self._drain_loop, name="ingest-spool-drainer", daemon=True)
+        self._drainer.start()
+        logger.info(f"Started ingest spool drainer for {self.directory}")
+
+    def stop_drainer(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._drainer is not None:
+            self._drainer.join(timeout)
+
+    def drain_rate(self, window_seconds: float = 60.0) -> float:
+        """Records drained per second over the recent window."""
+        cutoff = time.monotonic() - window_seconds
+        with self._lock:
+            while self._drain_window and self._drain_window[0][0] < cutoff:
+                self._drain_window.popleft()
+            total = sum(count for _, count in self._drain_window)
+        return total / window_seconds
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "directory": self.directory,
+            "latency_budget": self.config.latency_budget,
+            "drainer_running": self._drainer is not None and self._drainer.is_alive(),
+            "backoff_seconds": self.backoff_seconds,
+            "segments": len(self._segments()) + sum(len(self._segments(d)) for d in list(self._adopted)),
+            "drain_rate_per_sec": round(self.drain_rate(), 3),
+            "metrics": dict(self.metrics),
+        }
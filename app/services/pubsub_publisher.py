@@ -0,0 +1,286 @@
+"""
+Batched Pub/Sub publisher service for the xAPI ingest path.
+
+Publishes a whole list of statements at once: every message is handed to the
+Pub/Sub client up front (which batches them according to ``BatchSettings``
+and applies ``PublishFlowControl``), and all publish futures are resolved
+together.  Callers get one result per statement, in input order, with either
+the message id or the publish error.
+
+A publish still unresolved at the timeout is not cancelled (cancelling a
+Pub/Sub future does not stop delivery).  It is reported with
+``outcome_unknown`` set: the message may still arrive, so a caller that
+republishes it relies on downstream statement-id dedup, or waits on the
+original future handed to ``on_unresolved``.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, wait
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from google.auth import default
+from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1 import types
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("pubsub_publisher")
+
+LATENCY_EWMA_ALPHA = 0.2  # weight of the newest batch in the smoothed latency
+
+
+@dataclass
+class PublisherConfig:
+    """Batching and flow control settings for the ingest publisher."""
+    batch_max_messages: int = 100
+    batch_max_bytes: int = 1024 * 1024
+    batch_max_latency: float = 0.01  # seconds
+    flow_control_max_messages: int = 1000
+    flow_control_max_bytes: int = 10 * 1024 * 1024
+    publish_timeout: float = 30.0  # seconds to wait for a whole batch
+
+    @classmethod
+    def from_settings(cls) -> "PublisherConfig":
+        """Build the publisher configuration from application settings."""
+        return cls(
+            batch_max_messages=settings.PUBSUB_BATCH_MAX_MESSAGES,
+            batch_max_bytes=settings.PUBSUB_BATCH_MAX_BYTES,
+            batch_max_latency=settings.PUBSUB_BATCH_MAX_LATENCY,
+            flow_control_max_messages=settings.PUBSUB_FLOW_CONTROL_MAX_MESSAGES,
+            flow_control_max_bytes=settings.PUBSUB_FLOW_CONTROL_MAX_BYTES,
+            publish_timeout=settings.PUBSUB_PUBLISH_TIMEOUT,
+        )
+
+    def batch_settings(self) -> types.BatchSettings:
+        return types.BatchSettings(
+            max_bytes=self.batch_max_bytes,
+            max_latency=self.batch_max_latency,
+            max_messages=self.batch_max_messages,
+        )
+
+    def publisher_options(self) -> types.PublisherOptions:
+        return types.PublisherOptions(
+            flow_control=types.PublishFlowControl(
+                message_limit=self.flow_control_max_messages,
+                byte_limit=self.flow_control_max_bytes,
+                limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+            )
+        )
+
+
+class PubSubPublisherService:
+    """Shared publisher that sends lists of xAPI payloads to one topic."""
+
+    def __init__(
+        self,
+        project_id: str,
+        topic_name: str,
+        config: Optional[PublisherConfig] = None,
+        client_factory: Optional[Callable[[PublisherConfig], Any]] = None,
+    ):
+        self.project_id = project_id
+        self.topic_name = topic_name
+        self.config = config or PublisherConfig.from_settings()
+        self._client_factory = client_factory or self._default_client_factory
+        self._client = None
+        self._topic_path: Optional[str] = None
+        self._lock = threading.Lock()
+
+        self.metrics = {
+            "batches_published": 0,
+            "messages_published": 0,
+            "messages_failed": 0,
+            "last_batch_size": 0,
+            "last_batch_duration_ms": 0.0,
+            "latency_ewma_ms": 0.0,  # smoothed batch latency, used for admission control
+            "in_flight": 0,  # messages handed to the client and not yet resolved
+            "publishes_unresolved": 0,  # still pending at the timeout
+            "late_publishes": 0,  # ...that were delivered afterwards
+            "late_failures": 0,  # ...that failed afterwards
+        }
+
+    @staticmethod
+    def _default_client_factory(config: PublisherConfig) -> pubsub_v1.PublisherClient:
+        credentials, _ = default()
+        return pubsub_v1.PublisherClient(
+            credentials=credentials,
+            batch_settings=config.batch_settings(),
+            publisher_options=config.publisher_options(),
+        )
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._client is not None
+
+    def get_client(self):
+        """Return the (lazily created) Pub/Sub client and topic path."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        client = self._client_factory(self.config)
+                        self._topic_path = client.topic_path(self.project_id, self.topic_name)
+                        self._client = client
+                        logger.info(f"Initialized batched Pub/Sub publisher for topic: {self._topic_path}")
+                    except Exception as e:
+                        logger.error(f"Failed to initialize Pub/Sub client: {e}")
+                        raise RuntimeError(f"Pub/Sub client not initialized: {e}") from e
+        return self._client, self._topic_path
+
+    def publish_batch(
+        self,
+        payloads: Sequence[Dict[str, Any]],
+        *,
+        source: str,
+        attributes: Optional[Sequence[Optional[Dict[str, str]]]] = None,
+        timeout: Optional[float] = None,
+        on_unresolved: Optional[Callable[[int, Future], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Publish all payloads concurrently and wait for every future.
+
+        Args:
+            payloads: xAPI statements (JSON-serializable dicts)
+            source: Ingestion source recorded on every message
+            attributes: Optional extra message attributes, one entry per payload
+            timeout: Seconds to wait for the batch (defaults to ``publish_timeout``)
+            on_unresolved: Called with ``(index, future)`` for each publish still
+                pending at the timeout
+
+        Returns:
+            One result per payload, in input order: ``{"success": True,
+            "message_id", "topic"}`` or ``{"success": False, "error", "error_type", "topic"}``;
+            timed-out publishes also carry ``"outcome_unknown": True``
+        """
+        if not payloads:
+            return []
+
+        client, topic_path = self.get_client()
+        started = time.perf_counter()
+        published_at = datetime.now(timezone.utc).isoformat()
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(payloads)
+        pending = {}
+        for index, payload in enumerate(payloads):
+            message_attributes = {
+                "timestamp": published_at,
+                "source": source,
+                "statement_count": "1",
+            }
+            if attributes and attributes[index]:
+                message_attributes.update(attributes[index])
+            try:
+                data = json_codec.dumps_bytes(payload)
+                pending[client.publish(topic_path, data, **message_attributes)] = index
+            except Exception as e:
+                results[index] = self._failure(e, topic_path)
+
+        timeout = self.config.publish_timeout if timeout is None else timeout
+        with self._lock:
+            self.metrics["in_flight"] += len(pending)
+        try:
+            done, not_done = wait(list(pending), timeout=timeout)
+        finally:
+            with self._lock:
+                self.metrics["in_flight"] -= len(pending)
+        for future in not_done:
+            # Left running: cancel() would not stop a message the client already sent
+            index = pending[future]
+            results[index] = {
+                **self._failure(TimeoutError(f"Publish unresolved after {timeout}s"), topic_path),
+                "outcome_unknown": True,
+            }
+            future.add_done_callback(self._record_late_outcome)
+            if on_unresolved is not None:
+                on_unresolved(index, future)
+        if not_done:
+            with self._lock:
+                self.metrics["publishes_unresolved"] += len(not_done)
+        for future in done:
+            index = pending[future]
+            try:
+                results[index] = {
+                    "success": True,
+                    "message_id": future.result(),
+                    "topic": topic_path,
+                }
+            except Exception as e:
+                results[index] = self._failure(e, topic_path)
+
+        failed = sum(1 for result in results if not result["success"])
+        duration_ms = (time.perf_counter() - started) * 1000
+        self.metrics["batches_published"] += 1
+        self.metrics["messages_published"] += len(payloads) - failed
+        self.metrics["messages_failed"] += failed
+        self.metrics["last_batch_size"] = len(payloads)
+        self.metrics["last_batch_duration_ms"] = round(duration_ms, 2)
+        self.metrics["latency_ewma_ms"] = round(
+            LATENCY_EWMA_ALPHA * duration_ms + (1 - LATENCY_EWMA_ALPHA) * self.metrics["latency_ewma_ms"], 2
+        )
+
+        if failed:
+            logger.warning(f"Published batch of {len(payloads)} to {topic_path} with {failed} failure(s)")
+        else:
+            logger.info(f"Published batch of {len(payloads)} message(s) to {topic_path} in {duration_ms:.1f}ms")
+        return results
+
+    def _record_late_outcome(self, future: Future) -> None:
+        failed = future.cancelled() or future.exception() is not None
+        with self._lock:
+            self.metrics["late_failures" if failed else "late_publishes"] += 1
+
+    @staticmethod
+    def _failure(error: Exception, topic_path: Optional[str]) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": str(error),
+            "error_type": type(error).__name__,
+            "topic": topic_path,
+        }
+
+    async def publish_batch_async(
+        self,
+        payloads: Sequence[Dict[str, Any]],
+        *,
+        source: str,
+        attributes: Optional[Sequence[Optional[Dict[str, str]]]] = None,
+        timeout: Optional[float] = None,
+        on_unresolved: Optional[Callable[[int, Future], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Publish a batch without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None,
+            lambda: self.publish_batch(
+                payloads, source=source, attributes=attributes, timeout=timeout, on_unresolved=on_unresolved
+            ),
+        )
+
+    def get_load(self) -> Dict[str, float]:
+        """Current publish pressure: messages in flight and smoothed batch latency."""
+        return {
+            "in_flight": self.metrics["in_flight"],
+            "queue_limit": self.config.flow_control_max_messages,
+            "latency_ms": self.metrics["latency_ewma_ms"],
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "initialized": self.is_initialized,
+            "topic_path": self._topic_path,
+            "config": {
+                "batch_max_messages": self.config.batch_max_messages,
+                "batch_max_bytes": self.config.batch_max_bytes,
+                "batch_max_latency": self.config.batch_max_latency,
+                "flow_control_max_messages": self.config.flow_control_max_messages,
+                "flow_control_max_bytes": self.config.flow_control_max_bytes,
+                "publish_timeout": self.config.publish_timeout,
+            },
+            "metrics": self.metrics.copy(),
+        }
@@ -0,0 +1,241 @@
+"""
+Buffered ``users`` activity updates.
+
+Every normalized statement bumps its learner's ``last_seen`` and
+``activity_count``.  Instead of a MERGE per statement, deltas are folded
+together in memory per user id and written with one set-based MERGE every
+``flush_interval`` seconds (or sooner once ``max_pending`` users are
+waiting).  The MERGE adds counts and widens the first/last-seen window, so
+deltas from several instances compose; a failed flush puts its deltas back
+to be retried with the next one.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from google.cloud import bigquery
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("user_activity")
+
+
+@dataclass
+class ActivityBufferConfig:
+    """Flush triggers for buffered user activity."""
+    flush_interval: float = 5.0  # seconds
+    max_pending: int = 5000  # distinct users
+
+    @classmethod
+    def from_settings(cls) -> "ActivityBufferConfig":
+        return cls(
+            flush_interval=settings.USER_ACTIVITY_FLUSH_INTERVAL,
+            max_pending=settings.USER_ACTIVITY_MAX_PENDING,
+        )
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def fold_activity(pending: Optional[Dict[str, Any]], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two activity deltas for the same user (same rules as the MERGE)."""
+    if pending is None:
+        return dict(delta, sources=list(delta["sources"]))
+    folded = dict(pending, sources=list(pending["sources"]))
+    if delta["first_seen"] and (not folded["first_seen"] or delta["first_seen"] < folded["first_seen"]):
+        folded["first_seen"] = delta["first_seen"]
+    if delta["last_seen"] and (not folded["last_seen"] or delta["last_seen"] > folded["last_seen"]):
+        folded["last_seen"] = delta["last_seen"]
+    folded["activity_count"] += delta["activity_count"]
+    if not folded["email"]:
+        folded["email"] = delta["email"]
+    if len(delta["name"]) > len(folded["name"]):
+        folded["name"] = delta["name"]
+    for source in delta["sources"]:
+        if source not in folded["sources"]:
+            folded["sources"].append(source)
+    return folded
+
+
+def build_activity_merge_query(table_id: str) -> str:
+    """One MERGE applying a JSON array of per-user deltas to ``users``."""
+    return f"""
+    MERGE `{table_id}` T
+    USING (
+      SELECT
+        JSON_VALUE(r, '$.user_id') AS user_id,
+        JSON_VALUE(r, '$.email') AS email,
+        JSON_VALUE(r, '$.name') AS name,
+        ARRAY(SELECT JSON_VALUE(s) FROM UNNEST(JSON_EXTRACT_ARRAY(r, '$.sources')) AS s) AS sources,
+        SAFE.TIMESTAMP(JSON_VALUE(r, '$.first_seen')) AS first_seen,
+        SAFE.TIMESTAMP(JSON_VALUE(r, '$.last_seen')) AS last_seen,
+        CAST(JSON_VALUE(r, '$.activity_count') AS INT64) AS activity_count
+      FROM UNNEST(JSON_EXTRACT_ARRAY(@rows_json)) AS r
+    ) S
+    ON T.user_id = S.user_id
+    WHEN MATCHED THEN
+      UPDATE SET
+        email = IF(IFNULL(T.email, '') = '', S.email, T.email),
+        name = IF(LENGTH(IFNULL(S.name, '')) > LENGTH(IFNULL(T.name, '')), S.name, T.name),
+        sources = ARRAY(SELECT DISTINCT s FROM UNNEST(ARRAY_CONCAT(IFNULL(T.sources, []), S.sources)) AS s),
+        first_seen = LEAST(IFNULL(T.first_seen, S.first_seen), IFNULL(S.first_seen, T.first_seen)),
+        last_seen = GREATEST(IFNULL(T.last_seen, S.last_seen), IFNULL(S.last_seen, T.last_seen)),
+        activity_count = IFNULL(T.activity_count, 0) + S.activity_count,
+        updated_at = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN
+      INSERT (user_id, email, name, sources, first_seen, last_seen,
+              activity_count, csv_data, created_at, updated_at)
+      VALUES (S.user_id, S.email, S.name, S.sources, S.first_seen, S.last_seen,
+              S.activity_count, ARRAY<JSON>[], CURRENT_TIMESTAMP(), CURRENT_TIMESTAMP())
+    """
+
+
+class UserActivityBuffer:
+    """Accumulates per-user activity deltas and writes them in periodic MERGEs."""
+
+    def __init__(
+        self,
+        client: bigquery.Client,
+        dataset_id: str,
+        table_id: str = "users",
+        config: Optional[ActivityBufferConfig] = None,
+    ):
+        self.client = client
+        self.dataset_id = dataset_id
+        self.table_id = table_id
+        self.config = config or ActivityBufferConfig.from_settings()
+
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.metrics = {
+            "events_recorded": 0,
+            "users_pending": 0,
+            "flushes": 0,
+            "flush_failures": 0,
+            "users_flushed": 0,
+            "last_flush_size": 0,
+            "last_flush_ms": 0.0,
+            "last_flush_time": None,
+        }
+
+    @property
+    def target_table(self) -> str:
+        return f"{self.dataset_id}.{self.table_id}"
+
+    def record(self, user_info: Dict[str, Any]) -> None:
+        """Fold one statement's user activity into the pending deltas."""
+        user_id = user_info.get("user_id")
+        if not user_id:
+            return
+        first_seen = _parse_timestamp(user_info.get("first_seen"))
+        last_seen = _parse_timestamp(user_info.get("last_seen"))
+        delta = {
+            "user_id": user_id,
+            "email": user_info.get("email") or "",
+            "name": user_info.get("name") or "",
+            "sources": [user_info["source"]] if user_info.get("source") else [],
+            "first_seen": first_seen.isoformat() if first_seen else None,
+            "last_seen": last_seen.isoformat() if last_seen else None,
+            "activity_count": user_info.get("activity_count", 1),
+        }
+        self._ensure_flusher()
+        with self._condition:
+            self._pending[user_id] = fold_activity(self._pending.get(user_id), delta)
+            self.metrics["events_recorded"] += 1
+            self.metrics["users_pending"] = len(self._pending)
+            if len(self._pending) >= self.config.max_pending:
+                self._condition.notify()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._condition:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._stopping = False
+            self._flusher = threading.Thread(target=self._flush_loop, name="user-activity-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.config.flush_interval
+                while not self._stopping and len(self._pending) < self.config.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every pending delta in one MERGE; returns the number of users written."""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = self._pending, {}
+                self.metrics["users_pending"] = 0
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ScalarQueryParameter("rows_json", "STRING", json_codec.dumps(list(batch.values())))
+                ]
+            )
+            try:
+                self.client.query(build_activity_merge_query(self.target_table), job_config=job_config).result()
+            except Exception as e:
+                self.metrics["flush_failures"] += 1
+                logger.error(f"User activity flush for {len(batch)} user(s) failed, will retry: {e}")
+                with self._condition:
+                    for user_id, delta in batch.items():
+                        self._pending[user_id] = fold_activity(self._pending.get(user_id), delta)
+                    self.metrics["users_pending"] = len(self._pending)
+                return 0
+
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.metrics["flushes"] += 1
+            self.metrics["users_flushed"] += len(batch)
+            self.metrics["last_flush_size"] = len(batch)
+            self.metrics["last_flush_ms"] = round(duration_ms, 2)
+            self.metrics["last_flush_time"] = datetime.now(timezone.utc).isoformat()
+            logger.info(f"Flushed activity for {len(batch)} user(s) to {self.target_table} in {duration_ms:.1f}ms")
+            return len(batch)
+
+    def close(self) -> None:
+        """Stop the background flusher and write whatever is pending."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=60)
+        self.flush()
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "target_table": self.target_table,
+            "flush_interval": self.config.flush_interval,
+            "max_pending": self.config.max_pending,
+            "flusher_running": self._flusher is not None and self._flusher.is_alive(),
+            "metrics": dict(self.metrics),
+        }
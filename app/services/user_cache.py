@@ -0,0 +1,266 @@
+"""
+User profile cache for statement normalization.
+
+Enrichment only needs a user's identity and CSV metadata, which change when a
+roster is imported, not when a learner is active.  Profiles are cached by
+normalized email and by user id so the steady-state path needs no BigQuery
+job.  Two backends share one interface:
+
+* ``InMemoryUserCache`` - per-process LRU with a per-entry TTL (default).
+* ``RedisUserCache`` - shared across instances; a lookup is one ``MGET`` and
+  a fill is one pipelined batch of ``SET key value EX ttl`` commands.
+
+Lookups that found no user are cached too (as ``None``) so unknown learners
+do not cost a query per statement.  The TTL bounds how long an instance can
+miss a CSV import made by another instance.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("user_cache")
+
+# Fields kept for enrichment; activity counters live in BigQuery only
+PROFILE_FIELDS = ("user_id", "email", "name", "csv_data")
+
+# Marks a cached "no such user" in Redis, where None cannot be stored
+_ABSENT = "null"
+
+
+def user_profile(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Trim a ``users`` row down to the JSON-safe fields used for enrichment."""
+    return json_codec.to_jsonable({field: user.get(field) for field in PROFILE_FIELDS})
+
+
+class UserCache:
+    """Interface shared by the user cache backends."""
+
+    backend = "base"
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.metrics = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "fills": 0,
+            "invalidations": 0,
+            "errors": 0,
+        }
+
+    def get_many(self, keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Cached entries for ``keys``; a key maps to ``None`` when the user is known not to exist.
+
+        Keys that are not cached are left out of the result.
+        """
+        found = self._get_many(keys)
+        for key in keys:
+            if key not in found:
+                self.metrics["misses"] += 1
+            elif found[key] is None:
+                self.metrics["negative_hits"] += 1
+            else:
+                self.metrics["hits"] += 1
+        return found
+
+    def put_many(self, entries: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        if entries:
+            self._put_many(entries)
+            self.metrics["fills"] += len(entries)
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        keys = [key for key in keys if key]
+        if keys:
+            self._invalidate(keys)
+            self.metrics["invalidations"] += len(keys)
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def _put_many(self, entries: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        raise NotImplementedError
+
+    def _invalidate(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def get_status(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["negative_hits"] + self.metrics["misses"]
+        hits = self.metrics["hits"] + self.metrics["negative_hits"]
+        return {
+            "backend": self.backend,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "metrics": dict(self.metrics),
+        }
+
+
+class InMemoryUserCache(UserCache):
+    """Per-process LRU of user profiles with a per-entry TTL."""
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds: float, max_entries: int, clock=time.monotonic):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expiry, profile)
+        self._lock = threading.Lock()
+        self.metrics["evictions"] = 0
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        now = self._clock()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+        return found
+
+    def _put_many(self, entries: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        expires_at = self._clock() + self.ttl_seconds
+        with self._lock:
+            for key, profile in entries.items():
+                self._entries[key] = (expires_at, profile)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics["evictions"] += 1
+
+    def _invalidate(self, keys: List[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status.update({"entries": len(self._entries), "max_entries": self.max_entries})
+        return status
+
+
+class RedisUserCache(UserCache):
+    """User profiles shared across instances through Redis.
+
+    Reads go to the in-process fallback first and only misses reach Redis;
+    if Redis is unreachable the fallback alone keeps enrichment working.
+    """
+
+    backend = "redis"
+
+    def __init__(
+        self,
+        redis_url: str,
+        ttl_seconds: float,
+        fallback: InMemoryUserCache,
+        key_prefix: str = "users:profile:",
+        client: Optional[Any] = None,
+    ):
+        super().__init__(ttl_seconds)
+        self.redis_url = redis_url
+        self.key_prefix = key_prefix
+        self.fallback = fallback
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(
+                self.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0
+            )
+        return self._client
+
+    def _key(self, key: str) -> str:
+        return f"{self.key_prefix}{key}"
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        found = self.fallback._get_many(keys)
+        remote_keys = [key for key in keys if key not in found]
+        if not remote_keys:
+            return found
+        try:
+            values = self.client.mget([self._key(key) for key in remote_keys])
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"Redis user cache read failed, using in-process entries only: {e}")
+            return found
+
+        fetched = {}
+        for key, value in zip(remote_keys, values):
+            if value is None:
+                continue
+            fetched[key] = None if value in (_ABSENT, _ABSENT.encode()) else json_codec.loads(value)
+        self.fallback._put_many(fetched)
+        found.update(fetched)
+        return found
+
+    def _put_many(self, entries: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        self.fallback._put_many(entries)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            ttl = max(1, int(self.ttl_seconds))
+            for key, profile in entries.items():
+                value = _ABSENT if profile is None else json_codec.dumps(profile)
+                pipe.set(self._key(key), value, ex=ttl)
+            pipe.execute()
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"Failed to write {len(entries)} user profile(s) to Redis: {e}")
+
+    def _invalidate(self, keys: List[str]) -> None:
+        self.fallback._invalidate(keys)
+        try:
+            self.client.delete(*(self._key(key) for key in keys))
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"Failed to invalidate user profiles in Redis: {e}")
+
+    def clear(self) -> None:
+        self.fallback.clear()
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status.update({"key_prefix": self.key_prefix, "fallback": self.fallback.get_status()})
+        return status
+
+
+def create_user_cache(backend: Optional[str] = None) -> UserCache:
+    """Build the user cache selected by ``USER_CACHE_BACKEND``."""
+    backend = (backend or settings.USER_CACHE_BACKEND).lower()
+    memory_cache = InMemoryUserCache(
+        ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+        max_entries=settings.USER_CACHE_MAX_ENTRIES,
+    )
+    if backend == "redis":
+        from app.config import get_redis_url
+
+        return RedisUserCache(
+            get_redis_url(),
+            ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+            fallback=memory_cache,
+        )
+    if backend != "memory":
+        logger.warning(f"Unknown user cache backend '{backend}', using in-process cache")
+    return memory_cache
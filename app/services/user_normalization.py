@@ -2,15 +2,24 @@
 User Normalization Service
 
 Handles user profile normalization, merging, and deduplication across data sources.
+
+Statement normalization reads user profiles from ``UserCache`` and buffers
+activity updates in ``UserActivityBuffer``, so the per-statement path runs no
+BigQuery job once the cache is warm.  CSV imports still upsert row by row and
+refresh the cache entries they change.
 """
 
+import asyncio
 import re
 import hashlib
 import json
+import time
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timezone
 from app.logging_config import get_logger
 from app.config.gcp_config import get_gcp_config
+from app.services.user_activity import UserActivityBuffer
+from app.services.user_cache import UserCache, create_user_cache, user_profile
 from google.cloud import bigquery
 
 logger = get_logger("user_normalization")
@@ -19,10 +28,16 @@ logger = get_logger("user_normalization")
 class UserNormalizationService:
     """Service for normalizing and merging user profiles across data sources."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        user_cache: Optional[UserCache] = None,
+        activity_buffer: Optional[UserActivityBuffer] = None,
+    ):
         self.gcp_config = get_gcp_config()
         self.bigquery_client = self.gcp_config.bigquery_client
         self.dataset_id = self.gcp_config.bigquery_dataset
+        self.user_cache = user_cache or create_user_cache()
+        self.activity_buffer = activity_buffer or UserActivityBuffer(self.bigquery_client, self.dataset_id)
     
     def normalize_email(self, email: str) -> str:
         """Normalize email address for consistent matching."""
@@ -165,49 +180,89 @@ class UserNormalizationService:
         return user_info
     
     async def find_existing_user(self, user_id: str, email: str = "") -> Optional[Dict[str, Any]]:
-        """Find existing user by ID or email."""
-        try:
-            # Try to find by user_id first
-            if user_id:
-                query = f"""
-                SELECT * FROM `{self.dataset_id}.users` 
-                WHERE user_id = @user_id
-                LIMIT 1
-                """
-                
-                job_config = bigquery.QueryJobConfig()
-                job_config.query_parameters = [
-                    bigquery.ScalarQueryParameter("user_id", "STRING", user_id)
-                ]
-                
-                results = self.bigquery_client.query(query, job_config=job_config)
-                for row in results:
-                    return dict(row)
-            
-            # Try to find by email if user_id didn't work
-            if email:
-                normalized_email = self.normalize_email(email)
-                query = f"""
-                SELECT * FROM `{self.dataset_id}.users` 
-                WHERE email = @email
-                LIMIT 1
-                """
-                
-                job_config = bigquery.QueryJobConfig()
-                job_config.query_parameters = [
-                    bigquery.ScalarQueryParameter("email", "STRING", normalized_email)
-                ]
-                
-                results = self.bigquery_client.query(query, job_config=job_config)
-                for row in results:
-                    return dict(row)
-            
+        """Find existing user by ID or email (one query; an ID match wins)."""
+        normalized_email = self.normalize_email(email) if email else ""
+        if not user_id and not normalized_email:
             return None
-            
+        query = f"""
+        SELECT * FROM `{self.dataset_id}.users`
+        WHERE (@user_id != '' AND user_id = @user_id)
+           OR (@email != '' AND email = @email)
+        ORDER BY IF(user_id = @user_id, 0, 1)
+        LIMIT 1
+        """
+
+        job_config = bigquery.QueryJobConfig()
+        job_config.query_parameters = [
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id or ""),
+            bigquery.ScalarQueryParameter("email", "STRING", normalized_email)
+        ]
+
+        def run_query() -> Optional[Dict[str, Any]]:
+            results = self.bigquery_client.query(query, job_config=job_config)
+            for row in results:
+                return dict(row)
+            return None
+
+        try:
+            # Off the event loop: callers may share it with other statements
+            return await asyncio.to_thread(run_query)
         except Exception as e:
             logger.error(f"Error finding existing user: {e}")
             return None
-    
+
+    def _cache_keys(self, user_id: str, email: str = "") -> List[str]:
+        keys = []
+        for key in (user_id, self.normalize_email(email) if email else ""):
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+
+    async def get_cached_user(self, user_id: str, email: str = "") -> Optional[Dict[str, Any]]:
+        """Find a user's profile through the cache, querying BigQuery only on a miss."""
+        keys = self._cache_keys(user_id, email)
+        if not keys:
+            return None
+
+        cached = self.user_cache.get_many(keys)
+        for key in keys:
+            if cached.get(key) is not None:
+                return cached[key]
+        if len(cached) == len(keys):
+            return None  # cached as absent under every key
+
+        existing_user = await self.find_existing_user(user_id, email)
+        profile = user_profile(existing_user) if existing_user else None
+        entries = {key: profile for key in keys}
+        if profile:
+            for key in self._cache_keys(profile.get("user_id") or "", profile.get("email") or ""):
+                entries[key] = profile
+        self.user_cache.put_many(entries)
+        return profile
+
+    def warm_user_cache(self) -> int:
+        """Load every user profile into the cache with one query; returns the number loaded."""
+        try:
+            started = time.perf_counter()
+            query = f"SELECT user_id, email, name, csv_data FROM `{self.dataset_id}.users`"
+            entries = {}
+            count = 0
+            for row in self.bigquery_client.query(query).result(page_size=10000):
+                profile = user_profile(dict(row))
+                for key in self._cache_keys(profile.get("user_id") or "", profile.get("email") or ""):
+                    entries[key] = profile
+                count += 1
+                if len(entries) >= 1000:
+                    self.user_cache.put_many(entries)
+                    entries = {}
+            self.user_cache.put_many(entries)
+            logger.info(f"Warmed user cache with {count} profile(s) in {time.perf_counter() - started:.1f}s")
+            return count
+        except Exception as e:
+            # Lookups still fall back to per-user queries on a miss
+            logger.error(f"Failed to warm user cache: {e}")
+            return 0
+
     async def merge_user_data(self, existing_user: Dict[str, Any], new_user: Dict[str, Any]) -> Dict[str, Any]:
         """Merge new user data with existing user data."""
         merged = existing_user.copy()
@@ -346,6 +401,12 @@ class UserNormalizationService:
             
             query_job = self.bigquery_client.query(merge_query, job_config=job_config)
             query_job.result()  # Wait for completion
+
+            # Enrichment reads the cache, so publish the new profile (e.g. fresh CSV data)
+            profile = user_profile(dict(bigquery_row, csv_data=csv_data_list))
+            self.user_cache.put_many({
+                key: profile for key in self._cache_keys(bigquery_row["user_id"], bigquery_row["email"])
+            })
             
             return True
             
@@ -358,8 +419,8 @@ class UserNormalizationService:
         # Extract user info
         user_info = self.extract_user_info_from_xapi(statement)
         
-        # Upsert user (this will merge with CSV users if they exist)
-        await self.upsert_user(user_info)
+        # Buffer last_seen/activity_count; written with the next set-based MERGE
+        self.activity_buffer.record(user_info)
         
         # Return normalized statement with user_id
         normalized_statement = statement.copy()
@@ -367,7 +428,7 @@ class UserNormalizationService:
         
         # Check if user has CSV data and enrich statement
         if user_info.get("user_id") or user_info.get("email"):
-            existing_user = await self.find_existing_user(
+            existing_user = await self.get_cached_user(
                 user_info.get("user_id", ""),
                 user_info.get("email", "")
             )
@@ -487,6 +548,12 @@ class UserNormalizationService:
         
         return normalized_row
 
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "cache": self.user_cache.get_status(),
+            "activity": self.activity_buffer.get_status(),
+        }
+
 
 # Global service instance (lazy-loaded)
 user_normalization_service = None
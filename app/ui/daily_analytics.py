@@ -18,8 +18,9 @@ import os
 
 from app.logging_config import get_logger
 from app.api.bigquery_analytics import execute_bigquery_query
+from app.utils.json_codec import FastJSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)  # large analytics payloads
 logger = get_logger("daily_analytics")
 templates = Jinja2Templates(directory="app/templates")
 
@@ -4,11 +4,13 @@ from fastapi import APIRouter, Request, Query
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from typing import Optional, Dict, Any
+import asyncio
 import httpx
 import os
 from app.logging_config import get_logger
+from app.utils.json_codec import FastJSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)  # large statement feeds
 templates = Jinja2Templates(directory="app/templates")
 logger = get_logger("data_explorer")
 
@@ -647,13 +649,30 @@ async def data_explorer(
     return templates.TemplateResponse("data_explorer_modern.html", context)
 
 
+async def get_archive_summary() -> Optional[Dict[str, Any]]:
+    """Archive totals from the archive index (one object read, no bucket listing)."""
+    from app.etl.archive_index import get_archive_index
+
+    try:
+        index = get_archive_index()
+        if index is None:
+            return None
+        summary = await asyncio.to_thread(index.summary)
+        summary["total_size_mb"] = round(summary["total_size_bytes"] / (1024 * 1024), 2)
+        return summary
+    except Exception as e:
+        logger.warning(f"Archive index unavailable: {e}")
+        return None
+
+
 @router.get("/raw-statements", response_class=HTMLResponse)
 async def raw_statements_debug(request: Request, limit: int = Query(25, ge=1, le=100)) -> HTMLResponse:
     """Debug view showing raw incoming xAPI statements before processing."""
     base_url = get_api_base_url(request)
     raw_data = await get_raw_incoming_statements(limit, base_url)
     status = await get_system_status(request)
-    
+    archive = await get_archive_summary()
+
     context = {
         "request": request,
         "active_page": "raw_statements",
@@ -662,7 +681,8 @@ async def raw_statements_debug(request: Request, limit: int = Query(25, ge=1, le
         "total_count": raw_data.get("total_count", 0),
         "system_status": status,
         "limit": limit,
-        "success": raw_data.get("success", False)
+        "success": raw_data.get("success", False),
+        "archive": archive
     }
 
     return templates.TemplateResponse("raw_statements_debug.html", context)
@@ -0,0 +1,85 @@
+"""
+Central JSON codec for hot serialization paths.
+
+Uses ``orjson`` when it is installed and falls back to the stdlib ``json``
+module otherwise, so callers never need to care which backend is active.
+Output is compact UTF-8 (no ASCII escaping); ``indent=True`` gives two-space
+indentation in both backends.
+
+``JSONDecodeError`` is raised for invalid input by either backend
+(``orjson.JSONDecodeError`` subclasses ``json.JSONDecodeError``).
+"""
+
+import json
+from json import JSONDecodeError
+from typing import Any, Callable, Optional, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson installed
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps_bytes(
+    obj: Any,
+    *,
+    default: Optional[Callable[[Any], Any]] = None,
+    indent: bool = False,
+    sort_keys: bool = False,
+) -> bytes:
+    """Serialize ``obj`` to UTF-8 JSON bytes."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits; the stdlib handles those
+            pass
+    return json.dumps(
+        obj,
+        default=default,
+        indent=2 if indent else None,
+        sort_keys=sort_keys,
+        ensure_ascii=False,
+        separators=None if indent else (",", ":"),
+    ).encode("utf-8")
+
+
+def dumps(
+    obj: Any,
+    *,
+    default: Optional[Callable[[Any], Any]] = None,
+    indent: bool = False,
+    sort_keys: bool = False,
+) -> str:
+    """Serialize ``obj`` to a JSON string."""
+    return dumps_bytes(obj, default=default, indent=indent, sort_keys=sort_keys).decode("utf-8")
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Deserialize JSON text or UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Deep-copy ``obj`` into plain JSON types, stringifying anything unknown."""
+    return loads(dumps_bytes(obj, default=str))
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` rendered through the shared codec (orjson when available)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content, default=str)
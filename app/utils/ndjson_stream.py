@@ -0,0 +1,142 @@
+"""
+Incremental NDJSON parsing for streamed (optionally gzip-compressed) request bodies.
+
+Bulk ingest reads the request body chunk by chunk instead of buffering the
+whole upload, so memory stays bounded by the chunk size and statements can be
+published while the client is still sending.  Gzip bodies may hold several
+concatenated members (``pigz``, ``cat a.gz b.gz``); each inflate step is
+capped at ``INFLATE_STEP_BYTES`` and the whole body at ``max_decompressed_bytes``.
+"""
+
+import zlib
+from typing import Any, AsyncIterator, Iterator, List, Tuple, Union
+
+from app.utils import json_codec
+
+MAX_LINE_BYTES = 1024 * 1024  # a single xAPI statement is far below this
+MAX_DECOMPRESSED_BYTES = 1024 * 1024 * 1024
+INFLATE_STEP_BYTES = 256 * 1024
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+ParsedLine = Tuple[int, Union[Any, Exception]]
+
+
+class NDJSONLineTooLong(ValueError):
+    """Raised (per line) when a line exceeds ``MAX_LINE_BYTES``."""
+
+
+class NDJSONBodyTooLarge(ValueError):
+    """Raised when a gzip body inflates past ``max_decompressed_bytes``."""
+
+
+class _GzipInflater:
+    """Incremental gunzip of one or more concatenated members, bounded per step and in total."""
+
+    def __init__(self, max_total: int, step: int = INFLATE_STEP_BYTES):
+        self._decompressor = zlib.decompressobj(GZIP_WBITS)
+        self._max_total = max_total
+        self._step = step
+        self.total = 0
+
+    def _emit(self, piece: bytes) -> bytes:
+        self.total += len(piece)
+        if self.total > self._max_total:
+            raise NDJSONBodyTooLarge(f"decompressed body exceeds {self._max_total} bytes")
+        return piece
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        while True:
+            piece = self._decompressor.decompress(data, self._step)
+            if piece:
+                yield self._emit(piece)
+            if self._decompressor.eof:
+                # End of a member: whatever follows starts the next one
+                data = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(GZIP_WBITS)
+                if not data:
+                    return
+                continue
+            data = self._decompressor.unconsumed_tail
+            if not data and len(piece) < self._step:
+                return
+
+    def finish(self) -> bytes:
+        return self._emit(self._decompressor.flush())
+
+
+async def iter_ndjson_batches(
+    byte_stream: AsyncIterator[bytes],
+    *,
+    batch_size: int,
+    gzipped: bool = False,
+    max_line_bytes: int = MAX_LINE_BYTES,
+    max_decompressed_bytes: int = MAX_DECOMPRESSED_BYTES,
+) -> AsyncIterator[List[ParsedLine]]:
+    """
+    Yield lists of ``(line_number, value)`` parsed from an NDJSON byte stream.
+
+    ``value`` is the decoded JSON document, or the exception raised while
+    decoding that line, so one bad line never aborts the stream.  Blank lines
+    are skipped.  Line numbers are 1-based.
+
+    Args:
+        byte_stream: async iterator of raw body chunks (``request.stream()``)
+        batch_size: maximum number of parsed lines per yielded list
+        gzipped: body is gzip-compressed (``Content-Encoding: gzip``)
+        max_line_bytes: longest accepted line
+        max_decompressed_bytes: largest inflated gzip body; beyond it
+            ``NDJSONBodyTooLarge`` is raised
+
+    Raises:
+        zlib.error: the gzip body is corrupt
+        NDJSONBodyTooLarge: the gzip body inflates past ``max_decompressed_bytes``
+    """
+    inflater = _GzipInflater(max_decompressed_bytes) if gzipped else None
+    buffer = b""
+    skipping_long_line = False
+    line_number = 0
+    batch: List[ParsedLine] = []
+
+    def parse(line: bytes) -> None:
+        nonlocal line_number
+        line_number += 1
+        if not line.strip():
+            return
+        try:
+            batch.append((line_number, json_codec.loads(line)))
+        except ValueError as e:
+            batch.append((line_number, e))
+
+    async for chunk in byte_stream:
+        for piece in inflater.feed(chunk) if inflater is not None else (chunk,):
+            buffer += piece
+
+            start = 0
+            while True:
+                newline = buffer.find(b"\n", start)
+                if newline < 0:
+                    break
+                line, start = buffer[start:newline], newline + 1
+                if skipping_long_line:
+                    skipping_long_line = False
+                    continue
+                parse(line)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            buffer = buffer[start:]
+
+            if len(buffer) > max_line_bytes and not skipping_long_line:
+                # Drop the oversized line up to its newline instead of buffering it
+                line_number += 1
+                batch.append((line_number, NDJSONLineTooLong(f"line exceeds {max_line_bytes} bytes")))
+                skipping_long_line = True
+            if skipping_long_line:
+                buffer = b""
+
+    if inflater is not None:
+        buffer += inflater.finish()
+    if buffer and not skipping_long_line:
+        parse(buffer)
+    if batch:
+        yield batch
@@ -0,0 +1,178 @@
+"""
+Heartbeats from worker processes to the web tier.
+
+Each worker process periodically reports its component status; the web
+tier reads the latest reports to show worker health without hosting the
+workers itself.  Two backends share one interface:
+
+* ``FileWorkerHealthStore`` - one JSON file per component in a directory
+  shared by the supervisor and the web process (same host or volume).
+* ``RedisWorkerHealthStore`` - keys with a TTL, for workers running on
+  other instances; falls back to the file store if Redis is unreachable.
+"""
+
+import os
+import socket
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.utils import json_codec
+
+logger = get_logger("worker_health")
+
+
+class WorkerHealthStore:
+    """Interface shared by the worker health backends."""
+
+    backend = "base"
+
+    def report(self, component: str, status: Dict[str, Any]) -> None:
+        """Record the latest status of ``component`` (stamped with pid, host and time)."""
+        payload = {
+            **status,
+            "component": component,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "reported_at": time.time(),
+        }
+        self._write(component, json_codec.dumps(payload, default=str))
+
+    def read_all(self) -> Dict[str, Dict[str, Any]]:
+        reports = {}
+        for component, raw in self._read_all().items():
+            try:
+                reports[component] = json_codec.loads(raw)
+            except ValueError:
+                logger.warning(f"Ignoring unreadable health report for {component}")
+        return reports
+
+    def _write(self, component: str, payload: str) -> None:
+        raise NotImplementedError
+
+    def _read_all(self) -> Dict[str, str]:
+        raise NotImplementedError
+
+
+class FileWorkerHealthStore(WorkerHealthStore):
+    """One ``<component>.json`` per worker, replaced atomically on every report."""
+
+    backend = "file"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _write(self, component: str, payload: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{component}.", suffix=".tmp")
+        with os.fdopen(fd, "w") as tmp:
+            tmp.write(payload)
+        os.replace(tmp_path, os.path.join(self.directory, f"{component}.json"))
+
+    def _read_all(self) -> Dict[str, str]:
+        if not os.path.isdir(self.directory):
+            return {}
+        reports = {}
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as report:
+                    reports[filename[:-len(".json")]] = report.read()
+            except OSError:
+                continue  # replaced or removed while listing
+        return reports
+
+
+class RedisWorkerHealthStore(WorkerHealthStore):
+    """Health reports as ``SET key payload EX ttl`` so dead workers age out."""
+
+    backend = "redis"
+
+    def __init__(
+        self,
+        redis_url: str,
+        ttl_seconds: float,
+        fallback: FileWorkerHealthStore,
+        key_prefix: str = "workers:health:",
+        client: Optional[Any] = None,
+    ):
+        self.redis_url = redis_url
+        self.ttl_seconds = ttl_seconds
+        self.fallback = fallback
+        self.key_prefix = key_prefix
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(
+                self.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0
+            )
+        return self._client
+
+    def _write(self, component: str, payload: str) -> None:
+        try:
+            self.client.set(f"{self.key_prefix}{component}", payload, ex=max(1, int(self.ttl_seconds)))
+        except Exception as e:
+            logger.warning(f"Redis health report failed, writing to {self.fallback.directory}: {e}")
+            self.fallback._write(component, payload)
+
+    def _read_all(self) -> Dict[str, str]:
+        try:
+            keys = list(self.client.scan_iter(match=f"{self.key_prefix}*"))
+            values = self.client.mget(keys) if keys else []
+        except Exception as e:
+            logger.warning(f"Redis health read failed, using {self.fallback.directory}: {e}")
+            return self.fallback._read_all()
+        reports = self.fallback._read_all()
+        for key, value in zip(keys, values):
+            if value is not None:
+                key = key.decode() if isinstance(key, bytes) else key
+                reports[key[len(self.key_prefix):]] = value.decode() if isinstance(value, bytes) else value
+        return reports
+
+
+def create_worker_health_store(backend: Optional[str] = None) -> WorkerHealthStore:
+    """Build the health store selected by ``WORKER_HEALTH_BACKEND``."""
+    backend = (backend or settings.WORKER_HEALTH_BACKEND).lower()
+    file_store = FileWorkerHealthStore(settings.WORKER_HEALTH_DIR)
+    if backend == "redis":
+        from app.config import get_redis_url
+
+        return RedisWorkerHealthStore(
+            get_redis_url(),
+            ttl_seconds=settings.WORKER_HEALTH_STALE_AFTER,
+            fallback=file_store,
+        )
+    if backend != "file":
+        logger.warning(f"Unknown worker health backend '{backend}', using {file_store.directory}")
+    return file_store
+
+
+def worker_health_summary(
+    store: Optional[WorkerHealthStore] = None,
+    stale_after: Optional[float] = None,
+    now: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Latest report per component, flagged unhealthy when stale or not running."""
+    store = store or create_worker_health_store()
+    stale_after = stale_after if stale_after is not None else settings.WORKER_HEALTH_STALE_AFTER
+    now = now if now is not None else time.time()
+
+    workers = {}
+    for component, report in store.read_all().items():
+        age = now - float(report.get("reported_at") or 0)
+        report["age_seconds"] = round(age, 1)
+        report["healthy"] = age <= stale_after and report.get("state") == "running"
+        workers[component] = report
+
+    return {
+        "backend": store.backend,
+        "healthy": bool(workers) and all(report["healthy"] for report in workers.values()),
+        "workers": workers,
+    }
@@ -0,0 +1,299 @@
+"""
+Worker entrypoint that runs pipeline components as separate OS processes.
+
+Inside the web process the Pub/Sub consumers compete with request handling
+for the GIL.  With ``APP_RUN_MODE=api`` the web tier starts none of them and
+this supervisor runs each selected component in its own process instead
+(the ingest spool drainer stays in the web process, the only writer of its
+spool directory):
+
+    python -m app.workers.supervisor                       # WORKER_COMPONENTS
+    python -m app.workers.supervisor processor storage     # explicit selection
+    python -m app.workers.supervisor --list
+
+Children are started with the ``spawn`` method (gRPC clients do not survive
+``fork``), report their status every ``WORKER_HEARTBEAT_INTERVAL`` seconds
+through the worker health store, and are restarted with exponential backoff
+when they exit.  The web tier reads the reports at
+``/api/debug/workers-status``.
+"""
+
+import argparse
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.logging_config import get_logger
+from app.workers.health import WorkerHealthStore, create_worker_health_store
+
+logger = get_logger("worker_supervisor")
+
+# start() launches the component's background thread(s), stop() drains them, status() reports
+ComponentHooks = Tuple[Callable[[], Any], Callable[[], Any], Callable[[], Dict[str, Any]]]
+
+
+def _processor() -> ComponentHooks:
+    from app.etl import pubsub_bigquery_processor as module
+
+    return module.start_processor_background, module.stop_processor, lambda: module.get_processor().get_status()
+
+
+def _storage() -> ComponentHooks:
+    from app.etl import pubsub_storage_subscriber as module
+
+    return module.start_subscriber_background, module.stop_subscriber, lambda: module.get_subscriber().get_status()
+
+
+def _migration() -> ComponentHooks:
+    from app.etl import bigquery_schema_migration as module
+
+    return (
+        module.start_migration_background,
+        module.stop_migration,
+        lambda: module.get_migration().get_migration_status(),
+    )
+
+
+def _unified() -> ComponentHooks:
+    from app.etl import unified_consumer as module
+
+    return (
+        module.start_unified_consumer_background,
+        module.stop_unified_consumer,
+        lambda: module.get_unified_consumer().get_status(),
+    )
+
+
+def _safety() -> ComponentHooks:
+    # The AI batcher queues in-process, so it runs next to the consumer that feeds it
+    import asyncio
+
+    from app.api.batch_ai_safety import batch_processor
+    from app.etl import pubsub_safety_consumer as module
+    from app.workers.batch_processor import BatchWorker
+
+    worker = BatchWorker()
+
+    def start():
+        module.start_safety_consumer_background()
+        threading.Thread(target=asyncio.run, args=(worker.start(),), name="ai-batch-worker", daemon=True).start()
+
+    def stop():
+        worker.stop()
+        module.stop_safety_consumer()
+
+    def status():
+        return {**module.get_safety_consumer().get_status(), "ai_batch": batch_processor.get_batch_status()}
+
+    return start, stop, status
+
+
+COMPONENTS: Dict[str, Callable[[], ComponentHooks]] = {
+    "processor": _processor,
+    "storage": _storage,
+    "migration": _migration,
+    "unified": _unified,
+    "safety": _safety,
+}
+
+
+def default_components() -> List[str]:
+    """``WORKER_COMPONENTS``, or whatever the web process would otherwise start."""
+    if settings.WORKER_COMPONENTS:
+        return [name.strip() for name in settings.WORKER_COMPONENTS.split(",") if name.strip()]
+    etl = ["unified"] if settings.ETL_UNIFIED_CONSUMER_ENABLED else ["processor", "storage", "migration"]
+    return etl + ["safety"]
+
+
+def run_component(name: str, heartbeat_interval: float) -> None:
+    """Child process body: start one component and report on it until SIGTERM."""
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+
+    store = create_worker_health_store()
+    start, stop, status = COMPONENTS[name]()
+    started_at = datetime.now(timezone.utc).isoformat()
+    logger.info(f"Worker {name} starting (pid {multiprocessing.current_process().pid})")
+    start()
+
+    def report(state: str) -> None:
+        try:
+            details = status()
+        except Exception as e:
+            details = {"error": str(e)}
+        try:
+            store.report(name, {"state": state, "started_at": started_at, "status": details})
+        except Exception as e:
+            logger.warning(f"Worker {name} failed to report health: {e}")
+
+    while not stopping.is_set():
+        report("running")
+        stopping.wait(heartbeat_interval)
+
+    logger.info(f"Worker {name} stopping")
+    try:
+        stop()
+    finally:
+        report("stopped")
+
+
+@dataclass
+class _Child:
+    name: str
+    process: Optional[multiprocessing.process.BaseProcess] = None
+    started_at: float = 0.0
+    restarts: int = 0
+    failures: int = 0  # consecutive short-lived runs, drives the backoff
+    next_start: float = 0.0
+    last_exitcode: Optional[int] = None
+
+
+class WorkerSupervisor:
+    """Keeps one process per component alive and reports on them."""
+
+    def __init__(
+        self,
+        components: List[str],
+        store: Optional[WorkerHealthStore] = None,
+        heartbeat_interval: float = 10.0,
+        restart_backoff: float = 1.0,
+        max_restart_backoff: float = 60.0,
+        target: Callable[[str, float], None] = run_component,
+        context=None,
+        clock=time.monotonic,
+    ):
+        unknown = [name for name in components if name not in COMPONENTS]
+        if unknown:
+            raise ValueError(f"Unknown worker component(s): {', '.join(unknown)}")
+        if not components:
+            raise ValueError("No worker components selected")
+        self.children = {name: _Child(name) for name in components}
+        self.store = store or create_worker_health_store()
+        self.heartbeat_interval = heartbeat_interval
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self.target = target
+        self.context = context or multiprocessing.get_context("spawn")
+        self._clock = clock
+        self._stopping = threading.Event()
+
+    @classmethod
+    def from_settings(cls, components: Optional[List[str]] = None) -> "WorkerSupervisor":
+        return cls(
+            components or default_components(),
+            heartbeat_interval=settings.WORKER_HEARTBEAT_INTERVAL,
+            restart_backoff=settings.WORKER_RESTART_BACKOFF,
+            max_restart_backoff=settings.WORKER_MAX_RESTART_BACKOFF,
+        )
+
+    def _spawn(self, child: _Child) -> None:
+        child.process = self.context.Process(
+            target=self.target,
+            args=(child.name, self.heartbeat_interval),
+            name=f"worker-{child.name}",
+        )
+        child.process.start()
+        child.started_at = self._clock()
+        logger.info(f"Started worker {child.name} (pid {child.process.pid})")
+
+    def start(self) -> None:
+        for child in self.children.values():
+            self._spawn(child)
+
+    def check(self) -> List[str]:
+        """Restart exited children whose backoff has elapsed; returns their names."""
+        restarted = []
+        now = self._clock()
+        for child in self.children.values():
+            if child.process is None or child.process.is_alive() or self._stopping.is_set():
+                continue
+            if child.next_start == 0.0:
+                # Just noticed the exit: schedule the restart
+                child.last_exitcode = child.process.exitcode
+                uptime = now - child.started_at
+                child.failures = 1 if uptime >= self.max_restart_backoff else child.failures + 1
+                delay = min(self.max_restart_backoff, self.restart_backoff * (2 ** (child.failures - 1)))
+                child.next_start = now + delay
+                logger.warning(
+                    f"Worker {child.name} exited with code {child.last_exitcode} after {uptime:.0f}s; "
+                    f"restarting in {delay:.0f}s"
+                )
+            if now >= child.next_start:
+                child.next_start = 0.0
+                child.restarts += 1
+                self._spawn(child)
+                restarted.append(child.name)
+        return restarted
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """SIGTERM every child, wait up to ``timeout`` for them to drain, then kill stragglers."""
+        self._stopping.set()
+        alive = [child.process for child in self.children.values() if child.process and child.process.is_alive()]
+        for process in alive:
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in alive:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {process.name} did not stop in {timeout:.0f}s, killing")
+                process.kill()
+                process.join()
+
+    def run(self) -> None:
+        """Start every component and supervise until SIGTERM/SIGINT."""
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: self._stopping.set())
+        self.start()
+        while not self._stopping.is_set():
+            self.check()
+            try:
+                self.store.report("supervisor", {"state": "running", "status": self.get_status()})
+            except Exception as e:
+                logger.warning(f"Supervisor failed to report health: {e}")
+            self._stopping.wait(min(self.heartbeat_interval, 1.0 + self.restart_backoff))
+        logger.info("Stopping workers")
+        self.stop()
+        self.store.report("supervisor", {"state": "stopped", "status": self.get_status()})
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "children": {
+                child.name: {
+                    "pid": child.process.pid if child.process else None,
+                    "alive": bool(child.process and child.process.is_alive()),
+                    "restarts": child.restarts,
+                    "last_exitcode": child.last_exitcode,
+                }
+                for child in self.children.values()
+            },
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run pipeline components as supervised worker processes.")
+    parser.add_argument("components", nargs="*", help=f"any of: {', '.join(COMPONENTS)}")
+    parser.add_argument("--list", action="store_true", help="list components and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        defaults = default_components()
+        for name in COMPONENTS:
+            print(f"{name}{' (default)' if name in defaults else ''}")
+        return
+
+    try:
+        supervisor = WorkerSupervisor.from_settings(args.components)
+    except ValueError as e:
+        parser.error(str(e))
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])